@@ -0,0 +1,600 @@
+import copy
+import math
+from collections import Counter
+from datetime import datetime
+from anomaly_engine import AnomalyEngine, DEFAULT_RULES
+from sketches import SpaceSaving, HyperLogLog
+from dns_transactions import DnsTransactionTable
+from tcp_flows import FlowTable
+from timeline import build_series, timeline_preview
+from traffic_tables import add_conversation, merge_conversations, conversation_table, top_conversations
+from packet_record import (
+    LAYER_IP, LAYER_TCP, LAYER_UDP, LAYER_ICMP, LAYER_ARP, LAYER_DNS, FILTER_PROTOCOLS
+)
+
+
+class Accumulator:
+    """Base class for single-pass analysis stages
+
+    Each accumulator sees every PacketRecord exactly once through ``add`` and
+    produces its section of ``analysis_results`` from ``result``. State must
+    stay bounded by flows/endpoints, never by the number of packets.
+
+    For parallel analysis each chunk of a capture gets its own instance and
+    the partial states are combined with ``merge`` in capture order, so
+    first-seen ordering matches a serial run. Anything that depends on the
+    whole capture (averages, thresholds, top-N) belongs in ``result``.
+
+    ``result`` may consume state that only the end of a capture settles
+    (open TCP flows, pending DNS queries, anomaly windows); for a capture
+    that is still growing ``peek`` returns the same section and leaves the
+    state to take more packets. ``revision`` changes whenever ``result``
+    would; None means unknown and the section is always rebuilt.
+    """
+    key = None
+
+    def add(self, record):
+        raise NotImplementedError
+
+    def merge(self, other):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+    def peek(self):
+        return self.result()
+
+    def revision(self):
+        return None
+
+
+class BasicStatsAccumulator(Accumulator):
+    """Packet/byte totals and capture time range"""
+    key = 'basic_stats'
+
+    def __init__(self):
+        self.total_packets = 0
+        self.total_bytes = 0
+        self.first_time = None
+        self.last_time = None
+
+    def add(self, record):
+        self.total_packets += 1
+        self.total_bytes += record.length
+        ts = record.time
+        if self.first_time is None or ts < self.first_time:
+            self.first_time = ts
+        if self.last_time is None or ts > self.last_time:
+            self.last_time = ts
+
+    def merge(self, other):
+        self.total_packets += other.total_packets
+        self.total_bytes += other.total_bytes
+        if other.first_time is not None and (self.first_time is None or other.first_time < self.first_time):
+            self.first_time = other.first_time
+        if other.last_time is not None and (self.last_time is None or other.last_time > self.last_time):
+            self.last_time = other.last_time
+
+    def result(self):
+        if not self.total_packets:
+            return {}
+
+        duration = self.last_time - self.first_time
+        start_time = datetime.fromtimestamp(self.first_time)
+        end_time = datetime.fromtimestamp(self.last_time)
+
+        throughput_bps = self.total_bytes / duration if duration > 0 else 0
+        throughput_pps = self.total_packets / duration if duration > 0 else 0
+
+        return {
+            'total_packets': self.total_packets,
+            'total_bytes': self.total_bytes,
+            'duration_seconds': round(duration, 2),
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'throughput_bps': round(throughput_bps, 2),
+            'throughput_pps': round(throughput_pps, 2),
+            'avg_packet_size': round(self.total_bytes / self.total_packets, 2)
+        }
+
+
+class ProtocolDistributionAccumulator(Accumulator):
+    """Packet counts per top-level protocol class"""
+    key = 'protocol_distribution'
+
+    def __init__(self):
+        self.protocol_counts = Counter()
+
+    def add(self, record):
+        layers = record.layers
+        if layers & LAYER_IP:
+            if layers & LAYER_TCP:
+                self.protocol_counts['TCP'] += 1
+            elif layers & LAYER_UDP:
+                self.protocol_counts['UDP'] += 1
+            elif layers & LAYER_ICMP:
+                self.protocol_counts['ICMP'] += 1
+            else:
+                self.protocol_counts['Other IP'] += 1
+        elif layers & LAYER_ARP:
+            self.protocol_counts['ARP'] += 1
+        else:
+            self.protocol_counts['Other'] += 1
+
+    def merge(self, other):
+        self.protocol_counts.update(other.protocol_counts)
+
+    def result(self):
+        total = sum(self.protocol_counts.values())
+        return {
+            proto: {'count': count, 'percentage': round((count / total) * 100, 2)}
+            for proto, count in self.protocol_counts.items()
+        }
+
+
+class ConversationAccumulator(Accumulator):
+    """Every undirected IP conversation, with per-direction counters and first/last seen
+
+    PcapAnalyzer derives the top-10 ``ip_conversations`` from this section.
+    """
+    key = 'conversation_table'
+    top_n = 10
+
+    def __init__(self):
+        self.conversations = {}
+
+    def add(self, record):
+        if record.layers & LAYER_IP:
+            add_conversation(self.conversations, record.src, record.dst, record.length, record.time)
+
+    def merge(self, other):
+        merge_conversations(self.conversations, other.conversations)
+
+    def result(self):
+        return conversation_table(self.conversations)
+
+
+class TcpAccumulator(Accumulator):
+    """Bidirectional TCP flows, handshake outcomes and timings"""
+    key = 'tcp_analysis'
+
+    def __init__(self):
+        self.flows = FlowTable()
+
+    def add(self, record):
+        if record.layers & (LAYER_IP | LAYER_TCP) != (LAYER_IP | LAYER_TCP):
+            return
+        self.flows.add(record.time, record.src, record.sport, record.dst, record.dport,
+                       record.tcp_flags, record.length)
+
+    def merge(self, other):
+        self.flows.merge(other.flows)
+
+    def result(self):
+        return self.flows.result()
+
+    def peek(self):
+        view = copy.copy(self)
+        view.flows = self.flows.view()
+        return view.result()
+
+    def revision(self):
+        return self.flows.total_packets
+
+
+class DnsAccumulator(Accumulator):
+    """DNS query/response counts, most queried domains and query/response transactions"""
+    key = 'dns_analysis'
+
+    def __init__(self):
+        self.total_queries = 0
+        self.total_responses = 0
+        self.domains = Counter()
+        self.transactions = DnsTransactionTable()
+
+    def add(self, record):
+        if not record.layers & LAYER_DNS:
+            return
+        if record.layers & LAYER_IP:
+            self.transactions.add(record.time, record.src, record.dst, record.dns_qr, record.dns_id, record.dns_rcode)
+        if record.dns_qr == 0:
+            self.total_queries += 1
+            if record.dns_qname is not None:
+                self.domains[record.dns_qname] += 1
+        else:
+            self.total_responses += 1
+
+    def merge(self, other):
+        self.total_queries += other.total_queries
+        self.total_responses += other.total_responses
+        self.domains.update(other.domains)
+        self.transactions.merge(other.transactions)
+
+    def peek(self):
+        view = copy.copy(self)
+        view.transactions = self.transactions.view()
+        return view.result()
+
+    def revision(self):
+        return self.total_queries, self.total_responses
+
+    def result(self):
+        if not self.total_queries and not self.total_responses:
+            return {'total_queries': 0, 'total_responses': 0, 'top_domains': []}
+
+        top_domains = [{'domain': domain, 'count': count}
+                       for domain, count in self.domains.most_common(10)]
+
+        return {
+            'total_queries': self.total_queries,
+            'total_responses': self.total_responses,
+            'top_domains': top_domains,
+            'unique_domains': len(self.domains),
+            **self.transactions.result()
+        }
+
+
+def domain_table(domains):
+    """Column table of a Counter of queried names, most queried first (ties in first-seen order)"""
+    ranked = domains.most_common()
+    return {'domain': [domain for domain, _ in ranked], 'count': [count for _, count in ranked]}
+
+
+class DomainAccumulator(Accumulator):
+    """Query count of every queried name; ``dns_analysis`` only keeps the top 10"""
+    key = 'domain_table'
+
+    def __init__(self):
+        self.domains = Counter()
+        self.queries = 0
+
+    def add(self, record):
+        if record.layers & LAYER_DNS and record.dns_qr == 0 and record.dns_qname is not None:
+            self.domains[record.dns_qname] += 1
+            self.queries += 1
+
+    def merge(self, other):
+        self.domains.update(other.domains)
+        self.queries += other.queries
+
+    def revision(self):
+        return self.queries
+
+    def result(self):
+        return domain_table(self.domains)
+
+
+class AnomalyAccumulator(Accumulator):
+    """Whole-capture high-frequency source check plus windowed rules
+
+    The whole-capture check reports the capture's time range as its
+    window; ``rules`` (port scans among them) run in an AnomalyEngine and
+    report the window they fired in.
+    """
+    key = 'anomalies'
+    frequency_multiplier = 5
+    rules = DEFAULT_RULES
+
+    def __init__(self):
+        self.ip_packet_counts = Counter()
+        self.first_time = None
+        self.last_time = None
+        self.engine = AnomalyEngine(self.rules)
+
+    def add(self, record):
+        self.engine.add(record)
+        time = record.time
+        if self.first_time is None or time < self.first_time:
+            self.first_time = time
+        if self.last_time is None or time > self.last_time:
+            self.last_time = time
+
+        if record.layers & LAYER_IP:
+            self.add_packet(record.src)
+
+    def add_packet(self, src_ip):
+        self.ip_packet_counts[src_ip] += 1
+
+    def merge(self, other):
+        self.engine.merge(other.engine)
+        if other.first_time is not None:
+            self.first_time = other.first_time if self.first_time is None else min(self.first_time, other.first_time)
+            self.last_time = other.last_time if self.last_time is None else max(self.last_time, other.last_time)
+        self.merge_packets(other)
+
+    def peek(self):
+        view = copy.copy(self)
+        view.engine = self.engine.view()
+        return view.result()
+
+    def merge_packets(self, other):
+        self.ip_packet_counts.update(other.ip_packet_counts)
+
+    def packet_counts(self):
+        """(IP packets, distinct sources, (source IP, packets) in first-seen order)"""
+        counts = self.ip_packet_counts
+        return sum(counts.values()), len(counts), counts.items()
+
+    def result(self):
+        anomalies = []
+        window = {'start': self.first_time, 'end': self.last_time}
+
+        total_packets, sources, counts = self.packet_counts()
+        if sources:
+            avg_packets = total_packets / sources
+            threshold = avg_packets * self.frequency_multiplier
+
+            for ip, count in counts:
+                if count > threshold:
+                    anomalies.append({
+                        'type': 'High Frequency Traffic',
+                        'description': f'IP {ip} generated {count} packets (avg: {avg_packets:.1f})',
+                        'severity': 'Low',
+                        'source_ip': ip,
+                        'window': window
+                    })
+
+        return anomalies + self.engine.result()
+
+
+class TimelineAccumulator(Accumulator):
+    """Packets and bytes per one-second bucket, rolled up into the multi-resolution series
+
+    PcapAnalyzer derives the ``timeline`` overview from this section.
+    """
+    key = 'timeline_series'
+
+    def __init__(self):
+        self.buckets = {}
+
+    def add(self, record):
+        timestamp = int(record.time)
+        bucket = self.buckets.get(timestamp)
+        if bucket is None:
+            self.buckets[timestamp] = [1, record.length]
+        else:
+            bucket[0] += 1
+            bucket[1] += record.length
+
+    def merge(self, other):
+        for timestamp, (packets, total_bytes) in other.buckets.items():
+            bucket = self.buckets.get(timestamp)
+            if bucket is None:
+                self.buckets[timestamp] = [packets, total_bytes]
+            else:
+                bucket[0] += packets
+                bucket[1] += total_bytes
+
+    def result(self):
+        return build_series(self.buckets)
+
+
+class RollupAccumulator(Accumulator):
+    """Basic stats, top conversations and timeline overview of a subset of packets
+
+    The section shape of PcapAnalyzer.filter_by_protocol and filter_by_expression.
+    """
+    key = 'rollup'
+    conversation_accumulator = ConversationAccumulator
+
+    def __init__(self):
+        self.basic_stats = BasicStatsAccumulator()
+        self.conversations = self.conversation_accumulator()
+        self.timeline = TimelineAccumulator()
+
+    def add(self, record):
+        self.basic_stats.add(record)
+        self.conversations.add(record)
+        self.timeline.add(record)
+
+    def merge(self, other):
+        self.basic_stats.merge(other.basic_stats)
+        self.conversations.merge(other.conversations)
+        self.timeline.merge(other.timeline)
+
+    def result(self):
+        return {
+            'filtered_packet_count': self.basic_stats.total_packets,
+            'basic_stats': self.basic_stats.result(),
+            'ip_conversations': self.top_conversations(),
+            'timeline': timeline_preview(self.timeline.result())
+        }
+
+    def top_conversations(self):
+        return top_conversations(self.conversations.result())
+
+
+class ProtocolRollupAccumulator(Accumulator):
+    """Rollup of each filter protocol
+
+    Selects packets exactly like PcapAnalyzer.filter_by_protocol, so filter
+    requests can be answered from the stored result.
+    """
+    key = 'protocol_rollups'
+    rollup_accumulator = RollupAccumulator
+
+    def __init__(self):
+        self.rollups = {protocol: self.rollup_accumulator() for protocol in FILTER_PROTOCOLS}
+
+    def add(self, record):
+        layers = record.layers
+        if layers & LAYER_TCP:
+            self.rollups['TCP'].add(record)
+            if record.sport == 80 or record.dport == 80:
+                self.rollups['HTTP'].add(record)
+        if layers & LAYER_UDP:
+            self.rollups['UDP'].add(record)
+        if layers & LAYER_DNS:
+            self.rollups['DNS'].add(record)
+        if layers & LAYER_ICMP:
+            self.rollups['ICMP'].add(record)
+
+    def merge(self, other):
+        for protocol, rollup in self.rollups.items():
+            rollup.merge(other.rollups[protocol])
+
+    def revision(self):
+        return tuple(rollup.basic_stats.total_packets for rollup in self.rollups.values())
+
+    def result(self):
+        return {protocol: rollup.result() for protocol, rollup in self.rollups.items()}
+
+
+class SketchConversationAccumulator(ConversationAccumulator):
+    """Top conversations from a Space-Saving summary instead of every pair
+
+    Packet counts are over-estimated by at most ``top_error`` times the
+    number of IP packets; each entry reports its own bound as
+    ``packets_error``. Sketch mode keeps no full conversation table.
+    """
+    key = 'ip_conversations'
+    top_error = 0.001
+
+    def __init__(self):
+        self.conversations = SpaceSaving(math.ceil(1 / self.top_error))
+
+    def add(self, record):
+        if not record.layers & LAYER_IP:
+            return
+        src, dst = record.src, record.dst
+        self.conversations.add((src, dst) if src <= dst else (dst, src), 1, record.length)
+
+    def merge(self, other):
+        self.conversations.merge(other.conversations)
+
+    def result(self):
+        return [
+            {
+                'endpoints': f"{conv[0]} ↔ {conv[1]}",
+                'packets': packets,
+                'bytes': total_bytes,
+                'packets_error': error
+            }
+            for conv, packets, error, total_bytes in self.conversations.top(self.top_n)
+        ]
+
+
+class SketchRollupAccumulator(RollupAccumulator):
+    """Rollup whose top conversations come from a Space-Saving summary"""
+    conversation_accumulator = SketchConversationAccumulator
+
+    def top_conversations(self):
+        return self.conversations.result()
+
+
+class SketchProtocolRollupAccumulator(ProtocolRollupAccumulator):
+    """Protocol rollups with sketched top conversations"""
+    rollup_accumulator = SketchRollupAccumulator
+
+
+class SketchDnsAccumulator(DnsAccumulator):
+    """DNS section with Space-Saving top domains and a HyperLogLog domain count"""
+    top_error = 0.001
+    cardinality_error = 0.01
+
+    def __init__(self):
+        super().__init__()
+        self.domains = SpaceSaving(math.ceil(1 / self.top_error))
+        self.unique = HyperLogLog(self.cardinality_error)
+
+    def add(self, record):
+        if not record.layers & LAYER_DNS:
+            return
+        if record.layers & LAYER_IP:
+            self.transactions.add(record.time, record.src, record.dst, record.dns_qr, record.dns_id, record.dns_rcode)
+        if record.dns_qr == 0:
+            self.total_queries += 1
+            if record.dns_qname is not None:
+                self.domains.add(record.dns_qname)
+                self.unique.add(record.dns_qname)
+        else:
+            self.total_responses += 1
+
+    def merge(self, other):
+        self.total_queries += other.total_queries
+        self.total_responses += other.total_responses
+        self.domains.merge(other.domains)
+        self.unique.merge(other.unique)
+        self.transactions.merge(other.transactions)
+
+    def result(self):
+        if not self.total_queries and not self.total_responses:
+            return {'total_queries': 0, 'total_responses': 0, 'top_domains': []}
+
+        return {
+            'total_queries': self.total_queries,
+            'total_responses': self.total_responses,
+            'top_domains': [{'domain': domain, 'count': count, 'error': error}
+                            for domain, count, error, _ in self.domains.top(10)],
+            'unique_domains': self.unique.estimate(),
+            'unique_domains_error': self.unique.relative_error,
+            **self.transactions.result()
+        }
+
+
+class SketchAnomalyAccumulator(AnomalyAccumulator):
+    """Anomaly detection with bounded per-source state
+
+    Packets per source come from a Space-Saving summary (each count
+    over-estimated by at most ``top_error`` times the IP packets, reported
+    as ``packets_error``) and the number of sources from a HyperLogLog, so
+    only sources among the summary's heavy hitters can be reported as
+    high-frequency. The windowed rules only keep their last window and need
+    no sketching.
+    """
+    top_error = 0.001
+    cardinality_error = 0.01
+
+    def __init__(self):
+        super().__init__()
+        self.ip_packet_counts = SpaceSaving(math.ceil(1 / self.top_error))
+        self.sources = HyperLogLog(self.cardinality_error)
+
+    def add_packet(self, src_ip):
+        # Counting a source once while it is monitored is enough for the HyperLogLog
+        if src_ip not in self.ip_packet_counts.counters:
+            self.sources.add(src_ip)
+        self.ip_packet_counts.add(src_ip)
+
+    def merge_packets(self, other):
+        self.ip_packet_counts.merge(other.ip_packet_counts)
+        self.sources.merge(other.sources)
+
+    def packet_counts(self):
+        counts = self.ip_packet_counts
+        return counts.total, self.sources.estimate(), ((ip, counter[0]) for ip, counter in counts.counters.items())
+
+    def result(self):
+        anomalies = super().result()
+        for anomaly in anomalies:
+            if anomaly['type'] == 'High Frequency Traffic':
+                anomaly['packets_error'] = self.ip_packet_counts.counters[anomaly['source_ip']][1]
+        return anomalies
+
+
+# Order matches the section order of PcapAnalyzer.analysis_results
+DEFAULT_ACCUMULATORS = (
+    BasicStatsAccumulator,
+    ProtocolDistributionAccumulator,
+    ConversationAccumulator,
+    TcpAccumulator,
+    DnsAccumulator,
+    DomainAccumulator,
+    AnomalyAccumulator,
+    TimelineAccumulator,
+    ProtocolRollupAccumulator,
+)
+
+# Bounded-memory variant for captures with millions of endpoints: same
+# sections, with sketched conversations (also in the protocol rollups),
+# domains and per-source packet counts, and without the full domain table
+SKETCH_ACCUMULATORS = tuple(
+    {
+        ConversationAccumulator: SketchConversationAccumulator,
+        DnsAccumulator: SketchDnsAccumulator,
+        AnomalyAccumulator: SketchAnomalyAccumulator,
+        ProtocolRollupAccumulator: SketchProtocolRollupAccumulator,
+    }.get(cls, cls)
+    for cls in DEFAULT_ACCUMULATORS if cls is not DomainAccumulator
+)
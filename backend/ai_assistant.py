@@ -1,6 +1,9 @@
 import os
-import json
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
+from ai_context import build_context, relevant_sections
 
 # Load environment variables
 load_dotenv()
@@ -12,30 +15,187 @@ try:
 except ImportError:
     OPENAI_AVAILABLE = False
 
+# Chat backend: openai, local (offline stand-in for load tests) or fallback (pattern matching)
+AI_BACKEND = os.getenv('AI_BACKEND', 'openai' if OPENAI_AVAILABLE else 'fallback').lower()
+# Simulated first-token latency and per-token delay of the local backend, in seconds
+LOCAL_LLM_LATENCY = float(os.getenv('LOCAL_LLM_LATENCY', 0))
+LOCAL_LLM_TOKEN_DELAY = float(os.getenv('LOCAL_LLM_TOKEN_DELAY', 0))
+# Estimated tokens of analysis context sent with a question, and the longest answer
+AI_CONTEXT_TOKENS = int(os.getenv('AI_CONTEXT_TOKENS', 1500))
+AI_MAX_TOKENS = int(os.getenv('AI_MAX_TOKENS', 500))
+
+SYSTEM_PROMPT = """You are a cybersecurity expert assistant analyzing network traffic data. 
+            You have access to PCAP analysis results and can answer questions about network security, 
+            traffic patterns, anomalies, and protocol analysis. Provide clear, technical but accessible 
+            explanations based on the provided data."""
+
+
+class OpenAIBackend:
+    """Streams chat completions from the OpenAI API"""
+    name = 'openai'
+
+    def __init__(self, model='gpt-3.5-turbo', max_tokens=500, temperature=0.7):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    def stream(self, messages):
+        response = openai.ChatCompletion.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            stream=True
+        )
+        for chunk in response:
+            content = chunk.choices[0].delta.get('content')
+            if content:
+                yield content
+
+
+class LocalBackend:
+    """Offline stand-in for an LLM
+
+    Streams a canned answer describing the prompt word by word, after
+    ``latency`` seconds and with ``token_delay`` seconds between words, so
+    the chat path can be exercised and load-tested without an API key.
+    """
+    name = 'local'
+
+    def __init__(self, latency=0.0, token_delay=0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+
+    def stream(self, messages):
+        prompt = messages[-1]['content']
+        question = prompt.rsplit('User Question:', 1)[-1].split('\n', 1)[0].strip()
+        answer = (f'Local model answer to "{question}" based on {len(prompt)} characters '
+                  f'of network analysis context.')
+        if self.latency:
+            time.sleep(self.latency)
+        for index, word in enumerate(answer.split(' ')):
+            if index and self.token_delay:
+                time.sleep(self.token_delay)
+            yield word if not index else ' ' + word
+
+
+def make_backend(name):
+    """Backend for an AI_BACKEND name; None answers with pattern matching"""
+    if name == 'openai':
+        return OpenAIBackend(max_tokens=AI_MAX_TOKENS) if OPENAI_AVAILABLE else None
+    if name == 'local':
+        return LocalBackend(LOCAL_LLM_LATENCY, LOCAL_LLM_TOKEN_DELAY)
+    if name == 'fallback':
+        return None
+    raise ValueError(f"Unknown AI backend: {name}. Use openai, local or fallback")
+
+
+class LRUCache:
+    """Thread-safe mapping that keeps the ``max_entries`` most recently used keys"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def normalize_question(message):
+    return ' '.join(message.lower().split())
+
+
 class AIAssistant:
-    def __init__(self):
-        self.openai_available = OPENAI_AVAILABLE
+    """Answers questions about an analysis through a pluggable chat backend
+
+    Pass an ``analysis_key`` that changes whenever the analysis does (e.g.
+    its id and revision) to reuse the prepared context of an analysis and
+    answer repeated questions from the response cache; without one every
+    question goes to the backend. Contexts hold only the sections relevant
+    to the question, within ``context_tokens`` estimated tokens.
+    """
+
+    def __init__(self, backend=None, context_cache_size=32, response_cache_size=256,
+                 context_tokens=AI_CONTEXT_TOKENS):
+        self.backend = make_backend(AI_BACKEND) if backend is None else backend
+        self.context_tokens = context_tokens
+        self.openai_available = isinstance(self.backend, OpenAIBackend)
+        self.contexts = LRUCache(context_cache_size)
+        self.responses = LRUCache(response_cache_size)
         
-    def process_query(self, user_message, analysis_data):
+    def process_query(self, user_message, analysis_data, analysis_key=None):
         """Process user query about network analysis data"""
-        
-        if self.openai_available:
-            return self._process_with_openai(user_message, analysis_data)
-        else:
-            return self._process_with_fallback(user_message, analysis_data)
-    
-    def _process_with_openai(self, user_message, analysis_data):
-        """Process query using OpenAI API"""
+        return ''.join(self.stream_query(user_message, analysis_data, analysis_key)).strip()
+
+    def stream_query(self, user_message, analysis_data, analysis_key=None):
+        """Yield the answer to a query as text chunks, as the backend produces them"""
+        if self.backend is None:
+            yield self._process_with_fallback(user_message, analysis_data)
+            return
+
+        cache_key = None
+        if analysis_key is not None:
+            cache_key = (self.backend.name, analysis_key, normalize_question(user_message))
+            cached = self.responses.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        chunks = []
         try:
-            # Prepare context from analysis data
-            context = self._prepare_context(analysis_data)
-            
-            system_prompt = """You are a cybersecurity expert assistant analyzing network traffic data. 
-            You have access to PCAP analysis results and can answer questions about network security, 
-            traffic patterns, anomalies, and protocol analysis. Provide clear, technical but accessible 
-            explanations based on the provided data."""
-            
-            user_prompt = f"""
+            context, _ = self.context_for(user_message, analysis_data, analysis_key)
+            for chunk in self.backend.stream(self._messages(user_message, context)):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            yield f"AI processing error: {str(e)}. Falling back to pattern matching."
+            return
+
+        if cache_key is not None:
+            self.responses.put(cache_key, ''.join(chunks))
+
+    def context_for(self, user_message, analysis_data, analysis_key=None):
+        """(context, token usage report) for a question, built once per analysis_key and set of sections"""
+        sections = relevant_sections(analysis_data, user_message)
+        if analysis_key is None:
+            return self._prepare_context(analysis_data, sections)
+        cache_key = (analysis_key, sections)
+        prepared = self.contexts.get(cache_key)
+        if prepared is None:
+            prepared = self._prepare_context(analysis_data, sections)
+            self.contexts.put(cache_key, prepared)
+        return prepared
+
+    def context_usage(self, user_message, analysis_data, analysis_key=None):
+        """Token usage report of the context a question is answered from; None without a backend"""
+        if self.backend is None:
+            return None
+        return self.context_for(user_message, analysis_data, analysis_key)[1]
+
+    def _messages(self, user_message, context):
+        user_prompt = f"""
             Network Analysis Data:
             {context}
             
@@ -43,21 +203,10 @@ class AIAssistant:
             
             Please provide a detailed analysis based on the network data above.
             """
-            
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            return f"AI processing error: {str(e)}. Falling back to pattern matching."
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
     
     def _process_with_fallback(self, user_message, analysis_data):
         """Process query using pattern matching fallback"""
@@ -175,33 +324,8 @@ Try asking questions like:
 For example: "How many packets were captured?" or "Are there any security threats?"
 """
     
-    def _prepare_context(self, analysis_data):
-        """Prepare analysis data context for OpenAI"""
-        context_parts = []
-        
-        # Basic statistics
-        if 'basic_stats' in analysis_data:
-            stats = analysis_data['basic_stats']
-            context_parts.append(f"Basic Statistics: {json.dumps(stats, indent=2)}")
-        
-        # Protocol distribution
-        if 'protocol_distribution' in analysis_data:
-            protocols = analysis_data['protocol_distribution']
-            context_parts.append(f"Protocol Distribution: {json.dumps(protocols, indent=2)}")
-        
-        # Anomalies
-        if 'anomalies' in analysis_data:
-            anomalies = analysis_data['anomalies']
-            context_parts.append(f"Detected Anomalies: {json.dumps(anomalies, indent=2)}")
-        
-        # TCP analysis
-        if 'tcp_analysis' in analysis_data:
-            tcp = analysis_data['tcp_analysis']
-            context_parts.append(f"TCP Analysis: {json.dumps(tcp, indent=2)}")
-        
-        # DNS analysis
-        if 'dns_analysis' in analysis_data:
-            dns = analysis_data['dns_analysis']
-            context_parts.append(f"DNS Analysis: {json.dumps(dns, indent=2)}")
-        
-        return "\n\n".join(context_parts)
\ No newline at end of file
+    def _prepare_context(self, analysis_data, sections=None):
+        """Prepare analysis data context for OpenAI, within the token budget"""
+        if sections is None:
+            sections = relevant_sections(analysis_data)
+        return build_context(analysis_data, sections, self.context_tokens)
@@ -0,0 +1,121 @@
+"""Token-budgeted analysis context for the AI assistant
+
+Only the sections relevant to a question are included, most relevant
+first. Each is rendered as compact JSON with its lists cut to the first
+entries of LIST_LIMITS; while the context is over budget the least
+relevant section is shrunk a step at a time, and dropped once it cannot
+shrink further, before any more relevant section loses detail. Anomalies are ranked by severity and summarized with
+counts by severity and type, so a noisy capture costs a fixed amount.
+"""
+import json
+import math
+import re
+from collections import Counter
+
+# Section key, title and question word stems that make it relevant, in default priority order
+CONTEXT_SECTIONS = (
+    ('basic_stats', 'Basic Statistics', ()),
+    ('anomalies', 'Detected Anomalies',
+     ('anomal', 'suspicious', 'threat', 'attack', 'secur', 'scan', 'flood', 'malicious', 'risk', 'alert')),
+    ('protocol_distribution', 'Protocol Distribution',
+     ('protocol', 'tcp', 'udp', 'icmp', 'arp', 'dns', 'http', 'distribution')),
+    ('tcp_analysis', 'TCP Analysis',
+     ('tcp', 'connection', 'handshake', 'rtt', 'syn', 'reset', 'refused', 'success', 'fail')),
+    ('dns_analysis', 'DNS Analysis',
+     ('dns', 'domain', 'quer', 'resol', 'nxdomain', 'servfail', 'lookup', 'latency')),
+    ('ip_conversations', 'Top IP Conversations',
+     ('ip', 'conversation', 'host', 'endpoint', 'talker', 'communicat', 'bandwidth', 'traffic')),
+)
+SECTION_TITLES = {key: title for key, title, _ in CONTEXT_SECTIONS}
+
+# Entries kept of every list, from the full detail down to lists replaced by their length
+LIST_LIMITS = (10, 5, 2, 0)
+
+SEVERITY_RANK = {'High': 0, 'Medium': 1, 'Low': 2}
+
+# Rough size of an English/JSON token for gpt-style tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def relevant_sections(analysis_data, question=''):
+    """Keys of the sections a question needs, most relevant first
+
+    Basic statistics always come first; a question that names no section
+    gets every section.
+    """
+    words = re.findall(r'[a-z0-9]+', question.lower())
+    available = [key for key, _, _ in CONTEXT_SECTIONS if key in analysis_data]
+    matched = [key for key, _, stems in CONTEXT_SECTIONS
+               if key in analysis_data and any(word.startswith(stem) for stem in stems for word in words)]
+    if not matched:
+        return tuple(available)
+    return tuple(key for key in available if key == 'basic_stats' or key in matched)
+
+
+def summarize_anomalies(anomalies):
+    """Counts by severity and type, and the anomalies ordered most severe first"""
+    ranked = sorted(anomalies, key=lambda anomaly: SEVERITY_RANK.get(anomaly.get('severity'), len(SEVERITY_RANK)))
+    return {
+        'total': len(anomalies),
+        'by_severity': dict(Counter(anomaly.get('severity', 'Unknown') for anomaly in ranked)),
+        'by_type': dict(Counter(anomaly.get('type', 'Unknown') for anomaly in ranked).most_common()),
+        'top': [{key: value for key, value in anomaly.items() if key != 'window'} for anomaly in ranked]
+    }
+
+
+def shrink(value, limit):
+    """``value`` with every list cut to ``limit`` entries, or replaced by its length when limit is 0"""
+    if isinstance(value, dict):
+        return {key: shrink(item, limit) for key, item in value.items()}
+    if isinstance(value, list):
+        if not limit:
+            return len(value)
+        kept = [shrink(item, limit) for item in value[:limit]]
+        if len(value) > limit:
+            kept.append(f'... {len(value) - limit} more')
+        return kept
+    return value
+
+
+def render_section(analysis_data, key, limit):
+    value = analysis_data[key]
+    if key == 'anomalies':
+        value = summarize_anomalies(value)
+    return f"{SECTION_TITLES[key]}: {json.dumps(shrink(value, limit), separators=(',', ':'), default=str)}"
+
+
+def build_context(analysis_data, sections, budget):
+    """Context text of ``sections`` within ``budget`` tokens, and a report of the tokens used"""
+    sections = list(sections)
+    levels = [0] * len(sections)
+    rendered = [render_section(analysis_data, key, LIST_LIMITS[0]) for key in sections]
+    dropped = []
+
+    def total():
+        return estimate_tokens('\n\n'.join(rendered))
+
+    while sections and total() > budget:
+        # Only the least relevant section is shrunk; more relevant ones keep their detail until it is dropped
+        if levels[-1] < len(LIST_LIMITS) - 1:
+            levels[-1] += 1
+            rendered[-1] = render_section(analysis_data, sections[-1], LIST_LIMITS[levels[-1]])
+        elif len(sections) > 1:
+            dropped.append(sections.pop())
+            levels.pop()
+            rendered.pop()
+        else:
+            # The most relevant section is kept even over budget
+            break
+
+    context = '\n\n'.join(rendered)
+    return context, {
+        'budget': budget,
+        'used': estimate_tokens(context),
+        'sections': [{'section': key, 'list_limit': LIST_LIMITS[level], 'tokens': estimate_tokens(text)}
+                     for key, level, text in zip(sections, levels, rendered)],
+        'dropped': dropped
+    }
@@ -0,0 +1,273 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from sections import analysis_summary
+
+# Lists longer than this have their size extrapolated from an evenly spaced sample
+SIZE_SAMPLE = 64
+
+
+def estimate_size(value):
+    """Approximate length of the JSON encoding of ``value``, without encoding it"""
+    size = 0
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            size += len(value) + 2
+        elif isinstance(value, dict):
+            size += 2 + 4 * len(value) + sum(len(str(key)) for key in value)
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            size += 2 + len(value)
+            if len(value) > SIZE_SAMPLE:
+                step = len(value) / SIZE_SAMPLE
+                sample = [value[int(i * step)] for i in range(SIZE_SAMPLE)]
+                size += estimate_size(sample) * len(value) // SIZE_SAMPLE
+            else:
+                stack.extend(value)
+        else:
+            size += 8
+    return size
+
+
+class MemoryAnalysisStore:
+    """In-process LRU of analyses keyed by analysis id
+
+    Entry sizes approximate their JSON length; once the total passes
+    ``max_bytes`` the least recently used analyses are dropped (the newest
+    one is always kept). Putting an existing ``analysis_id`` replaces it,
+    e.g. with newer results of a live capture.
+
+    Job and live capture statuses are kept alongside, so the API reads them
+    the same way whichever store is configured.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, max_statuses=1000):
+        self.max_bytes = max_bytes
+        self.max_statuses = max_statuses
+        self.entries = OrderedDict()
+        self.statuses = OrderedDict()
+        self.total_bytes = 0
+        self.latest_id = None
+        self.lock = threading.Lock()
+
+    def put(self, filename, analysis, capture_hash=None, analysis_id=None):
+        analysis_id = analysis_id or uuid.uuid4().hex
+        size = estimate_size(analysis)
+        with self.lock:
+            replaced = self.entries.pop(analysis_id, None)
+            if replaced is not None:
+                self.total_bytes -= replaced[3]
+            self.entries[analysis_id] = (filename, analysis, capture_hash, size)
+            self.total_bytes += size
+            self.latest_id = analysis_id
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, _, _, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return analysis_id
+
+    def get(self, analysis_id, keys=None):
+        """Stored analysis; with ``keys`` it only holds those top-level keys"""
+        with self.lock:
+            entry = self.entries.get(analysis_id)
+            if entry is None:
+                return None
+            self.entries.move_to_end(analysis_id)
+        filename, analysis, capture_hash, _ = entry
+        if keys is not None:
+            analysis = {key: analysis[key] for key in keys if key in analysis}
+        return {'analysis_id': analysis_id, 'filename': filename, 'analysis': analysis,
+                'capture_hash': capture_hash}
+
+    def get_summary(self, analysis_id):
+        """Stored analysis with its summary (see sections.analysis_summary) in place of the analysis"""
+        stored = self.get(analysis_id)
+        if stored is not None:
+            stored['summary'] = analysis_summary(stored.pop('analysis'))
+        return stored
+
+    def latest(self, keys=None):
+        """Most recently stored analysis"""
+        return self.get(self.latest_id, keys)
+
+    def latest_summary(self):
+        return self.get_summary(self.latest_id)
+
+    def put_status(self, kind, status_id, status):
+        """Record the status of a job or live capture; a pending stop request is kept"""
+        with self.lock:
+            stop = self.statuses.pop((kind, status_id), (None, False))[1]
+            self.statuses[(kind, status_id)] = (status, stop)
+            while len(self.statuses) > self.max_statuses:
+                self.statuses.popitem(last=False)
+
+    def get_status(self, kind, status_id):
+        with self.lock:
+            entry = self.statuses.get((kind, status_id))
+        return dict(entry[0]) if entry else None
+
+    def request_stop(self, kind, status_id):
+        """Ask the worker running a job or live capture to stop it; False if it is unknown"""
+        with self.lock:
+            entry = self.statuses.get((kind, status_id))
+            if entry is None:
+                return False
+            self.statuses[(kind, status_id)] = (entry[0], True)
+        return True
+
+    def stop_requested(self, kind, status_id):
+        with self.lock:
+            entry = self.statuses.get((kind, status_id))
+        return bool(entry and entry[1])
+
+
+class SQLiteAnalysisStore:
+    """Analyses shared by every worker process through a SQLite database
+
+    Each top-level key of an analysis is a row of its own and the summary is
+    kept in a column, so requests load only the parts they read. At most
+    ``max_entries`` analyses are kept; the least recently read ones are
+    deleted first. Putting an existing ``analysis_id`` replaces it.
+    Job and live capture statuses, and requests to stop them, are shared
+    the same way so any worker can answer for, or cancel, work running in
+    another one.
+    """
+
+    def __init__(self, path, max_entries=1000):
+        self.path = path
+        self.max_entries = max_entries
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS analyses ('
+                'id TEXT PRIMARY KEY, filename TEXT, analysis TEXT, '
+                'capture_hash TEXT, created_at REAL, accessed_at REAL)'
+            )
+            # Databases of older versions hold whole analyses in the analysis column
+            if 'summary' not in {row[1] for row in conn.execute('PRAGMA table_info(analyses)')}:
+                conn.execute('ALTER TABLE analyses ADD COLUMN summary TEXT')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS analysis_keys ('
+                'analysis_id TEXT, key TEXT, value TEXT, PRIMARY KEY (analysis_id, key))'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS statuses ('
+                'kind TEXT, id TEXT, status TEXT, stop INTEGER DEFAULT 0, updated_at REAL, '
+                'PRIMARY KEY (kind, id))'
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Transaction on a fresh connection, so the store works from any thread"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def put(self, filename, analysis, capture_hash=None, analysis_id=None):
+        analysis_id = analysis_id or uuid.uuid4().hex
+        now = time.time()
+        summary = json.dumps(analysis_summary(analysis))
+        values = [(analysis_id, key, json.dumps(value)) for key, value in analysis.items()]
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO analyses (id, filename, capture_hash, created_at, accessed_at, summary) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (analysis_id, filename, capture_hash, now, now, summary)
+            )
+            conn.execute('DELETE FROM analysis_keys WHERE analysis_id = ?', (analysis_id,))
+            conn.executemany('INSERT INTO analysis_keys VALUES (?, ?, ?)', values)
+            conn.execute(
+                'DELETE FROM analyses WHERE id NOT IN '
+                '(SELECT id FROM analyses ORDER BY accessed_at DESC LIMIT ?)',
+                (self.max_entries,)
+            )
+            conn.execute('DELETE FROM analysis_keys WHERE analysis_id NOT IN (SELECT id FROM analyses)')
+        return analysis_id
+
+    def _row(self, conn, analysis_id, column):
+        row = conn.execute(f'SELECT filename, capture_hash, analysis, {column} FROM analyses WHERE id = ?',
+                           (analysis_id,)).fetchone()
+        if row is not None:
+            conn.execute('UPDATE analyses SET accessed_at = ? WHERE id = ?', (time.time(), analysis_id))
+        return row
+
+    def get(self, analysis_id, keys=None):
+        """Stored analysis; with ``keys`` only those top-level keys are loaded"""
+        with self._connect() as conn:
+            row = self._row(conn, analysis_id, 'NULL')
+            if row is None:
+                return None
+            if row[2] is not None:
+                analysis = json.loads(row[2])
+                if keys is not None:
+                    analysis = {key: analysis[key] for key in keys if key in analysis}
+            else:
+                query = 'SELECT key, value FROM analysis_keys WHERE analysis_id = ?'
+                params = [analysis_id]
+                if keys is not None:
+                    keys = list(keys)
+                    query += f" AND key IN ({', '.join('?' * len(keys))})"
+                    params += keys
+                analysis = {key: json.loads(value) for key, value in conn.execute(query, params)}
+        return {'analysis_id': analysis_id, 'filename': row[0], 'analysis': analysis, 'capture_hash': row[1]}
+
+    def get_summary(self, analysis_id):
+        """Stored analysis with its summary (see sections.analysis_summary) in place of the analysis"""
+        with self._connect() as conn:
+            row = self._row(conn, analysis_id, 'summary')
+        if row is None:
+            return None
+        summary = json.loads(row[3]) if row[3] is not None else analysis_summary(json.loads(row[2]))
+        return {'analysis_id': analysis_id, 'filename': row[0], 'summary': summary, 'capture_hash': row[1]}
+
+    def _latest_id(self):
+        with self._connect() as conn:
+            row = conn.execute('SELECT id FROM analyses ORDER BY created_at DESC LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def latest(self, keys=None):
+        """Most recently stored analysis"""
+        analysis_id = self._latest_id()
+        return self.get(analysis_id, keys) if analysis_id else None
+
+    def latest_summary(self):
+        analysis_id = self._latest_id()
+        return self.get_summary(analysis_id) if analysis_id else None
+    def put_status(self, kind, status_id, status):
+        """Record the status of a job or live capture; a pending stop request is kept"""
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO statuses (kind, id, status, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (kind, id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at',
+                (kind, status_id, json.dumps(status), time.time())
+            )
+            conn.execute(
+                'DELETE FROM statuses WHERE kind = ? AND id NOT IN '
+                '(SELECT id FROM statuses WHERE kind = ? ORDER BY updated_at DESC LIMIT ?)',
+                (kind, kind, self.max_entries)
+            )
+
+    def get_status(self, kind, status_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT status FROM statuses WHERE kind = ? AND id = ?',
+                               (kind, status_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def request_stop(self, kind, status_id):
+        """Ask the worker running a job or live capture to stop it; False if it is unknown"""
+        with self._connect() as conn:
+            cursor = conn.execute('UPDATE statuses SET stop = 1 WHERE kind = ? AND id = ?', (kind, status_id))
+        return cursor.rowcount > 0
+
+    def stop_requested(self, kind, status_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT stop FROM statuses WHERE kind = ? AND id = ?',
+                               (kind, status_id)).fetchone()
+        return bool(row and row[0])
@@ -0,0 +1,384 @@
+import copy
+from collections import deque
+from packet_record import LAYER_IP, LAYER_TCP, LAYER_DNS
+
+
+class WindowRule:
+    """Base class for sliding-window anomaly rules
+
+    Each packet ``extract`` maps to a (key, value) pair is counted in a
+    one-second bucket; the buckets of the last ``window`` seconds sit in a
+    ring (a deque trimmed as seconds close) with running per-key totals, so
+    the per-packet cost is constant. Only packets carrying all of ``layers``
+    reach ``extract``. When a second closes, every key touched
+    in it (plus every key currently alerting) is checked against
+    ``threshold``: with ``distinct`` the number of different values in the
+    window, otherwise the number of events. Consecutive alerting seconds of
+    a key form one anomaly, reported with the time window it spans.
+
+    A rule fed a chunk of a capture cannot judge the windows overlapping its
+    first ``window`` seconds, as earlier packets are missing; it keeps those
+    buckets in ``head`` and the windows are judged when it is merged after
+    the previous chunk (or, for the first chunk, in ``result``). A key only
+    starts alerting in a second it was touched, so alerting keys are all
+    that need rechecking; at the end of the head every key is checked once.
+    Merged results match a serial run as long as timestamps do not go back
+    across a chunk boundary; late packets move the head of the next chunk.
+    """
+    type = None
+    layers = 0
+    severity = 'Medium'
+    window = 60
+    threshold = 10
+    distinct = False
+
+    def __init__(self):
+        self.buckets = deque()  # (second, {key: count or set of values}), oldest first
+        self.totals = {}        # key -> count, or {value: number of buckets holding it}
+        self.first_second = None
+        self.current = None
+        self.head = []
+        self.complete = False   # nothing precedes the first packet
+        self.open = {}          # key -> alerting episode
+        self.closed = []
+
+    def extract(self, record):
+        """(key, value) a packet counts towards, or None"""
+        raise NotImplementedError
+
+    def describe(self, key, peak):
+        raise NotImplementedError
+
+    def subject(self, key):
+        """Fields naming the host an anomaly is about"""
+        return {'source_ip': key}
+
+    def add(self, record, second):
+        item = self.extract(record)
+        if item is None:
+            return
+        key, value = item
+        data = self._bucket(second)
+        if self.distinct:
+            values = data.get(key)
+            if values is None:
+                values = data[key] = set()
+            if value not in values:
+                values.add(value)
+                seen = self.totals.get(key)
+                if seen is None:
+                    seen = self.totals[key] = {}
+                seen[value] = seen.get(value, 0) + 1
+        else:
+            data[key] = data.get(key, 0) + 1
+            self.totals[key] = self.totals.get(key, 0) + 1
+
+    def _bucket(self, second):
+        """Bucket of ``second``, closing the seconds before it; late packets join the newest bucket"""
+        if self.current is not None:
+            if second <= self.current:
+                return self.buckets[-1][1]
+            for t in range(self.current, min(second - 1, self.current + self.window) + 1):
+                self._evaluate(t)
+        if self.first_second is None:
+            self.first_second = second
+        self.current = second
+        data = {}
+        self.buckets.append((second, data))
+        if not self.complete and second <= self.first_second + self.window - 1:
+            self.head.append((second, data))
+        return data
+
+    def _add_bucket(self, second, other_data):
+        data = self._bucket(second)
+        for key, value in other_data.items():
+            if self.distinct:
+                values = data.get(key)
+                if values is None:
+                    values = data[key] = set()
+                seen = self.totals.get(key)
+                if seen is None:
+                    seen = self.totals[key] = {}
+                for item in value - values:
+                    values.add(item)
+                    seen[item] = seen.get(item, 0) + 1
+            else:
+                data[key] = data.get(key, 0) + value
+                self.totals[key] = self.totals.get(key, 0) + value
+
+    def _expire(self, data):
+        for key, value in data.items():
+            if self.distinct:
+                seen = self.totals[key]
+                for item in value:
+                    if seen[item] == 1:
+                        del seen[item]
+                    else:
+                        seen[item] -= 1
+                if not seen:
+                    del self.totals[key]
+            else:
+                if self.totals[key] == value:
+                    del self.totals[key]
+                else:
+                    self.totals[key] -= value
+
+    def _value(self, key):
+        total = self.totals.get(key)
+        if total is None:
+            return 0
+        return len(total) if self.distinct else total
+
+    def _evaluate(self, t):
+        """Check the window ending with second ``t``"""
+        buckets = self.buckets
+        while buckets and buckets[0][0] <= t - self.window:
+            self._expire(buckets.popleft()[1])
+        if not buckets:
+            self.closed.extend(self.open.values())
+            self.open = {}
+            return
+        if not self.complete and t <= self.first_second + self.window - 1:
+            return
+
+        newest, data = buckets[-1]
+        if not self.complete and t == self.first_second + self.window:
+            # Keys alerting since before this chunk may not have been touched
+            candidates = list(self.totals)
+        else:
+            candidates = list(self.open)
+            if newest == t:
+                candidates.extend(key for key in data if key not in self.open)
+        for key in candidates:
+            value = self._value(key)
+            episode = self.open.get(key)
+            if value > self.threshold:
+                if episode is not None and episode['last'] == t - 1:
+                    episode['end'] = newest + 1
+                    episode['last'] = t
+                    episode['peak'] = max(episode['peak'], value)
+                else:
+                    if episode is not None:
+                        self.closed.append(episode)
+                    self.open[key] = {'key': key, 'start': buckets[0][0], 'end': newest + 1,
+                                      'first': t, 'last': t, 'peak': value}
+            elif episode is not None:
+                self.closed.append(self.open.pop(key))
+
+    def merge(self, other):
+        """Continue with the rule of the chunk of the capture that follows"""
+        if other.first_second is None:
+            return
+        if self.first_second is None:
+            self.first_second = other.first_second
+        for second, data in other.head:
+            self._add_bucket(second, data)
+
+        head_end = other.first_second + other.window - 1
+        if other.current <= head_end:
+            return
+        # Windows after the other chunk's head hold only its own packets, so
+        # its state and alerts from there on are exact
+        for t in range(self.current, head_end + 1):
+            self._evaluate(t)
+        # Seconds are judged once the next one starts, so unless the other
+        # rule got past head_end + 1 the alerts still open here carry on
+        if other.current > head_end + 1:
+            for episode in other.closed + list(other.open.values()):
+                earlier = self.open.get(episode['key'])
+                if episode['first'] == head_end + 1 and earlier is not None and earlier['last'] == head_end:
+                    del self.open[episode['key']]
+                    episode['start'] = earlier['start']
+                    episode['first'] = earlier['first']
+                    episode['peak'] = max(episode['peak'], earlier['peak'])
+            self.closed.extend(self.open.values())
+            self.closed.extend(other.closed)
+            self.open = other.open
+        self.buckets = other.buckets
+        self.totals = other.totals
+        self.current = other.current
+
+    def view(self):
+        """Copy whose result() leaves the windows of this rule open, for a capture still growing"""
+        rule = copy.copy(self)
+        rule.buckets = deque(self.buckets)
+        if self.distinct:
+            rule.totals = {key: dict(seen) for key, seen in self.totals.items()}
+        else:
+            rule.totals = dict(self.totals)
+        rule.open = {key: dict(episode) for key, episode in self.open.items()}
+        rule.closed = [dict(episode) for episode in self.closed]
+        return rule
+
+    def result(self):
+        if self.first_second is None:
+            return []
+        resolved = type(self)()
+        resolved.complete = True
+        resolved.merge(self)
+        resolved._evaluate(resolved.current)
+        episodes = sorted(resolved.closed + list(resolved.open.values()),
+                          key=lambda episode: (episode['start'], episode['first'], str(episode['key'])))
+        return [self.anomaly(episode) for episode in episodes]
+
+    def anomaly(self, episode):
+        return {
+            'type': self.type,
+            'description': self.describe(episode['key'], episode['peak']),
+            'severity': self.severity,
+            **self.subject(episode['key']),
+            'window': {'start': episode['start'], 'end': episode['end']}
+        }
+
+
+class PortScanBurstRule(WindowRule):
+    """Sources reaching many TCP ports within a minute"""
+    type = 'Port Scan Burst'
+    window = 60
+    threshold = 10
+    distinct = True
+    layers = LAYER_IP | LAYER_TCP
+
+    def extract(self, record):
+        return record.src, record.dport
+
+    def describe(self, key, peak):
+        return f'IP {key} accessed {peak} different ports within {self.window} s'
+
+
+class SynFloodRule(WindowRule):
+    """Hosts receiving a burst of connection attempts"""
+    type = 'SYN Flood'
+    severity = 'High'
+    window = 10
+    threshold = 200
+    layers = LAYER_IP | LAYER_TCP
+
+    def extract(self, record):
+        if record.tcp_flags & 0x12 == 0x02:
+            return record.dst, None
+        return None
+
+    def subject(self, key):
+        return {'target_ip': key}
+
+    def describe(self, key, peak):
+        return f'IP {key} received {peak} SYNs within {self.window} s'
+
+
+class DnsQueryBurstRule(WindowRule):
+    """Hosts sending DNS queries at a high rate"""
+    type = 'DNS Query Burst'
+    window = 60
+    threshold = 100
+    layers = LAYER_IP | LAYER_DNS
+
+    def extract(self, record):
+        if record.dns_qr == 0:
+            return record.src, None
+        return None
+
+    def describe(self, key, peak):
+        return f'IP {key} sent {peak} DNS queries within {self.window} s'
+
+
+class TrafficSpikeRule:
+    """Seconds whose packet count jumps above an EWMA baseline
+
+    The baseline depends on the whole history, so instead of a ring this
+    rule keeps one counter per second (like the timeline) and runs the
+    EWMA when results are collected; partial counts from parallel chunks
+    add up exactly.
+    """
+    type = 'Traffic Spike'
+    severity = 'Low'
+    alpha = 0.1
+    multiplier = 5
+    min_packets = 100
+    warmup = 10
+    layers = 0
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, record, second):
+        self.counts[second] = self.counts.get(second, 0) + 1
+
+    def merge(self, other):
+        for second, count in other.counts.items():
+            self.counts[second] = self.counts.get(second, 0) + count
+
+    def view(self):
+        return self  # result() only reads the counts
+
+    def result(self):
+        anomalies = []
+        baseline = None
+        previous = None
+        seconds_seen = 0
+        episode = None
+        for second in sorted(self.counts):
+            count = self.counts[second]
+            if baseline is not None:
+                # Empty seconds since the previous one decay the baseline
+                gap = second - previous - 1
+                baseline *= (1 - self.alpha) ** gap
+                seconds_seen += gap
+
+            if (baseline is not None and seconds_seen >= self.warmup
+                    and count > max(self.min_packets, self.multiplier * baseline)):
+                if episode is not None and episode['end'] == second:
+                    episode['end'] = second + 1
+                    episode['peak'] = max(episode['peak'], count)
+                else:
+                    episode = {'start': second, 'end': second + 1, 'peak': count, 'baseline': baseline}
+                    anomalies.append(episode)
+
+            baseline = count if baseline is None else self.alpha * count + (1 - self.alpha) * baseline
+            previous = second
+            seconds_seen += 1
+
+        return [{
+            'type': self.type,
+            'description': f"{episode['peak']} packets/s against a baseline of {episode['baseline']:.1f}",
+            'severity': self.severity,
+            'window': {'start': episode['start'], 'end': episode['end']}
+        } for episode in anomalies]
+
+
+DEFAULT_RULES = (PortScanBurstRule, SynFloodRule, DnsQueryBurstRule, TrafficSpikeRule)
+
+
+class AnomalyEngine:
+    """Runs time-windowed anomaly rules over PacketRecords in a single pass
+
+    ``rules`` are rule classes, see WindowRule; each instance gets
+    ``add(record, second)``, ``merge(other)``, ``view()`` and ``result()`` and is only
+    fed packets carrying all of its ``layers``. Anomalies are returned
+    ordered by the start of their window.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = [cls() for cls in (rules or DEFAULT_RULES)]
+        self.adders = [(getattr(rule, 'layers', 0), rule.add) for rule in self.rules]
+
+    def add(self, record):
+        second = int(record.time)
+        layers = record.layers
+        for required, add in self.adders:
+            if layers & required == required:
+                add(record, second)
+
+    def merge(self, other):
+        for rule, other_rule in zip(self.rules, other.rules):
+            rule.merge(other_rule)
+
+    def view(self):
+        """Copy whose result() leaves the rules of this engine running"""
+        engine = copy.copy(self)
+        engine.rules = [rule.view() for rule in self.rules]
+        return engine
+
+    def result(self):
+        anomalies = [anomaly for rule in self.rules for anomaly in rule.result()]
+        return sorted(anomalies, key=lambda anomaly: anomaly['window']['start'])
@@ -1,39 +1,254 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
+import io
+import itertools
 import os
+import queue
 import tempfile
+import threading
+import time
+from collections import OrderedDict
 from werkzeug.utils import secure_filename
-from pcap_analyzer import PcapAnalyzer
+from pcap_analyzer import PcapAnalyzer, ANALYZER_VERSION
+from accumulators import SKETCH_ACCUMULATORS
+from packet_table import PacketTable
+from jobs import JobQueue
+from result_cache import ResultCache
+from analysis_store import MemoryAnalysisStore, SQLiteAnalysisStore
+from live_capture import LiveCapture
+from sections import DEFAULT_PAGE_SIZE, SECTION_KEYS, analysis_summary, client_analysis, page_section
+from timeline import DOWNSAMPLE_METHODS, PREVIEW_POINTS, query_timeline, series_from_points
+from traffic_tables import DEFAULT_TOP_K, TrafficTables
+from streaming_upload import GrowingFile, UploadRejected, is_capture_header, read_header, receive_upload
+from config import Config
 from ai_assistant import AIAssistant
-from utils import generate_pdf_report, generate_csv_report
+from ai_context import SECTION_TITLES
+from instrumentation import MetricsRegistry
+from bulk_export import BULK_FORMATS, BULK_TABLES, PYARROW_AVAILABLE, iter_ndjson, write_bulk
+from export_cache import ExportCache, analysis_revision
+from utils import generate_pdf_report, csv_report_header, iter_csv_body, save_upload
 import json
 
 app = Flask(__name__)
 CORS(app)
+app.config['MAX_CONTENT_LENGTH'] = Config.MAX_UPLOAD_SIZE
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
-MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB
+MAX_FILE_SIZE = Config.MAX_UPLOAD_SIZE
 ALLOWED_EXTENSIONS = {'pcap', 'pcapng'}
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+# Processes per analysis; by default the CPUs are shared between the concurrent jobs
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', max(1, (os.cpu_count() or 1) // JOB_WORKERS)))
+RESULT_CACHE_FOLDER = os.environ.get('RESULT_CACHE_FOLDER', 'cache')
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+# Packet indexes (for filter expressions and bulk exports) are written for captures of up to
+# PACKET_INDEX_MAX_PACKETS packets (0 turns them off) and cached within their own byte budget
+PACKET_INDEX_MAX_PACKETS = int(os.environ.get('PACKET_INDEX_MAX_PACKETS', 10_000_000))
+PACKET_INDEX_MAX_BYTES = int(os.environ.get('PACKET_INDEX_MAX_BYTES', 2 * 1024 ** 3))
+# Set ANALYSIS_DB to share analyses between worker processes through SQLite
+ANALYSIS_DB = os.environ.get('ANALYSIS_DB')
+ANALYSIS_STORE_MAX_BYTES = int(os.environ.get('ANALYSIS_STORE_MAX_BYTES', 512 * 1024 * 1024))
+# Approximate conversations, domains and per-source packet counts with bounded-memory sketches
+SKETCH_MODE = os.environ.get('SKETCH_MODE', 'false').lower() == 'true'
+# Directory whose growing or rotated captures may be tailed; live capture is off without it
+LIVE_CAPTURE_DIR = os.environ.get('LIVE_CAPTURE_DIR')
+MAX_LIVE_CAPTURES = int(os.environ.get('MAX_LIVE_CAPTURES', 4))
+# Per-stage analysis timings: off, on, or memory (also traces peak allocations, much slower)
+ANALYSIS_PROFILING = os.environ.get('ANALYSIS_PROFILING', 'off').lower()
+MAX_FINISHED_LIVE_CAPTURES = 100
+# Largest max_points accepted by the timeline endpoint
+MAX_TIMELINE_POINTS = 10000
+# Seconds between comments that keep idle event streams open
+SSE_KEEPALIVE_SECONDS = 15
+
+# Rendered PDF/CSV exports kept in memory; larger exports are streamed without being kept
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+MAX_CACHED_EXPORT_BYTES = 16 * 1024 * 1024
+
+# Indexed conversation/endpoint tables kept for the most recently queried analyses
+MAX_TRAFFIC_TABLES = 8
+
+# Prepared AI contexts (one per analysis) and chat answers kept in memory
+AI_CONTEXT_CACHE_SIZE = int(os.environ.get('AI_CONTEXT_CACHE_SIZE', 32))
+AI_RESPONSE_CACHE_SIZE = int(os.environ.get('AI_RESPONSE_CACHE_SIZE', 256))
+
+# Top-level analysis keys read to answer chat questions (the context sections and the revision)
+CHAT_KEYS = ('total_packets', *SECTION_TITLES)
+
+# Request latency and analysis stage metrics served at /api/metrics
+metrics = MetricsRegistry()
+
+# Exports by analysis id, re-rendered when the analysis changes
+export_cache = ExportCache(EXPORT_CACHE_MAX_BYTES, MAX_CACHED_EXPORT_BYTES)
+
+# Chat backend picked by AI_BACKEND, with its context and response caches
+ai_assistant = AIAssistant(context_cache_size=AI_CONTEXT_CACHE_SIZE, response_cache_size=AI_RESPONSE_CACHE_SIZE)
 
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# Global variables to store current analysis
-current_analysis = None
-current_filename = None
+# Analyses by analysis id
+if ANALYSIS_DB:
+    analysis_store = SQLiteAnalysisStore(ANALYSIS_DB)
+else:
+    analysis_store = MemoryAnalysisStore(ANALYSIS_STORE_MAX_BYTES)
+
+# Analysis results of previously uploaded captures
+result_cache = ResultCache(RESULT_CACHE_FOLDER, RESULT_CACHE_MAX_BYTES,
+                           f'{ANALYZER_VERSION}-sketch' if SKETCH_MODE else ANALYZER_VERSION, PACKET_INDEX_MAX_BYTES)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def job_response(job):
+    """Job status; a finished job carries the analysis summary, sections are fetched on demand"""
+    job_dict = job.to_dict()
+    if 'analysis' in job_dict:
+        job_dict['summary'] = analysis_summary(job_dict.pop('analysis'))
+    return jsonify(job_dict)
+
+def stored_job_response(job_dict):
+    """Status of a job run by another worker, as published in the analysis store"""
+    if job_dict['status'] == 'completed':
+        stored = analysis_store.get_summary(job_dict['analysis_id'])
+        job_dict['summary'] = stored['summary'] if stored else None
+    return jsonify(job_dict)
+
+def find_analysis(analysis_id=None, keys=None):
+    """Stored analysis for an id, or the most recent one when no id is given
+
+    With ``keys`` only those top-level keys of the analysis are loaded.
+    """
+    if analysis_id:
+        return analysis_store.get(analysis_id, keys)
+    return analysis_store.latest(keys)
+
+def find_summary(analysis_id=None):
+    """Like find_analysis, with the analysis summary in place of the analysis"""
+    if analysis_id:
+        return analysis_store.get_summary(analysis_id)
+    return analysis_store.latest_summary()
+
+def analysis_profile():
+    """``profile`` argument of analyze_pcap for ANALYSIS_PROFILING"""
+    if ANALYSIS_PROFILING == 'memory':
+        return 'memory'
+    return ANALYSIS_PROFILING in ('on', 'true', '1')
+
+def index_expected(analysis):
+    """Whether a packet index is written for a capture like the one of this analysis"""
+    return 0 < analysis.get('total_packets', 0) <= PACKET_INDEX_MAX_PACKETS
+
+def find_cached_analysis(capture_hash):
+    """Cached analysis of a capture, unless the packet index it should have was evicted"""
+    analysis = result_cache.get(capture_hash)
+    if analysis is None or not index_expected(analysis) or result_cache.get_index(capture_hash):
+        return analysis
+    return None
+
+def run_analysis_job(job):
+    """Analyze an uploaded capture in a job worker and store the result"""
+    analyzer = PcapAnalyzer(SKETCH_ACCUMULATORS if SKETCH_MODE else None)
+    analyzer.max_index_packets = PACKET_INDEX_MAX_PACKETS
+    # A streamed upload only has its hash once fully received, so the index
+    # is written next to the upload and moved into the cache afterwards
+    index_path = f'{job.filepath}.index.npz' if PACKET_INDEX_MAX_PACKETS > 0 else None
+    try:
+        analysis_result = analyzer.analyze_pcap(job.stream or job.filepath, workers=ANALYSIS_WORKERS,
+                                                progress=job.report_progress, index_path=index_path,
+                                                profile=analysis_profile())
+        performance = analysis_result.get('performance')
+        with metrics.time_stage('serialization', analysis_result['total_packets']) as serialization:
+            result_cache.put(job.capture_hash, analysis_result)
+        if analyzer.index_saved:
+            result_cache.put_index(job.capture_hash, index_path)
+    finally:
+        if index_path and os.path.exists(index_path):
+            os.remove(index_path)
+    
+    if performance:
+        metrics.observe_performance(performance)
+        # Cached copies are written before their serialization is timed; stored analyses show it
+        performance['stages'].append(serialization)
+    job.analysis_id = analysis_store.put(job.filename, analysis_result, job.capture_hash)
+    return analysis_result
+
+# Job statuses are published to the analysis store so any worker process can answer for them
+job_queue = JobQueue(run_analysis_job, max_workers=JOB_WORKERS, store=analysis_store)
+
+# Live captures by live id
+live_captures = {}
+live_captures_lock = threading.Lock()
+
+def resolve_live_path(path):
+    """Real path of a capture file or directory inside LIVE_CAPTURE_DIR, or None"""
+    root = os.path.realpath(LIVE_CAPTURE_DIR)
+    target = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, target]) != root or not os.path.exists(target):
+        return None
+    return target
+
+def store_live_results(live, results):
+    """Keep the rolling results of a live capture under one analysis id"""
+    live.analysis_id = analysis_store.put(live.filename, results, analysis_id=live.analysis_id)
+    export_cache.invalidate(live.analysis_id)
+
+# TrafficTables by (analysis id, packet count), so a growing live analysis is re-indexed
+traffic_tables = OrderedDict()
+traffic_tables_lock = threading.Lock()
+
+def find_traffic_tables(stored):
+    """Indexed conversation and endpoint tables of a stored analysis, or None without a full table
+
+    ``stored`` needs the total_packets of its analysis; the conversation
+    table is loaded from the store only when it is not indexed yet.
+    """
+    key = (stored['analysis_id'], stored['analysis'].get('total_packets'))
+    with traffic_tables_lock:
+        tables = traffic_tables.get(key)
+        if tables is not None:
+            traffic_tables.move_to_end(key)
+            return tables
+    table = stored['analysis'].get('conversation_table')
+    if table is None:
+        loaded = analysis_store.get(stored['analysis_id'], ('conversation_table',))
+        table = loaded['analysis'].get('conversation_table') if loaded else None
+    if table is None:
+        return None
+    tables = TrafficTables(table)
+    with traffic_tables_lock:
+        traffic_tables[key] = tables
+        while len(traffic_tables) > MAX_TRAFFIC_TABLES:
+            traffic_tables.popitem(last=False)
+    return tables
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Route templates, not raw paths, keep the label set bounded
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+    return response
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'message': 'OGPW Backend API is running'})
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    global current_analysis, current_filename
-    
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -46,86 +261,422 @@ def upload_file():
     
     try:
         filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        # Unique path so concurrent uploads of the same name don't collide
+        fd, filepath = tempfile.mkstemp(prefix='upload_', suffix=f'_{filename}', dir=UPLOAD_FOLDER)
+        os.close(fd)
+        capture_hash = save_upload(file, filepath)
         
-        # Analyze the PCAP file
-        analyzer = PcapAnalyzer()
-        analysis_result = analyzer.analyze_pcap(filepath)
+        # Same bytes analyzed before by this analyzer version: skip the analysis
+        cached_analysis = find_cached_analysis(capture_hash)
+        if cached_analysis is not None:
+            os.remove(filepath)
+            return jsonify({
+                'message': 'File uploaded, analysis loaded from cache',
+                'analysis_id': analysis_store.put(filename, cached_analysis, capture_hash),
+                'filename': filename,
+                'summary': analysis_summary(cached_analysis),
+                'cached': True
+            })
         
-        current_analysis = analysis_result
-        current_filename = filename
+        # Analysis runs in the background; the uploaded file belongs to the job now
+        job = job_queue.submit(filepath, filename, capture_hash)
         
-        # Clean up uploaded file
-        os.remove(filepath)
+        return jsonify({
+            'message': 'File uploaded, analysis queued',
+            'filename': filename,
+            'job_id': job.id,
+            'status_url': f'/api/jobs/{job.id}'
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+
+@app.route('/api/upload/stream', methods=['POST'])
+def upload_stream():
+    """Receive a raw capture body in chunks while it is being analyzed"""
+    filename = secure_filename(request.args.get('filename', ''))
+    if not filename:
+        return jsonify({'error': 'No file selected'}), 400
+    
+    if not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Only .pcap and .pcapng files are allowed'}), 400
+    
+    if request.content_length and request.content_length > MAX_FILE_SIZE:
+        return jsonify({'error': f'File too large (max {MAX_FILE_SIZE} bytes)'}), 413
+    
+    # Reject non-captures from their first bytes instead of after the whole body
+    header = read_header(request.stream)
+    if not is_capture_header(header):
+        return jsonify({'error': 'Invalid file content. Not a pcap or pcapng capture'}), 400
+    
+    try:
+        fd, filepath = tempfile.mkstemp(prefix='upload_', suffix=f'_{filename}', dir=UPLOAD_FOLDER)
+        os.close(fd)
+        growing = GrowingFile(filepath)
+        job = job_queue.submit(filepath, filename, stream=growing, total_bytes=request.content_length or 0)
+        
+        upload_error = 'Upload failed'
+        try:
+            capture_hash, size = receive_upload(request.stream, filepath, header, MAX_FILE_SIZE, growing,
+                                                should_stop=lambda: job.status in ('failed', 'cancelled'))
+            if request.content_length and size < request.content_length:
+                raise UploadRejected('Upload incomplete')
+            job.capture_hash = capture_hash
+            job.total_bytes = size
+            upload_error = None
+        except UploadRejected as e:
+            upload_error = str(e)
+            job_queue.cancel(job.id)
+            message = f'Analysis failed: {job.error}' if job.error else upload_error
+            return jsonify({'error': message}), e.status_code
+        finally:
+            growing.finish(upload_error)
+        
+        cached_analysis = find_cached_analysis(capture_hash)
+        if cached_analysis is not None:
+            job_queue.cancel(job.id)
+            return jsonify({
+                'message': 'File uploaded, analysis loaded from cache',
+                'analysis_id': analysis_store.put(filename, cached_analysis, capture_hash),
+                'filename': filename,
+                'summary': analysis_summary(cached_analysis),
+                'cached': True
+            })
         
         return jsonify({
-            'message': 'File uploaded and analyzed successfully',
+            'message': 'File uploaded, analysis in progress',
             'filename': filename,
-            'analysis': analysis_result
-        })
+            'job_id': job.id,
+            'status_url': f'/api/jobs/{job.id}'
+        }), 202
         
     except Exception as e:
-        return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is not None:
+        return job_response(job)
+    
+    job_dict = analysis_store.get_status('job', job_id)
+    if job_dict is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return stored_job_response(job_dict)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is not None:
+        return job_response(job)
+    
+    # Running in another worker, which stops at its next progress report
+    if not analysis_store.request_stop('job', job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    return stored_job_response(analysis_store.get_status('job', job_id))
+
+@app.route('/api/live', methods=['POST'])
+def start_live_capture():
+    """Start tailing a growing capture file or a directory of rotated captures"""
+    if not LIVE_CAPTURE_DIR:
+        return jsonify({'error': 'Live capture is disabled. Set LIVE_CAPTURE_DIR to enable it'}), 403
+    
+    data = request.get_json() or {}
+    path = data.get('path', '')
+    if not path:
+        return jsonify({'error': 'Path parameter is required'}), 400
+    
+    target = resolve_live_path(path)
+    if target is None:
+        return jsonify({'error': 'Capture path not found'}), 404
+    
+    with live_captures_lock:
+        finished = [live_id for live_id, live in live_captures.items() if live.status != 'running']
+        for live_id in finished[:max(len(finished) - MAX_FINISHED_LIVE_CAPTURES, 0)]:
+            del live_captures[live_id]
+        if sum(1 for live in live_captures.values() if live.status == 'running') >= MAX_LIVE_CAPTURES:
+            return jsonify({'error': f'Too many live captures (max {MAX_LIVE_CAPTURES})'}), 429
+        live = LiveCapture(target, os.path.basename(target.rstrip(os.sep)),
+                           SKETCH_ACCUMULATORS if SKETCH_MODE else None, on_update=store_live_results,
+                           store=analysis_store)
+        live_captures[live.id] = live
+    live.start()
+    
+    return jsonify({
+        'message': 'Live capture started',
+        **live.to_dict(),
+        'status_url': f'/api/live/{live.id}',
+        'events_url': f'/api/live/{live.id}/events'
+    }), 201
+
+@app.route('/api/live/<live_id>', methods=['GET'])
+def get_live_capture(live_id):
+    live = live_captures.get(live_id)
+    if live is not None:
+        return jsonify(live.to_dict())
+    
+    status = analysis_store.get_status('live', live_id)
+    if status is None:
+        return jsonify({'error': 'Live capture not found'}), 404
+    return jsonify(status)
+
+@app.route('/api/live/<live_id>/stop', methods=['POST'])
+def stop_live_capture(live_id):
+    live = live_captures.get(live_id)
+    if live is not None:
+        live.stop()
+        return jsonify(live.to_dict())
+    
+    # Tailed by another worker, which stops at its next poll
+    if not analysis_store.request_stop('live', live_id):
+        return jsonify({'error': 'Live capture not found'}), 404
+    return jsonify(analysis_store.get_status('live', live_id))
+
+@app.route('/api/live/<live_id>/events', methods=['GET'])
+def live_capture_events(live_id):
+    """Server-Sent Events: a snapshot of the results, then a delta per update"""
+    live = live_captures.get(live_id)
+    if live is None:
+        if analysis_store.get_status('live', live_id) is None:
+            return jsonify({'error': 'Live capture not found'}), 404
+        return Response(stream_with_context(stored_live_events(live_id)), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    events = live.subscribe()
+    
+    def generate():
+        try:
+            while True:
+                try:
+                    event, data = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield sse_event(event, data)
+                if event == 'end':
+                    return
+        finally:
+            live.unsubscribe(events)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def stored_live_events(live_id):
+    """Events of a live capture tailed by another worker, read from the analysis store
+
+    Its published status is polled; every new sequence is sent as a snapshot
+    of the stored results rather than a delta.
+    """
+    sequence = None
+    idle = 0
+    while True:
+        status = analysis_store.get_status('live', live_id)
+        if status['sequence'] != sequence:
+            sequence = status['sequence']
+            stored = analysis_store.get(status['analysis_id']) if status['analysis_id'] else None
+            yield sse_event('snapshot', {'sequence': sequence,
+                                         'analysis': client_analysis(stored['analysis']) if stored else None})
+            idle = 0
+        if status['status'] != 'running':
+            yield sse_event('end', status)
+            return
+        time.sleep(LiveCapture.poll_interval)
+        idle += LiveCapture.poll_interval
+        if idle >= SSE_KEEPALIVE_SECONDS:
+            yield ': keepalive\n\n'
+            idle = 0
 
 @app.route('/api/analysis/current', methods=['GET'])
-def get_current_analysis():
-    if current_analysis is None:
+@app.route('/api/analysis/<analysis_id>', methods=['GET'])
+def get_current_analysis(analysis_id=None):
+    """Summary of a stored analysis, or with ?full=true the whole analysis minus its server-side sections"""
+    analysis_id = analysis_id or request.args.get('analysis_id')
+    full = request.args.get('full', 'false').lower() == 'true'
+    stored = find_analysis(analysis_id) if full else find_summary(analysis_id)
+    if stored is None:
+        return jsonify({'error': 'No analysis data available'}), 404
+    
+    if full:
+        stored['analysis'] = client_analysis(stored['analysis'])
+    return jsonify(stored)
+
+@app.route('/api/analysis/summary', methods=['GET'])
+def get_analysis_summary():
+    """Headline numbers only; list sections are fetched page by page"""
+    stored = find_summary(request.args.get('analysis_id'))
+    if stored is None:
         return jsonify({'error': 'No analysis data available'}), 404
     
     return jsonify({
-        'filename': current_filename,
-        'analysis': current_analysis
+        'analysis_id': stored['analysis_id'],
+        'filename': stored['filename'],
+        'summary': stored['summary']
     })
 
+@app.route('/api/analysis/sections/<section>', methods=['GET'])
+def get_analysis_section(section):
+    """One sorted page of a list section, e.g. ?sort=-bytes&limit=50&cursor=..."""
+    stored = find_analysis(request.args.get('analysis_id'), ('total_packets', *SECTION_KEYS.get(section, ())))
+    if stored is None:
+        return jsonify({'error': 'No analysis data available'}), 404
+    
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    try:
+        tables = find_traffic_tables(stored) if section == 'conversations' else None
+        page = page_section(stored['analysis'], section, request.args.get('sort'), limit,
+                            request.args.get('cursor'), tables)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(page)
+
+@app.route('/api/analysis/timeline', methods=['GET'])
+def get_timeline():
+    """Traffic timeline of a time range, downsampled to at most max_points points"""
+    stored = find_analysis(request.args.get('analysis_id'), ('timeline_series', 'timeline'))
+    if stored is None:
+        return jsonify({'error': 'No analysis data available'}), 404
+    
+    try:
+        start = float(request.args['start']) if request.args.get('start') else None
+        end = float(request.args['end']) if request.args.get('end') else None
+        max_points = int(request.args.get('max_points', PREVIEW_POINTS))
+    except ValueError:
+        return jsonify({'error': 'start, end and max_points must be numbers'}), 400
+    method = request.args.get('method', 'lttb')
+    if not 3 <= max_points <= MAX_TIMELINE_POINTS:
+        return jsonify({'error': f'max_points must be between 3 and {MAX_TIMELINE_POINTS}'}), 400
+    if method not in DOWNSAMPLE_METHODS:
+        return jsonify({'error': f'method must be one of {", ".join(DOWNSAMPLE_METHODS)}'}), 400
+    
+    analysis = stored['analysis']
+    # Analyses stored before the series existed only have per-second points
+    series = analysis.get('timeline_series') or series_from_points(analysis.get('timeline', []))
+    return jsonify({'start': start, 'end': end, **query_timeline(series, start, end, max_points, method)})
+
+@app.route('/api/analysis/conversations', methods=['GET'])
+@app.route('/api/analysis/endpoints', methods=['GET'])
+def get_traffic_table():
+    """Top-K conversations or endpoints, e.g. ?by=bytes&k=20&ip=10.0.0.0/8"""
+    stored = find_analysis(request.args.get('analysis_id'), ('total_packets',))
+    if stored is None:
+        return jsonify({'error': 'No analysis data available'}), 404
+    tables = find_traffic_tables(stored)
+    if tables is None:
+        return jsonify({'error': 'This analysis has no full conversation table (sketch mode or an older analysis)'}), 404
+    
+    try:
+        k = int(request.args.get('k', DEFAULT_TOP_K))
+    except ValueError:
+        return jsonify({'error': 'k must be a number'}), 400
+    ip = request.args.get('ip') or None
+    try:
+        if request.path.endswith('/conversations'):
+            top = tables.top_conversations(request.args.get('by', 'packets'), k, ip)
+        else:
+            top = tables.top_endpoints(request.args.get('by', 'bytes'), k, ip)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'analysis_id': stored['analysis_id'], 'ip': ip, **top})
+
 @app.route('/api/analysis/filter', methods=['POST'])
 def filter_analysis():
-    if current_analysis is None:
+    """Filter by protocol name, or by a BPF-style expression such as 'tcp and dst port 443'"""
+    data = request.get_json()
+    stored = find_analysis(data.get('analysis_id'))
+    if stored is None:
         return jsonify({'error': 'No analysis data available'}), 404
     
-    data = request.get_json()
+    expression = data.get('expression', '').strip()
     protocol = data.get('protocol', '').upper()
     
-    if not protocol:
-        return jsonify({'error': 'Protocol parameter is required'}), 400
+    if not protocol and not expression:
+        return jsonify({'error': 'Protocol or expression parameter is required'}), 400
     
     try:
         analyzer = PcapAnalyzer()
-        filtered_data = analyzer.filter_by_protocol(current_analysis, protocol)
+        # Expressions, and analyses without precomputed rollups, run on the saved packet index
+        if (expression or 'protocol_rollups' not in stored['analysis']) and stored.get('capture_hash'):
+            index_path = result_cache.get_index(stored['capture_hash'])
+            if index_path:
+                analyzer.packet_table = PacketTable.load(index_path)
+        if expression:
+            if analyzer.packet_table is None:
+                return jsonify({'error': 'No packet index is available to filter this analysis'}), 404
+            filtered_data = analyzer.filter_by_expression(expression)
+        else:
+            filtered_data = analyzer.filter_by_protocol(stored['analysis'], protocol)
         return jsonify(filtered_data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Filtering failed: {str(e)}'}), 500
 
 @app.route('/api/chat', methods=['POST'])
 def chat_with_ai():
-    if current_analysis is None:
+    data = request.get_json()
+    stored = find_analysis(data.get('analysis_id'), CHAT_KEYS)
+    if stored is None:
         return jsonify({'error': 'No analysis data available for AI assistant'}), 404
     
-    data = request.get_json()
     message = data.get('message', '')
     
     if not message:
         return jsonify({'error': 'Message is required'}), 400
     
+    # Cached contexts and answers are dropped once a live capture grows
+    analysis_key = (stored['analysis_id'], analysis_revision(stored['analysis']))
+    
+    if data.get('stream'):
+        chunks = ai_assistant.stream_query(message, stored['analysis'], analysis_key)
+        
+        def generate():
+            """Server-Sent Events: a token event per chunk, then the whole answer and its context usage"""
+            parts = []
+            try:
+                for chunk in chunks:
+                    parts.append(chunk)
+                    yield sse_event('token', {'text': chunk})
+                usage = ai_assistant.context_usage(message, stored['analysis'], analysis_key)
+            except Exception as e:
+                yield sse_event('error', {'error': f'AI processing failed: {str(e)}'})
+                return
+            yield sse_event('done', {'response': ''.join(parts).strip(), 'context': usage})
+        
+        return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
     try:
-        ai_assistant = AIAssistant()
-        response = ai_assistant.process_query(message, current_analysis)
-        return jsonify({'response': response})
+        response = ai_assistant.process_query(message, stored['analysis'], analysis_key)
+        usage = ai_assistant.context_usage(message, stored['analysis'], analysis_key)
+        return jsonify({'response': response, 'context': usage})
     except Exception as e:
         return jsonify({'error': f'AI processing failed: {str(e)}'}), 500
 
 @app.route('/api/export/pdf', methods=['GET'])
 def export_pdf():
-    if current_analysis is None:
+    stored = find_analysis(request.args.get('analysis_id'))
+    if stored is None:
         return jsonify({'error': 'No analysis data available'}), 404
+    filename = stored['filename']
+    analysis = stored['analysis']
+    revision = analysis_revision(analysis)
     
     try:
-        pdf_buffer = generate_pdf_report(current_analysis, current_filename)
+        pdf = export_cache.get(stored['analysis_id'], 'pdf', revision)
+        if pdf is None:
+            with metrics.time_stage('export_pdf', analysis.get('total_packets', 0)):
+                pdf = generate_pdf_report(analysis, filename).getvalue()
+            export_cache.put(stored['analysis_id'], 'pdf', revision, pdf)
         
         return send_file(
-            pdf_buffer,
+            io.BytesIO(pdf),
             as_attachment=True,
-            download_name=f'{current_filename}_analysis.pdf',
+            download_name=f'{filename}_analysis.pdf',
             mimetype='application/pdf'
         )
     except Exception as e:
@@ -133,20 +684,85 @@ def export_pdf():
 
 @app.route('/api/export/csv', methods=['GET'])
 def export_csv():
-    if current_analysis is None:
+    stored = find_analysis(request.args.get('analysis_id'))
+    if stored is None:
         return jsonify({'error': 'No analysis data available'}), 404
+    filename = stored['filename']
+    analysis = stored['analysis']
+    revision = analysis_revision(analysis)
     
-    try:
-        csv_buffer = generate_csv_report(current_analysis, current_filename)
-        
+    # The title rows carry the time of this request, so only the body below them is cached
+    csv_report = export_cache.get(stored['analysis_id'], 'csv', revision)
+    if csv_report is not None:
         return send_file(
-            csv_buffer,
+            io.BytesIO(csv_report_header(filename) + csv_report),
             as_attachment=True,
-            download_name=f'{current_filename}_analysis.csv',
+            download_name=f'{filename}_analysis.csv',
             mimetype='text/csv'
         )
+    
+    def generate():
+        # Rows are sent as they are written, so large reports start downloading at once
+        with metrics.time_stage('export_csv', analysis.get('total_packets', 0)):
+            yield from export_cache.tee(stored['analysis_id'], 'csv', revision, iter_csv_body(analysis))
+    
+    chunks = generate()
+    try:
+        first = next(chunks, b'')
     except Exception as e:
         return jsonify({'error': f'CSV generation failed: {str(e)}'}), 500
+    
+    response = Response(stream_with_context(itertools.chain([csv_report_header(filename), first], chunks)),
+                        mimetype='text/csv')
+    response.headers.set('Content-Disposition', 'attachment', filename=f'{filename}_analysis.csv')
+    return response
+
+@app.route('/api/export/bulk', methods=['GET'])
+def export_bulk():
+    """Per-packet, per-flow or per-second table of a capture as Parquet, Arrow or NDJSON"""
+    stored = find_analysis(request.args.get('analysis_id'), ())
+    if stored is None:
+        return jsonify({'error': 'No analysis data available'}), 404
+    table_name = request.args.get('table', 'packets')
+    export_format = request.args.get('format', 'parquet' if PYARROW_AVAILABLE else 'ndjson')
+    if table_name not in BULK_TABLES:
+        return jsonify({'error': f"table must be one of {', '.join(BULK_TABLES)}"}), 400
+    if export_format not in BULK_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(BULK_FORMATS)}"}), 400
+    if export_format != 'ndjson' and not PYARROW_AVAILABLE:
+        return jsonify({'error': 'Parquet and Arrow exports need pyarrow installed on the server'}), 501
+    
+    index_path = result_cache.get_index(stored['capture_hash']) if stored.get('capture_hash') else None
+    if not index_path:
+        return jsonify({'error': 'No packet index is available to export this analysis'}), 404
+    mimetype, extension = BULK_FORMATS[export_format]
+    download_name = f"{stored['filename']}_{table_name}.{extension}"
+    
+    try:
+        table = PacketTable.load(index_path)
+        if export_format == 'ndjson':
+            def generate():
+                with metrics.time_stage('export_ndjson', len(table)):
+                    yield from iter_ndjson(table, table_name)
+            
+            response = Response(stream_with_context(generate()), mimetype=mimetype)
+            response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+            return response
+        
+        # Parquet and Arrow files end with a footer, so they are written to disk before sending
+        fd, path = tempfile.mkstemp(dir=UPLOAD_FOLDER, suffix=f'.{extension}')
+        os.close(fd)
+        try:
+            with metrics.time_stage(f'export_{export_format}', len(table)):
+                write_bulk(table, table_name, export_format, path)
+            response = send_file(path, as_attachment=True, download_name=download_name, mimetype=mimetype)
+        except Exception:
+            os.remove(path)
+            raise
+        response.call_on_close(lambda: os.remove(path))
+        return response
+    except Exception as e:
+        return jsonify({'error': f'Bulk export failed: {str(e)}'}), 500
 
 if __name__ == '__main__':
     print("Starting OGPW Backend API...")
@@ -0,0 +1,221 @@
+"""Analyzer throughput benchmark on synthetic captures
+
+Generates deterministic captures (see synthetic_capture.py), runs
+``analyze_pcap`` in each mode and the legacy ``_get_*`` stages, and
+reports packets/sec, peak RSS and per-stage seconds. Results are compared
+with a stored baseline; anything slower (or larger) than the baseline by
+more than the threshold is a regression and the exit status is 1.
+
+    python benchmark.py                       # 10k and 1m packets
+    python benchmark.py --sizes 10k,1m,10m --threshold 0.25
+    python benchmark.py --update-baseline     # record this machine as the baseline
+
+Baselines only mean something on the machine that recorded them; record
+one on the deployment hardware before comparing there. Modes that use
+every CPU are not compared against a baseline recorded with a different
+CPU count.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from instrumentation import peak_rss_mb
+from synthetic_capture import parse_size, write_capture
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+DEFAULT_SIZES = ('10k', '1m')
+REGRESSION_THRESHOLD = 0.25
+
+# analyze_pcap options of each benchmarked mode
+MODES = {
+    'streaming': {},
+    'columnar': {'columnar': True},
+    'parallel': {'workers': os.cpu_count() or 1},
+}
+# Modes whose throughput scales with the CPU count of the machine
+CPU_SCALED_MODES = tuple(mode for mode, options in MODES.items() if 'workers' in options)
+
+# Legacy stages scan a capture loaded with rdpcap, which keeps every packet in memory
+LEGACY_STAGES = (
+    '_get_basic_statistics',
+    '_get_protocol_distribution',
+    '_get_ip_conversations',
+    '_get_conversation_table',
+    '_get_tcp_analysis',
+    '_get_dns_analysis',
+    '_get_domain_table',
+    '_detect_anomalies',
+    '_detect_windowed_anomalies',
+    '_get_traffic_timeline',
+)
+MAX_STAGE_PACKETS = 200_000
+
+# Runs and stages shorter than this are too noisy to flag as regressions
+MIN_COMPARED_SECONDS = 0.25
+
+
+def measure_mode(path, mode):
+    """Run analyze_pcap once; meant to run in a fresh process so peak RSS is its own"""
+    from pcap_analyzer import PcapAnalyzer
+    started = time.perf_counter()
+    results = PcapAnalyzer().analyze_pcap(path, **MODES[mode])
+    seconds = time.perf_counter() - started
+    return {
+        'seconds': round(seconds, 3),
+        'packets_per_second': round(results['total_packets'] / seconds),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def measure_stages(path):
+    """Time rdpcap and each legacy ``_get_*`` stage over the loaded packets"""
+    from scapy.all import rdpcap
+    from pcap_analyzer import PcapAnalyzer
+    analyzer = PcapAnalyzer()
+    started = time.perf_counter()
+    analyzer.packets = rdpcap(path)
+    seconds = {'rdpcap': round(time.perf_counter() - started, 3)}
+    for stage in LEGACY_STAGES:
+        started = time.perf_counter()
+        getattr(analyzer, stage)()
+        seconds[stage] = round(time.perf_counter() - started, 3)
+    return {'seconds': seconds, 'peak_rss_mb': peak_rss_mb()}
+
+
+def _isolated(function, *args):
+    """Call ``function`` in a fresh interpreter"""
+    with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(function, *args).result()
+
+
+def run_benchmark(size, workdir, modes=tuple(MODES), stages=True, seed=0):
+    """Benchmark one capture size; the capture is generated once per size and seed"""
+    count = parse_size(size)
+    path = os.path.join(workdir, f'synthetic-{count}-{seed}.pcap')
+    if not os.path.exists(path):
+        print(f"Generating {count} packets into {path}")
+        write_capture(path, count, seed)
+
+    result = {
+        'packets': count,
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'modes': {}
+    }
+    for mode in modes:
+        result['modes'][mode] = _isolated(measure_mode, path, mode)
+        print(f"{size:>6} {mode:<10} {result['modes'][mode]['packets_per_second']:>10} packets/s  "
+              f"peak {result['modes'][mode]['peak_rss_mb']} MB")
+    if stages and count <= MAX_STAGE_PACKETS:
+        result['stages'] = _isolated(measure_stages, path)
+        for stage, seconds in result['stages']['seconds'].items():
+            print(f"{size:>6} {stage:<28} {seconds:>8.3f} s")
+    elif stages:
+        print(f"{size:>6} legacy stages skipped above {MAX_STAGE_PACKETS} packets")
+    return result
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Regressions of ``results`` against ``baseline`` as readable lines"""
+    regressions = []
+
+    def check(name, value, reference, higher_is_better):
+        if value is None or reference is None:
+            return
+        if higher_is_better and value < reference * (1 - threshold):
+            regressions.append(f"{name}: {value} < {reference} (-{1 - value / reference:.0%})")
+        elif not higher_is_better and value > reference * (1 + threshold):
+            regressions.append(f"{name}: {value} > {reference} (+{value / reference - 1:.0%})")
+
+    for size, result in results.items():
+        reference = baseline.get(size)
+        if reference is None:
+            continue
+        cpus = result.get('machine', {}).get('cpus')
+        expected_cpus = reference.get('machine', {}).get('cpus')
+        for mode, measured in result['modes'].items():
+            expected = reference['modes'].get(mode)
+            if expected is None:
+                continue
+            if mode in CPU_SCALED_MODES and cpus != expected_cpus:
+                print(f"{size} {mode} not compared: baseline recorded on {expected_cpus} CPUs, this run on {cpus}")
+                continue
+            if max(measured['seconds'], expected['seconds']) >= MIN_COMPARED_SECONDS:
+                check(f"{size} {mode} packets/s", measured['packets_per_second'], expected['packets_per_second'], True)
+            check(f"{size} {mode} peak RSS MB", measured['peak_rss_mb'], expected['peak_rss_mb'], False)
+        expected_stages = reference.get('stages', {}).get('seconds', {})
+        for stage, seconds in result.get('stages', {}).get('seconds', {}).items():
+            expected = expected_stages.get(stage)
+            if expected is not None and max(seconds, expected) >= MIN_COMPARED_SECONDS:
+                check(f"{size} {stage} seconds", seconds, expected, False)
+    return regressions
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Merge ``results`` into the baseline file, keeping sizes that were not run"""
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the PCAP analyzer on synthetic captures')
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES), help='comma separated, e.g. 10k,1m,10m')
+    parser.add_argument('--modes', default=','.join(MODES), help=f"comma separated subset of {', '.join(MODES)}")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='allowed slowdown as a fraction of the baseline')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--no-stages', action='store_true', help='skip the legacy _get_* stages')
+    parser.add_argument('--workdir', help='directory for the generated captures (kept for reuse)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    modes = [mode for mode in args.modes.split(',') if mode]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+    sizes = [size.strip().lower() for size in args.sizes.split(',') if size.strip()]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='ogpw-benchmark-')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        results = {size: run_benchmark(size, workdir, modes, not args.no_stages, args.seed) for size in sizes}
+    finally:
+        if not args.workdir:
+            for name in os.listdir(workdir):
+                os.remove(os.path.join(workdir, name))
+            os.rmdir(workdir)
+
+    if args.update_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} of the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
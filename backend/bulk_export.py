@@ -0,0 +1,179 @@
+"""Full-detail bulk exports of a capture's packet index
+
+Three tables are derived from a PacketTable with vectorized group-bys:
+``packets`` (one row per packet header), ``flows`` (one row per
+unidirectional 5-tuple, in first-seen order) and ``timeline`` (one row per
+second with traffic). They are written a batch of rows at a time as
+Parquet or Arrow IPC files (both need pyarrow) or as NDJSON, so no row is
+ever turned into a Python dict.
+"""
+import numpy as np
+import pandas as pd
+from packet_record import LAYER_IP, LAYER_TCP, LAYER_UDP, LAYER_ICMP, LAYER_ARP
+from packet_table import int_to_ip
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Columns of each table and their Arrow types
+BULK_TABLES = {
+    'packets': (('offset', 'uint64'), ('time', 'float64'), ('length', 'uint32'), ('protocol', 'string'),
+                ('src', 'string'), ('dst', 'string'), ('sport', 'uint16'), ('dport', 'uint16'),
+                ('tcp_flags', 'uint16')),
+    'flows': (('src', 'string'), ('dst', 'string'), ('sport', 'uint16'), ('dport', 'uint16'),
+              ('protocol', 'string'), ('packets', 'int64'), ('bytes', 'int64'), ('first_seen', 'float64'),
+              ('last_seen', 'float64'), ('tcp_flags', 'uint16')),
+    'timeline': (('timestamp', 'int64'), ('packets', 'int64'), ('bytes', 'int64')),
+}
+
+# Format -> (mimetype, file extension)
+BULK_FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.file', 'arrow'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# Rows per written batch (and per Parquet row group)
+BATCH_ROWS = 65536
+
+# Protocol names by code; protocol_codes tests the layers in this order
+PROTOCOL_NAMES = np.array(['tcp', 'udp', 'icmp', 'ip', 'arp', 'other'], dtype=object)
+
+
+def protocol_codes(layers):
+    """Index into PROTOCOL_NAMES of each packet's highest decoded protocol"""
+    return np.select(
+        [(layers & LAYER_TCP) != 0, (layers & LAYER_UDP) != 0, (layers & LAYER_ICMP) != 0,
+         (layers & LAYER_IP) != 0, (layers & LAYER_ARP) != 0],
+        [0, 1, 2, 3, 4], default=5)
+
+
+def ip_strings(values, present=None):
+    """Dotted quads of integer addresses, converting each distinct address once; None where not ``present``"""
+    codes, uniques = pd.factorize(values)
+    addresses = np.array([int_to_ip(value) for value in uniques], dtype=object)[codes]
+    if present is not None:
+        addresses[~present] = None
+    return addresses
+
+
+def _packet_frames(table, batch_rows):
+    df = table.df
+    for start in range(0, len(df), batch_rows):
+        batch = df.iloc[start:start + batch_rows]
+        layers = batch['layers'].to_numpy()
+        ip = (layers & LAYER_IP) != 0
+        yield pd.DataFrame({
+            'offset': batch['offset'].to_numpy(),
+            'time': batch['time'].to_numpy(),
+            'length': batch['length'].to_numpy(),
+            'protocol': PROTOCOL_NAMES[protocol_codes(layers)],
+            'src': ip_strings(batch['src'].to_numpy(), ip),
+            'dst': ip_strings(batch['dst'].to_numpy(), ip),
+            'sport': batch['sport'].to_numpy(),
+            'dport': batch['dport'].to_numpy(),
+            'tcp_flags': batch['tcp_flags'].to_numpy(),
+        })
+
+
+def flow_frame(table):
+    """Unidirectional 5-tuple flows of the IP packets, in first-seen order"""
+    df = table.df
+    layers = df['layers'].to_numpy()
+    ip = (layers & LAYER_IP) != 0
+    packets = pd.DataFrame({
+        'src': df['src'].to_numpy()[ip], 'dst': df['dst'].to_numpy()[ip],
+        'sport': df['sport'].to_numpy()[ip], 'dport': df['dport'].to_numpy()[ip],
+        'protocol': protocol_codes(layers[ip]),
+        'length': df['length'].to_numpy()[ip].astype(np.int64), 'time': df['time'].to_numpy()[ip],
+    })
+    # OR of the TCP flags seen in a flow, one flag bit at a time
+    flags = df['tcp_flags'].to_numpy()[ip]
+    aggregations = {'packets': ('length', 'size'), 'bytes': ('length', 'sum'),
+                    'first_seen': ('time', 'min'), 'last_seen': ('time', 'max')}
+    for bit in range(9):
+        packets[f'flag{bit}'] = (flags >> bit) & 1
+        aggregations[f'flag{bit}'] = (f'flag{bit}', 'max')
+    flows = packets.groupby(['src', 'dst', 'sport', 'dport', 'protocol'], sort=False).agg(**aggregations)
+    flows = flows.reset_index()
+
+    tcp_flags = np.zeros(len(flows), dtype=np.uint16)
+    for bit in range(9):
+        tcp_flags |= flows[f'flag{bit}'].to_numpy().astype(np.uint16) << bit
+    return pd.DataFrame({
+        'src': flows['src'].to_numpy(), 'dst': flows['dst'].to_numpy(),
+        'sport': flows['sport'].to_numpy(), 'dport': flows['dport'].to_numpy(),
+        'protocol': flows['protocol'].to_numpy(),
+        'packets': flows['packets'].to_numpy(), 'bytes': flows['bytes'].to_numpy(),
+        'first_seen': flows['first_seen'].to_numpy(), 'last_seen': flows['last_seen'].to_numpy(),
+        'tcp_flags': tcp_flags,
+    })
+
+
+def _flow_frames(table, batch_rows):
+    flows = flow_frame(table)
+    for start in range(0, len(flows), batch_rows):
+        batch = flows.iloc[start:start + batch_rows].copy()
+        batch['src'] = ip_strings(batch['src'].to_numpy())
+        batch['dst'] = ip_strings(batch['dst'].to_numpy())
+        batch['protocol'] = PROTOCOL_NAMES[batch['protocol'].to_numpy()]
+        yield batch
+
+
+def _timeline_frames(table, batch_rows):
+    seconds = table.df['time'].to_numpy().astype(np.int64)
+    buckets = pd.Series(table.df['length'].to_numpy(dtype=np.int64)).groupby(seconds).agg(['size', 'sum'])
+    timeline = pd.DataFrame({'timestamp': buckets.index.to_numpy(dtype=np.int64),
+                             'packets': buckets['size'].to_numpy(dtype=np.int64),
+                             'bytes': buckets['sum'].to_numpy(dtype=np.int64)})
+    for start in range(0, len(timeline), batch_rows):
+        yield timeline.iloc[start:start + batch_rows]
+
+
+_FRAMES = {'packets': _packet_frames, 'flows': _flow_frames, 'timeline': _timeline_frames}
+
+
+def iter_frames(table, table_name, batch_rows=BATCH_ROWS):
+    """DataFrames of up to ``batch_rows`` rows of one bulk table"""
+    if table_name not in BULK_TABLES:
+        raise ValueError(f"Unknown bulk table: {table_name}. Use one of {', '.join(BULK_TABLES)}")
+    return _FRAMES[table_name](table, batch_rows)
+
+
+def iter_ndjson(table, table_name, batch_rows=BATCH_ROWS):
+    """UTF-8 NDJSON chunks of one bulk table, a batch of rows each"""
+    for frame in iter_frames(table, table_name, batch_rows):
+        yield frame.to_json(orient='records', lines=True, double_precision=6).encode('utf-8')
+
+
+def arrow_schema(table_name):
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in BULK_TABLES[table_name]])
+
+
+def _record_batches(table, table_name, schema, batch_rows):
+    for frame in iter_frames(table, table_name, batch_rows):
+        yield pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def write_bulk(table, table_name, export_format, path, batch_rows=BATCH_ROWS):
+    """Write one bulk table to ``path`` as ``parquet`` or ``arrow`` (IPC file format)"""
+    if export_format not in ('parquet', 'arrow'):
+        raise ValueError(f"Unknown bulk format: {export_format}")
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError('Parquet and Arrow exports need pyarrow')
+    schema = arrow_schema(table_name)
+    batches = _record_batches(table, table_name, schema, batch_rows)
+    if export_format == 'parquet':
+        # One row group per batch
+        with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+            for batch in batches:
+                writer.write_table(pa.Table.from_batches([batch], schema=schema))
+    else:
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    return path
@@ -0,0 +1,294 @@
+import copy
+from collections import OrderedDict
+from sketches import QuantileSketch
+from tcp_flows import RunningStats
+
+RCODE_NAMES = {0: 'NOERROR', 1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+NXDOMAIN = 3
+SERVFAIL = 2
+
+# Resolution latency quantiles reported, as (name, q)
+LATENCY_QUANTILES = (('p50', 0.5), ('p90', 0.9), ('p95', 0.95), ('p99', 0.99))
+
+
+def rcode_name(rcode):
+    return RCODE_NAMES.get(rcode, f'RCODE{rcode}')
+
+
+def _percent(part, total):
+    return round(part / total * 100, 2) if total else 0
+
+
+class LatencyStats:
+    """Count, min, avg, max and quantiles of resolution latencies"""
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.quantiles = QuantileSketch()
+
+    def add(self, seconds):
+        self.stats.add(seconds)
+        self.quantiles.add(seconds)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.quantiles.merge(other.quantiles)
+
+    def result(self):
+        """Milliseconds; quantiles are within 1% of the true latency"""
+        latency = self.stats.result(scale=1000)
+        for name, q in LATENCY_QUANTILES:
+            value = self.quantiles.quantile(q)
+            latency[name] = round(value * 1000, 3) if value is not None else 0
+        return latency
+
+
+class ResolverStats:
+    __slots__ = ('queries', 'retries', 'responses', 'answered', 'unanswered', 'rcodes', 'latency')
+
+    def __init__(self):
+        self.queries = 0
+        self.retries = 0
+        self.responses = 0
+        self.answered = 0
+        self.unanswered = 0
+        self.rcodes = {}
+        self.latency = LatencyStats()
+
+    def merge(self, other):
+        self.queries += other.queries
+        self.retries += other.retries
+        self.responses += other.responses
+        self.answered += other.answered
+        self.unanswered += other.unanswered
+        for rcode, count in other.rcodes.items():
+            self.rcodes[rcode] = self.rcodes.get(rcode, 0) + count
+        self.latency.merge(other.latency)
+
+
+class DnsTransactionTable:
+    """Matches DNS queries to responses by (client, server, transaction id)
+
+    Queries wait in a pending table in arrival order. A response from the
+    server back to the client with the same id answers the query if it
+    arrives within ``timeout`` seconds; queries left waiting longer are
+    unanswered, and responses without a waiting query are unmatched. A
+    repeated query (a client retry) while the first is pending keeps the
+    first, so latency counts from the original send, and is counted as a
+    retry rather than as another transaction. Beyond ``max_pending``
+    waiting queries the oldest are given up as unanswered, so query floods
+    cost bounded memory. Likewise at most ``max_resolvers`` servers keep
+    statistics: when full, the tenth with the fewest queries is dropped.
+
+    Tables built over consecutive chunks of a capture combine with
+    ``merge``. A chunk holds back the unmatched responses of its first
+    ``timeout`` seconds in ``heads``, since they may answer queries still
+    pending at the end of the previous chunk.
+    """
+    timeout = 5.0
+    max_pending = 100000
+    max_resolvers = 1000
+    sweep_interval = 4096
+
+    def __init__(self):
+        self.pending = OrderedDict()  # (client, server, id) -> query time
+        self.heads = []  # (time, client, server, id, rcode) of early unmatched responses
+        self.first_time = None
+        self.latest_time = None
+        self.pending_sweep = self.sweep_interval
+        self.queries = 0
+        self.retries = 0
+        self.responses = 0
+        self.answered = 0
+        self.unanswered = 0
+        self.unmatched_responses = 0
+        self.evicted_queries = 0
+        self.evicted_resolvers = 0
+        self.rcodes = {}
+        self.latency = LatencyStats()
+        self.resolvers = {}
+
+    def _resolver(self, server):
+        stats = self.resolvers.get(server)
+        if stats is None:
+            if len(self.resolvers) >= self.max_resolvers:
+                self._prune_resolvers()
+            stats = self.resolvers[server] = ResolverStats()
+        return stats
+
+    def _prune_resolvers(self):
+        """Keep the nine tenths of the resolvers with the most queries, oldest first among equals"""
+        ranked = sorted(self.resolvers.items(), key=lambda item: (-item[1].queries, -item[1].responses))
+        kept = ranked[:self.max_resolvers * 9 // 10]
+        self.evicted_resolvers += len(ranked) - len(kept)
+        self.resolvers = dict(kept)
+
+    def add(self, time, src, dst, qr, txid, rcode):
+        if self.first_time is None:
+            self.first_time = time
+        if self.latest_time is None or time > self.latest_time:
+            self.latest_time = time
+
+        if qr == 0:
+            self.queries += 1
+            self._resolver(dst).queries += 1
+            key = (src, dst, txid)
+            queried = self.pending.get(key)
+            if queried is not None and time - queried > self.timeout:
+                del self.pending[key]
+                self._expire(key)
+                queried = None
+            if queried is None:
+                self.pending[key] = time
+                if len(self.pending) > self.max_pending:
+                    self._make_room()
+            else:
+                self.retries += 1
+                self._resolver(dst).retries += 1
+        else:
+            self._respond(time, src, dst, txid, rcode, hold=True)
+
+        self.pending_sweep -= 1
+        if not self.pending_sweep:
+            self.pending_sweep = self.sweep_interval
+            self.sweep()
+
+    def _respond(self, time, src, dst, txid, rcode, hold=False):
+        key = (dst, src, txid)
+        queried = self.pending.get(key)
+        if queried is not None and queried > time:
+            # A held-back response cannot answer a later query
+            queried = None
+        elif queried is not None:
+            del self.pending[key]
+            if time - queried > self.timeout:
+                self._expire(key)
+                queried = None
+        if (queried is None and hold and time - self.first_time <= self.timeout
+                and len(self.heads) < self.max_pending):
+            # May answer a query pending at the end of the previous chunk
+            self.heads.append((time, src, dst, txid, rcode))
+            return
+
+        self.responses += 1
+        self.rcodes[rcode] = self.rcodes.get(rcode, 0) + 1
+        resolver = self._resolver(src)
+        resolver.responses += 1
+        resolver.rcodes[rcode] = resolver.rcodes.get(rcode, 0) + 1
+        if queried is None:
+            self.unmatched_responses += 1
+        else:
+            self.answered += 1
+            self.latency.add(time - queried)
+            resolver.answered += 1
+            resolver.latency.add(time - queried)
+
+    def sweep(self, now=None):
+        """Give up on every query pending for longer than timeout"""
+        now = self.latest_time if now is None else now
+        if now is None:
+            return
+        while self.pending:
+            key, queried = next(iter(self.pending.items()))
+            if now - queried <= self.timeout:
+                break
+            del self.pending[key]
+            self._expire(key)
+
+    def _expire(self, key):
+        self.unanswered += 1
+        self._resolver(key[1]).unanswered += 1
+
+    def _make_room(self):
+        self.sweep()
+        while len(self.pending) > self.max_pending:
+            key, _ = self.pending.popitem(last=False)
+            self._expire(key)
+            self.evicted_queries += 1
+
+    def merge(self, other):
+        """Combine with the table of the chunk of the capture that follows"""
+        self.queries += other.queries
+        self.retries += other.retries
+        self.responses += other.responses
+        self.answered += other.answered
+        self.unanswered += other.unanswered
+        self.unmatched_responses += other.unmatched_responses
+        self.evicted_queries += other.evicted_queries
+        self.evicted_resolvers += other.evicted_resolvers
+        for rcode, count in other.rcodes.items():
+            self.rcodes[rcode] = self.rcodes.get(rcode, 0) + count
+        self.latency.merge(other.latency)
+        for server, stats in other.resolvers.items():
+            self._resolver(server).merge(stats)
+
+        if self.first_time is None:
+            self.first_time = other.first_time
+            self.heads = other.heads
+        else:
+            for head in other.heads:
+                self._respond(*head)
+        if other.latest_time is not None:
+            self.sweep(other.latest_time)
+            if self.latest_time is None or other.latest_time > self.latest_time:
+                self.latest_time = other.latest_time
+        for key, queried in other.pending.items():
+            earlier = self.pending.get(key)
+            if earlier is not None and queried - earlier <= self.timeout:
+                # A retry of a query pending since the previous chunk
+                self.retries += 1
+                self._resolver(key[1]).retries += 1
+                continue
+            if earlier is not None:
+                del self.pending[key]
+                self._expire(key)
+            self.pending[key] = queried
+        if len(self.pending) > self.max_pending:
+            self._make_room()
+
+    def view(self):
+        """Copy whose result() leaves the queries of this table pending, for a capture still growing"""
+        if self.heads:
+            # Matching held-back responses adds to the shared latencies and response codes
+            return copy.deepcopy(self)
+        table = copy.copy(self)
+        table.pending = OrderedDict(self.pending)
+        table.resolvers = {server: copy.copy(stats) for server, stats in self.resolvers.items()}
+        return table
+
+    def result(self, top_resolvers=10):
+        """Transaction fields of the dns_analysis section; gives up on the queries still pending"""
+        for head in self.heads:
+            self._respond(*head)
+        self.heads = []
+        for key in self.pending:
+            self._expire(key)
+        self.pending.clear()
+
+        resolvers = sorted(self.resolvers.items(),
+                           key=lambda item: (-item[1].queries, -item[1].responses, item[0]))
+        return {
+            'answered_queries': self.answered,
+            'unanswered_queries': self.unanswered,
+            'unmatched_responses': self.unmatched_responses,
+            'retried_queries': self.retries,
+            'answer_rate': _percent(self.answered, self.queries - self.retries),
+            'response_codes': {rcode_name(rcode): count for rcode, count in sorted(self.rcodes.items()) if count},
+            'nxdomain_rate': _percent(self.rcodes.get(NXDOMAIN, 0), self.responses),
+            'servfail_rate': _percent(self.rcodes.get(SERVFAIL, 0), self.responses),
+            'latency_ms': self.latency.result(),
+            'resolvers': [
+                {
+                    'resolver': server,
+                    'queries': stats.queries,
+                    'retries': stats.retries,
+                    'responses': stats.responses,
+                    'answered': stats.answered,
+                    'unanswered': stats.unanswered,
+                    'nxdomain': stats.rcodes.get(NXDOMAIN, 0),
+                    'servfail': stats.rcodes.get(SERVFAIL, 0),
+                    'latency_ms': stats.latency.result()
+                }
+                for server, stats in resolvers[:top_resolvers]
+            ]
+        }
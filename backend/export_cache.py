@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+
+
+def analysis_revision(analysis):
+    """Cheap fingerprint of an analysis that changes when a live capture grows"""
+    stats = analysis.get('basic_stats') or {}
+    return (analysis.get('total_packets'), stats.get('total_bytes'))
+
+
+class ExportCache:
+    """In-process LRU of rendered PDF/CSV exports keyed by analysis id and format
+
+    Each entry remembers the revision of the analysis it was rendered from;
+    a lookup with a different revision drops the stale entry, so replaced
+    analyses (e.g. the rolling results of a live capture) are re-rendered.
+    Exports larger than ``max_entry_bytes`` are served but not kept, and
+    once the total passes ``max_bytes`` the least recently used are dropped.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, analysis_id, export_format, revision):
+        """Rendered bytes of an export, or None"""
+        key = (analysis_id, export_format)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != revision:
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, analysis_id, export_format, revision, data):
+        if len(data) > self.max_entry_bytes:
+            return
+        key = (analysis_id, export_format)
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (revision, data)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def tee(self, analysis_id, export_format, revision, chunks):
+        """Yield ``chunks`` and cache them once all were sent, unless they outgrow max_entry_bytes"""
+        kept = []
+        size = 0
+        for chunk in chunks:
+            if kept is not None:
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    kept = None
+                else:
+                    kept.append(chunk)
+            yield chunk
+        if kept is not None:
+            self.put(analysis_id, export_format, revision, b''.join(kept))
+
+    def invalidate(self, analysis_id):
+        """Drop every export of an analysis"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == analysis_id]:
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= len(entry[1])
@@ -0,0 +1,605 @@
+"""Raw-bytes capture decoder
+
+Reads pcap/pcapng record headers directly and decodes the fixed-offset
+Ethernet/IPv4/IPv6/TCP/UDP/ICMP/ARP/DNS headers into PacketRecords without
+building scapy layers. Payload dispatch follows scapy's own bind_layers
+tables, so every packet yields the same PacketRecord as record_from_packet()
+on the dissected packet. Anything the decoder does not understand (tunnels,
+ICMP errors, other link types, truncated headers, ...) is handed to scapy.
+"""
+import gzip
+import os
+import struct
+import time
+from decimal import Decimal
+from socket import inet_ntoa
+from scapy.all import conf, Ether, Dot1Q, IP, IPv6, TCP, UDP, DNS, ICMP, ARP
+from packet_record import (
+    PacketRecord, record_from_packet,
+    LAYER_IP, LAYER_TCP, LAYER_UDP, LAYER_ICMP, LAYER_ARP, LAYER_DNS
+)
+
+# Scapy readers cut every record to this size
+MTU = 0xffff
+
+DLT_EN10MB = 1
+DLT_RAW = 101
+DLT_IPV4 = 228
+DLT_IPV6 = 229
+
+PCAP_MAGICS = {
+    b"\xa1\xb2\xc3\xd4": (">", 1000000),
+    b"\xd4\xc3\xb2\xa1": ("<", 1000000),
+    b"\xa1\xb2\x3c\x4d": (">", 1000000000),
+    b"\x4d\x3c\xb2\xa1": ("<", 1000000000),
+}
+PCAPNG_MAGIC = b"\x0a\x0d\x0d\x0a"
+
+ETHERTYPE_MAX_LENGTH = 1500
+ICMP_ECHO_TYPES = (0, 8)
+ICMPV6_INFO_MIN_TYPE = 128
+# hwtype=1, ptype=0x0800, hwlen=6, plen=4
+ARP_ETHER_IPV4 = b"\x00\x01\x08\x00\x06\x04"
+
+# Resource record types whose rdata cannot fail to parse at this length
+SAFE_RDATA_LENGTHS = {1: 4, 28: 16}
+
+# Question kept by DNS when the message ends right after the header
+_DNS_DEFAULT_QNAME = DNS().qd.qname
+
+_DNS_RR_FIELD = next(f for f in DNS.fields_desc if f.name == 'an')
+
+_SHORT = struct.Struct("!H")
+_RR_HEADER = struct.Struct("!HHIH")
+
+# Returned by payload lookups that only scapy can resolve
+_FALLBACK = object()
+
+
+class _PayloadGuesser:
+    """Memoized replica of Packet.guess_payload_class for one layer
+
+    Only the header fields named in ``keys`` are known to the decoder; a
+    binding that tests any other field resolves to _FALLBACK.
+    """
+
+    def __init__(self, layer, keys):
+        self.table = [entry for alias in layer.aliastypes for entry in alias.payload_guess]
+        self.keys = keys
+        self.values = {}
+        for fval, _ in self.table:
+            for key, value in fval.items():
+                self.values.setdefault(key, set()).add(value)
+        # Whether every binding tests only ``keys``; otherwise a value no binding names can still match
+        self.keyed = all(fval and set(fval) <= set(keys) for fval, _ in self.table)
+        self.cache = {}
+
+    def could_match(self, value):
+        """True if any binding tests one of ``keys`` against value"""
+        return any(value in self.values.get(key, ()) for key in self.keys)
+
+    def __call__(self, *values):
+        try:
+            return self.cache[values]
+        except KeyError:
+            pass
+        fields = dict(zip(self.keys, values))
+        cls = None
+        for fval, candidate in self.table:
+            if not all(key in fields for key in fval):
+                cls = _FALLBACK
+                break
+            if all(fields[key] == value for key, value in fval.items()):
+                cls = candidate
+                break
+        if len(self.cache) < 65536:
+            self.cache[values] = cls
+        return cls
+
+
+_ETHER_PAYLOAD = _PayloadGuesser(Ether, ('type',))
+_DOT1Q_PAYLOAD = _PayloadGuesser(Dot1Q, ('type',))
+_IP_PAYLOAD = _PayloadGuesser(IP, ('frag', 'proto'))
+_IPV6_PAYLOAD = _PayloadGuesser(IPv6, ('nh',))
+_TCP_PAYLOAD = _PayloadGuesser(TCP, ('sport', 'dport'))
+_UDP_PAYLOAD = _PayloadGuesser(UDP, ('sport', 'dport'))
+
+
+def _port_payload(guesser, sport, dport):
+    """Payload class bound to a TCP/UDP port pair, None for raw data
+
+    Ports no binding names are raw data without a lookup, unless a binding
+    also tests another field (or none), which the full lookup resolves.
+    """
+    if not guesser.keyed or guesser.could_match(sport) or guesser.could_match(dport):
+        return guesser(sport, dport)
+    return None
+
+
+def _dns_get_str(s, pointer):
+    """Port of scapy's dns_get_str() for a complete DNS message"""
+    max_length = len(s)
+    name = b""
+    after_pointer = None
+    processed_pointers = []
+    while True:
+        if abs(pointer) >= max_length:
+            break
+        cur = s[pointer]
+        pointer += 1
+        if cur & 0xc0:
+            if after_pointer is None:
+                after_pointer = pointer + 1
+            if pointer >= max_length:
+                break
+            pointer = ((cur & ~0xc0) << 8) + s[pointer] - 12
+            if pointer in processed_pointers:
+                break
+            processed_pointers.append(pointer)
+            continue
+        elif cur > 0:
+            name += bytes(s[pointer:pointer + cur]) + b"."
+            pointer += cur
+        else:
+            break
+    if after_pointer is not None:
+        pointer = after_pointer
+    return name, pointer
+
+
+def _decode_dns(msg):
+    """Return (qr, qname, id, rcode) for a DNS message, or None if scapy would reject it
+
+    ``msg`` starts at the DNS id field. The question/answer sections are
+    walked the same way scapy's DNSRRField does so that malformed messages
+    are recognised as raw payload.
+    """
+    qr = msg[2] >> 7
+    txid = (msg[0] << 8) | msg[1]
+    rcode = msg[3] & 0x0f
+    counts = (_SHORT.unpack_from(msg, 4)[0], _SHORT.unpack_from(msg, 6)[0],
+              _SHORT.unpack_from(msg, 8)[0], _SHORT.unpack_from(msg, 10)[0])
+    s = msg[12:]
+    if not s:
+        # Scapy stops dissecting and keeps the default question record
+        qname = _DNS_DEFAULT_QNAME if qr == 0 else None
+        return qr, qname.decode('utf-8').rstrip('.') if qname else None, txid, rcode
+    qname = None
+    p = 0
+
+    for section, count in enumerate(counts):
+        if count > len(s):
+            p = 0
+            continue
+        while count:
+            count -= 1
+            name, p = _dns_get_str(s, p)
+            if section == 0:
+                # Question: DNSQR(b"\x00" + s[p:p + 4]) fails on a partial short
+                if len(s[p:p + 4]) in (1, 3):
+                    return None
+                if qname is None:
+                    qname = name
+                p += 4
+            else:
+                header = s[p:p + 10]
+                if len(header) < 10:
+                    return None
+                rrtype, _, _, rdlen = _RR_HEADER.unpack(header)
+                if SAFE_RDATA_LENGTHS.get(rrtype) != rdlen or len(s) < p + 10 + rdlen:
+                    # Let scapy's own record decoder decide on anything else
+                    try:
+                        _DNS_RR_FIELD.decodeRR(name, s, p)
+                    except Exception:
+                        return None
+                p += 10 + rdlen
+
+    if qr == 0 and qname is not None:
+        return qr, qname.decode('utf-8').rstrip('.'), txid, rcode
+    return qr, None, txid, rcode
+
+
+def decode_frame(data, linktype, ts):
+    """Decode one captured frame into a PacketRecord
+
+    Returns None when the frame needs full scapy dissection.
+    """
+    length = len(data)
+    layers = 0
+    src = dst = None
+    sport = dport = tcp_flags = 0
+    dns_qr = dns_qname = dns_id = dns_rcode = None
+
+    # Link layer
+    if linktype == DLT_EN10MB:
+        if length < 14:
+            return None
+        ethertype = (data[12] << 8) | data[13]
+        if ethertype <= ETHERTYPE_MAX_LENGTH:
+            return None
+        o = 14
+        cls = _ETHER_PAYLOAD(ethertype)
+        while cls is Dot1Q and o < length:
+            if length - o < 4:
+                return None
+            ethertype = (data[o + 2] << 8) | data[o + 3]
+            o += 4
+            cls = _DOT1Q_PAYLOAD(ethertype)
+            if cls is None and ethertype <= ETHERTYPE_MAX_LENGTH:
+                return None
+        if o >= length:
+            cls = None
+    elif linktype == DLT_IPV4:
+        o, cls = 0, IP
+    elif linktype == DLT_IPV6:
+        o, cls = 0, IPv6
+    elif linktype == DLT_RAW:
+        o = 0
+        cls = IPv6 if length and data[0] >> 4 == 6 else IP
+    else:
+        return None
+
+    if cls is None:
+        return PacketRecord(ts, length, layers, src, dst, sport, dport, tcp_flags, dns_qr, dns_qname)
+
+    # Network layer
+    if cls is IP:
+        if length - o < 20:
+            return None
+        ihl = (data[o] & 0x0f) * 4
+        if ihl < 20 or length - o < ihl:
+            return None
+        layers = LAYER_IP
+        src = inet_ntoa(data[o + 12:o + 16])
+        dst = inet_ntoa(data[o + 16:o + 20])
+        ip_len = (data[o + 2] << 8) | data[o + 3]
+        frag = ((data[o + 6] & 0x1f) << 8) | data[o + 7]
+        proto = data[o + 9]
+        end = o + ip_len if ip_len >= ihl else length
+        o += ihl
+        if end > length:
+            end = length
+        if o >= end:
+            return PacketRecord(ts, length, layers, src, dst, sport, dport, tcp_flags, dns_qr, dns_qname)
+        cls = _IP_PAYLOAD(frag, proto)
+        if cls is None:
+            return PacketRecord(ts, length, layers, src, dst, sport, dport, tcp_flags, dns_qr, dns_qname)
+    elif cls is IPv6:
+        if length - o < 40:
+            return None
+        plen = (data[o + 4] << 8) | data[o + 5]
+        nh = data[o + 6]
+        if plen == 0:
+            return None
+        o += 40
+        end = min(o + plen, length)
+        if o >= end:
+            return PacketRecord(ts, length, layers, src, dst, sport, dport, tcp_flags, dns_qr, dns_qname)
+        cls = _IPV6_PAYLOAD(nh)
+        if cls is None:
+            if nh == 59:
+                return PacketRecord(ts, length, layers, src, dst, sport, dport, tcp_flags, dns_qr, dns_qname)
+            if nh == 58 and data[o] >= ICMPV6_INFO_MIN_TYPE:
+                return PacketRecord(ts, length, layers, src, dst, sport, dport, tcp_flags, dns_qr, dns_qname)
+            return None
+    elif cls is ARP:
+        # Only Ethernet/IPv4 ARP has fixed-size addresses
+        if length - o < 28 or data[o:o + 6] != ARP_ETHER_IPV4:
+            return None
+        return PacketRecord(ts, length, LAYER_ARP, src, dst, sport, dport, tcp_flags, dns_qr, dns_qname)
+    else:
+        return None
+
+    # Transport layer
+    if cls is TCP:
+        if end - o < 20:
+            return None
+        layers |= LAYER_TCP
+        sport = (data[o] << 8) | data[o + 1]
+        dport = (data[o + 2] << 8) | data[o + 3]
+        tcp_flags = ((data[o + 12] & 0x01) << 8) | data[o + 13]
+        dataofs = (data[o + 12] >> 4) * 4
+        o += dataofs if dataofs > 20 else 20
+        if o >= end:
+            return PacketRecord(ts, length, layers, src, dst, sport, dport, tcp_flags, dns_qr, dns_qname)
+        cls = _port_payload(_TCP_PAYLOAD, sport, dport)
+        if cls is DNS:
+            # DNS over TCP carries a two byte length prefix (DNS.pre_dissect)
+            if end - o >= 2:
+                dns_len = (data[o] << 8) | data[o + 1]
+                if dns_len >= 14 and end - o >= dns_len:
+                    dns = _decode_dns(data[o + 2:end])
+                    if dns is not None:
+                        layers |= LAYER_DNS
+                        dns_qr, dns_qname, dns_id, dns_rcode = dns
+        elif cls is not None:
+            return None
+    elif cls is UDP:
+        if end - o < 8:
+            return None
+        layers |= LAYER_UDP
+        sport = (data[o] << 8) | data[o + 1]
+        dport = (data[o + 2] << 8) | data[o + 3]
+        udp_len = (data[o + 4] << 8) | data[o + 5]
+        # UDP.extract_padding slices with len - 8, which may be negative
+        payload = data[o + 8:end][:udp_len - 8]
+        if not payload:
+            return PacketRecord(ts, length, layers, src, dst, sport, dport, tcp_flags, dns_qr, dns_qname)
+        cls = _port_payload(_UDP_PAYLOAD, sport, dport)
+        if cls is DNS:
+            if len(payload) < 12:
+                return None
+            dns = _decode_dns(payload)
+            if dns is not None:
+                layers |= LAYER_DNS
+                dns_qr, dns_qname, dns_id, dns_rcode = dns
+        elif cls is not None:
+            return None
+    elif cls is ICMP:
+        if end - o < 8 or data[o] not in ICMP_ECHO_TYPES:
+            return None
+        layers |= LAYER_ICMP
+    else:
+        return None
+
+    return PacketRecord(ts, length, layers, src, dst, sport, dport, tcp_flags, dns_qr, dns_qname, dns_id, dns_rcode)
+
+
+def decode_with_scapy(data, linktype, ts):
+    """Dissect a frame with scapy exactly like PcapReader does"""
+    cls = conf.l2types.num2layer.get(linktype, conf.raw_layer)
+    try:
+        pkt = cls(data)
+    except Exception:
+        pkt = conf.raw_layer(data)
+    if ts is not None:
+        pkt.time = ts
+    return record_from_packet(pkt)
+
+
+def _open_capture(filepath):
+    """Open a capture file, transparently handling gzip like scapy"""
+    with open(filepath, 'rb') as f:
+        compressed = f.read(2) == b"\x1f\x8b"
+    return gzip.open(filepath, 'rb') if compressed else open(filepath, 'rb')
+
+
+def _wrap_capture(fileobj):
+    """Capture reader on an already open binary file object, handling gzip"""
+    compressed = fileobj.read(2) == b"\x1f\x8b"
+    fileobj.seek(0)
+    return gzip.GzipFile(fileobj=fileobj, mode='rb') if compressed else fileobj
+
+
+def iter_capture(filepath):
+    """Yield (offset, linktype, timestamp, data) for every captured frame
+
+    ``filepath`` may also be an open binary file object, which is left open.
+    """
+    if hasattr(filepath, 'read'):
+        f = _wrap_capture(filepath)
+        owned = f is not filepath
+    else:
+        f = _open_capture(filepath)
+        owned = True
+    try:
+        magic = f.read(4)
+        if not magic:
+            raise Exception("No data could be read!")
+        if magic in PCAP_MAGICS:
+            yield from _iter_pcap(f, *pcap_layout(f, magic))
+        elif magic == PCAPNG_MAGIC:
+            yield from _iter_pcapng(f)
+        else:
+            raise Exception("Not a supported capture file")
+    finally:
+        if owned:
+            f.close()
+
+
+def pcap_layout(f, magic):
+    """Read the rest of a pcap global header: (record header, resolution, linktype)"""
+    endian, resolution = PCAP_MAGICS[magic]
+    header = f.read(20)
+    if len(header) < 20:
+        raise Exception("Not a supported capture file")
+    linktype = struct.unpack(endian + "HHIIII", header)[5]
+    return struct.Struct(endian + "IIII"), resolution, linktype
+
+
+def _iter_pcap(f, record_header, resolution, linktype, offset=24, end=None):
+    read = f.read
+
+    while end is None or offset < end:
+        hdr = read(16)
+        if len(hdr) < 16:
+            return
+        sec, frac, caplen, _ = record_header.unpack(hdr)
+        data = read(caplen)
+        yield offset, linktype, (sec * resolution + frac) / resolution, data[:MTU]
+        offset += 16 + caplen
+
+
+def _pcapng_options(options, endian):
+    """Port of RawPcapNgReader._read_options, returning the tsresol"""
+    tsresol = 1000000
+    while len(options) >= 4:
+        code, length = struct.unpack(endian + "HH", options[:4])
+        if code == 9 and length == 1 and len(options) >= 5:
+            value = options[4]
+            tsresol = (2 if value & 128 else 10) ** (value & 127)
+        if code == 1 and length >= 1 and 4 + length < len(options):
+            if options[4:4 + length].find(b"\n") == -1:
+                break
+        if code == 0:
+            break
+        if length % 4:
+            length += (4 - (length % 4))
+        options = options[4 + length:]
+    return tsresol
+
+
+def _pcapng_time(tshigh, tslow, tsresol):
+    ticks = (tshigh << 32) + tslow
+    if tsresol % 10 == 0 or tsresol == 1:
+        return ticks / tsresol
+    return float(Decimal(ticks) / tsresol)
+
+
+def _iter_pcapng(f):
+    read = f.read
+    interfaces = []
+
+    def read_shb():
+        """Read a Section Header Block, returning (endian, bytes consumed)"""
+        blocklen_raw = read(4)
+        byte_order = read(4)
+        if byte_order == b"\x1a\x2b\x3c\x4d":
+            endian = ">"
+        elif byte_order == b"\x4d\x3c\x2b\x1a":
+            endian = "<"
+        else:
+            return None
+        blocklen = struct.unpack(endian + "I", blocklen_raw)[0]
+        if blocklen < 16:
+            return None
+        read(blocklen - 16)
+        if not read_tail(blocklen, endian):
+            return None
+        return endian, blocklen + (-blocklen % 4)
+
+    def read_tail(blocklen, endian):
+        if blocklen % 4:
+            read(-blocklen % 4)
+        tail = read(4)
+        return len(tail) == 4 and struct.unpack(endian + "I", tail)[0] == blocklen
+
+    shb = read_shb()
+    if shb is None:
+        raise Exception("Not a supported capture file")
+    endian, offset = shb
+
+    while True:
+        block_offset = offset
+        raw_type = read(4)
+        if len(raw_type) < 4:
+            return
+        blocktype = struct.unpack(endian + "I", raw_type)[0]
+        if blocktype == 0x0A0D0D0A:
+            shb = read_shb()
+            if shb is None:
+                return
+            endian, consumed = shb
+            offset += consumed
+            continue
+        raw_len = read(4)
+        if len(raw_len) < 4:
+            return
+        blocklen = struct.unpack(endian + "I", raw_len)[0]
+        if blocklen < 12:
+            return
+        block = read(blocklen - 12)
+        if not read_tail(blocklen, endian):
+            return
+        offset += blocklen + (-blocklen % 4)
+
+        if blocktype == 1:  # Interface Description Block
+            if len(block) < 8:
+                return
+            linktype, snaplen = struct.unpack(endian + "HxxI", block[:8])
+            interfaces.append((linktype, snaplen, _pcapng_options(block[8:-4], endian)))
+        elif blocktype == 6:  # Enhanced Packet Block
+            if len(block) < 20:
+                return
+            intid, tshigh, tslow, caplen, _ = struct.unpack(endian + "5I", block[:20])
+            if intid >= len(interfaces):
+                return
+            linktype, _, tsresol = interfaces[intid]
+            yield (block_offset, linktype, _pcapng_time(tshigh, tslow, tsresol),
+                   block[20:20 + caplen][:MTU])
+        elif blocktype == 3:  # Simple Packet Block
+            if not interfaces or len(block) < 4:
+                return
+            wirelen = struct.unpack(endian + "I", block[:4])[0]
+            linktype, snaplen, _ = interfaces[0]
+            # SPBs carry no timestamp; scapy leaves the creation time
+            yield block_offset, linktype, time.time(), block[4:4 + min(wirelen, snaplen)][:MTU]
+        elif blocktype == 2:  # Obsolete Packet Block
+            if len(block) < 20:
+                return
+            intid, _, tshigh, tslow, caplen, _ = struct.unpack(endian + "HH4I", block[:20])
+            if intid >= len(interfaces):
+                return
+            linktype, _, tsresol = interfaces[intid]
+            yield (block_offset, linktype, _pcapng_time(tshigh, tslow, tsresol),
+                   block[20:20 + caplen][:MTU])
+
+
+def index_pcap(filepath):
+    """Yield the byte offset of every record in an uncompressed pcap file
+
+    Only the 16-byte record headers are read; payloads are skipped.
+    """
+    with open(filepath, 'rb') as f:
+        magic = f.read(4)
+        if magic not in PCAP_MAGICS:
+            raise Exception("Not an uncompressed pcap file")
+        record_header = pcap_layout(f, magic)[0]
+        offset = 24
+        while True:
+            hdr = f.read(16)
+            if len(hdr) < 16:
+                return
+            yield offset
+            offset += 16 + record_header.unpack(hdr)[2]
+            f.seek(offset)
+
+
+def pcap_ranges(filepath, chunks, min_chunk_bytes=0):
+    """Split an uncompressed pcap into up to ``chunks`` (start, end) byte ranges
+
+    Ranges start on record boundaries and are at least ``min_chunk_bytes``
+    long. Returns an empty list for pcapng and gzip captures, which cannot be
+    entered at an arbitrary record.
+    """
+    with open(filepath, 'rb') as f:
+        if f.read(4) not in PCAP_MAGICS:
+            return []
+    size = os.path.getsize(filepath)
+    chunk_bytes = max((size - 24) // max(chunks, 1), min_chunk_bytes, 1)
+
+    starts = []
+    next_start = 24
+    for offset in index_pcap(filepath):
+        if offset >= next_start:
+            starts.append(offset)
+            next_start = offset + chunk_bytes
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def iter_pcap_range(filepath, start, end):
+    """Yield (offset, linktype, timestamp, data) for pcap records starting in [start, end)"""
+    with open(filepath, 'rb') as f:
+        layout = pcap_layout(f, f.read(4))
+        f.seek(start)
+        yield from _iter_pcap(f, *layout, offset=start, end=end)
+
+
+def decode_frames(frames):
+    """Yield (offset, PacketRecord) per (offset, linktype, timestamp, data) frame, using scapy only where needed"""
+    for offset, linktype, ts, data in frames:
+        record = decode_frame(data, linktype, ts)
+        if record is None:
+            record = decode_with_scapy(data, linktype, ts)
+        yield offset, record
+
+
+def decode_records(frames):
+    """Yield a PacketRecord per (offset, linktype, timestamp, data) frame, using scapy only where needed"""
+    for _, record in decode_frames(frames):
+        yield record
+
+
+def iter_records(filepath):
+    """Yield a PacketRecord per frame, using scapy only where needed"""
+    yield from decode_records(iter_capture(filepath))
@@ -0,0 +1,278 @@
+"""Analysis stage profiling and Prometheus-style metrics
+
+A Profiler records wall time, CPU time and packets per named stage of one
+analysis, and with ``memory`` the peak memory allocated by Python while
+the stage ran (tracemalloc; process-wide, so concurrent analyses add to
+each other's numbers, and tracing lasts until the last of them stops). MetricsRegistry keeps histograms and counters and
+renders them in the Prometheus text exposition format for /api/metrics.
+"""
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Records decoded per batch when accumulators are profiled one at a time
+PROFILE_BATCH = 8192
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+MEMORY_BUCKETS = tuple(2 ** n for n in range(20, 35, 2))  # 1 MiB to 16 GiB
+
+# Memory-mode profilers running; tracemalloc stops when the last one that needed it does
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+def _acquire_tracing():
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if not _tracing_users and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_users += 1
+
+
+def _release_tracing():
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        _tracing_users -= 1
+        if not _tracing_users and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class Profiler:
+    """Per-stage timings of one analysis, in the order stages first ran
+
+    A stage may run many times (e.g. once per batch); its numbers add up,
+    except the peak allocation, which is the highest of its runs.
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.started_cpu = time.process_time()
+        self.tracing = bool(memory)
+        if memory:
+            _acquire_tracing()
+
+    @contextmanager
+    def stage(self, name, packets=0):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {'stage': name, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'packets': 0}
+            if self.memory:
+                entry['peak_allocated_bytes'] = 0
+        if self.memory:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield entry
+        finally:
+            entry['wall_seconds'] += time.perf_counter() - wall
+            entry['cpu_seconds'] += time.process_time() - cpu
+            entry['packets'] += packets
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1] - traced_before
+                entry['peak_allocated_bytes'] = max(entry['peak_allocated_bytes'], peak)
+
+    def accumulate(self, accumulators, records, batch_size=PROFILE_BATCH):
+        """Push records through accumulators a batch at a time; returns the packet count
+
+        Decoding the batch and each accumulator's pass over it are timed as
+        separate stages (``decode`` and the accumulator's key), which costs a
+        few timer calls per batch instead of per packet.
+        """
+        records = iter(records)
+        total_packets = 0
+        while True:
+            with self.stage('decode') as decode:
+                batch = list(islice(records, batch_size))
+                decode['packets'] += len(batch)
+            if not batch:
+                return total_packets
+            total_packets += len(batch)
+            for acc in accumulators:
+                add = acc.add
+                with self.stage(acc.key, len(batch)):
+                    for record in batch:
+                        add(record)
+
+    def stop(self):
+        """Release memory tracing; it stops once no other profiler needs it"""
+        if self.tracing:
+            self.tracing = False
+            _release_tracing()
+
+    def result(self, mode, total_packets):
+        """The ``performance`` section of an analysis"""
+        self.stop()
+        wall = time.perf_counter() - self.started
+        stages = []
+        for entry in self.stages.values():
+            stage = dict(entry, wall_seconds=round(entry['wall_seconds'], 6), cpu_seconds=round(entry['cpu_seconds'], 6))
+            stages.append(stage)
+        return {
+            'mode': mode,
+            'wall_seconds': round(wall, 6),
+            'cpu_seconds': round(time.process_time() - self.started_cpu, 6),
+            'packets': total_packets,
+            'packets_per_second': round(total_packets / wall) if wall > 0 else 0,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': stages
+        }
+
+
+def profiled(profiler, name, packets=0):
+    """``profiler.stage(name, packets)``, or a no-op context without a profiler"""
+    return profiler.stage(name, packets) if profiler is not None else nullcontext()
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label values -> [bucket counts..., count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        counts = self.values.get(key)
+        if counts is None:
+            counts = self.values[key] = [0] * len(self.buckets) + [0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-2] += 1
+        counts[-1] += value
+
+    def samples(self):
+        names = self.labelnames + ('le',)
+        for key, counts in self.values.items():
+            for bound, count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket{_labels(names, key + (_number(bound),))} {count}'
+            yield f'{self.name}_bucket{_labels(names, key + ("+Inf",))} {counts[-2]}'
+            yield f'{self.name}_count{_labels(self.labelnames, key)} {counts[-2]}'
+            yield f'{self.name}_sum{_labels(self.labelnames, key)} {_number(counts[-1])}'
+
+
+class MetricsRegistry:
+    """Thread-safe set of metrics rendered as Prometheus text"""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+        self.request_seconds = self.register(Histogram(
+            'ogpw_http_request_duration_seconds', 'Time to produce a response, per Flask route',
+            ('method', 'route', 'status')))
+        self.stage_seconds = self.register(Histogram(
+            'ogpw_analysis_stage_seconds', 'Wall time of an analysis stage', ('stage',)))
+        self.stage_cpu_seconds = self.register(Histogram(
+            'ogpw_analysis_stage_cpu_seconds', 'CPU time of an analysis stage', ('stage',)))
+        self.stage_packets = self.register(Counter(
+            'ogpw_analysis_stage_packets_total', 'Packets processed by an analysis stage', ('stage',)))
+        self.stage_peak_bytes = self.register(Histogram(
+            'ogpw_analysis_stage_peak_allocated_bytes', 'Peak Python memory allocated during a stage',
+            ('stage',), MEMORY_BUCKETS))
+        self.analyses = self.register(Counter(
+            'ogpw_analyses_total', 'Profiled analyses, per analysis mode', ('mode',)))
+        self.analysis_seconds = self.register(Histogram(
+            'ogpw_analysis_seconds', 'Wall time of a whole profiled analysis', ('mode',)))
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def observe_request(self, method, route, status, seconds):
+        with self.lock:
+            self.request_seconds.observe(seconds, method=method, route=route, status=status)
+
+    def observe_stage(self, stage):
+        with self.lock:
+            self._observe_stage(stage)
+
+    def _observe_stage(self, stage):
+        name = stage['stage']
+        self.stage_seconds.observe(stage['wall_seconds'], stage=name)
+        self.stage_cpu_seconds.observe(stage['cpu_seconds'], stage=name)
+        self.stage_packets.inc(stage['packets'], stage=name)
+        if 'peak_allocated_bytes' in stage:
+            self.stage_peak_bytes.observe(stage['peak_allocated_bytes'], stage=name)
+
+    def observe_performance(self, performance):
+        """Add the ``performance`` section of an analysis to the stage histograms"""
+        with self.lock:
+            self.analyses.inc(mode=performance['mode'])
+            self.analysis_seconds.observe(performance['wall_seconds'], mode=performance['mode'])
+            for stage in performance['stages']:
+                self._observe_stage(stage)
+
+    @contextmanager
+    def time_stage(self, name, packets=0):
+        """Observe the block as one run of stage ``name``, e.g. an export; yields the stage entry"""
+        profiler = Profiler()
+        with profiler.stage(name, packets) as entry:
+            yield entry
+        entry['wall_seconds'] = round(entry['wall_seconds'], 6)
+        entry['cpu_seconds'] = round(entry['cpu_seconds'], 6)
+        self.observe_stage(entry)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f'# HELP {metric.name} {metric.documentation}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
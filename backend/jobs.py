@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Raised from a progress callback to stop a cancelled job"""
+
+
+class AnalysisJob:
+    """An uploaded capture waiting for, or going through, analysis
+
+    ``stream`` is an open file object to analyze instead of ``filepath``,
+    e.g. a GrowingFile of an upload that is still arriving; ``total_bytes``
+    then comes from the request rather than the file size.
+
+    With a ``store`` (see analysis_store) the status is also published there,
+    at most every ``publish_interval`` seconds while running, and a stop
+    requested through the store by another worker cancels the job.
+    """
+    publish_interval = 1.0
+
+    def __init__(self, filepath, filename, capture_hash=None, stream=None, total_bytes=None, store=None):
+        self.id = uuid.uuid4().hex
+        self.store = store
+        self.published_at = 0
+        self.filepath = filepath
+        self.filename = filename
+        self.capture_hash = capture_hash
+        self.stream = stream
+        self.analysis_id = None
+        self.status = 'queued'
+        self.total_bytes = total_bytes if total_bytes is not None else os.path.getsize(filepath)
+        self.bytes_processed = 0
+        self.packets_processed = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    def report_progress(self, packets, bytes_read):
+        """Progress callback for PcapAnalyzer.analyze_pcap"""
+        if self.cancel_event.is_set():
+            raise JobCancelled('Analysis cancelled')
+        self.packets_processed = packets
+        self.bytes_processed = min(bytes_read, self.total_bytes)
+        if self.store is not None and time.time() - self.published_at >= self.publish_interval:
+            if self.store.stop_requested('job', self.id):
+                self.cancel_event.set()
+                raise JobCancelled('Analysis cancelled')
+            self.publish()
+
+    def publish(self):
+        """Share the status with other workers; the result itself is in the analysis store"""
+        if self.store is None:
+            return
+        self.published_at = time.time()
+        status = self.to_dict()
+        status.pop('analysis', None)
+        self.store.put_status('job', self.id, status)
+
+    def to_dict(self):
+        elapsed = 0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+
+        if self.status == 'completed':
+            progress = 100.0
+        else:
+            progress = self.bytes_processed / self.total_bytes * 100 if self.total_bytes else 0
+
+        eta_seconds = None
+        if self.status == 'running' and self.bytes_processed > 0:
+            eta_seconds = elapsed * (self.total_bytes - self.bytes_processed) / self.bytes_processed
+        elif self.status == 'completed':
+            eta_seconds = 0
+
+        job = {
+            'job_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'progress': round(progress, 2),
+            'bytes_processed': self.bytes_processed,
+            'total_bytes': self.total_bytes,
+            'packets_processed': self.packets_processed,
+            'packets_per_second': round(self.packets_processed / elapsed, 2) if elapsed > 0 else 0,
+            'elapsed_seconds': round(elapsed, 2),
+            'eta_seconds': round(eta_seconds, 2) if eta_seconds is not None else None
+        }
+        if self.error:
+            job['error'] = self.error
+        if self.status == 'completed':
+            job['analysis_id'] = self.analysis_id
+            job['analysis'] = self.result
+        return job
+
+
+class JobQueue:
+    """Bounded pool of background threads running analysis jobs
+
+    ``analyze(job)`` does the work and returns the analysis result. The queue
+    owns the uploaded file and deletes it once the job has finished, failed
+    or been cancelled. Only the most recent ``max_finished_jobs`` finished
+    jobs are kept for polling; with a ``store`` their statuses outlive them
+    there and can be read by every worker.
+    """
+
+    def __init__(self, analyze, max_workers=2, max_finished_jobs=100, store=None):
+        self.analyze = analyze
+        self.store = store
+        self.max_finished_jobs = max_finished_jobs
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, filepath, filename, capture_hash=None, stream=None, total_bytes=None):
+        job = AnalysisJob(filepath, filename, capture_hash, stream, total_bytes, self.store)
+        with self.lock:
+            self.jobs[job.id] = job
+        job.publish()
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation; running jobs stop at their next progress report"""
+        job = self.get(job_id)
+        if job is not None and job.status in ('queued', 'running'):
+            job.cancel_event.set()
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.publish()
+        return job
+
+    def _run(self, job):
+        status = 'cancelled'
+        if self.store is not None and self.store.stop_requested('job', job.id):
+            job.cancel_event.set()
+        if not job.cancel_event.is_set():
+            job.status = 'running'
+            job.started_at = time.time()
+            job.publish()
+            print(f"Job {job.id}: analyzing {job.filename}")
+            try:
+                job.result = self.analyze(job)
+                status = 'completed'
+            except Exception as e:
+                if not job.cancel_event.is_set():
+                    status = 'failed'
+                    job.error = str(e)
+
+        job.finished_at = time.time()
+        if job.stream is not None:
+            job.stream.close()
+        if os.path.exists(job.filepath):
+            os.remove(job.filepath)
+        # Published last so pollers never see a finished job still holding its file
+        job.status = status
+        job.publish()
+        print(f"Job {job.id}: {status}")
+        self._prune()
+
+    def _prune(self):
+        with self.lock:
+            finished = [job_id for job_id, job in self.jobs.items()
+                        if job.status in ('completed', 'failed', 'cancelled')]
+            for job_id in finished[:max(len(finished) - self.max_finished_jobs, 0)]:
+                del self.jobs[job_id]
@@ -0,0 +1,277 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from fast_decoder import PCAP_MAGICS, PCAPNG_MAGIC, MTU, pcap_layout, decode_frames
+from pcap_analyzer import PcapAnalyzer
+from sections import client_analysis
+
+# Extensions of the rotated files picked up in a capture directory
+LIVE_EXTENSIONS = ('.pcap',)
+
+
+class PcapTailer:
+    """Reads the pcap records appended to a capture since the previous call
+
+    ``path`` is a pcap file that is still being written, or a directory of
+    rotated captures (e.g. ``tcpdump -G -w dir/%s.pcap``) read oldest first
+    by modification time. Only complete records are returned; one still
+    being written is picked up by a later call. A file replaced under the
+    same name is finished through the open handle before the new one is
+    read, and one truncated in place is read again from the start.
+    Compressed and pcapng captures cannot be tailed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.directory = os.path.isdir(path)
+        self.f = None
+        self.current = None
+        self.layout = None
+        self.offset = 0
+        self.finished = set()  # rotated files already read to the end
+
+    def read_frames(self):
+        """Yield (offset, linktype, timestamp, data) for each record written since the last call"""
+        while True:
+            if self.f is None and not self._open_next():
+                return
+            # Looked up before draining, so the current file has been closed
+            # by its writer if a newer one exists
+            rotated = self._rotated()
+            yield from self._drain()
+            if not rotated:
+                return
+            if self.directory:
+                self.finished.add(self.current)
+            self.close()
+
+    def _files(self):
+        """Unfinished capture files of the directory, oldest first"""
+        entries = []
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if not name.endswith(LIVE_EXTENSIONS) or path in self.finished:
+                continue
+            try:
+                entries.append((os.stat(path).st_mtime, name, path))
+            except FileNotFoundError:
+                continue  # removed by the writer's ring buffer (-W)
+        return [path for _, _, path in sorted(entries)]
+
+    def _open_next(self):
+        if self.directory:
+            files = self._files()
+            # Forget rotated files the writer has deleted since
+            self.finished &= {os.path.join(self.path, name) for name in os.listdir(self.path)}
+            if not files:
+                return False
+            path = files[0]
+        else:
+            path = self.path
+        try:
+            self.f = open(path, 'rb')
+        except FileNotFoundError:
+            return False
+        self.current = path
+        self.layout = None
+        self.offset = 0
+        return True
+
+    def _rotated(self):
+        """True if the current file will not grow any more"""
+        if self.directory:
+            return any(path != self.current for path in self._files())
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.f.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _drain(self):
+        f = self.f
+        if os.fstat(f.fileno()).st_size < self.offset:
+            print(f"Capture {self.current} was truncated, reading it again")
+            self.layout = None
+        if self.layout is None:
+            f.seek(0)
+            magic = f.read(4)
+            if magic == PCAPNG_MAGIC or (len(magic) == 4 and magic not in PCAP_MAGICS):
+                raise Exception(f"Live capture supports uncompressed pcap files only: {self.current}")
+            if len(magic) < 4 or os.fstat(f.fileno()).st_size < 24:
+                return
+            self.layout = pcap_layout(f, magic)
+            self.offset = 24
+
+        record_header, resolution, linktype = self.layout
+        f.seek(self.offset)
+        while True:
+            hdr = f.read(16)
+            if len(hdr) < 16:
+                return
+            sec, frac, caplen, _ = record_header.unpack(hdr)
+            data = f.read(caplen)
+            if len(data) < caplen:
+                return
+            offset = self.offset
+            self.offset += 16 + caplen
+            yield offset, linktype, (sec * resolution + frac) / resolution, data[:MTU]
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+        self.f = None
+
+
+def result_delta(results, changes):
+    """Sections of client results among the changed keys of PcapAnalyzer.live_changes"""
+    return {key: results[key] for key in changes if key in results}
+
+
+class LiveCapture:
+    """Background analysis of a capture that is still being written
+
+    Every ``poll_interval`` seconds the records appended since the previous
+    poll are added to a running PcapAnalyzer. When anything arrived, the
+    sections that changed are published to every subscriber, and the
+    refreshed results are handed to ``on_update(live, results)`` at most
+    every ``update_interval`` seconds (and once more when the capture ends),
+    as storing the whole analysis costs far more than a poll.
+
+    With a ``store`` (see analysis_store) the status is also published there
+    after every update, and a stop requested through the store by another
+    worker ends the capture at its next poll.
+    """
+    poll_interval = 1.0
+    update_interval = 10.0
+    subscriber_queue_size = 64
+
+    def __init__(self, path, filename, accumulators=None, on_update=None, store=None):
+        self.id = uuid.uuid4().hex
+        self.store = store
+        self.path = path
+        self.filename = filename
+        self.analyzer = PcapAnalyzer(accumulators)
+        self.tailer = PcapTailer(path)
+        self.on_update = on_update
+        self.analysis_id = None
+        self.results = None
+        self.sequence = 0
+        self.status = 'running'
+        self.error = None
+        self.started_at = time.time()
+        self.updated_at = None
+        self.handed_at = 0  # when on_update last got the results
+        self.update_pending = False
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self._publish_status()
+        self.thread = threading.Thread(target=self._run, name=f'live-{self.id}', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Ask the poll thread to finish; the status is 'stopping' until it has"""
+        self.stop_event.set()
+
+    def _run(self):
+        print(f"Live capture {self.id}: tailing {self.path}")
+        try:
+            while True:
+                self.poll()
+                if self.stop_event.wait(self.poll_interval) or self._stop_requested():
+                    break
+            self.status = 'stopped'
+        except Exception as e:
+            self.status = 'failed'
+            self.error = str(e)
+        finally:
+            self.tailer.close()
+            if self.update_pending:
+                self._update()
+            self._publish_status()
+            self._publish('end', self.to_dict())
+            print(f"Live capture {self.id}: {self.status}")
+
+    def poll(self):
+        """Analyze the records written since the last poll; returns the number of new packets"""
+        records = (record for _, record in decode_frames(self.tailer.read_frames()))
+        added = self.analyzer.add_records(records)
+        if added or self.results is None:
+            # Subscribers get the overviews; full series and tables are queried on demand
+            results = client_analysis(self.analyzer.analysis_results)
+            now = time.time()
+            with self.lock:
+                self.results = results
+                self.sequence += 1
+                self.updated_at = now
+            self.update_pending = self.on_update is not None
+            if self.update_pending and now - self.handed_at >= self.update_interval:
+                self._update()
+            self._publish_status()
+            self._publish('delta', {'sequence': self.sequence,
+                                    'changes': result_delta(results, self.analyzer.live_changes)})
+        return added
+
+    def _update(self):
+        self.on_update(self, self.analyzer.analysis_results)
+        self.handed_at = time.time()
+        self.update_pending = False
+
+    def _stop_requested(self):
+        return self.store is not None and self.store.stop_requested('live', self.id)
+
+    def _publish_status(self):
+        if self.store is not None:
+            self.store.put_status('live', self.id, self.to_dict())
+
+    def subscribe(self):
+        """Queue of (event, data) starting with a snapshot of the results so far"""
+        events = queue.Queue(self.subscriber_queue_size)
+        with self.lock:
+            events.put(('snapshot', {'sequence': self.sequence, 'analysis': self.results}))
+            if self.status == 'running':
+                self.subscribers.append(events)
+            else:
+                events.put(('end', self.to_dict()))
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            if events in self.subscribers:
+                self.subscribers.remove(events)
+
+    def _publish(self, event, data):
+        with self.lock:
+            for events in self.subscribers:
+                try:
+                    events.put_nowait((event, data))
+                except queue.Full:
+                    # A subscriber that fell behind starts over from the full results
+                    while not events.empty():
+                        events.get_nowait()
+                    events.put_nowait(('snapshot', {'sequence': self.sequence, 'analysis': self.results}))
+                    if event == 'end':
+                        events.put_nowait((event, data))
+            if event == 'end':
+                self.subscribers = []
+
+    def to_dict(self):
+        live = {
+            'live_id': self.id,
+            'filename': self.filename,
+            'status': 'stopping' if self.status == 'running' and self.stop_event.is_set() else self.status,
+            'analysis_id': self.analysis_id,
+            'current_file': os.path.basename(self.tailer.current) if self.tailer.current else None,
+            'packets_processed': self.analyzer.live_packets,
+            'sequence': self.sequence,
+            'started_at': self.started_at,
+            'updated_at': self.updated_at
+        }
+        if self.error:
+            live['error'] = self.error
+        return live
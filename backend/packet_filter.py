@@ -0,0 +1,321 @@
+import ipaddress
+import operator
+import re
+from functools import lru_cache
+import numpy as np
+from packet_record import LAYER_IP, LAYER_TCP, LAYER_UDP, LAYER_ICMP, LAYER_ARP, LAYER_DNS
+from packet_table import ip_to_int
+
+# Longest expression and deepest nesting accepted from a request
+MAX_EXPRESSION_LENGTH = 1024
+MAX_DEPTH = 64
+
+# Protocol primitives: layer bits a packet must carry, and a port it must use
+PROTOCOLS = {
+    'ip': (LAYER_IP, None),
+    'tcp': (LAYER_TCP, None),
+    'udp': (LAYER_UDP, None),
+    'icmp': (LAYER_ICMP, None),
+    'arp': (LAYER_ARP, None),
+    'dns': (LAYER_DNS, None),
+    'http': (LAYER_TCP, 80),
+}
+
+TCP_FLAGS = {
+    'tcp-fin': 0x01, 'tcp-syn': 0x02, 'tcp-rst': 0x04, 'tcp-push': 0x08,
+    'tcp-ack': 0x10, 'tcp-urg': 0x20, 'tcp-ece': 0x40, 'tcp-cwr': 0x80,
+}
+
+_TOKEN = re.compile(r'\s*(&&|\|\||!=|==|<=|>=|[()\[\]!&|<>=]|[^\s()\[\]!&|<>=]+)')
+
+# Work on scalars and, elementwise, on numpy columns
+_COMPARISONS = {
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+@lru_cache(maxsize=65536)
+def _address(address):
+    return ip_to_int(address)
+
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser of a pcap-filter(7) subset into a tuple tree
+
+    Nodes are ``('and', left, right)``, ``('or', left, right)``,
+    ``('not', node)``, ``('layers', bits)``, ``('port', direction, low, high)``,
+    ``('host', direction, low, high)`` (addresses and networks as integer
+    ranges), ``('length', comparison, value)`` and
+    ``('flags', mask, comparison, value)``.
+    """
+
+    def __init__(self, expression):
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.depth = 0
+
+    def peek(self):
+        return self.tokens[self.position].lower() if self.position < len(self.tokens) else None
+
+    def take(self, *expected):
+        token = self.peek()
+        if token is None:
+            raise ValueError(f"Unexpected end of filter, expected {' or '.join(expected) or 'more'}")
+        if expected and token not in expected:
+            raise ValueError(f"Expected {' or '.join(expected)} but found '{self.tokens[self.position]}'")
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError('Filter expression is empty')
+        node = self.expression()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected '{self.tokens[self.position]}' in filter")
+        return node
+
+    def expression(self):
+        node = self.term()
+        while self.peek() in ('or', '||'):
+            self.take()
+            node = ('or', node, self.term())
+        return node
+
+    def term(self):
+        node = self.factor()
+        while self.peek() in ('and', '&&'):
+            self.take()
+            node = ('and', node, self.factor())
+        return node
+
+    def factor(self):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise ValueError(f"Filter is nested more than {MAX_DEPTH} levels deep")
+        token = self.peek()
+        if token in ('not', '!'):
+            self.take()
+            node = ('not', self.factor())
+        elif token == '(':
+            self.take()
+            node = self.expression()
+            self.take(')')
+        else:
+            node = self.primitive()
+        self.depth -= 1
+        return node
+
+    def primitive(self):
+        token = self.take()
+        if token in ('less', 'greater'):
+            return ('length', '<=' if token == 'less' else '>=', self.number())
+        if token == 'len':
+            return ('length', self.take(*_COMPARISONS), self.number())
+
+        qualifier = None
+        if token in PROTOCOLS:
+            if token == 'tcp' and self.peek() == '[':
+                return self.tcp_flags()
+            if self.peek() not in ('src', 'dst', 'host', 'net', 'port', 'portrange'):
+                bits, port = PROTOCOLS[token]
+                node = ('layers', bits)
+                return ('and', node, ('port', None, port, port)) if port else node
+            if token not in ('ip', 'tcp', 'udp'):
+                raise ValueError(f"Only ip, tcp and udp can qualify an address or port, not {token}")
+            qualifier = token
+            token = self.take()
+
+        direction = None
+        if token in ('src', 'dst'):
+            direction = token
+            token = self.take('host', 'net', 'port', 'portrange')
+
+        if token in ('port', 'portrange'):
+            if qualifier == 'ip':
+                raise ValueError('Ports can only be qualified with tcp or udp')
+            low, high = self.port_range() if token == 'portrange' else (self.port(),) * 2
+            node = ('port', direction, low, high)
+        elif token == 'host':
+            address = self.ipv4(self.take())
+            node = ('host', direction, address, address)
+        elif token == 'net':
+            network = self.network(self.take())
+            node = ('host', direction, int(network.network_address), int(network.broadcast_address))
+        else:
+            raise ValueError(f"Unknown filter primitive '{self.tokens[self.position - 1]}'")
+        return ('and', ('layers', PROTOCOLS[qualifier][0]), node) if qualifier else node
+
+    def tcp_flags(self):
+        """``tcp[tcpflags] & FLAGS <op> VALUE``, e.g. ``tcp[tcpflags] & (tcp-syn|tcp-ack) == tcp-syn``"""
+        self.take('[')
+        self.take('tcpflags', '13')
+        self.take(']')
+        mask = 0xff
+        if self.peek() == '&':
+            self.take()
+            mask = self.flag_set()
+        comparison = self.take(*_COMPARISONS)
+        return ('flags', mask, comparison, self.flag_set())
+
+    def flag_set(self):
+        if self.peek() == '(':
+            self.take()
+            value = self.flag_set()
+            self.take(')')
+            return value
+        token = self.take()
+        value = TCP_FLAGS[token] if token in TCP_FLAGS else self.number(token)
+        while self.peek() == '|':
+            self.take()
+            value |= self.flag_set()
+        return value
+
+    def number(self, token=None):
+        token = token if token is not None else self.take()
+        try:
+            return int(token, 0)
+        except ValueError:
+            raise ValueError(f"Expected a number but found '{token}'")
+
+    def port(self, token=None):
+        port = self.number(token)
+        if not 0 <= port <= 65535:
+            raise ValueError(f"Port out of range: {port}")
+        return port
+
+    def port_range(self):
+        token = self.take()
+        low, separator, high = token.partition('-')
+        if not separator:
+            raise ValueError(f"Expected a port range like 1-1024 but found '{token}'")
+        low, high = self.port(low), self.port(high)
+        if low > high:
+            raise ValueError(f"Empty port range: {token}")
+        return low, high
+
+    def ipv4(self, token):
+        try:
+            return int(ipaddress.IPv4Address(token))
+        except ValueError:
+            raise ValueError(f"Expected an IPv4 address but found '{token}'")
+
+    def network(self, token):
+        try:
+            return ipaddress.IPv4Network(token, strict=False)
+        except ValueError:
+            raise ValueError(f"Expected an IPv4 network like 10.0.0.0/8 but found '{token}'")
+
+
+def _predicate(node):
+    """Compile a tree into a function of one PacketRecord"""
+    kind = node[0]
+    if kind == 'and':
+        left, right = _predicate(node[1]), _predicate(node[2])
+        return lambda record: left(record) and right(record)
+    if kind == 'or':
+        left, right = _predicate(node[1]), _predicate(node[2])
+        return lambda record: left(record) or right(record)
+    if kind == 'not':
+        inner = _predicate(node[1])
+        return lambda record: not inner(record)
+    if kind == 'layers':
+        bits = node[1]
+        return lambda record: record.layers & bits != 0
+    if kind == 'port':
+        _, direction, low, high = node
+        ported = LAYER_TCP | LAYER_UDP
+        if direction == 'src':
+            return lambda record: record.layers & ported != 0 and low <= record.sport <= high
+        if direction == 'dst':
+            return lambda record: record.layers & ported != 0 and low <= record.dport <= high
+        return lambda record: record.layers & ported != 0 and (low <= record.sport <= high or low <= record.dport <= high)
+    if kind == 'host':
+        _, direction, low, high = node
+        if direction == 'src':
+            return lambda record: record.layers & LAYER_IP != 0 and low <= _address(record.src) <= high
+        if direction == 'dst':
+            return lambda record: record.layers & LAYER_IP != 0 and low <= _address(record.dst) <= high
+        return lambda record: record.layers & LAYER_IP != 0 and (
+            low <= _address(record.src) <= high or low <= _address(record.dst) <= high)
+    if kind == 'length':
+        compare, value = _COMPARISONS[node[1]], node[2]
+        return lambda record: bool(compare(record.length, value))
+    if kind == 'flags':
+        _, mask, comparison, value = node
+        compare = _COMPARISONS[comparison]
+        return lambda record: record.layers & LAYER_TCP != 0 and bool(compare(record.tcp_flags & mask, value))
+    raise ValueError(f"Unknown filter node: {kind}")
+
+
+def _mask(node, df):
+    """Evaluate a tree as a boolean array over the rows of a PacketTable frame"""
+    kind = node[0]
+    if kind == 'and':
+        return _mask(node[1], df) & _mask(node[2], df)
+    if kind == 'or':
+        return _mask(node[1], df) | _mask(node[2], df)
+    if kind == 'not':
+        return ~_mask(node[1], df)
+    layers = df['layers'].to_numpy()
+    if kind == 'layers':
+        return (layers & node[1]) != 0
+    if kind in ('port', 'host'):
+        _, direction, low, high = node
+        if kind == 'port':
+            present = (layers & (LAYER_TCP | LAYER_UDP)) != 0
+            source, destination = df['sport'].to_numpy(), df['dport'].to_numpy()
+        else:
+            present = (layers & LAYER_IP) != 0
+            source, destination = df['src'].to_numpy(), df['dst'].to_numpy()
+        in_source = (source >= low) & (source <= high)
+        in_destination = (destination >= low) & (destination <= high)
+        if direction == 'src':
+            return present & in_source
+        if direction == 'dst':
+            return present & in_destination
+        return present & (in_source | in_destination)
+    if kind == 'length':
+        return _COMPARISONS[node[1]](df['length'].to_numpy().astype(np.int64), node[2])
+    if kind == 'flags':
+        _, mask, comparison, value = node
+        flags = df['tcp_flags'].to_numpy().astype(np.int64) & mask
+        return ((layers & LAYER_TCP) != 0) & _COMPARISONS[comparison](flags, value)
+    raise ValueError(f"Unknown filter node: {kind}")
+
+
+class PacketFilter:
+    """BPF-style filter expression compiled once for repeated evaluation
+
+    Supports the pcap-filter(7) primitives that the decoded header fields
+    can answer: ``ip``, ``tcp``, ``udp``, ``icmp``, ``arp``, ``dns`` and
+    ``http``; ``[src|dst] host``, ``net`` and ``port``/``portrange``
+    (optionally ``tcp``/``udp`` qualified); ``less``/``greater``/``len``;
+    ``tcp[tcpflags] & FLAGS == VALUE``; combined with ``and``/``or``/``not``
+    (or ``&&``/``||``/``!``) and parentheses. Raises ValueError for
+    anything else.
+
+    ``matches(record)`` tests one PacketRecord; ``mask(table)`` evaluates
+    the whole expression as vectorized column operations on a PacketTable.
+    """
+
+    def __init__(self, expression):
+        if len(expression) > MAX_EXPRESSION_LENGTH:
+            raise ValueError(f"Filter expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+        self.expression = expression
+        self.tree = _Parser(expression).parse()
+        self.matches = _predicate(self.tree)
+
+    def mask(self, table):
+        return np.asarray(_mask(self.tree, table.df), dtype=bool)
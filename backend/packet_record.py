@@ -0,0 +1,69 @@
+from collections import namedtuple
+from scapy.all import IP, TCP, UDP, DNS, ICMP, ARP
+from scapy.packet import NoPayload
+
+# Layer bits recorded for every decoded packet
+LAYER_IP = 0x01
+LAYER_TCP = 0x02
+LAYER_UDP = 0x04
+LAYER_ICMP = 0x08
+LAYER_ARP = 0x10
+LAYER_DNS = 0x20
+
+# Protocols PcapAnalyzer.filter_by_protocol can select
+FILTER_PROTOCOLS = ['TCP', 'UDP', 'DNS', 'HTTP', 'ICMP']
+
+# Compact per-packet view holding only the header fields the analysis needs.
+# ``sport``/``dport`` come from the first TCP layer, or the first UDP layer
+# when the packet carries no TCP. ``dns_qr``, ``dns_id`` (transaction id)
+# and ``dns_rcode`` are None for non-DNS packets and ``dns_qname`` is only
+# decoded for queries that carry a question.
+PacketRecord = namedtuple('PacketRecord', [
+    'time', 'length', 'layers', 'src', 'dst',
+    'sport', 'dport', 'tcp_flags', 'dns_qr', 'dns_qname', 'dns_id', 'dns_rcode'
+], defaults=(None, None))
+
+
+def record_from_packet(pkt):
+    """Decode a dissected scapy packet into a PacketRecord in one layer walk"""
+    layers = 0
+    src = dst = None
+    sport = dport = tcp_flags = 0
+    dns_qr = dns_qname = dns_id = dns_rcode = None
+
+    layer = pkt
+    while not isinstance(layer, NoPayload):
+        cls = layer.__class__
+        if cls is IP:
+            if not layers & LAYER_IP:
+                layers |= LAYER_IP
+                src = layer.src
+                dst = layer.dst
+        elif cls is TCP:
+            if not layers & LAYER_TCP:
+                layers |= LAYER_TCP
+                sport = layer.sport
+                dport = layer.dport
+                tcp_flags = int(layer.flags)
+        elif cls is UDP:
+            if not layers & LAYER_UDP:
+                layers |= LAYER_UDP
+                if not layers & LAYER_TCP:
+                    sport = layer.sport
+                    dport = layer.dport
+        elif cls is ICMP:
+            layers |= LAYER_ICMP
+        elif cls is ARP:
+            layers |= LAYER_ARP
+        elif cls is DNS:
+            if not layers & LAYER_DNS:
+                layers |= LAYER_DNS
+                dns_qr = layer.qr
+                dns_id = layer.id
+                dns_rcode = layer.rcode
+                if dns_qr == 0 and layer.qd:
+                    dns_qname = layer.qd.qname.decode('utf-8').rstrip('.')
+        layer = layer.payload
+
+    return PacketRecord(float(pkt.time), len(pkt), layers, src, dst,
+                        sport, dport, tcp_flags, dns_qr, dns_qname, dns_id, dns_rcode)
@@ -0,0 +1,401 @@
+from array import array
+from datetime import datetime
+from socket import inet_aton, inet_ntoa
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+import numpy as np
+import pandas as pd
+from tcp_flows import FlowTable
+from timeline import build_series, timeline_preview
+from traffic_tables import conversation_table
+from packet_record import (
+    LAYER_IP, LAYER_TCP, LAYER_UDP, LAYER_ICMP, LAYER_ARP, LAYER_DNS, FILTER_PROTOCOLS
+)
+
+# Protocol classes in the order _get_protocol_distribution tests them
+PROTOCOL_CLASSES = ['TCP', 'UDP', 'ICMP', 'Other IP', 'ARP', 'Other']
+
+# Columns kept per packet; also the arrays persisted by PacketTable.save
+COLUMNS = ['offset', 'time', 'length', 'layers', 'src', 'dst', 'sport', 'dport', 'tcp_flags']
+COLUMN_DTYPES = {
+    'offset': np.uint64, 'time': np.float64, 'length': np.uint32, 'layers': np.uint8, 'src': np.uint32,
+    'dst': np.uint32, 'sport': np.uint16, 'dport': np.uint16, 'tcp_flags': np.uint16
+}
+
+_IPV4 = struct.Struct('!I')
+
+
+def ip_to_int(address):
+    return _IPV4.unpack(inet_aton(address))[0]
+
+
+def int_to_ip(value):
+    return inet_ntoa(_IPV4.pack(int(value)))
+
+
+class PacketTableBuilder:
+    """Collects PacketRecords into compact typed columns"""
+
+    def __init__(self):
+        self.offset = array('Q')
+        self.time = array('d')
+        self.length = array('I')
+        self.layers = array('B')
+        self.src = array('I')
+        self.dst = array('I')
+        self.sport = array('H')
+        self.dport = array('H')
+        self.tcp_flags = array('H')
+        self._ip_cache = {}
+
+    def _ip(self, address):
+        value = self._ip_cache.get(address)
+        if value is None:
+            value = self._ip_cache[address] = ip_to_int(address)
+        return value
+
+    def add(self, record, offset=0):
+        self.offset.append(offset)
+        self.time.append(record.time)
+        self.length.append(record.length)
+        self.layers.append(record.layers)
+        if record.layers & LAYER_IP:
+            self.src.append(self._ip(record.src))
+            self.dst.append(self._ip(record.dst))
+        else:
+            self.src.append(0)
+            self.dst.append(0)
+        self.sport.append(record.sport)
+        self.dport.append(record.dport)
+        self.tcp_flags.append(record.tcp_flags)
+
+    def extend(self, other):
+        """Append the rows of another builder, e.g. from a later chunk of the capture"""
+        for name in COLUMNS:
+            getattr(self, name).extend(getattr(other, name))
+
+    def __len__(self):
+        return len(self.offset)
+
+    def build(self):
+        return PacketTable({name: np.frombuffer(getattr(self, name), dtype=COLUMN_DTYPES[name]) for name in COLUMNS})
+
+
+class PacketIndexWriter:
+    """Writes the packet index to disk while a capture is analyzed
+
+    Rows are collected in a PacketTableBuilder and appended to one spill
+    file per column every ``flush_rows`` packets, so indexing a capture
+    costs bounded memory however many packets it has. ``save`` streams the
+    spill files into the .npz file PacketTable.load reads. A capture of
+    more than ``max_packets`` packets is not indexed: its rows are dropped
+    and ``save`` writes nothing.
+
+    Indexes of consecutive chunks of a capture (written e.g. by worker
+    processes into the same ``directory``) combine with ``extend``.
+    """
+    flush_rows = 65536
+
+    def __init__(self, directory, max_packets=None):
+        self.directory = directory
+        self.max_packets = max_packets
+        self.rows = 0
+        self.truncated = False
+        self.builder = PacketTableBuilder()
+        self.spill_dir = tempfile.mkdtemp(dir=directory, prefix='index_')
+
+    def add(self, record, offset=0):
+        if self.truncated:
+            return
+        if self.max_packets is not None and self.rows >= self.max_packets:
+            self.truncated = True
+            self.discard()
+            return
+        self.builder.add(record, offset)
+        self.rows += 1
+        if len(self.builder) >= self.flush_rows:
+            self.flush()
+
+    def _spill_path(self, name):
+        return os.path.join(self.spill_dir, f'{name}.bin')
+
+    def flush(self):
+        """Append the buffered rows to the spill files"""
+        if self.truncated or not len(self.builder):
+            return
+        for name in COLUMNS:
+            with open(self._spill_path(name), 'ab') as f:
+                getattr(self.builder, name).tofile(f)
+        self.builder = PacketTableBuilder()
+
+    def extend(self, other):
+        """Append the rows of the index of a later chunk of the capture, consuming it"""
+        self.flush()
+        other.flush()
+        if other.truncated or (self.max_packets is not None and self.rows + other.rows > self.max_packets):
+            self.truncated = True
+            self.discard()
+        if not self.truncated:
+            for name in COLUMNS:
+                if os.path.exists(other._spill_path(name)):
+                    with open(self._spill_path(name), 'ab') as dst, open(other._spill_path(name), 'rb') as src:
+                        shutil.copyfileobj(src, dst)
+            self.rows += other.rows
+        other.discard()
+
+    def save(self, path):
+        """Write the index as an uncompressed .npz file (atomically); False if it was dropped"""
+        self.flush()
+        if self.truncated:
+            return False
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f, zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+                for name in COLUMNS:
+                    dtype = np.dtype(COLUMN_DTYPES[name])
+                    with archive.open(f'{name}.npy', 'w', force_zip64=True) as member:
+                        np.lib.format.write_array_header_1_0(member, {
+                            'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (self.rows,)
+                        })
+                        if os.path.exists(self._spill_path(name)):
+                            with open(self._spill_path(name), 'rb') as spill:
+                                shutil.copyfileobj(spill, member)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        finally:
+            self.discard()
+        return True
+
+    def discard(self):
+        """Remove the buffered rows and the spill files"""
+        self.builder = PacketTableBuilder()
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+
+class PacketTable:
+    """Columnar per-packet header table with vectorized aggregations
+
+    Each method returns exactly what the matching ``PcapAnalyzer._get_*``
+    stage computes from dissected packets. Group-bys use ``sort=False`` so
+    groups come out in first-seen order, which is what the dict/Counter
+    based stages use to break ties.
+    """
+
+    def __init__(self, columns):
+        self.df = pd.DataFrame(columns, copy=False)
+
+    @classmethod
+    def from_records(cls, records):
+        builder = PacketTableBuilder()
+        for record in records:
+            builder.add(record)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.df)
+
+    def save(self, path):
+        """Persist the table as an uncompressed .npz file (written atomically)"""
+        directory = os.path.dirname(path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **{name: self.df[name].to_numpy() for name in COLUMNS})
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in COLUMNS})
+
+    def protocol_mask(self, protocol):
+        """Packets filter_by_protocol selects for TCP, UDP, DNS, HTTP or ICMP"""
+        layers = self.df['layers'].to_numpy()
+        if protocol == 'HTTP':
+            tcp = (layers & LAYER_TCP) != 0
+            return tcp & ((self.df['sport'].to_numpy() == 80) | (self.df['dport'].to_numpy() == 80))
+        mask = {'TCP': LAYER_TCP, 'UDP': LAYER_UDP, 'DNS': LAYER_DNS, 'ICMP': LAYER_ICMP}[protocol]
+        return (layers & mask) != 0
+
+    def select(self, mask):
+        """Table of the rows where ``mask`` is true"""
+        return PacketTable(self.df[mask].reset_index(drop=True))
+
+    def rollup(self):
+        """Vectorized RollupAccumulator result over every row"""
+        return {
+            'filtered_packet_count': len(self),
+            'basic_stats': self.basic_statistics(),
+            'ip_conversations': self.ip_conversations(),
+            'timeline': timeline_preview(self.timeline())
+        }
+
+    def protocol_rollup(self, protocol):
+        """Vectorized filter_by_protocol section for one protocol"""
+        return self.select(self.protocol_mask(protocol)).rollup()
+
+    def protocol_rollups(self):
+        return {protocol: self.protocol_rollup(protocol) for protocol in FILTER_PROTOCOLS}
+
+    def _has(self, mask):
+        return (self.df['layers'].to_numpy() & mask) == mask
+
+    def basic_statistics(self):
+        """Vectorized _get_basic_statistics"""
+        if not len(self.df):
+            return {}
+
+        total_packets = len(self.df)
+        total_bytes = int(self.df['length'].sum())
+        first_time = float(self.df['time'].min())
+        last_time = float(self.df['time'].max())
+        duration = last_time - first_time
+
+        throughput_bps = total_bytes / duration if duration > 0 else 0
+        throughput_pps = total_packets / duration if duration > 0 else 0
+
+        return {
+            'total_packets': total_packets,
+            'total_bytes': total_bytes,
+            'duration_seconds': round(duration, 2),
+            'start_time': datetime.fromtimestamp(first_time).isoformat(),
+            'end_time': datetime.fromtimestamp(last_time).isoformat(),
+            'throughput_bps': round(throughput_bps, 2),
+            'throughput_pps': round(throughput_pps, 2),
+            'avg_packet_size': round(total_bytes / total_packets, 2)
+        }
+
+    def protocol_classes(self):
+        """Per-packet index into PROTOCOL_CLASSES"""
+        layers = self.df['layers'].to_numpy()
+        is_ip = (layers & LAYER_IP) != 0
+        return np.select(
+            [is_ip & ((layers & LAYER_TCP) != 0),
+             is_ip & ((layers & LAYER_UDP) != 0),
+             is_ip & ((layers & LAYER_ICMP) != 0),
+             is_ip,
+             (layers & LAYER_ARP) != 0],
+            [0, 1, 2, 3, 4],
+            5
+        )
+
+    def protocol_distribution(self):
+        """Vectorized _get_protocol_distribution"""
+        if not len(self.df):
+            return {}
+        classes = self.protocol_classes()
+        counts = pd.Series(classes).groupby(classes, sort=False).size()
+        total = int(counts.sum())
+        return {
+            PROTOCOL_CLASSES[code]: {'count': int(count), 'percentage': round((int(count) / total) * 100, 2)}
+            for code, count in counts.items()
+        }
+
+    def ip_conversations(self, top_n=10):
+        """Vectorized _get_ip_conversations"""
+        ip = self.df[self._has(LAYER_IP)]
+        if not len(ip):
+            return []
+
+        src = ip['src'].to_numpy()
+        dst = ip['dst'].to_numpy()
+        pairs = pd.DataFrame({
+            'a': np.minimum(src, dst),
+            'b': np.maximum(src, dst),
+            'length': ip['length'].to_numpy(dtype=np.int64),
+        })
+        conversations = pairs.groupby(['a', 'b'], sort=False)['length'].agg(['size', 'sum'])
+        top = conversations.sort_values('size', ascending=False, kind='stable').head(top_n)
+
+        results = []
+        for (a, b), packets, total_bytes in zip(top.index, top['size'], top['sum']):
+            # The dict-based stage orders endpoints as strings
+            endpoints = sorted([int_to_ip(a), int_to_ip(b)])
+            results.append({
+                'endpoints': f"{endpoints[0]} ↔ {endpoints[1]}",
+                'packets': int(packets),
+                'bytes': int(total_bytes)
+            })
+        return results
+
+    def conversation_table(self):
+        """Vectorized _get_conversation_table"""
+        ip = self.df[self._has(LAYER_IP)]
+        directions = ip.groupby(['src', 'dst'], sort=False).agg(
+            packets=('length', 'size'), bytes=('length', 'sum'), first=('time', 'min'), last=('time', 'max'))
+
+        # Directions in first-seen order fold into undirected pairs in first-seen order
+        conversations = {}
+        addresses = {}
+        for (src, dst), packets, total_bytes, first, last in zip(
+                directions.index, directions['packets'].tolist(), directions['bytes'].tolist(),
+                directions['first'].tolist(), directions['last'].tolist()):
+            src = addresses.get(src) or addresses.setdefault(src, int_to_ip(src))
+            dst = addresses.get(dst) or addresses.setdefault(dst, int_to_ip(dst))
+            forward = src <= dst
+            conversation = (src, dst) if forward else (dst, src)
+            state = conversations.get(conversation)
+            if state is None:
+                state = conversations[conversation] = [0, 0, 0, 0, first, last]
+            else:
+                state[4] = min(state[4], first)
+                state[5] = max(state[5], last)
+            counters = 0 if forward else 2
+            state[counters] += packets
+            state[counters + 1] += total_bytes
+        return conversation_table(conversations)
+
+    def tcp_analysis(self):
+        """_get_tcp_analysis over the table; flow tracking is sequential, so rows go through a FlowTable"""
+        tcp = self.df[self._has(LAYER_IP | LAYER_TCP)]
+        flows = FlowTable()
+        for row in zip(*(tcp[name].tolist() for name in ('time', 'src', 'sport', 'dst', 'dport', 'tcp_flags', 'length'))):
+            flows.add(*row)
+        return flows.result()
+
+    def packets_per_source(self):
+        """IP packets sent per source IP, in first-seen order"""
+        return self.df[self._has(LAYER_IP)].groupby('src', sort=False).size()
+
+    def anomalies(self, frequency_multiplier=5):
+        """Vectorized _detect_anomalies"""
+        anomalies = []
+        times = self.df['time']
+        window = {'start': float(times.min()), 'end': float(times.max())} if len(times) else None
+
+        ip_packet_counts = self.packets_per_source()
+        if len(ip_packet_counts):
+            avg_packets = int(ip_packet_counts.sum()) / len(ip_packet_counts)
+            threshold = avg_packets * frequency_multiplier
+
+            for src, count in ip_packet_counts[ip_packet_counts > threshold].items():
+                ip = int_to_ip(src)
+                anomalies.append({
+                    'type': 'High Frequency Traffic',
+                    'description': f'IP {ip} generated {int(count)} packets (avg: {avg_packets:.1f})',
+                    'severity': 'Low',
+                    'source_ip': ip,
+                    'window': window
+                })
+
+        return anomalies
+
+    def timeline(self):
+        """Vectorized _get_traffic_timeline"""
+        if not len(self.df):
+            return build_series({})
+
+        seconds = self.df['time'].to_numpy().astype(np.int64)
+        buckets = pd.Series(self.df['length'].to_numpy(dtype=np.int64)).groupby(seconds).agg(['size', 'sum'])
+        return build_series({
+            int(timestamp): (int(packets), int(total_bytes))
+            for timestamp, packets, total_bytes in zip(buckets.index, buckets['size'], buckets['sum'])
+        })
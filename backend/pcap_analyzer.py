@@ -1,45 +1,421 @@
-from scapy.all import rdpcap, IP, TCP, UDP, DNS, ICMP, ARP
-import pandas as pd
+from scapy.all import rdpcap, PcapReader, IP, TCP, UDP, DNS, ICMP, ARP
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
 import time
 from datetime import datetime
+from accumulators import DEFAULT_ACCUMULATORS, DnsAccumulator, DomainAccumulator, RollupAccumulator, domain_table
+from packet_record import record_from_packet
+from dns_transactions import DnsTransactionTable
+from tcp_flows import FlowTable
+from anomaly_engine import AnomalyEngine
+from fast_decoder import iter_capture, pcap_ranges, iter_pcap_range, decode_frames, decode_with_scapy
+from packet_table import PacketIndexWriter, PacketTableBuilder, FILTER_PROTOCOLS
+from packet_filter import PacketFilter
+from instrumentation import Profiler, profiled
+from timeline import build_series, timeline_preview
+from traffic_tables import add_conversation, conversation_table, top_conversations
+
+# Sections derived from another section when results are collected,
+# stored just before it: source key -> (derived key, function)
+DERIVED_SECTIONS = {
+    'conversation_table': ('ip_conversations', top_conversations),
+    'timeline_series': ('timeline', timeline_preview),
+}
+
+# Bump whenever analysis output changes so cached results are not reused
+ANALYZER_VERSION = '12'
+
+# Packets between two progress callbacks
+PROGRESS_INTERVAL = 1000
+
+
+def report_progress(frames, progress):
+    """Pass capture frames through, calling progress(packets, bytes_read) every PROGRESS_INTERVAL frames"""
+    packets = 0
+    for frame in frames:
+        packets += 1
+        if packets % PROGRESS_INTERVAL == 0:
+            progress(packets, frame[0])
+        yield frame
+
+
+def index_records(indexed, builder):
+    """Yield the records of (offset, PacketRecord) pairs, adding each row to ``builder``"""
+    for offset, record in indexed:
+        builder.add(record, offset)
+        yield record
+
+
+def run_accumulators(accumulator_classes, records, profiler=None):
+    """Push PacketRecords through fresh accumulators, returning (accumulators, packet count)"""
+    accumulators = [cls() for cls in accumulator_classes]
+    if profiler is not None:
+        return accumulators, profiler.accumulate(accumulators, records)
+    adders = [acc.add for acc in accumulators]
+    total_packets = 0
+    
+    for record in records:
+        total_packets += 1
+        for add in adders:
+            add(record)
+    
+    return accumulators, total_packets
+
+
+def analyze_range(filepath, start, end, accumulator_classes, fast_decode=True, index=None):
+    """Worker entry point: accumulate the pcap records starting in [start, end)
+
+    ``index`` is a (directory, max_packets) pair to write the packet index
+    of the range there. Returns (accumulators, packet count,
+    PacketIndexWriter of the range or None).
+    """
+    frames = iter_pcap_range(filepath, start, end)
+    if fast_decode:
+        indexed = decode_frames(frames)
+    else:
+        indexed = ((offset, decode_with_scapy(data, linktype, ts)) for offset, linktype, ts, data in frames)
+    writer = PacketIndexWriter(*index) if index else None
+    records = index_records(indexed, writer) if index else (record for _, record in indexed)
+    try:
+        accumulators, total_packets = run_accumulators(accumulator_classes, records)
+        if writer:
+            # Only the spill files go back to the parent process
+            writer.flush()
+    except BaseException:
+        if writer:
+            writer.discard()
+        raise
+    return accumulators, total_packets, writer
+
 
 class PcapAnalyzer:
-    def __init__(self):
+    # Captures are only split into ranges of at least this much
+    min_chunk_bytes = 4 * 1024 * 1024
+    # Ranges per worker; progress and cancellation come as each range finishes
+    ranges_per_worker = 4
+    # Captures with more packets get no packet index (None: no limit)
+    max_index_packets = None
+
+    def __init__(self, accumulators=None):
         self.packets = []
         self.analysis_results = {}
+        self.packet_table = None
+        self.index_saved = False
+        self.accumulators = list(accumulators or DEFAULT_ACCUMULATORS)
+        self.live_accumulators = None
+        self.live_packets = 0
+        self.live_revisions = {}
+        self.live_changes = []
     
-    def analyze_pcap(self, filepath):
-        """Main analysis function for PCAP files"""
+    def analyze_pcap(self, filepath, streaming=True, fast_decode=True, columnar=False, workers=1,
+                     progress=None, index_path=None, profile=None):
+        """Main analysis function for PCAP files
+
+        In streaming mode packets are read one at a time, decoded once and
+        pushed through ``self.accumulators``; nothing is kept in
+        ``self.packets``. ``fast_decode`` parses the headers straight from the
+        raw bytes and only hands unusual frames to scapy. ``columnar`` keeps
+        the decoded headers in ``self.packet_table`` instead and computes the
+        sections with vectorized group-bys. With ``workers`` > 1 an
+        uncompressed pcap is split into ``ranges_per_worker`` byte ranges per
+        worker that are accumulated in separate processes and merged. With
+        ``streaming=False`` the whole capture is loaded with rdpcap and each
+        ``_get_*`` stage scans it separately.
+
+        While streaming, ``progress(packets, bytes_read)`` is called
+        periodically; an exception raised from it aborts the analysis.
+        ``filepath`` may also be an open binary file object when streaming.
+        ``index_path`` also saves the per-packet headers and file offsets
+        there, so later protocol filters don't need the capture. The index is
+        written to disk as the capture is read (only columnar analyses keep
+        it in ``self.packet_table``), and is not saved for captures of more
+        than ``max_index_packets`` packets; ``self.index_saved`` tells.
+
+        ``profile`` adds a ``performance`` section with the wall time, CPU
+        time and packets of each stage (decoding, each accumulator or
+        ``_get_*`` stage, collecting results); ``profile='memory'`` also
+        traces the peak memory allocated in each stage, which slows the
+        analysis down considerably.
+        """
+        profiler = Profiler(memory=profile == 'memory') if profile else None
+        index = None
+        self.index_saved = False
         try:
+            if streaming:
+                print(f"Streaming PCAP file: {filepath}")
+                # Only files on disk can be split; file objects (e.g. uploads still arriving) are read serially
+                splittable = workers > 1 and not columnar and not hasattr(filepath, 'read')
+                range_count = workers * self.ranges_per_worker
+                ranges = pcap_ranges(filepath, range_count, self.min_chunk_bytes) if splittable else []
+                if index_path and not columnar:
+                    index = PacketIndexWriter(os.path.dirname(index_path) or '.', self.max_index_packets)
+                if len(ranges) > 1:
+                    print(f"Analyzing {len(ranges)} chunks in parallel")
+                    mode = 'parallel'
+                    self.analysis_results = self.analyze_parallel(filepath, ranges, fast_decode, workers, progress,
+                                                                  index=index, profiler=profiler)
+                else:
+                    if fast_decode:
+                        frames = iter_capture(filepath)
+                        if progress:
+                            frames = report_progress(frames, progress)
+                        indexed = decode_frames(frames)
+                    else:
+                        indexed = self._scapy_records(filepath, progress)
+
+                    builder = PacketTableBuilder() if columnar else index
+                    if builder is not None:
+                        records = index_records(indexed, builder)
+                    else:
+                        records = (record for _, record in indexed)
+                    if columnar:
+                        mode = 'columnar'
+                        self.analysis_results = self.analyze_table(records, builder, profiler)
+                    else:
+                        mode = 'streaming'
+                        self.analysis_results = self.analyze_records(records, profiler)
+
+                if index_path:
+                    with profiled(profiler, 'save_index'):
+                        if index is None:
+                            self.packet_table.save(index_path)
+                            self.index_saved = True
+                        else:
+                            self.index_saved = index.save(index_path)
+                    if not self.index_saved:
+                        print(f"No packet index saved: more than {self.max_index_packets} packets")
+                if profiler:
+                    self.analysis_results['performance'] = profiler.result(mode, self.analysis_results['total_packets'])
+                print(f"Analyzed {self.analysis_results['total_packets']} packets")
+                return self.analysis_results
+
             print(f"Loading PCAP file: {filepath}")
-            self.packets = rdpcap(filepath)
-            print(f"Loaded {len(self.packets)} packets")
+            with profiled(profiler, 'load') as load:
+                self.packets = rdpcap(filepath)
+            packets = len(self.packets)
+            if load is not None:
+                load['packets'] = packets
+            print(f"Loaded {packets} packets")
+            
+            def stage(method, *args):
+                with profiled(profiler, method.__name__, packets):
+                    return method(*args)
             
             # Perform various analyses
-            basic_stats = self._get_basic_statistics()
-            protocol_dist = self._get_protocol_distribution()
-            ip_conversations = self._get_ip_conversations()
-            tcp_analysis = self._get_tcp_analysis()
-            dns_analysis = self._get_dns_analysis()
-            anomalies = self._detect_anomalies()
-            timeline = self._get_traffic_timeline()
+            basic_stats = stage(self._get_basic_statistics)
+            protocol_dist = stage(self._get_protocol_distribution)
+            ip_conversations = stage(self._get_ip_conversations)
+            conversations = stage(self._get_conversation_table)
+            tcp_analysis = stage(self._get_tcp_analysis)
+            dns_analysis = stage(self._get_dns_analysis)
+            domains = stage(self._get_domain_table)
+            anomalies = stage(self._detect_anomalies) + stage(self._detect_windowed_anomalies)
+            timeline_series = stage(self._get_traffic_timeline)
+            protocol_rollups = {protocol: stage(self._scan_protocol, protocol) for protocol in FILTER_PROTOCOLS}
             
             self.analysis_results = {
                 'basic_stats': basic_stats,
                 'protocol_distribution': protocol_dist,
                 'ip_conversations': ip_conversations,
+                'conversation_table': conversations,
                 'tcp_analysis': tcp_analysis,
                 'dns_analysis': dns_analysis,
+                'domain_table': domains,
                 'anomalies': anomalies,
-                'timeline': timeline,
-                'total_packets': len(self.packets)
+                'timeline': timeline_preview(timeline_series),
+                'timeline_series': timeline_series,
+                'protocol_rollups': protocol_rollups,
+                'total_packets': packets
             }
+            if profiler:
+                self.analysis_results['performance'] = profiler.result('legacy', packets)
             
             return self.analysis_results
             
         except Exception as e:
+            if profiler:
+                profiler.stop()
             raise Exception(f"PCAP analysis failed: {str(e)}")
+        finally:
+            if index is not None:
+                index.discard()
+    
+    def _scapy_records(self, filepath, progress=None):
+        """(offset, PacketRecord) from full scapy dissection of each packet"""
+        reader = PcapReader(filepath)
+        try:
+            offset = reader.f.tell()
+            for packets, pkt in enumerate(reader, 1):
+                if progress and packets % PROGRESS_INTERVAL == 0:
+                    progress(packets, reader.f.tell())
+                yield offset, record_from_packet(pkt)
+                offset = reader.f.tell()
+        finally:
+            # File objects belong to the caller
+            if not hasattr(filepath, 'read'):
+                reader.close()
+    
+    def analyze_table(self, records, builder=None, profiler=None):
+        """Build a columnar packet table and aggregate it with group-bys
+
+        ``builder`` is a PacketTableBuilder the records are already being
+        added to (see index_records); otherwise a fresh one is filled here.
+        """
+        # DNS names and the windowed anomaly rules need more than the table columns
+        dns = DnsAccumulator()
+        domains = DomainAccumulator()
+        engine = AnomalyEngine()
+        with profiled(profiler, 'decode') as decode:
+            if builder is None:
+                builder = PacketTableBuilder()
+                for record in records:
+                    builder.add(record)
+                    dns.add(record)
+                    domains.add(record)
+                    engine.add(record)
+            else:
+                for record in records:
+                    dns.add(record)
+                    domains.add(record)
+                    engine.add(record)
+        
+        with profiled(profiler, 'build_table'):
+            table = self.packet_table = builder.build()
+        packets = len(table)
+        if decode is not None:
+            decode['packets'] = packets
+        
+        def section(name, compute):
+            with profiled(profiler, name, packets):
+                return compute()
+        
+        timeline_series = section('timeline_series', table.timeline)
+        return {
+            'basic_stats': section('basic_stats', table.basic_statistics),
+            'protocol_distribution': section('protocol_distribution', table.protocol_distribution),
+            'ip_conversations': section('ip_conversations', table.ip_conversations),
+            'conversation_table': section('conversation_table', table.conversation_table),
+            'tcp_analysis': section('tcp_analysis', table.tcp_analysis),
+            'dns_analysis': dns.result(),
+            'domain_table': domains.result(),
+            'anomalies': section('anomalies', table.anomalies) + engine.result(),
+            'timeline': timeline_preview(timeline_series),
+            'timeline_series': timeline_series,
+            'protocol_rollups': section('protocol_rollups', table.protocol_rollups),
+            'total_packets': packets
+        }
+    
+    def analyze_records(self, records, profiler=None):
+        """Run a single pass of PacketRecords through the accumulators"""
+        accumulators, total_packets = run_accumulators(self.accumulators, records, profiler)
+        with profiled(profiler, 'results', total_packets):
+            return self._collect_results(accumulators, total_packets)
+    
+    def add_records(self, records):
+        """Add PacketRecords to a running analysis and refresh analysis_results
+
+        Unlike analyze_records the accumulator state is kept between calls,
+        so a capture that is still being written is analyzed as it grows
+        without reading anything twice. Sections are peeked at rather than
+        finished (see Accumulator.peek), and only those whose accumulator
+        changed are rebuilt; their keys are left in ``live_changes``.
+        Returns the number of records added.
+        """
+        if self.live_accumulators is None:
+            self.live_accumulators = [cls() for cls in self.accumulators]
+        adders = [acc.add for acc in self.live_accumulators]
+        added = 0
+        
+        for record in records:
+            added += 1
+            for add in adders:
+                add(record)
+        
+        self.live_packets += added
+        self.live_changes = []
+        if added or not self.analysis_results:
+            results = dict(self.analysis_results or {})
+            for acc in self.live_accumulators:
+                revision = acc.revision()
+                if revision is not None and acc.key in results and self.live_revisions.get(acc.key) == revision:
+                    continue
+                self.live_revisions[acc.key] = revision
+                sections = self._sections(acc, acc.peek())
+                results.update(sections)
+                self.live_changes.extend(sections)
+            results['total_packets'] = self.live_packets
+            self.live_changes.append('total_packets')
+            self.analysis_results = results
+        return added
+    
+    def analyze_parallel(self, filepath, ranges, fast_decode=True, workers=None, progress=None, index=None,
+                         profiler=None):
+        """Accumulate pcap byte ranges in worker processes and merge them in order
+
+        ``progress`` is called as each range finishes, and an exception
+        raised from it cancels the ranges not started yet. ``index`` is a
+        PacketIndexWriter the packet indexes the workers write for their
+        ranges are appended to, in capture order. Profiled as a
+        whole ``chunks`` stage (CPU time spent in the workers is not
+        counted), then ``merge`` and ``results``.
+        """
+        range_index = (index.directory, index.max_packets) if index is not None else None
+        with profiled(profiler, 'chunks') as chunks:
+            executor = ProcessPoolExecutor(max_workers=workers or len(ranges))
+            futures = {}
+            partials = None
+            try:
+                for start, end in ranges:
+                    future = executor.submit(analyze_range, filepath, start, end, self.accumulators, fast_decode,
+                                             range_index)
+                    futures[future] = end - start
+                if progress:
+                    packets = bytes_read = 0
+                    for future in as_completed(futures):
+                        packets += future.result()[1]
+                        bytes_read += futures[future]
+                        progress(packets, bytes_read)
+                partials = [future.result() for future in futures]
+            finally:
+                executor.shutdown(cancel_futures=True)
+                if partials is None and index is not None:
+                    # Remove the spill files of the ranges that did finish
+                    for future in futures:
+                        if not future.cancelled() and future.exception() is None:
+                            future.result()[2].discard()
+        
+        with profiled(profiler, 'merge'):
+            accumulators, total_packets, chunk_index = partials[0]
+            if index is not None:
+                index.extend(chunk_index)
+            for chunk_accumulators, chunk_packets, chunk_index in partials[1:]:
+                for acc, chunk in zip(accumulators, chunk_accumulators):
+                    acc.merge(chunk)
+                total_packets += chunk_packets
+                if index is not None:
+                    index.extend(chunk_index)
+        if chunks is not None:
+            chunks['packets'] = total_packets
+        
+        # Results (and with them the anomaly averages) only see merged state
+        with profiled(profiler, 'results', total_packets):
+            return self._collect_results(accumulators, total_packets)
+    
+    def _collect_results(self, accumulators, total_packets):
+        results = {}
+        for acc in accumulators:
+            results.update(self._sections(acc, acc.result()))
+        results['total_packets'] = total_packets
+        return results
+    
+    def _sections(self, acc, section):
+        """Sections an accumulator result is stored as"""
+        if acc.key in DERIVED_SECTIONS:
+            # Overviews stored with the analysis; the full data is queried on demand
+            derived_key, derive = DERIVED_SECTIONS[acc.key]
+            return {derived_key: derive(section), acc.key: section}
+        return {acc.key: section}
     
     def _get_basic_statistics(self):
         """Calculate basic packet statistics"""
@@ -131,50 +507,22 @@ class PcapAnalyzer:
             for conv, data in sorted_conversations
         ]
     
+    def _get_conversation_table(self):
+        """Every IP conversation with per-direction counters and first/last seen"""
+        conversations = {}
+        for pkt in self.packets:
+            if IP in pkt:
+                add_conversation(conversations, pkt[IP].src, pkt[IP].dst, len(pkt), float(pkt.time))
+        return conversation_table(conversations)
+    
     def _get_tcp_analysis(self):
         """Analyze TCP connections and streams"""
-        tcp_packets = [pkt for pkt in self.packets if TCP in pkt and IP in pkt]
-        
-        if not tcp_packets:
-            return {'total_connections': 0, 'success_rate': 0, 'failed_connections': 0}
-        
-        # Track TCP connections
-        connections = defaultdict(lambda: {'syn': 0, 'syn_ack': 0, 'ack': 0, 'fin': 0, 'rst': 0})
-        
-        for pkt in tcp_packets:
-            src_ip = pkt[IP].src
-            dst_ip = pkt[IP].dst
-            src_port = pkt[TCP].sport
-            dst_port = pkt[TCP].dport
-            
-            connection_key = (src_ip, src_port, dst_ip, dst_port)
-            
-            flags = pkt[TCP].flags
-            if flags & 0x02:  # SYN
-                connections[connection_key]['syn'] += 1
-            if flags & 0x12:  # SYN-ACK
-                connections[connection_key]['syn_ack'] += 1
-            if flags & 0x10:  # ACK
-                connections[connection_key]['ack'] += 1
-            if flags & 0x01:  # FIN
-                connections[connection_key]['fin'] += 1
-            if flags & 0x04:  # RST
-                connections[connection_key]['rst'] += 1
-        
-        # Calculate success rate
-        successful_connections = sum(1 for conn in connections.values() 
-                                   if conn['syn'] > 0 and conn['syn_ack'] > 0)
-        total_connection_attempts = sum(1 for conn in connections.values() if conn['syn'] > 0)
-        
-        success_rate = (successful_connections / total_connection_attempts * 100) if total_connection_attempts > 0 else 0
-        
-        return {
-            'total_connections': len(connections),
-            'successful_connections': successful_connections,
-            'failed_connections': total_connection_attempts - successful_connections,
-            'success_rate': round(success_rate, 2),
-            'total_tcp_packets': len(tcp_packets)
-        }
+        flows = FlowTable()
+        for pkt in self.packets:
+            if TCP in pkt and IP in pkt:
+                flows.add(float(pkt.time), pkt[IP].src, pkt[TCP].sport, pkt[IP].dst, pkt[TCP].dport,
+                          int(pkt[TCP].flags), len(pkt))
+        return flows.result()
     
     def _get_dns_analysis(self):
         """Analyze DNS traffic"""
@@ -186,9 +534,13 @@ class PcapAnalyzer:
         queries = []
         responses = []
         domains = Counter()
+        transactions = DnsTransactionTable()
         
         for pkt in dns_packets:
             dns_layer = pkt[DNS]
+            if IP in pkt:
+                transactions.add(float(pkt.time), pkt[IP].src, pkt[IP].dst,
+                                 dns_layer.qr, dns_layer.id, dns_layer.rcode)
             if dns_layer.qr == 0:  # Query
                 queries.append(pkt)
                 if dns_layer.qd:
@@ -204,33 +556,25 @@ class PcapAnalyzer:
             'total_queries': len(queries),
             'total_responses': len(responses),
             'top_domains': top_domains,
-            'unique_domains': len(domains)
+            'unique_domains': len(domains),
+            **transactions.result()
         }
     
+    def _get_domain_table(self):
+        """Query count of every queried domain"""
+        domains = Counter()
+        for pkt in self.packets:
+            if DNS in pkt and pkt[DNS].qr == 0 and pkt[DNS].qd:
+                domains[pkt[DNS].qd.qname.decode('utf-8').rstrip('.')] += 1
+        return domain_table(domains)
+    
     def _detect_anomalies(self):
         """Detect potential network anomalies"""
         anomalies = []
+        timestamps = [float(pkt.time) for pkt in self.packets]
+        window = {'start': min(timestamps), 'end': max(timestamps)} if timestamps else None
         
-        # Port scan detection
-        port_scan_threshold = 10
-        src_ports = defaultdict(set)
-        
-        for pkt in self.packets:
-            if TCP in pkt and IP in pkt:
-                src_ip = pkt[IP].src
-                dst_port = pkt[TCP].dport
-                src_ports[src_ip].add(dst_port)
-        
-        for src_ip, ports in src_ports.items():
-            if len(ports) > port_scan_threshold:
-                anomalies.append({
-                    'type': 'Potential Port Scan',
-                    'description': f'IP {src_ip} accessed {len(ports)} different ports',
-                    'severity': 'Medium',
-                    'source_ip': src_ip
-                })
-        
-        # High frequency traffic detection
+        # High frequency traffic detection (port scans are windowed, see _detect_windowed_anomalies)
         ip_packet_counts = Counter()
         for pkt in self.packets:
             if IP in pkt:
@@ -247,42 +591,73 @@ class PcapAnalyzer:
                         'type': 'High Frequency Traffic',
                         'description': f'IP {ip} generated {count} packets (avg: {avg_packets:.1f})',
                         'severity': 'Low',
-                        'source_ip': ip
+                        'source_ip': ip,
+                        'window': window
                     })
         
         return anomalies
     
+    def _detect_windowed_anomalies(self):
+        """Run the sliding-window anomaly rules over the loaded packets"""
+        engine = AnomalyEngine()
+        for pkt in self.packets:
+            engine.add(record_from_packet(pkt))
+        return engine.result()
+    
     def _get_traffic_timeline(self):
-        """Generate traffic timeline data"""
-        if not self.packets:
-            return []
-        
+        """Generate the multi-resolution traffic timeline"""
         # Group packets by time intervals (1-second buckets)
-        timeline_data = defaultdict(lambda: {'packets': 0, 'bytes': 0})
+        timeline_data = defaultdict(lambda: [0, 0])
         
         for pkt in self.packets:
             if hasattr(pkt, 'time'):
                 timestamp = int(float(pkt.time))
-                timeline_data[timestamp]['packets'] += 1
-                timeline_data[timestamp]['bytes'] += len(pkt)
-        
-        # Convert to list format for frontend
-        timeline = []
-        for timestamp in sorted(timeline_data.keys()):
-            timeline.append({
-                'timestamp': timestamp,
-                'datetime': datetime.fromtimestamp(timestamp).isoformat(),
-                'packets': timeline_data[timestamp]['packets'],
-                'bytes': timeline_data[timestamp]['bytes']
-            })
-        
-        return timeline
+                timeline_data[timestamp][0] += 1
+                timeline_data[timestamp][1] += len(pkt)
+        
+        return build_series(timeline_data)
     
     def filter_by_protocol(self, analysis_data, protocol):
-        """Filter analysis data by specific protocol"""
-        if protocol not in ['TCP', 'UDP', 'DNS', 'HTTP', 'ICMP']:
+        """Filter analysis data by specific protocol
+
+        Reads the ``protocol_rollups`` precomputed during analysis when the
+        analysis data has them. Otherwise uses ``self.packet_table`` (e.g. a
+        saved packet index) when present, or rescans ``self.packets``.
+        """
+        if protocol not in FILTER_PROTOCOLS:
             raise ValueError(f"Unsupported protocol: {protocol}")
         
+        rollups = analysis_data.get('protocol_rollups') if analysis_data else None
+        if rollups:
+            rollup = rollups[protocol]
+        elif self.packet_table is not None:
+            rollup = self.packet_table.protocol_rollup(protocol)
+        else:
+            rollup = self._scan_protocol(protocol)
+        
+        return {'protocol': protocol, **rollup}
+    
+    def filter_by_expression(self, expression):
+        """Filter analysis data by a BPF-style expression, e.g. ``tcp and dst port 443``
+
+        The expression is compiled once, then evaluated as a vectorized mask
+        over ``self.packet_table`` when present, or as a predicate over the
+        records of ``self.packets``. Raises ValueError for invalid expressions.
+        """
+        packet_filter = PacketFilter(expression)
+        if self.packet_table is not None:
+            rollup = self.packet_table.select(packet_filter.mask(self.packet_table)).rollup()
+        else:
+            accumulator = RollupAccumulator()
+            for record in map(record_from_packet, self.packets):
+                if packet_filter.matches(record):
+                    accumulator.add(record)
+            rollup = accumulator.result()
+        
+        return {'expression': expression, **rollup}
+    
+    def _scan_protocol(self, protocol):
+        """Select the packets of one protocol from self.packets and analyze them"""
         filtered_packets = []
         
         for pkt in self.packets:
@@ -303,14 +678,13 @@ class PcapAnalyzer:
         
         try:
             filtered_analysis = {
-                'protocol': protocol,
                 'filtered_packet_count': len(filtered_packets),
                 'basic_stats': self._get_basic_statistics(),
                 'ip_conversations': self._get_ip_conversations(),
-                'timeline': self._get_traffic_timeline()
+                'timeline': timeline_preview(self._get_traffic_timeline())
             }
         finally:
             # Restore original packets
             self.packets = original_packets
         
-        return filtered_analysis
\ No newline at end of file
+        return filtered_analysis
@@ -0,0 +1,108 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+
+
+class ResultCache:
+    """On-disk cache of analysis results keyed by capture hash
+
+    Entries are gzip-compressed JSON files named after the SHA-256 of the
+    capture and the analyzer version, so results from an older analyzer are
+    never served. The packet index of a capture (see PacketIndexWriter) is
+    kept next to its results. Reads refresh an entry's mtime; when the
+    results grow past ``max_bytes``, or the indexes past
+    ``index_max_bytes``, the least recently used ones are deleted, so a
+    large index never pushes results out and results never evict indexes.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, version='1', index_max_bytes=2 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_max_bytes = index_max_bytes
+        self.version = str(version)
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, capture_hash):
+        return os.path.join(self.directory, f'{capture_hash}-v{self.version}.json.gz')
+
+    def index_path(self, capture_hash):
+        """Where the packet index of a capture is saved"""
+        return os.path.join(self.directory, f'{capture_hash}-v{self.version}.index.npz')
+
+    def get_index(self, capture_hash):
+        """Path of a capture's saved packet index, or None"""
+        path = self.index_path(capture_hash)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put_index(self, capture_hash, path):
+        """Move a saved packet index into the cache and evict old indexes beyond index_max_bytes"""
+        os.replace(path, self.index_path(capture_hash))
+        self._evict()
+
+    def get(self, capture_hash):
+        """Cached analysis results for a capture, or None"""
+        path = self._path(capture_hash)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                results = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError):
+            print(f"Discarding unreadable cache entry: {path}")
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return results
+
+    def put(self, capture_hash, results):
+        """Store analysis results and evict old entries beyond max_bytes"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                f.write(json.dumps(results).encode('utf-8'))
+            os.replace(tmp_path, self._path(capture_hash))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self._evict()
+
+    def _entries(self, suffix):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        with self.lock:
+            for suffix, max_bytes in (('.json.gz', self.max_bytes), ('.index.npz', self.index_max_bytes)):
+                entries = sorted(self._entries(suffix))
+                total = sum(size for _, size, _ in entries)
+                for _, size, path in entries:
+                    if total <= max_bytes:
+                        break
+                    self._remove(path)
+                    total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,166 @@
+import base64
+import binascii
+import heapq
+import json
+from operator import itemgetter
+from traffic_tables import TrafficTables
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+SEVERITY_RANK = {'Low': 1, 'Medium': 2, 'High': 3}
+
+# Sections kept on the server and queried on demand instead of sent whole
+SERVER_SECTIONS = ('timeline_series', 'conversation_table', 'domain_table')
+
+
+def _domain_rows(analysis):
+    """Every queried domain; sketch-mode and older analyses only have the top list"""
+    table = analysis.get('domain_table')
+    if table is None:
+        return analysis.get('dns_analysis', {}).get('top_domains', [])
+    return [{'domain': domain, 'count': count} for domain, count in zip(table['domain'], table['count'])]
+
+
+def _protocol_rows(analysis):
+    return [{'protocol': protocol, **counts} for protocol, counts in analysis.get('protocol_distribution', {}).items()]
+
+
+def _window_start(anomaly):
+    window = anomaly.get('window')
+    return window['start'] if window else 0
+
+
+# Paginated sections: rows of an analysis, sort keys by name, default sort
+SECTIONS = {
+    'conversations': (
+        # Only the top list; the full conversation_table is paged through TrafficTables
+        lambda analysis: analysis.get('ip_conversations', []),
+        {'packets': itemgetter('packets'), 'bytes': itemgetter('bytes'), 'endpoints': itemgetter('endpoints')},
+        '-packets'
+    ),
+    'anomalies': (
+        lambda analysis: analysis.get('anomalies', []),
+        {'severity': lambda anomaly: SEVERITY_RANK.get(anomaly['severity'], 0),
+         'type': itemgetter('type'), 'start': _window_start},
+        '-severity'
+    ),
+    'domains': (
+        _domain_rows,
+        {'count': itemgetter('count'), 'domain': itemgetter('domain')},
+        '-count'
+    ),
+    'protocols': (
+        _protocol_rows,
+        {'count': itemgetter('count'), 'protocol': itemgetter('protocol')},
+        '-count'
+    ),
+}
+
+
+# Top-level analysis keys each section is paged from; the full conversation
+# table is read through the analysis' TrafficTables
+SECTION_KEYS = {
+    'conversations': ('ip_conversations',),
+    'anomalies': ('anomalies',),
+    'domains': ('domain_table', 'dns_analysis'),
+    'protocols': ('protocol_distribution',),
+}
+
+
+def encode_cursor(offset, sort):
+    data = json.dumps({'offset': offset, 'sort': sort}).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_cursor(cursor, sort):
+    """Offset a cursor points at; it must come from a page with the same sort"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        offset = data['offset']
+        cursor_sort = data['sort']
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise ValueError('Invalid cursor')
+    if not isinstance(offset, int) or offset < 0 or cursor_sort != sort:
+        raise ValueError('Invalid cursor')
+    return offset
+
+
+def page_section(analysis, section, sort=None, limit=DEFAULT_PAGE_SIZE, cursor=None, tables=None):
+    """One page of a list section, sorted on the server
+
+    ``sort`` names a sort key of the section, prefixed with ``-`` for
+    descending order; ties keep the order of the analysis so pages never
+    overlap. ``cursor`` is the ``next_cursor`` of the previous page.
+    Conversations come from the full conversation table when the analysis
+    has one, through ``tables`` (the analysis' TrafficTables) if given, so
+    they are the same rows as the top-K conversation queries and their
+    sorted order is reused by later pages.
+    Raises ValueError for unknown sections, sort keys or cursors.
+    """
+    if section not in SECTIONS:
+        raise ValueError(f"Unknown section: {section}")
+    rows_of, sort_keys, default_sort = SECTIONS[section]
+    sort = sort or default_sort
+    field = sort.lstrip('-')
+    if field not in sort_keys:
+        raise ValueError(f"Cannot sort {section} by {field}; use one of {', '.join(sort_keys)}")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    offset = decode_cursor(cursor, sort) if cursor else 0
+
+    if section == 'conversations' and (tables is not None or 'conversation_table' in analysis):
+        if tables is None:
+            tables = TrafficTables(analysis['conversation_table'])
+        rows = tables.sorted_conversations(field, sort.startswith('-'))
+        items = [tables.conversation(row) for row in rows[offset:offset + limit]]
+    else:
+        # Heap selection of the rows up to this page; equal to sorting, ties included
+        rows = rows_of(analysis)
+        select = heapq.nlargest if sort.startswith('-') else heapq.nsmallest
+        items = select(offset + limit, rows, key=sort_keys[field])[offset:]
+    next_offset = offset + len(items)
+    return {
+        'section': section,
+        'sort': sort,
+        'total': len(rows),
+        'items': items,
+        'next_cursor': encode_cursor(next_offset, sort) if next_offset < len(rows) else None
+    }
+
+
+def section_size(analysis, section):
+    """Row count of a section, without building the rows of the full tables"""
+    if section == 'conversations' and 'conversation_table' in analysis:
+        return len(analysis['conversation_table']['a'])
+    if section == 'domains' and 'domain_table' in analysis:
+        return len(analysis['domain_table']['domain'])
+    return len(SECTIONS[section][0](analysis))
+
+
+def analysis_summary(analysis):
+    """Headline numbers of an analysis, small enough for the first paint"""
+    tcp = analysis.get('tcp_analysis', {})
+    dns = analysis.get('dns_analysis', {})
+    anomalies = analysis.get('anomalies', [])
+    by_severity = {}
+    for anomaly in anomalies:
+        by_severity[anomaly['severity']] = by_severity.get(anomaly['severity'], 0) + 1
+
+    return {
+        'total_packets': analysis.get('total_packets', 0),
+        'basic_stats': analysis.get('basic_stats', {}),
+        'tcp_analysis': {key: tcp[key] for key in ('total_connections', 'successful_connections',
+                                                   'failed_connections', 'success_rate') if key in tcp},
+        'dns_analysis': {key: dns[key] for key in ('total_queries', 'total_responses', 'unique_domains')
+                         if key in dns},
+        'anomalies': {'total': len(anomalies), 'by_severity': by_severity},
+        'sections': {section: section_size(analysis, section) for section in SECTIONS}
+    }
+
+
+def client_analysis(analysis):
+    """Analysis without its server-side sections (timeline series, full conversation and domain tables)"""
+    if not analysis or not any(key in analysis for key in SERVER_SECTIONS):
+        return analysis
+    return {key: value for key, value in analysis.items() if key not in SERVER_SECTIONS}
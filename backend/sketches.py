@@ -0,0 +1,249 @@
+import hashlib
+import heapq
+import math
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+MASK64 = (1 << 64) - 1
+# Fixed seed added to integers before mixing, so 0 does not hash to 0
+HASH_SEED = 0x9e3779b97f4a7c15
+
+
+def _mix64(x):
+    """splitmix64 finalizer of a 64-bit integer"""
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & MASK64
+    return x ^ (x >> 31)
+
+
+if XXHASH_AVAILABLE:
+    _hash_bytes = xxhash.xxh3_64_intdigest
+else:
+    def _hash_bytes(data):
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+def stable_hash(value):
+    """64-bit hash of a value that is the same in every process (unlike hash() of strings)
+
+    Integers are mixed directly and strings hashed from their UTF-8 bytes;
+    anything else falls back to its repr.
+    """
+    if isinstance(value, str):
+        return _hash_bytes(value.encode('utf-8'))
+    if isinstance(value, int):
+        return _mix64((value + HASH_SEED) & MASK64)
+    if isinstance(value, bytes):
+        return _hash_bytes(value)
+    return _hash_bytes(repr(value).encode('utf-8'))
+
+
+class SpaceSaving:
+    """Top-k heavy hitters in a fixed number of counters (Metwally et al.)
+
+    Every item's count is over-estimated by at most its ``error``, which is
+    never more than ``total / capacity``. Each counter also sums an ``extra``
+    weight (e.g. bytes); for items that took over a counter it only covers
+    the packets seen since.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}  # item -> [count, error, extra]
+        self.heap = []      # (count, item), possibly stale; see _pop_min
+        self.total = 0
+
+    def __len__(self):
+        return len(self.counters)
+
+    def add(self, item, weight=1, extra=0):
+        self.total += weight
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += weight
+            counter[2] += extra
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [weight, 0, extra]
+            heapq.heappush(self.heap, (weight, item))
+        else:
+            floor = self._pop_min()
+            self.counters[item] = [floor + weight, floor, extra]
+            heapq.heappush(self.heap, (floor + weight, item))
+            if len(self.heap) > 4 * self.capacity:
+                self._rebuild_heap()
+
+    def _pop_min(self):
+        """Drop the item with the smallest count and return that count
+
+        Counts only grow between replacements, so heap entries are lower
+        bounds; stale ones are refreshed until the top entry is exact.
+        """
+        while True:
+            count, item = self.heap[0]
+            counter = self.counters.get(item)
+            if counter is None:
+                heapq.heappop(self.heap)
+            elif counter[0] != count:
+                heapq.heapreplace(self.heap, (counter[0], item))
+            else:
+                heapq.heappop(self.heap)
+                del self.counters[item]
+                return count
+
+    def _rebuild_heap(self):
+        self.heap = [(counter[0], item) for item, counter in self.counters.items()]
+        heapq.heapify(self.heap)
+
+    def error_bound(self):
+        """Largest possible over-estimate of any reported count"""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    def merge(self, other):
+        """Combine two summaries (Agarwal et al., mergeable summaries)
+
+        Items missing from a full summary may have been counted up to its
+        smallest count, which is added to both their count and error.
+        """
+        floor = self.error_bound()
+        other_floor = other.error_bound()
+        merged = {}
+        for item, (count, error, extra) in self.counters.items():
+            other_counter = other.counters.get(item, (other_floor, other_floor, 0))
+            merged[item] = [count + other_counter[0], error + other_counter[1], extra + other_counter[2]]
+        for item, (count, error, extra) in other.counters.items():
+            if item not in merged:
+                merged[item] = [count + floor, error + floor, extra]
+
+        kept = sorted(merged.items(), key=lambda x: x[1][0], reverse=True)[:self.capacity]
+        self.counters = dict(kept)
+        self.total += other.total
+        self._rebuild_heap()
+
+    def top(self, n):
+        """The ``n`` largest (item, count, error, extra), first-monitored first on ties"""
+        ranked = sorted(self.counters.items(), key=lambda x: x[1][0], reverse=True)[:n]
+        return [(item, count, error, extra) for item, (count, error, extra) in ranked]
+
+
+class HyperLogLog:
+    """Distinct-count estimate with a relative standard error of about ``error``
+
+    Small sets are kept as exact hash sets of up to 2**p / 8 hashes before
+    switching to 2**p one-byte registers, so the many sources that touch a
+    handful of ports stay cheap and exact.
+    """
+
+    def __init__(self, error=0.01):
+        self.p = min(max(math.ceil(math.log2((1.04 / error) ** 2)), 4), 18)
+        self.m = 1 << self.p
+        self.sparse = set()
+        self.registers = None
+
+    @property
+    def relative_error(self):
+        """Standard error of the estimate; 0 while the set is still exact"""
+        return 0 if self.registers is None else round(1.04 / math.sqrt(self.m), 4)
+
+    def add(self, value):
+        hashed = stable_hash(value)
+        if self.registers is None:
+            self.sparse.add(hashed)
+            if len(self.sparse) > self.m // 8:
+                self._densify()
+        else:
+            self._insert(hashed)
+
+    def _insert(self, hashed):
+        bits = 64 - self.p
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def _densify(self):
+        self.registers = bytearray(self.m)
+        for hashed in self.sparse:
+            self._insert(hashed)
+        self.sparse = None
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError('Cannot merge HyperLogLogs of different precision')
+        if self.registers is None and other.registers is None:
+            self.sparse |= other.sparse
+            if len(self.sparse) > self.m // 8:
+                self._densify()
+            return
+        if self.registers is None:
+            self._densify()
+        if other.registers is None:
+            for hashed in other.sparse:
+                self._insert(hashed)
+        else:
+            self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        if self.registers is None:
+            return len(self.sparse)
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+
+class QuantileSketch:
+    """Quantiles with a relative error of at most ``error`` (DDSketch, Masson et al.)
+
+    Positive values fall into logarithmic buckets whose bounds grow by
+    ``gamma``; values at or below ``min_value`` share a zero bucket. Sketches
+    with the same parameters merge exactly, so merged chunks give the same
+    quantiles as a single pass.
+    """
+
+    def __init__(self, error=0.01, min_value=1e-6):
+        self.error = error
+        self.gamma = (1 + error) / (1 - error)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= self.min_value:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        if other.gamma != self.gamma or other.min_value != self.min_value:
+            raise ValueError('Cannot merge QuantileSketches with different parameters')
+        self.count += other.count
+        self.zeros += other.zeros
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def quantile(self, q):
+        """Estimate of the ``q`` quantile (0 to 1), or None when empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
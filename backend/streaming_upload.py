@@ -0,0 +1,103 @@
+import hashlib
+import os
+import threading
+from fast_decoder import PCAP_MAGICS, PCAPNG_MAGIC
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Leading bytes of the capture formats the analyzer reads (gzip is unpacked transparently)
+CAPTURE_MAGICS = tuple(PCAP_MAGICS) + (PCAPNG_MAGIC, b"\x1f\x8b")
+
+
+class UploadRejected(Exception):
+    """Raised when an upload stream is refused part-way through"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_capture_header(data):
+    return data.startswith(CAPTURE_MAGICS)
+
+
+def read_header(stream, size=4):
+    """Read at least ``size`` bytes (or everything up to EOF) from a stream"""
+    data = b''
+    while len(data) < size:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class GrowingFile:
+    """Read side of a file that an upload is still writing
+
+    Reads block until the requested bytes have been written or the upload
+    has finished, so a capture can be analyzed while it is arriving. A failed
+    upload makes pending and later reads raise.
+    """
+
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        self.cond = threading.Condition()
+        self.size = 0
+        self.finished = False
+        self.error = None
+
+    def written(self, nbytes):
+        with self.cond:
+            self.size += nbytes
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.finished = True
+            self.error = error
+            self.cond.notify_all()
+
+    def read(self, n=-1):
+        with self.cond:
+            while not self.finished and (n is None or n < 0 or self.size - self.f.tell() < n):
+                self.cond.wait()
+            if self.error:
+                raise Exception(self.error)
+        return self.f.read(n)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.f.seek(offset, whence)
+
+    def tell(self):
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+
+def receive_upload(stream, filepath, header, max_bytes, growing=None, should_stop=None):
+    """Write an upload stream to disk in fixed-size chunks
+
+    ``header`` holds the bytes already read from the stream. Returns the
+    SHA-256 and size of the upload. Raises UploadRejected as soon as the
+    upload passes ``max_bytes`` or ``should_stop()`` returns true. Readers of
+    ``growing`` are told about every chunk; finishing it is up to the caller.
+    """
+    digest = hashlib.sha256()
+    total = 0
+    with open(filepath, 'wb') as f:
+        chunk = header
+        while chunk:
+            total += len(chunk)
+            if total > max_bytes:
+                raise UploadRejected(f'File too large (max {max_bytes} bytes)', 413)
+            if should_stop and should_stop():
+                raise UploadRejected('Analysis stopped during upload', 409)
+            digest.update(chunk)
+            f.write(chunk)
+            f.flush()
+            if growing:
+                growing.written(len(chunk))
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+    return digest.hexdigest(), total
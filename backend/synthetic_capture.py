@@ -0,0 +1,236 @@
+"""Deterministic synthetic pcap captures for benchmarks and tests
+
+Frames are packed straight into bytes (no scapy), so millions of packets
+can be generated quickly. The same ``count`` and ``seed`` always produce
+the same file. Traffic is a weighted mix of scenarios: TCP sessions
+(handshake, data, teardown, some refused), UDP datagrams, DNS lookups
+(with NXDOMAIN/SERVFAIL and unanswered queries), ICMP echo, ARP, port
+scans and SYN floods. Checksums are left at zero; the analyzers never
+check them.
+
+    python synthetic_capture.py 1m capture.pcap [--seed 0]
+"""
+import argparse
+import random
+import struct
+
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# Start of the generated traffic and its mean packet rate
+BASE_TIME = 1_700_000_000
+PACKET_RATE = 20_000
+
+# Scenario weights; each scenario emits a burst of related packets
+MIX = (
+    ('tcp_session', 30),
+    ('udp', 20),
+    ('dns', 24),
+    ('icmp', 8),
+    ('arp', 4),
+    ('port_scan', 1),
+    ('syn_flood', 1),
+)
+
+RESOLVERS = ('8.8.8.8', '1.1.1.1', '10.0.0.53')
+SERVICE_PORTS = (80, 443, 22, 25, 3306, 8080)
+# Plain UDP services without a payload dissector
+UDP_PORTS = (514, 5000, 9000, 27015)
+
+_PCAP_HEADER = struct.Struct('<IHHiIII')
+_RECORD_HEADER = struct.Struct('<IIII')
+_ETHER = struct.Struct('!6s6sH')
+_IPV4 = struct.Struct('!BBHHHBBH4s4s')
+_TCP = struct.Struct('!HHIIBBHHH')
+_UDP = struct.Struct('!HHHH')
+_ICMP = struct.Struct('!BBHHH')
+_DNS = struct.Struct('!HHHHHH')
+_DNS_ANSWER = struct.Struct('!HHHIH4s')
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_ARP = 0x0806
+TCP_FIN, TCP_SYN, TCP_RST, TCP_PSH, TCP_ACK = 0x01, 0x02, 0x04, 0x08, 0x10
+
+
+def parse_size(text):
+    """Packet count of a size like ``10k``, ``1m`` or ``2500``"""
+    text = text.strip().lower()
+    if text in SIZES:
+        return SIZES[text]
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    try:
+        count = int(text.rstrip('km')) * multiplier
+    except ValueError:
+        raise ValueError(f"Invalid capture size: {text}")
+    if count < 1:
+        raise ValueError(f"Invalid capture size: {text}")
+    return count
+
+
+def _ip(address):
+    return bytes(int(part) for part in address.split('.'))
+
+
+def _mac(address):
+    return b'\x02\x00' + address
+
+
+def _ipv4_frame(src, dst, proto, payload):
+    header = _IPV4.pack(0x45, 0, 20 + len(payload), 0, 0x4000, 64, proto, 0, src, dst)
+    return _ETHER.pack(_mac(dst), _mac(src), ETHERTYPE_IPV4) + header + payload
+
+
+def _tcp(src, dst, sport, dport, flags, seq=0, ack=0, payload=b''):
+    segment = _TCP.pack(sport, dport, seq, ack, 5 << 4, flags, 65535, 0, 0) + payload
+    return _ipv4_frame(src, dst, 6, segment)
+
+
+def _udp(src, dst, sport, dport, payload):
+    return _ipv4_frame(src, dst, 17, _UDP.pack(sport, dport, 8 + len(payload), 0) + payload)
+
+
+def _dns_name(name):
+    return b''.join(bytes([len(label)]) + label.encode('ascii') for label in name.split('.')) + b'\x00'
+
+
+class SyntheticTraffic:
+    """Packet generator for one seed; ``frames(count)`` yields (microseconds, frame)"""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        rng = self.rng
+        self.clients = [_ip(f'10.{rng.randrange(4)}.{rng.randrange(16)}.{rng.randrange(1, 255)}')
+                        for _ in range(2000)]
+        self.servers = [_ip(f'172.16.{rng.randrange(4)}.{rng.randrange(1, 255)}') for _ in range(100)]
+        self.resolvers = [_ip(address) for address in RESOLVERS]
+        self.domains = [f'host{i}.example{i % 37}.{("com", "org", "net")[i % 3]}' for i in range(500)]
+        self.scenarios = [name for name, weight in MIX for _ in range(weight)]
+        self.time = BASE_TIME * 1_000_000
+        self.mean_gap = 1_000_000 / PACKET_RATE
+
+    def frames(self, count):
+        emitted = 0
+        while emitted < count:
+            for frame in getattr(self, self.rng.choice(self.scenarios))():
+                self.time += int(self.rng.expovariate(1) * self.mean_gap) + 1
+                yield self.time, frame
+                emitted += 1
+                if emitted == count:
+                    return
+
+    def client(self):
+        return self.rng.choice(self.clients)
+
+    def ephemeral_port(self):
+        return self.rng.randrange(32768, 61000)
+
+    def tcp_session(self):
+        rng = self.rng
+        client, server = self.client(), rng.choice(self.servers)
+        sport, dport = self.ephemeral_port(), rng.choice(SERVICE_PORTS)
+        seq, ack = rng.getrandbits(32), rng.getrandbits(32)
+        frames = [_tcp(client, server, sport, dport, TCP_SYN, seq)]
+        if rng.random() < 0.1:
+            frames.append(_tcp(server, client, dport, sport, TCP_RST | TCP_ACK, 0, seq + 1))
+            return frames
+        frames.append(_tcp(server, client, dport, sport, TCP_SYN | TCP_ACK, ack, seq + 1))
+        frames.append(_tcp(client, server, sport, dport, TCP_ACK, seq + 1, ack + 1))
+        for _ in range(rng.randrange(1, 8)):
+            size = rng.randrange(40, 1400)
+            frames.append(_tcp(client, server, sport, dport, TCP_PSH | TCP_ACK, seq + 1, ack + 1, b'\x00' * size))
+            seq += size
+            frames.append(_tcp(server, client, dport, sport, TCP_ACK, ack + 1, seq + 1))
+        frames.append(_tcp(client, server, sport, dport, TCP_FIN | TCP_ACK, seq + 1, ack + 1))
+        frames.append(_tcp(server, client, dport, sport, TCP_FIN | TCP_ACK, ack + 1, seq + 2))
+        frames.append(_tcp(client, server, sport, dport, TCP_ACK, seq + 2, ack + 2))
+        return frames
+
+    def udp(self):
+        rng = self.rng
+        client, server = self.client(), rng.choice(self.servers)
+        sport, dport = self.ephemeral_port(), rng.choice(UDP_PORTS)
+        return [_udp(client, server, sport, dport, b'\x00' * rng.randrange(20, 500))
+                for _ in range(rng.randrange(1, 4))]
+
+    def dns(self):
+        rng = self.rng
+        client, resolver = self.client(), rng.choice(self.resolvers)
+        sport, txid = self.ephemeral_port(), rng.getrandbits(16)
+        question = _dns_name(rng.choice(self.domains)) + b'\x00\x01\x00\x01'
+        frames = [_udp(client, resolver, sport, 53, _DNS.pack(txid, 0x0100, 1, 0, 0, 0) + question)]
+        outcome = rng.random()
+        if outcome < 0.02:
+            return frames  # unanswered
+        if outcome < 0.07:
+            answer = _DNS.pack(txid, 0x8183, 1, 0, 0, 0) + question  # NXDOMAIN
+        elif outcome < 0.08:
+            answer = _DNS.pack(txid, 0x8182, 1, 0, 0, 0) + question  # SERVFAIL
+        else:
+            record = _DNS_ANSWER.pack(0xc00c, 1, 1, 300, 4, rng.choice(self.servers))
+            answer = _DNS.pack(txid, 0x8180, 1, 1, 0, 0) + question + record
+        frames.append(_udp(resolver, client, 53, sport, answer))
+        return frames
+
+    def icmp(self):
+        rng = self.rng
+        client, server = self.client(), rng.choice(self.servers)
+        ident = rng.getrandbits(16)
+        frames = []
+        for sequence in range(rng.randrange(1, 4)):
+            frames.append(_ipv4_frame(client, server, 1, _ICMP.pack(8, 0, 0, ident, sequence) + b'\x00' * 56))
+            frames.append(_ipv4_frame(server, client, 1, _ICMP.pack(0, 0, 0, ident, sequence) + b'\x00' * 56))
+        return frames
+
+    def arp(self):
+        sender, target = self.client(), self.client()
+        body = struct.pack('!HHBBH6s4s6s4s', 1, ETHERTYPE_IPV4, 6, 4, 1, _mac(sender), sender, b'\x00' * 6, target)
+        return [_ETHER.pack(b'\xff' * 6, _mac(sender), ETHERTYPE_ARP) + body]
+
+    def port_scan(self):
+        rng = self.rng
+        scanner = _ip(f'192.168.66.{rng.randrange(1, 255)}')
+        target = rng.choice(self.servers)
+        sport = self.ephemeral_port()
+        first = rng.randrange(1, 60000)
+        frames = []
+        for port in range(first, first + rng.randrange(20, 100)):
+            frames.append(_tcp(scanner, target, sport, port, TCP_SYN))
+            frames.append(_tcp(target, scanner, port, sport, TCP_RST | TCP_ACK))
+        return frames
+
+    def syn_flood(self):
+        rng = self.rng
+        target = rng.choice(self.servers)
+        return [_tcp(_ip(f'{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}'),
+                     target, self.ephemeral_port(), 80, TCP_SYN, rng.getrandbits(32))
+                for _ in range(rng.randrange(100, 400))]
+
+
+def write_capture(path, count, seed=0):
+    """Write a synthetic capture of exactly ``count`` packets; returns ``path``"""
+    with open(path, 'wb') as f:
+        f.write(_PCAP_HEADER.pack(0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+        chunk = []
+        for timestamp, frame in SyntheticTraffic(seed).frames(count):
+            seconds, micros = divmod(timestamp, 1_000_000)
+            chunk.append(_RECORD_HEADER.pack(seconds, micros, len(frame), len(frame)))
+            chunk.append(frame)
+            if len(chunk) >= 20000:
+                f.write(b''.join(chunk))
+                chunk = []
+        f.write(b''.join(chunk))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a deterministic synthetic pcap capture')
+    parser.add_argument('size', help='packet count, e.g. 10k, 1m, 10m or 2500')
+    parser.add_argument('path', help='pcap file to write')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    count = parse_size(args.size)
+    write_capture(args.path, count, args.seed)
+    print(f"Wrote {count} packets to {args.path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+import copy
+from collections import OrderedDict
+
+# Flag classes whose first occurrence is tracked per direction of a flow
+SYN, SYN_ACK, ACK, FIN, RST = range(5)
+
+# Handshake states, in the order a connection moves through them
+MIDSTREAM = 'MIDSTREAM'
+SYN_SENT = 'SYN_SENT'
+SYN_RECEIVED = 'SYN_RECEIVED'
+ESTABLISHED = 'ESTABLISHED'
+CLOSING = 'CLOSING'
+CLOSED = 'CLOSED'
+RESET = 'RESET'
+
+
+def flow_key(src, sport, dst, dport):
+    """Canonical key shared by both directions of a TCP connection
+
+    Returns (key, direction) where direction is 0 when the packet travels
+    from the lower to the higher (address, port) endpoint.
+    """
+    if (src, sport) <= (dst, dport):
+        return (src, sport, dst, dport), 0
+    return (dst, dport, src, sport), 1
+
+
+def flag_classes(flags):
+    """Flag classes a TCP flags value counts towards"""
+    classes = []
+    if flags & 0x02:
+        classes.append(SYN_ACK if flags & 0x10 else SYN)
+    elif flags & 0x10:
+        classes.append(ACK)
+    if flags & 0x01:
+        classes.append(FIN)
+    if flags & 0x04:
+        classes.append(RST)
+    return classes
+
+
+class RunningStats:
+    """Count, min, max and mean of a stream of values in constant memory"""
+    __slots__ = ('count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.count:
+            self.count += other.count
+            self.total += other.total
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def result(self, scale=1, digits=3):
+        if not self.count:
+            return {'count': 0, 'min': 0, 'avg': 0, 'max': 0}
+        return {
+            'count': self.count,
+            'min': round(self.min * scale, digits),
+            'avg': round(self.total / self.count * scale, digits),
+            'max': round(self.max * scale, digits)
+        }
+
+
+class TcpFlow:
+    """Both directions of one TCP connection
+
+    Only the first time each flag class was seen in each direction is kept
+    (``firsts[flag_class * 2 + direction]``). The handshake state is derived
+    from those timestamps, which makes two partial views of a flow from
+    consecutive chunks of a capture merge exactly.
+    """
+    __slots__ = ('first_seen', 'last_seen', 'first_direction', 'packets', 'bytes', 'firsts', 'state')
+
+    def __init__(self, time, direction):
+        self.first_seen = time
+        self.last_seen = time
+        self.first_direction = direction
+        self.packets = 0
+        self.bytes = 0
+        self.firsts = [None] * 10
+        self.state = MIDSTREAM
+
+    def add(self, time, direction, flags, length):
+        self.last_seen = time
+        self.packets += 1
+        self.bytes += length
+        changed = False
+        for flag_class in flag_classes(flags):
+            slot = flag_class * 2 + direction
+            if self.firsts[slot] is None:
+                self.firsts[slot] = time
+                changed = True
+        if changed:
+            self.state = self._derive_state()
+
+    def merge(self, later):
+        """Fold in the same flow as seen by a later chunk of the capture"""
+        self.last_seen = later.last_seen
+        self.packets += later.packets
+        self.bytes += later.bytes
+        for slot, time in enumerate(later.firsts):
+            if self.firsts[slot] is None:
+                self.firsts[slot] = time
+        self.state = self._derive_state()
+
+    def _first(self, flag_class, direction):
+        return self.firsts[flag_class * 2 + direction]
+
+    def client_direction(self):
+        """Direction the connection was opened from"""
+        syns = [self._first(SYN, 0), self._first(SYN, 1)]
+        if syns[0] is not None or syns[1] is not None:
+            if syns[1] is None or (syns[0] is not None and syns[0] <= syns[1]):
+                return 0
+            return 1
+        for direction in (0, 1):
+            if self._first(SYN_ACK, direction) is not None:
+                return 1 - direction
+        return self.first_direction
+
+    def handshake(self):
+        """(syn, syn_ack, ack) times of the client's handshake, None where missing"""
+        client = self.client_direction()
+        syn = self._first(SYN, client)
+        syn_ack = self._first(SYN_ACK, 1 - client)
+        if syn is None or syn_ack is None or syn_ack < syn:
+            return syn, None, None
+        ack = self._first(ACK, client)
+        return syn, syn_ack, ack if ack is not None and ack >= syn_ack else None
+
+    def _derive_state(self):
+        if self._first(RST, 0) is not None or self._first(RST, 1) is not None:
+            return RESET
+        fins = (self._first(FIN, 0) is not None) + (self._first(FIN, 1) is not None)
+        if fins == 2:
+            return CLOSED
+        if fins:
+            return CLOSING
+        syn, syn_ack, ack = self.handshake()
+        if ack is not None:
+            return ESTABLISHED
+        if syn_ack is not None:
+            return SYN_RECEIVED
+        if syn is not None:
+            return SYN_SENT
+        return MIDSTREAM
+
+
+class FlowTable:
+    """Bidirectional TCP flow table with bounded memory
+
+    Flows are keyed by their canonical 4-tuple and kept in least recently
+    used order. A flow idle for longer than ``idle_timeout`` seconds is
+    finished when its next packet arrives or by the periodic sweep; when more
+    than ``max_flows`` are open the least recently used ones are evicted.
+    Finished flows only survive as counters and running stats, so hostile
+    captures (SYN floods, scans) cost at most ``max_flows`` flow records.
+
+    Tables built over consecutive chunks of a capture combine with ``merge``.
+    A flow that times out within the first ``idle_timeout`` seconds of a
+    chunk may continue one from the previous chunk, so it is held in
+    ``heads`` until then; the merged result matches a serial run unless
+    flows were evicted for ``max_flows``.
+    """
+    idle_timeout = 300.0
+    max_flows = 100000
+    sweep_interval = 4096
+
+    def __init__(self):
+        self.flows = OrderedDict()
+        self.total_packets = 0
+        self.first_time = None
+        self.latest_time = None
+        self.heads = {}
+        self.pending_sweep = self.sweep_interval
+        self.total_flows = 0
+        self.attempts = 0
+        self.successful = 0
+        self.established = 0
+        self.refused = 0
+        self.resets = 0
+        self.midstream = 0
+        self.expired_flows = 0
+        self.evicted_flows = 0
+        self.durations = RunningStats()
+        self.handshake_rtts = RunningStats()
+
+    def add(self, time, src, sport, dst, dport, flags, length):
+        self.total_packets += 1
+        if self.first_time is None:
+            self.first_time = time
+        if self.latest_time is None or time > self.latest_time:
+            self.latest_time = time
+
+        key, direction = flow_key(src, sport, dst, dport)
+        flow = self.flows.get(key)
+        if flow is not None and time - flow.last_seen > self.idle_timeout:
+            self._expire(key, self.flows.pop(key))
+            flow = None
+        if flow is None:
+            flow = self.flows[key] = TcpFlow(time, direction)
+            if len(self.flows) > self.max_flows:
+                self._make_room()
+        else:
+            self.flows.move_to_end(key)
+        flow.add(time, direction, flags, length)
+
+        self.pending_sweep -= 1
+        if not self.pending_sweep:
+            self.pending_sweep = self.sweep_interval
+            self.sweep()
+
+    def sweep(self, now=None):
+        """Finish every flow idle for longer than idle_timeout"""
+        now = self.latest_time if now is None else now
+        if now is None:
+            return
+        while self.flows:
+            key, flow = next(iter(self.flows.items()))
+            if now - flow.last_seen <= self.idle_timeout:
+                break
+            del self.flows[key]
+            self._expire(key, flow)
+
+    def _expire(self, key, flow):
+        if (flow.first_seen - self.first_time <= self.idle_timeout and key not in self.heads
+                and len(self.heads) < self.max_flows):
+            self.heads[key] = flow
+        else:
+            self._finish(flow)
+            self.expired_flows += 1
+
+    def _make_room(self):
+        self.sweep()
+        while len(self.flows) > self.max_flows:
+            _, flow = self.flows.popitem(last=False)
+            self._finish(flow)
+            self.evicted_flows += 1
+
+    def _finish(self, flow):
+        self.total_flows += 1
+        if flow.state == MIDSTREAM:
+            self.midstream += 1
+        if flow.state == RESET:
+            self.resets += 1
+
+        syn, syn_ack, ack = flow.handshake()
+        if syn is not None:
+            self.attempts += 1
+            if syn_ack is not None:
+                self.successful += 1
+                self.handshake_rtts.add(syn_ack - syn)
+                self.durations.add(flow.last_seen - syn)
+            elif flow.state == RESET:
+                self.refused += 1
+        if ack is not None:
+            self.established += 1
+
+    def merge(self, other):
+        """Combine with the table of the chunk of the capture that follows"""
+        self.total_packets += other.total_packets
+        for name in ('total_flows', 'attempts', 'successful', 'established', 'refused',
+                     'resets', 'midstream', 'expired_flows', 'evicted_flows'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.durations.merge(other.durations)
+        self.handshake_rtts.merge(other.handshake_rtts)
+        if self.first_time is None:
+            self.first_time = other.first_time
+
+        for key, head in other.heads.items():
+            flow = self.flows.pop(key, None)
+            if flow is not None and head.first_seen - flow.last_seen <= self.idle_timeout:
+                flow.merge(head)
+                head = flow
+            elif flow is not None:
+                self._expire(key, flow)
+            self._expire(key, head)
+
+        for key, later in other.flows.items():
+            flow = self.flows.pop(key, None)
+            if flow is not None and later.first_seen - flow.last_seen > self.idle_timeout:
+                self._expire(key, flow)
+                flow = None
+            if flow is None:
+                self.flows[key] = later
+            else:
+                flow.merge(later)
+                self.flows[key] = flow
+        if other.latest_time is not None and (self.latest_time is None or other.latest_time > self.latest_time):
+            self.latest_time = other.latest_time
+        if len(self.flows) > self.max_flows:
+            self._make_room()
+
+    def view(self):
+        """Copy whose result() leaves the flows of this table open, for a capture still growing"""
+        table = copy.copy(self)
+        table.flows = OrderedDict(self.flows)
+        table.heads = dict(self.heads)
+        table.durations = copy.copy(self.durations)
+        table.handshake_rtts = copy.copy(self.handshake_rtts)
+        return table
+
+    def result(self):
+        """tcp_analysis section; finishes the flows still open at the end of the capture"""
+        if not self.total_packets:
+            return {'total_connections': 0, 'success_rate': 0, 'failed_connections': 0}
+
+        self.sweep()
+        for flow in self.heads.values():
+            self._finish(flow)
+            self.expired_flows += 1
+        self.heads.clear()
+        open_flows = sum(1 for flow in self.flows.values() if flow.state not in (CLOSED, RESET))
+        for flow in self.flows.values():
+            self._finish(flow)
+        self.flows.clear()
+
+        success_rate = (self.successful / self.attempts * 100) if self.attempts > 0 else 0
+        return {
+            'total_connections': self.total_flows,
+            'successful_connections': self.successful,
+            'failed_connections': self.attempts - self.successful,
+            'success_rate': round(success_rate, 2),
+            'total_tcp_packets': self.total_packets,
+            'established_connections': self.established,
+            'refused_connections': self.refused,
+            'reset_connections': self.resets,
+            'midstream_connections': self.midstream,
+            'open_connections': open_flows,
+            'connection_duration': self.durations.result(),
+            'handshake_rtt_ms': self.handshake_rtts.result(scale=1000),
+            'flow_table': {
+                'max_flows': self.max_flows,
+                'idle_timeout': self.idle_timeout,
+                'expired_flows': self.expired_flows,
+                'evicted_flows': self.evicted_flows
+            }
+        }
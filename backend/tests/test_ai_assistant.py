@@ -1,5 +1,6 @@
 import unittest
-from ai_assistant import AIAssistant
+from unittest.mock import patch
+from ai_assistant import AIAssistant, LocalBackend, LRUCache, make_backend
 
 class TestAIAssistant(unittest.TestCase):
     def setUp(self):
@@ -31,5 +32,66 @@ class TestAIAssistant(unittest.TestCase):
         self.assertIn('analyze', response.lower())
         self.assertIn('traffic', response.lower())
 
+    def test_context_and_response_caches(self):
+        """Test contexts are built once per analysis key and repeated questions are cached"""
+        assistant = AIAssistant(LocalBackend())
+        analysis_data = {'basic_stats': {'total_packets': 1000}}
+        with patch.object(assistant, '_prepare_context', wraps=assistant._prepare_context) as prepare:
+            first = assistant.process_query('What protocols?', analysis_data, ('a1', 1))
+            second = assistant.process_query('What protocols?', analysis_data, ('a1', 1))
+            third = assistant.process_query('Any threats?', analysis_data, ('a1', 1))
+            assistant.process_query('Any threats?', analysis_data, ('a1', 2))
+            self.assertEqual(prepare.call_count, 2)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertEqual((assistant.responses.hits, len(assistant.responses)), (1, 3))
+
+        # Without a key nothing is cached
+        assistant.process_query('What protocols?', analysis_data)
+        self.assertEqual(len(assistant.responses), 3)
+
+    def test_context_for_question(self):
+        """Test the context holds only the question's sections within the budget, cached per section set"""
+        assistant = AIAssistant(LocalBackend(), context_tokens=200)
+        analysis_data = {
+            'basic_stats': {'total_packets': 1000},
+            'anomalies': [{'type': 'SYN Flood', 'severity': 'High', 'description': 'x' * 100}] * 50,
+            'dns_analysis': {'total_queries': 10, 'top_domains': []}
+        }
+        context, usage = assistant.context_for('Any attacks?', analysis_data, ('a1', 1))
+        self.assertIn('Detected Anomalies', context)
+        self.assertNotIn('DNS Analysis', context)
+        self.assertLessEqual(usage['used'], 200)
+        self.assertIs(assistant.context_for('Any threats?', analysis_data, ('a1', 1))[1], usage)
+        self.assertIn('DNS Analysis', assistant.context_for('Top domains?', analysis_data, ('a1', 1))[0])
+        self.assertEqual(assistant.context_usage('Any attacks?', analysis_data, ('a1', 1)), usage)
+
+    def test_stream_query(self):
+        """Test answers are streamed in chunks and backend errors are reported, not cached"""
+        assistant = AIAssistant(LocalBackend())
+        chunks = list(assistant.stream_query('How many packets?', {}, ('a1', 1)))
+        self.assertGreater(len(chunks), 1)
+        self.assertIn('How many packets?', ''.join(chunks))
+
+        with patch.object(assistant.backend, 'stream', side_effect=RuntimeError('offline')):
+            response = assistant.process_query('Other question', {}, ('a1', 1))
+        self.assertIn('AI processing error: offline', response)
+        self.assertEqual(len(assistant.responses), 1)
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+
+    def test_make_backend(self):
+        self.assertIsInstance(make_backend('local'), LocalBackend)
+        self.assertIsNone(make_backend('fallback'))
+        with self.assertRaises(ValueError):
+            make_backend('gpt-9')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import unittest
+from ai_context import (
+    LIST_LIMITS, build_context, estimate_tokens, relevant_sections, shrink, summarize_anomalies
+)
+
+
+def noisy_analysis(anomalies=2000):
+    """Analysis whose anomaly list alone is far over any sensible budget"""
+    severities = ['Low', 'Medium', 'High']
+    return {
+        'basic_stats': {'total_packets': 50000, 'total_bytes': 4000000, 'duration_seconds': 60.0},
+        'protocol_distribution': {'TCP': {'count': 40000, 'percentage': 80.0},
+                                  'UDP': {'count': 10000, 'percentage': 20.0}},
+        'anomalies': [{'type': f'Rule {i % 7}', 'severity': severities[i % 3],
+                       'description': f'IP 10.0.{i // 250}.{i % 250} tripped rule {i % 7}',
+                       'window': {'start': i, 'end': i + 1}} for i in range(anomalies)],
+        'tcp_analysis': {'total_connections': 900, 'success_rate': 91.5,
+                         'handshake_rtt_ms': {'count': 820, 'avg': 12.5}},
+        'dns_analysis': {'total_queries': 300, 'nxdomain_rate': 4.2,
+                         'top_domains': [{'domain': f'host{i}.example.com', 'count': 30 - i} for i in range(10)]},
+        'ip_conversations': [{'endpoints': f'10.0.0.{i} ↔ 10.0.1.{i}', 'packets': 100 - i} for i in range(10)],
+    }
+
+
+class TestAIContext(unittest.TestCase):
+    def test_relevant_sections(self):
+        """Test questions pick their sections after basic stats, and general questions get all"""
+        analysis = noisy_analysis(10)
+        self.assertEqual(relevant_sections(analysis, 'Are there any threats?'), ('basic_stats', 'anomalies'))
+        self.assertEqual(relevant_sections(analysis, 'Which domains failed to resolve?'),
+                         ('basic_stats', 'tcp_analysis', 'dns_analysis'))
+        self.assertEqual(relevant_sections(analysis, 'Summarize this capture'),
+                         ('basic_stats', 'anomalies', 'protocol_distribution', 'tcp_analysis',
+                          'dns_analysis', 'ip_conversations'))
+        self.assertEqual(relevant_sections({'basic_stats': {}}, 'Any threats?'), ('basic_stats',))
+
+    def test_anomaly_summary(self):
+        """Test anomalies are counted and ranked most severe first"""
+        summary = summarize_anomalies(noisy_analysis(9)['anomalies'])
+        self.assertEqual(summary['total'], 9)
+        self.assertEqual(summary['by_severity'], {'High': 3, 'Medium': 3, 'Low': 3})
+        self.assertEqual([anomaly['severity'] for anomaly in summary['top'][:4]], ['High', 'High', 'High', 'Medium'])
+        self.assertNotIn('window', summary['top'][0])
+
+    def test_shrink(self):
+        value = {'top': [1, 2, 3], 'nested': {'items': [[1, 2, 3]]}, 'count': 3}
+        self.assertEqual(shrink(value, 2), {'top': [1, 2, '... 1 more'], 'nested': {'items': [[1, 2, '... 1 more']]},
+                                            'count': 3})
+        self.assertEqual(shrink(value, 0), {'top': 3, 'nested': {'items': 1}, 'count': 3})
+
+    def test_fits_budget(self):
+        """Test a noisy analysis is shrunk to the budget, least relevant section first"""
+        analysis = noisy_analysis()
+        sections = relevant_sections(analysis)
+        context, usage = build_context(analysis, sections, 600)
+        self.assertLessEqual(usage['used'], 600)
+        self.assertEqual(usage['used'], estimate_tokens(context))
+        self.assertIn('"total":2000', context)
+        limits = [section['list_limit'] for section in usage['sections']]
+        self.assertEqual(limits, sorted(limits, reverse=True))
+        self.assertEqual(usage['dropped'], [])
+
+        context, usage = build_context(analysis, sections, 1000000)
+        self.assertEqual({section['list_limit'] for section in usage['sections']}, {LIST_LIMITS[0]})
+
+    def test_drops_least_relevant_sections(self):
+        """Test sections are dropped from the least relevant once fully shrunk, keeping the first"""
+        analysis = noisy_analysis()
+        sections = relevant_sections(analysis)
+        context, usage = build_context(analysis, sections, 120)
+        self.assertLessEqual(usage['used'], 120)
+        self.assertEqual(usage['dropped'][0], 'ip_conversations')
+        self.assertEqual(usage['sections'][0]['section'], 'basic_stats')
+        # Only the last kept section gives up detail; the more relevant ones are left whole
+        self.assertEqual({section['list_limit'] for section in usage['sections'][:-1]}, {LIST_LIMITS[0]})
+
+        context, usage = build_context(analysis, sections, 300)
+        self.assertEqual(usage['dropped'],
+                         ['ip_conversations', 'dns_analysis', 'tcp_analysis', 'protocol_distribution'])
+        self.assertEqual([section['list_limit'] for section in usage['sections']], [LIST_LIMITS[0]] * 2)
+
+        context, usage = build_context(analysis, sections, 1)
+        self.assertEqual([section['section'] for section in usage['sections']], ['basic_stats'])
+        self.assertTrue(context.startswith('Basic Statistics: '))
+
+    def test_empty(self):
+        self.assertEqual(build_context({}, (), 100), ('', {'budget': 100, 'used': 0, 'sections': [], 'dropped': []}))
+
+
+if __name__ == '__main__':
+    unittest.main()
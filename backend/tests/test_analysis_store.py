@@ -0,0 +1,145 @@
+import unittest
+import json
+import os
+import sqlite3
+import tempfile
+from analysis_store import MemoryAnalysisStore, SQLiteAnalysisStore, estimate_size
+from sections import analysis_summary
+
+
+class StoreTests:
+    """Behaviour shared by every analysis store"""
+
+    def test_put_and_get(self):
+        """Test analyses are returned by id"""
+        analysis_id = self.store.put('sample.pcap', {'total_packets': 3})
+        self.assertEqual(self.store.get(analysis_id), {
+            'analysis_id': analysis_id,
+            'filename': 'sample.pcap',
+            'analysis': {'total_packets': 3},
+            'capture_hash': None
+        })
+        self.assertIsNone(self.store.get('missing'))
+
+    def test_capture_hash(self):
+        """Test the capture hash is kept with the analysis"""
+        analysis_id = self.store.put('sample.pcap', {}, 'abc123')
+        self.assertEqual(self.store.get(analysis_id)['capture_hash'], 'abc123')
+
+    def test_latest(self):
+        """Test the most recently stored analysis is the latest"""
+        self.assertIsNone(self.store.latest())
+        self.store.put('first.pcap', {})
+        second_id = self.store.put('second.pcap', {})
+        self.assertEqual(self.store.latest()['analysis_id'], second_id)
+
+    def test_partial_get_and_summary(self):
+        """Test only the requested keys are returned and the summary is served on its own"""
+        analysis = {'total_packets': 3, 'basic_stats': {'total_bytes': 180},
+                    'anomalies': [{'type': 'Port Scan', 'severity': 'High'}]}
+        analysis_id = self.store.put('sample.pcap', analysis)
+        self.assertEqual(self.store.get(analysis_id, ('anomalies', 'missing'))['analysis'],
+                         {'anomalies': analysis['anomalies']})
+        self.assertEqual(self.store.get(analysis_id, ())['analysis'], {})
+        self.assertEqual(self.store.latest(('total_packets',))['analysis'], {'total_packets': 3})
+
+        stored = self.store.get_summary(analysis_id)
+        self.assertEqual(stored['filename'], 'sample.pcap')
+        self.assertNotIn('analysis', stored)
+        self.assertEqual(stored['summary'], analysis_summary(analysis))
+        self.assertEqual(self.store.latest_summary(), stored)
+        self.assertIsNone(self.store.get_summary('missing'))
+
+    def test_statuses(self):
+        """Test job statuses are replaced by newer ones and keep a pending stop request"""
+        self.assertIsNone(self.store.get_status('job', 'abc'))
+        self.assertFalse(self.store.request_stop('job', 'abc'))
+
+        self.store.put_status('job', 'abc', {'status': 'queued'})
+        self.assertFalse(self.store.stop_requested('job', 'abc'))
+        self.assertTrue(self.store.request_stop('job', 'abc'))
+        self.store.put_status('job', 'abc', {'status': 'running'})
+        self.assertEqual(self.store.get_status('job', 'abc'), {'status': 'running'})
+        self.assertTrue(self.store.stop_requested('job', 'abc'))
+        self.assertIsNone(self.store.get_status('live', 'abc'))
+
+
+class TestEstimateSize(unittest.TestCase):
+    def test_close_to_json_length(self):
+        """Test estimates stay near the JSON length, for sampled long lists too"""
+        for analysis in ({'data': 'x' * 100},
+                         {'rows': [{'src': f'10.0.{i // 256}.{i % 256}', 'packets': i} for i in range(5000)]}):
+            actual = len(json.dumps(analysis))
+            self.assertLess(abs(estimate_size(analysis) - actual), actual * 0.25)
+
+
+class TestMemoryAnalysisStore(StoreTests, unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryAnalysisStore()
+
+    def test_memory_cap(self):
+        """Test least recently used analyses are evicted beyond max_bytes"""
+        analysis = {'data': 'x' * 100}
+        self.store.max_bytes = 250
+        first_id = self.store.put('first.pcap', analysis)
+        second_id = self.store.put('second.pcap', analysis)
+        self.store.get(first_id)
+        third_id = self.store.put('third.pcap', analysis)
+
+        self.assertIsNone(self.store.get(second_id))
+        self.assertIsNotNone(self.store.get(first_id))
+        self.assertIsNotNone(self.store.get(third_id))
+
+    def test_oversized_analysis_is_kept(self):
+        """Test a single analysis larger than the cap is still stored"""
+        self.store.max_bytes = 10
+        analysis_id = self.store.put('big.pcap', {'data': 'x' * 100})
+        self.assertIsNotNone(self.store.get(analysis_id))
+
+
+class TestSQLiteAnalysisStore(StoreTests, unittest.TestCase):
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            self.db_path = tmp.name
+        self.store = SQLiteAnalysisStore(self.db_path)
+
+    def tearDown(self):
+        os.unlink(self.db_path)
+
+    def test_shared_between_instances(self):
+        """Test analyses are visible to other stores on the same database"""
+        analysis_id = self.store.put('sample.pcap', {'total_packets': 3})
+        other = SQLiteAnalysisStore(self.db_path)
+        self.assertEqual(other.get(analysis_id)['analysis'], {'total_packets': 3})
+
+        self.store.put_status('live', 'abc', {'status': 'running'})
+        self.assertTrue(other.request_stop('live', 'abc'))
+        self.assertTrue(self.store.stop_requested('live', 'abc'))
+
+    def test_whole_analyses_of_older_versions(self):
+        """Test analyses stored whole in an older database are still read"""
+        os.unlink(self.db_path)
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute('CREATE TABLE analyses (id TEXT PRIMARY KEY, filename TEXT, analysis TEXT, '
+                         'capture_hash TEXT, created_at REAL, accessed_at REAL)')
+            conn.execute("INSERT INTO analyses VALUES ('old', 'old.pcap', '{\"total_packets\": 3}', NULL, 1, 1)")
+        conn.close()
+
+        store = SQLiteAnalysisStore(self.db_path)
+        self.assertEqual(store.get('old')['analysis'], {'total_packets': 3})
+        self.assertEqual(store.get('old', ())['analysis'], {})
+        self.assertEqual(store.get_summary('old')['summary']['total_packets'], 3)
+
+    def test_max_entries(self):
+        """Test the least recently read analyses are deleted beyond max_entries"""
+        self.store.max_entries = 2
+        first_id = self.store.put('first.pcap', {})
+        second_id = self.store.put('second.pcap', {})
+        self.store.get(first_id)
+        self.store.put('third.pcap', {})
+        self.assertIsNone(self.store.get(second_id))
+        self.assertIsNotNone(self.store.get(first_id))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import random
+import unittest
+from anomaly_engine import (AnomalyEngine, WindowRule, PortScanBurstRule, SynFloodRule,
+                            DnsQueryBurstRule, TrafficSpikeRule)
+from packet_record import PacketRecord, LAYER_IP, LAYER_TCP, LAYER_UDP, LAYER_DNS
+
+
+class SmallPortScan(PortScanBurstRule):
+    window = 5
+    threshold = 3
+
+
+class SmallSynFlood(SynFloodRule):
+    window = 3
+    threshold = 4
+
+
+class SmallDnsBurst(DnsQueryBurstRule):
+    window = 7
+    threshold = 5
+
+
+class SmallSpike(TrafficSpikeRule):
+    min_packets = 3
+    warmup = 2
+
+
+SMALL_RULES = (SmallPortScan, SmallSynFlood, SmallDnsBurst, SmallSpike)
+
+
+def tcp(time, src, dst, dport, flags=0x02):
+    return PacketRecord(time, 60, LAYER_IP | LAYER_TCP, src, dst, 40000, dport, flags, None, None)
+
+
+def dns(time, src, qr=0):
+    return PacketRecord(time, 70, LAYER_IP | LAYER_UDP | LAYER_DNS, src, '10.0.0.53', 5353, 53, 0, qr, 'a.test')
+
+
+def run(records, rules=SMALL_RULES):
+    engine = AnomalyEngine(rules)
+    for record in records:
+        engine.add(record)
+    return engine.result()
+
+
+def random_stream(rng):
+    time = rng.uniform(0, 5)
+    records = []
+    for _ in range(rng.randint(0, 300)):
+        time += rng.choice([0, 0.01, 0.05, 0.2, 1, 6]) * rng.random()
+        src = rng.choice(['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+        if rng.random() < 0.5:
+            dst = rng.choice(['10.0.1.1', '10.0.1.2'])
+            records.append(tcp(time, src, dst, rng.randint(1, 12), rng.choice([0x02, 0x12, 0x10])))
+        else:
+            records.append(dns(time, src, rng.choice([0, 1])))
+    return records
+
+
+class TestAnomalyEngine(unittest.TestCase):
+    def test_port_scan_burst_window(self):
+        """Test a port scan is reported with the window it happened in"""
+        records = [tcp(100 + i * 0.1, '10.0.0.9', '10.0.0.2', 1000 + i) for i in range(5)]
+        records.append(tcp(200, '10.0.0.9', '10.0.0.2', 2000))
+        anomalies = run(records, (SmallPortScan,))
+        self.assertEqual(len(anomalies), 1)
+        self.assertEqual(anomalies[0]['type'], 'Port Scan Burst')
+        self.assertEqual(anomalies[0]['source_ip'], '10.0.0.9')
+        self.assertEqual(anomalies[0]['window'], {'start': 100, 'end': 101})
+
+    def test_slow_scan_stays_below_threshold(self):
+        """Test ports spread wider than the window do not alert"""
+        records = [tcp(i * 10, '10.0.0.9', '10.0.0.2', 1000 + i) for i in range(20)]
+        self.assertEqual(run(records, (SmallPortScan,)), [])
+
+    def test_syn_flood_reports_target(self):
+        """Test a SYN flood is keyed by target and ignores SYN-ACKs"""
+        records = [tcp(50 + i * 0.2, f'10.9.0.{i}', '10.0.0.2', 80) for i in range(10)]
+        records += [tcp(50 + i * 0.2, '10.0.0.2', '10.0.0.7', 40000, 0x12) for i in range(10)]
+        records.sort()
+        anomalies = run(records, (SmallSynFlood,))
+        self.assertEqual(len(anomalies), 1)
+        self.assertEqual(anomalies[0]['target_ip'], '10.0.0.2')
+        self.assertEqual(anomalies[0]['severity'], 'High')
+        self.assertEqual(anomalies[0]['window'], {'start': 50, 'end': 52})
+
+    def test_dns_burst_counts_only_queries(self):
+        """Test DNS responses do not count towards a query burst"""
+        responses = [dns(10 + i * 0.1, '10.0.0.1', qr=1) for i in range(10)]
+        self.assertEqual(run(responses, (SmallDnsBurst,)), [])
+        queries = [dns(10 + i * 0.1, '10.0.0.1') for i in range(10)]
+        self.assertEqual(run(queries, (SmallDnsBurst,))[0]['type'], 'DNS Query Burst')
+
+    def test_traffic_spike_against_baseline(self):
+        """Test a burst well above the EWMA baseline is reported once"""
+        records = [tcp(second, '10.0.0.1', '10.0.0.2', 443, 0x10) for second in range(20)]
+        records += [tcp(20.5, '10.0.0.1', '10.0.0.2', 443, 0x10)] * 10
+        records += [tcp(second, '10.0.0.1', '10.0.0.2', 443, 0x10) for second in range(21, 30)]
+        anomalies = run(records, (SmallSpike,))
+        self.assertEqual(len(anomalies), 1)
+        self.assertEqual(anomalies[0]['window'], {'start': 20, 'end': 21})
+
+    def test_custom_rule(self):
+        """Test rules plug in by subclassing WindowRule"""
+        class TelnetRule(WindowRule):
+            type = 'Telnet Use'
+            layers = LAYER_IP | LAYER_TCP
+            threshold = 0
+
+            def extract(self, record):
+                return (record.src, None) if record.dport == 23 else None
+
+            def describe(self, key, peak):
+                return f'IP {key} used telnet'
+
+        anomalies = run([tcp(5, '10.0.0.1', '10.0.0.2', 23), dns(5, '10.0.0.3')], (TelnetRule,))
+        self.assertEqual([anomaly['source_ip'] for anomaly in anomalies], ['10.0.0.1'])
+
+    def test_chunked_merge_matches_serial(self):
+        """Test engines over consecutive chunks merge into the serial result"""
+        for seed in range(200):
+            rng = random.Random(seed)
+            records = random_stream(rng)
+            cuts = sorted(rng.sample(range(len(records) + 1), min(len(records) + 1, rng.randint(1, 6))))
+            bounds = [0] + cuts + [len(records)]
+            merged = AnomalyEngine(SMALL_RULES)
+            for start, end in zip(bounds, bounds[1:]):
+                chunk = AnomalyEngine(SMALL_RULES)
+                for record in records[start:end]:
+                    chunk.add(record)
+                merged.merge(chunk)
+            self.assertEqual(merged.result(), run(records), f'seed {seed}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,61 @@
 import unittest
 import json
 import tempfile
+from unittest.mock import patch
+from scapy.all import TCP
 import os
+import shutil
+import time
+from datetime import datetime
+import app as app_module
 from app import app
+from pcap_analyzer import PcapAnalyzer
+from result_cache import ResultCache
+from analysis_store import MemoryAnalysisStore, SQLiteAnalysisStore
+from export_cache import ExportCache
+from ai_assistant import AIAssistant, LocalBackend
+from sections import analysis_summary
+from timeline import series_from_points
+from tests.test_pcap_analyzer import build_sample_packets, write_sample_pcap
 
 class TestOGPWAPI(unittest.TestCase):
     def setUp(self):
         """Set up test client"""
         self.app = app.test_client()
         self.app.testing = True
+        self.cache_dir = tempfile.mkdtemp()
+        self.result_cache = app_module.result_cache
+        app_module.result_cache = ResultCache(self.cache_dir)
+        self.analysis_store = app_module.analysis_store
+        app_module.analysis_store = MemoryAnalysisStore()
+        app_module.job_queue.store = app_module.analysis_store
+        self.export_cache = app_module.export_cache
+        app_module.export_cache = ExportCache()
+        self.ai_assistant = app_module.ai_assistant
+        app_module.ai_assistant = AIAssistant(LocalBackend())
+
+    def tearDown(self):
+        """Restore the result cache and analysis store"""
+        app_module.result_cache = self.result_cache
+        app_module.analysis_store = self.analysis_store
+        app_module.job_queue.store = self.analysis_store
+        app_module.export_cache = self.export_cache
+        app_module.ai_assistant = self.ai_assistant
+        shutil.rmtree(self.cache_dir)
+
+    def upload(self, path, name):
+        """POST a capture to /api/upload"""
+        with open(path, 'rb') as test_file:
+            return self.app.post('/api/upload', data={'file': (test_file, name)})
+
+    def wait_for_job(self, job_id, timeout=30):
+        """Poll a job until it has finished and return its last status"""
+        deadline = time.time() + timeout
+        while True:
+            data = json.loads(self.app.get(f'/api/jobs/{job_id}').data)
+            if data['status'] not in ('queued', 'running') or time.time() > deadline:
+                return data
+            time.sleep(0.05)
 
     def test_health_check(self):
         """Test health check endpoint"""
@@ -45,10 +92,405 @@ class TestOGPWAPI(unittest.TestCase):
             content_type='application/json')
         self.assertEqual(response.status_code, 404)
 
+    def test_chat_streaming_and_cache(self):
+        """Test chat answers stream as SSE tokens and repeated questions skip the backend"""
+        analysis_id = app_module.analysis_store.put('sample.pcap', {'total_packets': 5, 'basic_stats': {'total_bytes': 500}})
+        backend = app_module.ai_assistant.backend
+        
+        with patch.object(backend, 'stream', wraps=backend.stream) as stream:
+            response = self.app.post('/api/chat',
+                data=json.dumps({'message': 'Any threats?', 'analysis_id': analysis_id, 'stream': True}),
+                content_type='application/json')
+            self.assertEqual(response.mimetype, 'text/event-stream')
+            events = [block.split('\n') for block in response.get_data(as_text=True).strip().split('\n\n')]
+            tokens = [json.loads(data[6:])['text'] for event, data in events if event == 'event: token']
+            self.assertGreater(len(tokens), 1)
+            self.assertEqual(events[-1][0], 'event: done')
+            done = json.loads(events[-1][1][6:])
+            answer = done['response']
+            self.assertEqual(done['context']['sections'][0]['section'], 'basic_stats')
+            self.assertEqual(''.join(tokens), answer)
+            self.assertIn('Any threats?', answer)
+            
+            response = self.app.post('/api/chat',
+                data=json.dumps({'message': '  any THREATS? ', 'analysis_id': analysis_id}),
+                content_type='application/json')
+            self.assertEqual(json.loads(response.data)['response'], answer)
+            self.assertEqual(json.loads(response.data)['context'], done['context'])
+            self.assertEqual(stream.call_count, 1)
+
     def test_current_analysis_no_data(self):
         """Test current analysis endpoint with no data"""
         response = self.app.get('/api/analysis/current')
         self.assertEqual(response.status_code, 404)
 
+    def test_upload_runs_analysis_job(self):
+        """Test upload returns a job that can be polled until the analysis is done"""
+        pcap_path = write_sample_pcap()
+        try:
+            response = self.upload(pcap_path, 'sample.pcap')
+            self.assertEqual(response.status_code, 202)
+            data = self.wait_for_job(json.loads(response.data)['job_id'])
+
+            self.assertEqual(data['status'], 'completed')
+            self.assertEqual(data['progress'], 100.0)
+            self.assertEqual(data['summary']['total_packets'], len(build_sample_packets()))
+            self.assertNotIn('analysis', data)
+            self.assertEqual(data['filename'], 'sample.pcap')
+
+            stored = json.loads(self.app.get(f"/api/analysis/{data['analysis_id']}").data)
+            self.assertEqual(stored['summary'], data['summary'])
+            stored = json.loads(self.app.get(f"/api/analysis/{data['analysis_id']}?full=true").data)
+            self.assertEqual(stored['analysis']['total_packets'], len(build_sample_packets()))
+            self.assertNotIn('domain_table', stored['analysis'])
+
+            # The capture is gone; filtering runs on the saved packet index
+            response = self.app.post('/api/analysis/filter',
+                data=json.dumps({'protocol': 'TCP', 'analysis_id': data['analysis_id']}),
+                content_type='application/json')
+            filtered = json.loads(response.data)
+            self.assertEqual(filtered['filtered_packet_count'], sum(TCP in pkt for pkt in build_sample_packets()))
+            self.assertEqual(filtered['basic_stats']['total_packets'], filtered['filtered_packet_count'])
+
+            response = self.app.post('/api/analysis/filter',
+                data=json.dumps({'expression': 'tcp and dst port 80', 'analysis_id': data['analysis_id']}),
+                content_type='application/json')
+            filtered = json.loads(response.data)
+            self.assertEqual(filtered['expression'], 'tcp and dst port 80')
+            self.assertEqual(filtered['filtered_packet_count'], sum(
+                TCP in pkt and pkt[TCP].dport == 80 for pkt in build_sample_packets()))
+            response = self.app.post('/api/analysis/filter',
+                data=json.dumps({'expression': 'tcp and', 'analysis_id': data['analysis_id']}),
+                content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+            # Bulk exports also read the packet index
+            response = self.app.get(f"/api/export/bulk?table=packets&format=ndjson&analysis_id={data['analysis_id']}")
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            self.assertIn('sample.pcap_packets.ndjson', response.headers['Content-Disposition'])
+            self.assertEqual(len(response.get_data(as_text=True).splitlines()), len(build_sample_packets()))
+            for query, status in (('table=payloads', 400), ('format=xlsx', 400)):
+                response = self.app.get(f"/api/export/bulk?{query}&analysis_id={data['analysis_id']}")
+                self.assertEqual(response.status_code, status)
+            live_id = app_module.analysis_store.put('live.pcap', stored['analysis'])
+            self.assertEqual(self.app.get(f'/api/export/bulk?format=ndjson&analysis_id={live_id}').status_code, 404)
+        finally:
+            os.unlink(pcap_path)
+
+    def test_upload_cached_analysis(self):
+        """Test re-uploading the same bytes returns the cached analysis"""
+        pcap_path = write_sample_pcap()
+        try:
+            first = self.wait_for_job(json.loads(self.upload(pcap_path, 'first.pcap').data)['job_id'])
+            self.assertEqual(first['status'], 'completed')
+
+            with patch('app.PcapAnalyzer.analyze_pcap') as analyze_pcap:
+                response = self.upload(pcap_path, 'second.pcap')
+            analyze_pcap.assert_not_called()
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertTrue(data['cached'])
+            self.assertEqual(data['summary'], first['summary'])
+            self.assertEqual(json.loads(self.app.get('/api/analysis/current').data)['filename'], 'second.pcap')
+        finally:
+            os.unlink(pcap_path)
+
+    def test_upload_without_packet_index(self):
+        """Test captures over PACKET_INDEX_MAX_PACKETS get no index but are still served from the cache"""
+        pcap_path = write_sample_pcap()
+        try:
+            with patch('app.PACKET_INDEX_MAX_PACKETS', len(build_sample_packets()) - 1):
+                first = self.wait_for_job(json.loads(self.upload(pcap_path, 'first.pcap').data)['job_id'])
+                self.assertEqual(first['status'], 'completed')
+                response = self.app.post('/api/analysis/filter', data=json.dumps({'expression': 'tcp'}),
+                                         content_type='application/json')
+                self.assertEqual(response.status_code, 404)
+                self.assertTrue(json.loads(self.upload(pcap_path, 'second.pcap').data)['cached'])
+            # No spill files or partial indexes are left next to the uploads
+            self.assertEqual([name for name in os.listdir(app_module.UPLOAD_FOLDER) if 'index' in name], [])
+        finally:
+            os.unlink(pcap_path)
+
+    def test_job_of_another_worker(self):
+        """Test jobs and live captures run by another worker process are served from the store"""
+        store = app_module.analysis_store
+        analysis_id = store.put('sample.pcap', {'total_packets': 5, 'basic_stats': {'total_bytes': 500}})
+        store.put_status('job', 'remote', {'job_id': 'remote', 'status': 'running', 'progress': 50.0})
+        data = json.loads(self.app.post('/api/jobs/remote/cancel').data)
+        self.assertEqual(data['status'], 'running')
+        self.assertTrue(store.stop_requested('job', 'remote'))
+
+        store.put_status('job', 'remote', {'job_id': 'remote', 'status': 'completed', 'analysis_id': analysis_id})
+        data = json.loads(self.app.get('/api/jobs/remote').data)
+        self.assertEqual(data['summary']['total_packets'], 5)
+
+        store.put_status('live', 'remote', {'live_id': 'remote', 'status': 'running', 'sequence': 3,
+                                            'analysis_id': analysis_id})
+        self.assertEqual(json.loads(self.app.get('/api/live/remote').data)['sequence'], 3)
+        self.assertEqual(self.app.post('/api/live/remote/stop').status_code, 200)
+        self.assertTrue(store.stop_requested('live', 'remote'))
+        store.put_status('live', 'remote', {'live_id': 'remote', 'status': 'stopped', 'sequence': 3,
+                                            'analysis_id': analysis_id})
+        body = self.app.get('/api/live/remote/events').get_data(as_text=True)
+        self.assertTrue(body.startswith('event: snapshot\n'))
+        self.assertIn('"total_packets": 5', body)
+        self.assertIn('event: end\n', body)
+
+    def test_unknown_job(self):
+        """Test job endpoints with an unknown id"""
+        self.assertEqual(self.app.get('/api/jobs/missing').status_code, 404)
+        self.assertEqual(self.app.post('/api/jobs/missing/cancel').status_code, 404)
+
+    def test_stream_upload(self):
+        """Test a raw streamed upload is analyzed like a multipart one"""
+        pcap_path = write_sample_pcap()
+        try:
+            with open(pcap_path, 'rb') as f:
+                capture = f.read()
+            response = self.app.post('/api/upload/stream?filename=sample.pcap', data=capture,
+                                     content_type='application/octet-stream')
+            self.assertEqual(response.status_code, 202)
+            data = self.wait_for_job(json.loads(response.data)['job_id'])
+            self.assertEqual(data['status'], 'completed')
+            self.assertEqual(data['total_bytes'], len(capture))
+            self.assertEqual(data['summary'], analysis_summary(PcapAnalyzer().analyze_pcap(pcap_path)))
+
+            response = self.app.post('/api/upload/stream?filename=again.pcap', data=capture,
+                                     content_type='application/octet-stream')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(json.loads(response.data)['cached'])
+        finally:
+            os.unlink(pcap_path)
+
+    def test_stream_upload_rejected_early(self):
+        """Test streamed uploads with bad names, content or size are refused"""
+        response = self.app.post('/api/upload/stream?filename=test.txt', data=b'\xd4\xc3\xb2\xa1')
+        self.assertEqual(response.status_code, 400)
+        response = self.app.post('/api/upload/stream?filename=test.pcap', data=b'test content')
+        self.assertEqual(response.status_code, 400)
+        with patch('app.MAX_FILE_SIZE', 10):
+            response = self.app.post('/api/upload/stream?filename=test.pcap', data=b'\xd4\xc3\xb2\xa1' + b'\0' * 20)
+        self.assertEqual(response.status_code, 413)
+
+    def test_endpoints_take_analysis_id(self):
+        """Test every analysis endpoint serves the analysis it is asked for"""
+        first_id = app_module.analysis_store.put('first.pcap', {'basic_stats': {'total_packets': 1}})
+        second_id = app_module.analysis_store.put('second.pcap', {'basic_stats': {'total_packets': 2}})
+
+        data = json.loads(self.app.get(f'/api/analysis/current?analysis_id={first_id}').data)
+        self.assertEqual(data['filename'], 'first.pcap')
+        data = json.loads(self.app.get('/api/analysis/current').data)
+        self.assertEqual(data['analysis_id'], second_id)
+
+        response = self.app.get(f'/api/export/csv?analysis_id={first_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('first.pcap_analysis.csv', response.headers['Content-Disposition'])
+
+        response = self.app.post('/api/chat',
+            data=json.dumps({'message': 'summary', 'analysis_id': first_id}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        for response in (
+            self.app.get('/api/analysis/missing'),
+            self.app.get('/api/export/pdf?analysis_id=missing'),
+            self.app.post('/api/analysis/filter',
+                data=json.dumps({'protocol': 'TCP', 'analysis_id': 'missing'}),
+                content_type='application/json'),
+        ):
+            self.assertEqual(response.status_code, 404)
+
+    def test_exports_are_cached(self):
+        """Test exports are rendered once per analysis revision and CSV includes the full tables"""
+        table = {'a': ['10.0.0.1'], 'b': ['10.0.0.2'], 'packets_ab': [3], 'bytes_ab': [300], 'packets_ba': [2],
+                 'bytes_ba': [200], 'first_seen': [1.0], 'last_seen': [4.0]}
+        series = series_from_points([{'timestamp': 100, 'packets': 5, 'bytes': 500}])
+        stats = {'total_packets': 5, 'total_bytes': 500, 'duration_seconds': 1.0, 'avg_packet_size': 100.0,
+                 'throughput_pps': 5.0, 'throughput_bps': 500}
+        analysis = {'total_packets': 5, 'basic_stats': stats,
+                    'conversation_table': table, 'timeline_series': series}
+        analysis_id = app_module.analysis_store.put('sample.pcap', analysis)
+
+        with patch('app.iter_csv_body', wraps=app_module.iter_csv_body) as iter_csv_body, \
+                patch('utils.datetime') as clock:
+            clock.now.return_value = datetime(2024, 1, 1, 12, 0, 0)
+            first = self.app.get(f'/api/export/csv?analysis_id={analysis_id}')
+            self.assertTrue(first.is_streamed)
+            body = first.get_data(as_text=True)
+            clock.now.return_value = datetime(2024, 1, 2, 12, 0, 0)
+            second = self.app.get(f'/api/export/csv?analysis_id={analysis_id}').get_data(as_text=True)
+            self.assertEqual(iter_csv_body.call_count, 1)
+        # The cached body is served under a title with the time of each request
+        self.assertIn('Report Generated:,2024-01-01 12:00:00', body)
+        self.assertEqual(second, body.replace('2024-01-01', '2024-01-02'))
+        self.assertIn('10.0.0.1,10.0.0.2,3,300,2,200,1.0,4.0', body)
+        self.assertIn('100,5,500', body)
+
+        with patch('app.generate_pdf_report', wraps=app_module.generate_pdf_report) as generate_pdf_report:
+            pdf = self.app.get(f'/api/export/pdf?analysis_id={analysis_id}').data
+            self.assertEqual(self.app.get(f'/api/export/pdf?analysis_id={analysis_id}').data, pdf)
+            self.assertEqual(generate_pdf_report.call_count, 1)
+            # A replaced analysis (e.g. newer live results) is rendered again
+            analysis['total_packets'] = 6
+            app_module.analysis_store.put('sample.pcap', analysis, analysis_id=analysis_id)
+            self.app.get(f'/api/export/pdf?analysis_id={analysis_id}')
+            self.assertEqual(generate_pdf_report.call_count, 2)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+    def test_timeline_range(self):
+        """Test timeline ranges are served from the series and bounded by max_points"""
+        pcap_path = write_sample_pcap()
+        analysis = PcapAnalyzer().analyze_pcap(pcap_path)
+        os.unlink(pcap_path)
+        analysis_id = app_module.analysis_store.put('sample.pcap', analysis)
+        data = json.loads(self.app.get(f'/api/analysis/current?analysis_id={analysis_id}&full=true').data)
+        self.assertNotIn('timeline_series', data['analysis'])
+        self.assertEqual(len(data['analysis']['timeline']), len(analysis['timeline_series']['1']['timestamps']))
+
+        first = analysis['timeline'][0]['timestamp']
+        data = json.loads(self.app.get(f'/api/analysis/timeline?start={first}&end={first + 1}&max_points=3').data)
+        self.assertEqual(data['resolution'], 1)
+        self.assertEqual(data['timestamps'], [first])
+        self.assertEqual(data['packets'], [analysis['timeline'][0]['packets']])
+
+        for query in ('max_points=2', 'max_points=many', 'start=soon', 'method=average'):
+            self.assertEqual(self.app.get(f'/api/analysis/timeline?{query}').status_code, 400)
+        self.assertEqual(self.app.get('/api/analysis/timeline?analysis_id=missing').status_code, 404)
+
+    def test_summary_and_sections(self):
+        """Test the summary and paginated section endpoints"""
+        analysis = {
+            'total_packets': 5,
+            'ip_conversations': [{'endpoints': f'10.0.0.{i} ↔ 10.0.0.9', 'packets': i, 'bytes': 10 - i}
+                                 for i in range(5)]
+        }
+        analysis_id = app_module.analysis_store.put('sample.pcap', analysis)
+        data = json.loads(self.app.get('/api/analysis/summary').data)
+        self.assertEqual(data['analysis_id'], analysis_id)
+        self.assertEqual(data['summary']['sections']['conversations'], 5)
+
+        data = json.loads(self.app.get('/api/analysis/sections/conversations?sort=-bytes&limit=2').data)
+        self.assertEqual([item['bytes'] for item in data['items']], [10, 9])
+        data = json.loads(self.app.get(
+            f"/api/analysis/sections/conversations?sort=-bytes&limit=2&cursor={data['next_cursor']}").data)
+        self.assertEqual([item['bytes'] for item in data['items']], [8, 7])
+
+        for query in ('flows', 'conversations?sort=severity', 'conversations?limit=all',
+                      'conversations?cursor=bogus'):
+            self.assertEqual(self.app.get(f'/api/analysis/sections/{query}').status_code, 400)
+        self.assertEqual(self.app.get('/api/analysis/summary?analysis_id=missing').status_code, 404)
+
+    def test_sqlite_store(self):
+        """Test summaries, sections and tables are served from analyses stored key by key"""
+        db_dir = tempfile.mkdtemp()
+        try:
+            app_module.analysis_store = SQLiteAnalysisStore(os.path.join(db_dir, 'analyses.db'))
+            self.test_summary_and_sections()
+            self.test_conversation_and_endpoint_tables()
+        finally:
+            shutil.rmtree(db_dir)
+
+    def test_conversation_and_endpoint_tables(self):
+        """Test top-K conversations and endpoints with address filters"""
+        table = {'a': ['10.0.0.1', '10.0.0.1', '10.0.1.5'], 'b': ['10.0.0.2', '192.168.1.1', '8.8.8.8'],
+                 'packets_ab': [3, 1, 9], 'bytes_ab': [300, 100, 900], 'packets_ba': [2, 1, 0],
+                 'bytes_ba': [200, 100, 0], 'first_seen': [1.0, 2.0, 3.0], 'last_seen': [4.0, 2.5, 3.5]}
+        app_module.analysis_store.put('sample.pcap', {'total_packets': 16, 'conversation_table': table})
+
+        data = json.loads(self.app.get('/api/analysis/conversations?k=2').data)
+        self.assertEqual(data['total'], 3)
+        self.assertEqual([item['endpoints'] for item in data['items']],
+                         ['10.0.1.5 ↔ 8.8.8.8', '10.0.0.1 ↔ 10.0.0.2'])
+        top = data['items']
+        # The conversations section pages the same table
+        data = json.loads(self.app.get('/api/analysis/sections/conversations?limit=2').data)
+        self.assertEqual((data['total'], data['items']), (3, top))
+        data = json.loads(self.app.get('/api/analysis/conversations?ip=10.0.0.0/24').data)
+        self.assertEqual(data['total'], 2)
+        data = json.loads(self.app.get('/api/analysis/endpoints?by=peers&k=1').data)
+        self.assertEqual(data['items'][0]['address'], '10.0.0.1')
+        self.assertEqual(data['items'][0]['peers'], 2)
+        data = json.loads(self.app.get('/api/analysis/endpoints?ip=192.').data)
+        self.assertEqual([item['address'] for item in data['items']], ['192.168.1.1'])
+
+        for query in ('conversations?by=peers', 'endpoints?k=0', 'endpoints?k=all', 'endpoints?ip=10.0.0.0/99'):
+            self.assertEqual(self.app.get(f'/api/analysis/{query}').status_code, 400)
+        app_module.analysis_store.put('sketch.pcap', {'total_packets': 0, 'ip_conversations': []})
+        self.assertEqual(self.app.get('/api/analysis/endpoints').status_code, 404)
+
+    def test_metrics(self):
+        """Test request latency per route and profiled analysis stages in /api/metrics"""
+        self.app.get('/api/health')
+        self.app.get('/api/no-such-route')
+        pcap_path = write_sample_pcap()
+        try:
+            with patch('app.ANALYSIS_PROFILING', 'on'):
+                response = self.upload(pcap_path, 'sample.pcap')
+                data = self.wait_for_job(json.loads(response.data)['job_id'])
+        finally:
+            os.unlink(pcap_path)
+        self.assertEqual(data['status'], 'completed')
+        stored = json.loads(self.app.get(f"/api/analysis/{data['analysis_id']}?full=true").data)
+        stages = [stage['stage'] for stage in stored['analysis']['performance']['stages']]
+        self.assertIn('tcp_analysis', stages)
+        self.assertEqual(stages[-1], 'serialization')
+        self.app.get(f"/api/export/csv?analysis_id={data['analysis_id']}").get_data()
+
+        response = self.app.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.data.decode()
+        self.assertIn('ogpw_http_request_duration_seconds_count{method="GET",route="/api/health",status="200"}', text)
+        self.assertIn('route="unmatched",status="404"', text)
+        self.assertIn('route="/api/jobs/<job_id>"', text)
+        self.assertIn('ogpw_analysis_stage_seconds_count{stage="tcp_analysis"}', text)
+        self.assertIn('ogpw_analysis_stage_seconds_count{stage="export_csv"}', text)
+
+    def test_live_capture(self):
+        """Test a tailed capture is served as the current analysis and streamed as events"""
+        response = self.app.post('/api/live', data=json.dumps({'path': 'live.pcap'}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        live_dir = tempfile.mkdtemp()
+        pcap_path = write_sample_pcap()
+        try:
+            shutil.copy(pcap_path, os.path.join(live_dir, 'live.pcap'))
+            with patch('app.LIVE_CAPTURE_DIR', live_dir):
+                for path, status in (('../etc', 404), ('missing.pcap', 404), ('', 400)):
+                    response = self.app.post('/api/live', data=json.dumps({'path': path}),
+                                             content_type='application/json')
+                    self.assertEqual(response.status_code, status)
+                response = self.app.post('/api/live', data=json.dumps({'path': 'live.pcap'}),
+                                         content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+            live_id = json.loads(response.data)['live_id']
+
+            deadline = time.time() + 30
+            while time.time() < deadline:
+                live = json.loads(self.app.get(f'/api/live/{live_id}').data)
+                if live['sequence']:
+                    break
+                time.sleep(0.05)
+            data = json.loads(self.app.get('/api/analysis/current').data)
+            self.assertEqual(data['analysis_id'], live['analysis_id'])
+            self.assertEqual(data['summary']['total_packets'], len(build_sample_packets()))
+
+            data = json.loads(self.app.post(f'/api/live/{live_id}/stop').data)
+            self.assertIn(data['status'], ('stopping', 'stopped'))
+            app_module.live_captures[live_id].thread.join(10)
+            self.assertEqual(json.loads(self.app.get(f'/api/live/{live_id}').data)['status'], 'stopped')
+            response = self.app.get(f'/api/live/{live_id}/events')
+            self.assertEqual(response.mimetype, 'text/event-stream')
+            body = response.get_data(as_text=True)
+            self.assertTrue(body.startswith('event: snapshot\n'))
+            self.assertIn('event: end\n', body)
+            self.assertEqual(self.app.get('/api/live/missing/events').status_code, 404)
+            self.assertEqual(self.app.get('/api/live/missing').status_code, 404)
+            self.assertEqual(self.app.post('/api/live/missing/stop').status_code, 404)
+        finally:
+            shutil.rmtree(live_dir)
+            os.unlink(pcap_path)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
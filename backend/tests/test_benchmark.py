@@ -0,0 +1,67 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import benchmark
+
+
+def result(packets_per_second, seconds=1.0, peak_rss_mb=100.0, stages=None):
+    measured = {'packets': 1000, 'modes': {'streaming': {
+        'seconds': seconds, 'packets_per_second': packets_per_second, 'peak_rss_mb': peak_rss_mb}}}
+    if stages:
+        measured['stages'] = {'seconds': stages}
+    return measured
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_compare_flags_regressions_beyond_threshold(self):
+        """Test slower throughput, more memory and slower stages are regressions"""
+        baseline = {'1m': result(1000, stages={'_get_tcp_analysis': 1.0})}
+        self.assertEqual(benchmark.compare({'1m': result(900, stages={'_get_tcp_analysis': 1.1})}, baseline, 0.2), [])
+        regressions = benchmark.compare(
+            {'1m': result(700, peak_rss_mb=150.0, stages={'_get_tcp_analysis': 1.5})}, baseline, 0.2)
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(regressions[0].startswith('1m streaming packets/s: 700 < 1000'))
+
+    def test_compare_ignores_short_runs_and_unknown_sizes(self):
+        """Test runs too short to time reliably and sizes without a baseline are skipped"""
+        baseline = {'10k': result(1000, seconds=0.01, stages={'_get_dns_analysis': 0.01})}
+        measured = {'10k': result(100, seconds=0.1, stages={'_get_dns_analysis': 0.04}), '1m': result(1)}
+        self.assertEqual(benchmark.compare(measured, baseline), [])
+
+    def test_compare_skips_parallel_runs_on_other_cpu_counts(self):
+        """Test parallel throughput is only compared with a baseline recorded on as many CPUs"""
+        def measured(cpus, packets_per_second):
+            run = result(packets_per_second)
+            run['modes']['parallel'] = dict(run['modes']['streaming'])
+            run['machine'] = {'cpus': cpus}
+            return run
+
+        baseline = {'1m': measured(1, 1000)}
+        regressions = benchmark.compare({'1m': measured(8, 500)}, baseline)
+        self.assertEqual(regressions, ['1m streaming packets/s: 500 < 1000 (-50%)'])
+        regressions = benchmark.compare({'1m': measured(1, 500)}, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[1].startswith('1m parallel packets/s'))
+
+    def test_run_and_update_baseline(self):
+        """Test a small run is recorded as baseline and compares clean against itself"""
+        workdir = tempfile.mkdtemp()
+        try:
+            baseline_path = os.path.join(workdir, 'baseline.json')
+            self.assertEqual(benchmark.main(['--sizes', '500', '--modes', 'streaming', '--workdir', workdir,
+                                             '--baseline', baseline_path, '--update-baseline']), 0)
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            measured = baseline['500']
+            self.assertEqual(measured['packets'], 500)
+            self.assertGreater(measured['modes']['streaming']['packets_per_second'], 0)
+            self.assertIn('_get_tcp_analysis', measured['stages']['seconds'])
+            self.assertEqual(benchmark.compare(baseline, baseline), [])
+        finally:
+            shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import json
+import os
+import tempfile
+from collections import defaultdict
+from bulk_export import BULK_TABLES, PYARROW_AVAILABLE, flow_frame, iter_ndjson, write_bulk
+from packet_record import record_from_packet, LAYER_IP, LAYER_TCP
+from packet_table import PacketTable
+from tests.test_pcap_analyzer import build_sample_packets
+
+if PYARROW_AVAILABLE:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+
+def ndjson_rows(table, table_name, batch_rows):
+    chunks = list(iter_ndjson(table, table_name, batch_rows))
+    return chunks, [json.loads(line) for chunk in chunks for line in chunk.decode('utf-8').splitlines()]
+
+
+class TestBulkExport(unittest.TestCase):
+    def setUp(self):
+        self.records = [record_from_packet(pkt) for pkt in build_sample_packets()]
+        self.table = PacketTable.from_records(self.records)
+
+    def test_packets(self):
+        """Test every packet header is written once, in capture order and in batches"""
+        chunks, rows = ndjson_rows(self.table, 'packets', 10)
+        self.assertEqual(len(chunks), -(-len(self.records) // 10))
+        self.assertEqual(len(rows), len(self.records))
+        for row, record in zip(rows, self.records):
+            self.assertEqual(list(row), [name for name, _ in BULK_TABLES['packets']])
+            self.assertAlmostEqual(row['time'], record.time, places=6)
+            self.assertEqual(row['length'], record.length)
+            if record.layers & LAYER_IP:
+                self.assertEqual((row['src'], row['dst']), (record.src, record.dst))
+            else:
+                self.assertIsNone(row['src'])
+            if record.layers & LAYER_TCP:
+                self.assertEqual(row['protocol'], 'tcp')
+                self.assertEqual(row['tcp_flags'], record.tcp_flags)
+
+    def test_flows(self):
+        """Test flows total the packets, bytes and flags of each directed 5-tuple"""
+        expected = defaultdict(lambda: [0, 0, 0])
+        for record in self.records:
+            if record.layers & LAYER_IP:
+                flow = expected[(record.src, record.dst, record.sport, record.dport)]
+                flow[0] += 1
+                flow[1] += record.length
+                flow[2] |= record.tcp_flags
+        _, rows = ndjson_rows(self.table, 'flows', 4)
+        self.assertEqual(len(rows), len(expected))
+        self.assertEqual(len(flow_frame(self.table)), len(expected))
+        for row in rows:
+            self.assertEqual([row['packets'], row['bytes'], row['tcp_flags']],
+                             expected[(row['src'], row['dst'], row['sport'], row['dport'])])
+            self.assertLessEqual(row['first_seen'], row['last_seen'])
+
+    def test_timeline(self):
+        """Test the per-second rows match the finest timeline resolution"""
+        _, rows = ndjson_rows(self.table, 'timeline', 1000)
+        series = self.table.timeline()['1']
+        self.assertEqual([[row['timestamp'], row['packets'], row['bytes']] for row in rows],
+                         [list(point) for point in zip(series['timestamps'], series['packets'], series['bytes'])])
+
+    def test_empty_table_and_unknown_table(self):
+        empty = PacketTable.from_records([])
+        for table_name in BULK_TABLES:
+            self.assertEqual(list(iter_ndjson(empty, table_name)), [])
+        with self.assertRaises(ValueError):
+            list(iter_ndjson(self.table, 'payloads'))
+
+    @unittest.skipUnless(PYARROW_AVAILABLE, 'pyarrow is not installed')
+    def test_parquet_and_arrow(self):
+        """Test Parquet and Arrow files hold the same rows as NDJSON, one row group per batch"""
+        directory = tempfile.mkdtemp()
+        try:
+            for table_name in BULK_TABLES:
+                _, rows = ndjson_rows(self.table, table_name, 10)
+                parquet_path = write_bulk(self.table, table_name, 'parquet', os.path.join(directory, 'out.parquet'), 10)
+                arrow_path = write_bulk(self.table, table_name, 'arrow', os.path.join(directory, 'out.arrow'), 10)
+                parquet = pq.read_table(parquet_path)
+                self.assertEqual(pq.ParquetFile(parquet_path).num_row_groups, -(-len(rows) // 10))
+                self.assertTrue(parquet.equals(pa.ipc.open_file(arrow_path).read_all()))
+                self.assertEqual(parquet.num_rows, len(rows))
+                self.assertEqual(parquet.column_names, [name for name, _ in BULK_TABLES[table_name]])
+        finally:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+from dns_transactions import DnsTransactionTable, NXDOMAIN, SERVFAIL
+
+CLIENT, OTHER_CLIENT, RESOLVER, BACKUP = '10.0.0.5', '10.0.0.6', '8.8.8.8', '1.1.1.1'
+
+
+def lookup(time, txid, rcode=0, client=CLIENT, resolver=RESOLVER, latency=0.02):
+    """Query and response packets of one transaction; no response if latency is None"""
+    packets = [(time, client, resolver, 0, txid, 0)]
+    if latency is not None:
+        packets.append((time + latency, resolver, client, 1, txid, rcode))
+    return packets
+
+
+def sample_packets():
+    packets = []
+    for i in range(40):
+        packets += lookup(i * 0.5, i, latency=0.01 + (i % 10) * 0.01)
+    packets += lookup(21.0, 100, rcode=NXDOMAIN)
+    packets += lookup(21.5, 101, rcode=SERVFAIL, resolver=BACKUP)
+    packets += lookup(22.0, 102, latency=None)
+    packets += lookup(22.5, 103, client=OTHER_CLIENT, latency=6.0)
+    packets += [(30.0, RESOLVER, CLIENT, 1, 999, 0)]
+    packets += lookup(31.0, 104, client=OTHER_CLIENT, resolver=BACKUP)
+    # A retry while the first query is still pending
+    packets += lookup(24.0, 105, latency=0.6) + [(24.5, CLIENT, RESOLVER, 0, 105, 0)]
+    return sorted(packets)
+
+
+def run(packets):
+    table = DnsTransactionTable()
+    for packet in packets:
+        table.add(*packet)
+    return table
+
+
+class TestDnsTransactionTable(unittest.TestCase):
+    def test_matching_and_latency(self):
+        """Test responses answer queries by client, server and id, with latency percentiles"""
+        table = DnsTransactionTable()
+        for packet in lookup(0.0, 1, latency=0.05) + lookup(0.01, 1, client=OTHER_CLIENT, latency=0.01):
+            table.add(*packet)
+        result = table.result()
+        self.assertEqual(result['answered_queries'], 2)
+        self.assertEqual(result['unmatched_responses'], 0)
+        self.assertEqual(result['answer_rate'], 100.0)
+        self.assertEqual(result['latency_ms']['max'], 50.0)
+        self.assertAlmostEqual(result['latency_ms']['p50'], 10.0, delta=0.1)
+
+    def test_timeouts_and_unmatched(self):
+        """Test late, missing and unsolicited responses"""
+        result = run(sample_packets()).result()
+        self.assertEqual(result['answered_queries'], 44)
+        self.assertEqual(result['unanswered_queries'], 2)
+        self.assertEqual(result['retried_queries'], 1)
+        # The late response and the unsolicited one
+        self.assertEqual(result['unmatched_responses'], 2)
+        self.assertEqual(result['response_codes'], {'NOERROR': 44, 'SERVFAIL': 1, 'NXDOMAIN': 1})
+        self.assertEqual(result['nxdomain_rate'], 2.17)
+        self.assertEqual(result['answer_rate'], 95.65)
+
+    def test_retry_keeps_first_query(self):
+        """Test a retried query is answered once, timed from the original send"""
+        table = DnsTransactionTable()
+        for packet in [(0.0, CLIENT, RESOLVER, 0, 7, 0), (1.0, CLIENT, RESOLVER, 0, 7, 0),
+                       (1.2, RESOLVER, CLIENT, 1, 7, 0)]:
+            table.add(*packet)
+        result = table.result()
+        self.assertEqual((result['answered_queries'], result['unanswered_queries']), (1, 0))
+        self.assertEqual(result['retried_queries'], 1)
+        self.assertEqual(result['answer_rate'], 100.0)
+        self.assertEqual(result['resolvers'][0]['retries'], 1)
+        self.assertEqual(result['latency_ms']['max'], 1200.0)
+
+    def test_pending_is_bounded(self):
+        """Test a query flood never holds more than max_pending queries"""
+        table = DnsTransactionTable()
+        table.max_pending = 100
+        for txid in range(1000):
+            table.add(txid * 0.001, CLIENT, RESOLVER, 0, txid, 0)
+            self.assertLessEqual(len(table.pending), 100)
+        self.assertEqual(table.evicted_queries, 900)
+        self.assertEqual(table.result()['unanswered_queries'], 1000)
+
+    def test_resolvers_are_bounded(self):
+        """Test queries to many distinct servers keep at most max_resolvers, favouring the busiest"""
+        table = DnsTransactionTable()
+        table.max_resolvers = 50
+        for i in range(2000):
+            table.add(i * 0.001, CLIENT, RESOLVER, 0, i, 0)
+            table.add(i * 0.001, CLIENT, f'10.9.{i // 256}.{i % 256}', 0, i, 0)
+            self.assertLessEqual(len(table.resolvers), 50)
+        self.assertGreater(table.evicted_resolvers, 0)
+        result = table.result()
+        self.assertEqual(result['resolvers'][0]['resolver'], RESOLVER)
+        self.assertEqual(result['resolvers'][0]['queries'], 2000)
+
+    def test_resolvers(self):
+        """Test per-resolver counts, ordered by queries"""
+        resolvers = run(sample_packets()).result()['resolvers']
+        self.assertEqual([resolver['resolver'] for resolver in resolvers], [RESOLVER, BACKUP])
+        backup = resolvers[1]
+        self.assertEqual((backup['queries'], backup['answered'], backup['servfail']), (2, 2, 1))
+        self.assertEqual(resolvers[0]['unanswered'], 2)
+        self.assertEqual(resolvers[0]['nxdomain'], 1)
+
+    def test_chunked_merge_matches_serial(self):
+        """Test tables of consecutive chunks merge to the serial result, across chunk boundaries"""
+        packets = sample_packets()
+        expected = run(packets).result()
+        for cuts in ([1], [41, 42], [10, 30, 50, 80], list(range(1, len(packets)))):
+            bounds = [0] + cuts + [len(packets)]
+            merged = DnsTransactionTable()
+            for start, end in zip(bounds, bounds[1:]):
+                merged.merge(run(packets[start:end]))
+            self.assertEqual(merged.result(), expected, cuts)
+
+    def test_empty(self):
+        result = DnsTransactionTable().result()
+        self.assertEqual(result['answer_rate'], 0)
+        self.assertEqual(result['latency_ms']['p50'], 0)
+        self.assertEqual(result['resolvers'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from export_cache import ExportCache, analysis_revision
+
+
+class TestExportCache(unittest.TestCase):
+    def test_revision_invalidates(self):
+        """Test an export rendered from an older revision of the analysis is dropped"""
+        cache = ExportCache()
+        cache.put('a1', 'pdf', (10, 1000), b'report')
+        self.assertEqual(cache.get('a1', 'pdf', (10, 1000)), b'report')
+        self.assertIsNone(cache.get('a1', 'csv', (10, 1000)))
+        self.assertIsNone(cache.get('a1', 'pdf', (12, 1200)))
+        self.assertIsNone(cache.get('a1', 'pdf', (10, 1000)))
+        self.assertEqual(cache.total_bytes, 0)
+
+    def test_invalidate_analysis(self):
+        """Test invalidating an analysis drops all of its formats only"""
+        cache = ExportCache()
+        cache.put('a1', 'pdf', 1, b'pdf')
+        cache.put('a1', 'csv', 1, b'csv')
+        cache.put('a2', 'csv', 1, b'other')
+        cache.invalidate('a1')
+        self.assertIsNone(cache.get('a1', 'pdf', 1))
+        self.assertIsNone(cache.get('a1', 'csv', 1))
+        self.assertEqual(cache.get('a2', 'csv', 1), b'other')
+
+    def test_size_bounds(self):
+        """Test oversized exports are not kept and old ones are evicted first"""
+        cache = ExportCache(max_bytes=10, max_entry_bytes=6)
+        cache.put('big', 'csv', 1, b'x' * 7)
+        self.assertIsNone(cache.get('big', 'csv', 1))
+        cache.put('a1', 'csv', 1, b'x' * 5)
+        cache.put('a2', 'csv', 1, b'x' * 5)
+        cache.get('a1', 'csv', 1)
+        cache.put('a3', 'csv', 1, b'x' * 5)
+        self.assertIsNone(cache.get('a2', 'csv', 1))
+        self.assertIsNotNone(cache.get('a1', 'csv', 1))
+        self.assertEqual(cache.total_bytes, 10)
+
+    def test_tee(self):
+        """Test streamed chunks are cached only once fully sent and within bounds"""
+        cache = ExportCache(max_entry_bytes=6)
+        chunks = cache.tee('a1', 'csv', 1, iter([b'ab', b'cd']))
+        self.assertEqual(next(chunks), b'ab')
+        self.assertIsNone(cache.get('a1', 'csv', 1))
+        self.assertEqual(list(chunks), [b'cd'])
+        self.assertEqual(cache.get('a1', 'csv', 1), b'abcd')
+
+        self.assertEqual(b''.join(cache.tee('a2', 'csv', 1, iter([b'abcd', b'efgh']))), b'abcdefgh')
+        self.assertIsNone(cache.get('a2', 'csv', 1))
+
+    def test_analysis_revision(self):
+        self.assertEqual(analysis_revision({'total_packets': 3, 'basic_stats': {'total_bytes': 180}}), (3, 180))
+        self.assertEqual(analysis_revision({}), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import gzip
+import os
+import random
+import shutil
+from scapy.all import Ether, IP, UDP, TCP, DNS, DNSQR, DNSRR, Dot1Q, Raw, PcapReader, Packet, ShortField, bind_layers
+from scapy.utils import PcapNgWriter
+from fast_decoder import (
+    decode_frame, decode_with_scapy, iter_capture, iter_records,
+    index_pcap, pcap_ranges, iter_pcap_range, _PayloadGuesser, _port_payload, _FALLBACK
+)
+from packet_record import record_from_packet
+from tests.test_pcap_analyzer import build_sample_packets, write_sample_pcap
+
+
+def scapy_records(path):
+    """Reference records from full scapy dissection"""
+    with PcapReader(path) as reader:
+        return [record_from_packet(pkt) for pkt in reader]
+
+
+def decode_or_error(decode, *args):
+    """Decoded record, or the exception type a malformed frame raises"""
+    try:
+        return decode(*args)
+    except Exception as e:
+        return type(e)
+
+
+class TestFastDecoder(unittest.TestCase):
+    def setUp(self):
+        """Write a sample capture"""
+        self.packets = build_sample_packets() + [
+            Ether() / Dot1Q(vlan=7) / IP(src='10.1.1.1', dst='10.1.1.2') /
+            UDP(sport=3000, dport=53) / DNS(qd=DNSQR(qname='vlan.example')),
+            Ether() / IP(src='10.1.1.2', dst='10.1.1.1') / TCP(sport=53, dport=3001, flags='PA') /
+            DNS(qr=1, qd=DNSQR(qname='tcp.example'), an=DNSRR(rrname='tcp.example', rdata='1.2.3.4')),
+        ]
+        self.packets[-2].time = self.packets[-1].time = 1700000010.5
+        self.pcap_path = write_sample_pcap(self.packets)
+
+    def tearDown(self):
+        os.unlink(self.pcap_path)
+
+    def test_matches_scapy_pcap(self):
+        """Test raw decoding matches scapy dissection for pcap files"""
+        self.assertEqual(list(iter_records(self.pcap_path)), scapy_records(self.pcap_path))
+
+    def test_matches_scapy_pcapng(self):
+        """Test raw decoding matches scapy dissection for pcapng files"""
+        pcapng_path = self.pcap_path + 'ng'
+        writer = PcapNgWriter(pcapng_path)
+        writer.write(self.packets)
+        writer.close()
+        try:
+            self.assertEqual(list(iter_records(pcapng_path)), scapy_records(pcapng_path))
+        finally:
+            os.unlink(pcapng_path)
+
+    def test_gzip_capture(self):
+        """Test gzip-compressed captures are read transparently"""
+        gz_path = self.pcap_path + '.gz'
+        with open(self.pcap_path, 'rb') as src, gzip.open(gz_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        try:
+            self.assertEqual(list(iter_records(gz_path)), scapy_records(self.pcap_path))
+        finally:
+            os.unlink(gz_path)
+
+    def test_corrupted_frames_match_scapy(self):
+        """Test mutated frames decode like scapy or fall back to it"""
+        rng = random.Random(1)
+        frames = [bytes(pkt) for pkt in self.packets]
+        mutated = []
+        for i in range(500):
+            frame = bytearray(rng.choice(frames))
+            for _ in range(rng.randint(1, 4)):
+                if rng.random() < 0.7 and frame:
+                    frame[rng.randrange(len(frame))] = rng.randrange(256)
+                else:
+                    del frame[rng.randint(0, len(frame)):]
+            pkt = Raw(bytes(frame))
+            pkt.time = 1700000000 + i * 0.01
+            mutated.append(pkt)
+        path = write_sample_pcap(mutated)
+        try:
+            with PcapReader(path) as reader:
+                expected = [decode_or_error(record_from_packet, pkt) for pkt in reader]
+            decoded = []
+            for _, linktype, ts, data in iter_capture(path):
+                record = decode_or_error(decode_frame, data, linktype, ts)
+                if record is None:
+                    record = decode_or_error(decode_with_scapy, data, linktype, ts)
+                decoded.append(record)
+            self.assertEqual(decoded, expected)
+        finally:
+            os.unlink(path)
+
+    def test_index_and_ranges(self):
+        """Test record offsets and byte ranges cover the capture exactly"""
+        frames = list(iter_capture(self.pcap_path))
+        self.assertEqual(list(index_pcap(self.pcap_path)), [frame[0] for frame in frames])
+
+        ranges = pcap_ranges(self.pcap_path, 5)
+        self.assertEqual(len(ranges), 5)
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.pcap_path))
+        chunked = [frame for start, end in ranges for frame in iter_pcap_range(self.pcap_path, start, end)]
+        self.assertEqual(chunked, frames)
+
+        self.assertEqual(len(pcap_ranges(self.pcap_path, 5, min_chunk_bytes=1 << 20)), 1)
+
+    def test_unknown_frames_need_scapy(self):
+        """Test frames outside the fast path are left to scapy"""
+        self.assertIsNone(decode_frame(b'\x00' * 10, 1, 0.0))
+        self.assertIsNone(decode_frame(b'\x00' * 40, 113, 0.0))
+
+    def test_port_payload_bindings_on_other_fields(self):
+        """Test unbound ports are raw data unless a binding tests a field the decoder doesn't read"""
+        class Ports(Packet):
+            fields_desc = [ShortField('sport', 0), ShortField('dport', 0), ShortField('len', 0)]
+
+        class Sized(Packet):
+            fields_desc = Ports.fields_desc
+
+        bind_layers(Ports, Raw, dport=9999)
+        guesser = _PayloadGuesser(Ports, ('sport', 'dport'))
+        self.assertIs(_port_payload(guesser, 1000, 9999), Raw)
+        self.assertIsNone(_port_payload(guesser, 1000, 2000))
+
+        bind_layers(Sized, Raw, dport=9999)
+        bind_layers(Sized, Raw, len=4)
+        guesser = _PayloadGuesser(Sized, ('sport', 'dport'))
+        self.assertIs(_port_payload(guesser, 1000, 9999), Raw)
+        self.assertIs(_port_payload(guesser, 1000, 2000), _FALLBACK)
+
+    def test_invalid_file(self):
+        """Test non-capture files are rejected"""
+        with open(self.pcap_path, 'wb') as f:
+            f.write(b'invalid pcap content')
+        with self.assertRaises(Exception):
+            list(iter_records(self.pcap_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+import os
+import tracemalloc
+from accumulators import BasicStatsAccumulator, DnsAccumulator
+from instrumentation import Histogram, MetricsRegistry, Profiler, profiled
+from packet_record import PacketRecord, LAYER_IP, LAYER_UDP
+from pcap_analyzer import PcapAnalyzer
+from tests.test_pcap_analyzer import build_sample_packets, write_sample_pcap
+
+
+def stage_names(performance):
+    return [stage['stage'] for stage in performance['stages']]
+
+
+class TestProfiler(unittest.TestCase):
+    def test_stage_runs_add_up(self):
+        """Test repeated runs of a stage add their packets and keep first-run order"""
+        profiler = Profiler()
+        with profiler.stage('decode', 10):
+            pass
+        with profiled(profiler, 'results'):
+            pass
+        with profiler.stage('decode', 5):
+            pass
+        performance = profiler.result('streaming', 15)
+
+        self.assertEqual(stage_names(performance), ['decode', 'results'])
+        self.assertEqual(performance['stages'][0]['packets'], 15)
+        self.assertEqual(performance['mode'], 'streaming')
+        self.assertEqual(performance['packets'], 15)
+        self.assertGreaterEqual(performance['wall_seconds'], 0)
+        self.assertNotIn('peak_allocated_bytes', performance['stages'][0])
+        with profiled(None, 'anything'):
+            pass
+
+    def test_memory_profiling(self):
+        """Test memory profiling reports each stage's peak allocation and stops tracing"""
+        profiler = Profiler(memory=True)
+        with profiler.stage('allocate'):
+            data = bytearray(4 * 1024 * 1024)
+        del data
+        performance = profiler.result('legacy', 0)
+
+        self.assertGreaterEqual(performance['stages'][0]['peak_allocated_bytes'], 4 * 1024 * 1024)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_overlapping_memory_profilers(self):
+        """Test tracing outlives a finished profiler while another one still runs"""
+        first, second = Profiler(memory=True), Profiler(memory=True)
+        first.result('legacy', 0)
+        self.assertTrue(tracemalloc.is_tracing())
+        with second.stage('allocate'):
+            data = bytearray(4 * 1024 * 1024)
+        del data
+        first.stop()
+        performance = second.result('legacy', 0)
+        self.assertGreaterEqual(performance['stages'][0]['peak_allocated_bytes'], 4 * 1024 * 1024)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_accumulate_times_each_accumulator(self):
+        """Test accumulators profiled in batches see every record once"""
+        records = [PacketRecord(float(i), 60, LAYER_IP | LAYER_UDP, '10.0.0.1', '10.0.0.2', 1000, 53, 0, None, None)
+                   for i in range(25)]
+        profiler = Profiler()
+        accumulators = [BasicStatsAccumulator(), DnsAccumulator()]
+        self.assertEqual(profiler.accumulate(accumulators, iter(records), batch_size=10), 25)
+
+        expected = BasicStatsAccumulator()
+        for record in records:
+            expected.add(record)
+        self.assertEqual(accumulators[0].result(), expected.result())
+        performance = profiler.result('streaming', 25)
+        self.assertEqual(stage_names(performance), ['decode', 'basic_stats', 'dns_analysis'])
+        self.assertTrue(all(stage['packets'] == 25 for stage in performance['stages']))
+
+
+class TestProfiledAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.pcap_path = write_sample_pcap()
+
+    def tearDown(self):
+        os.unlink(self.pcap_path)
+
+    def analyze(self, **options):
+        analyzer = PcapAnalyzer()
+        analyzer.min_chunk_bytes = 1
+        return analyzer.analyze_pcap(self.pcap_path, **options)
+
+    def test_profiling_leaves_results_unchanged(self):
+        """Test every mode only adds a performance section when profiled"""
+        total = len(build_sample_packets())
+        for options, mode, stage in (({}, 'streaming', 'tcp_analysis'),
+                                     ({'columnar': True}, 'columnar', 'build_table'),
+                                     ({'workers': 2}, 'parallel', 'merge'),
+                                     ({'streaming': False}, 'legacy', '_get_tcp_analysis')):
+            with self.subTest(mode=mode):
+                expected = self.analyze(**options)
+                results = self.analyze(profile=True, **options)
+                performance = results.pop('performance')
+                self.assertEqual(results, expected)
+                self.assertEqual(performance['mode'], mode)
+                self.assertEqual(performance['packets'], total)
+                self.assertIn(stage, stage_names(performance))
+
+    def test_legacy_stages(self):
+        """Test the full-load path times loading and each _get_* stage"""
+        performance = self.analyze(streaming=False, profile='memory')['performance']
+        names = stage_names(performance)
+        self.assertEqual(names[:3], ['load', '_get_basic_statistics', '_get_protocol_distribution'])
+        self.assertIn('_scan_protocol', names)
+        self.assertEqual(performance['stages'][0]['packets'], len(build_sample_packets()))
+        self.assertTrue(all('peak_allocated_bytes' in stage for stage in performance['stages']))
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        """Test each bucket counts every observation at or below its bound"""
+        histogram = Histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, route='/api/health')
+        self.assertEqual(list(histogram.samples()), [
+            'latency_seconds_bucket{route="/api/health",le="0.1"} 1',
+            'latency_seconds_bucket{route="/api/health",le="1"} 2',
+            'latency_seconds_bucket{route="/api/health",le="+Inf"} 3',
+            'latency_seconds_count{route="/api/health"} 3',
+            'latency_seconds_sum{route="/api/health"} 5.55',
+        ])
+
+    def test_render_performance(self):
+        """Test analysis stages and timed exports show up in the exposition text"""
+        registry = MetricsRegistry()
+        profiler = Profiler()
+        with profiler.stage('decode', 100):
+            pass
+        registry.observe_performance(profiler.result('streaming', 100))
+        with registry.time_stage('export_csv', 100) as entry:
+            pass
+        text = registry.render()
+
+        self.assertEqual(entry['packets'], 100)
+        self.assertIn('# TYPE ogpw_analysis_stage_seconds histogram', text)
+        self.assertIn('ogpw_analysis_stage_packets_total{stage="decode"} 100', text)
+        self.assertIn('ogpw_analysis_stage_seconds_count{stage="export_csv"} 1', text)
+        self.assertIn('ogpw_analyses_total{mode="streaming"} 1', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
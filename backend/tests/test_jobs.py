@@ -0,0 +1,140 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from jobs import JobQueue, AnalysisJob
+from analysis_store import MemoryAnalysisStore
+
+
+def write_upload(size=1000):
+    """Write a dummy upload of ``size`` bytes and return its path"""
+    with tempfile.NamedTemporaryFile(suffix='.pcap', delete=False) as tmp:
+        tmp.write(b'\0' * size)
+        return tmp.name
+
+
+def wait_for(job, timeout=10):
+    """Wait until a job has left the queued/running states"""
+    deadline = time.time() + timeout
+    while job.status in ('queued', 'running') and time.time() < deadline:
+        time.sleep(0.01)
+    return job.status
+
+
+class TestJobQueue(unittest.TestCase):
+    def test_completed_job(self):
+        """Test a finished job reports its result and removes the upload"""
+        queue = JobQueue(lambda job: {'total_packets': 3})
+        path = write_upload()
+        job = queue.submit(path, 'sample.pcap')
+
+        self.assertEqual(wait_for(job), 'completed')
+        status = queue.get(job.id).to_dict()
+        self.assertEqual(status['progress'], 100.0)
+        self.assertEqual(status['eta_seconds'], 0)
+        self.assertEqual(status['analysis'], {'total_packets': 3})
+        self.assertFalse(os.path.exists(path))
+
+    def test_failed_job(self):
+        """Test analysis errors are reported on the job"""
+        def analyze(job):
+            raise Exception('PCAP analysis failed: bad file')
+
+        queue = JobQueue(analyze)
+        job = queue.submit(write_upload(), 'bad.pcap')
+        self.assertEqual(wait_for(job), 'failed')
+        self.assertEqual(job.to_dict()['error'], 'PCAP analysis failed: bad file')
+
+    def test_progress_and_cancel(self):
+        """Test a running job reports progress and stops when cancelled"""
+        reported = threading.Event()
+
+        def analyze(job):
+            packets = 0
+            while True:
+                packets += 1000
+                job.report_progress(packets, 250)
+                reported.set()
+                time.sleep(0.01)
+
+        queue = JobQueue(analyze)
+        job = queue.submit(write_upload(1000), 'slow.pcap')
+        self.assertTrue(reported.wait(10))
+
+        status = job.to_dict()
+        self.assertEqual(status['status'], 'running')
+        self.assertEqual(status['progress'], 25.0)
+        self.assertGreater(status['packets_per_second'], 0)
+        self.assertIsNotNone(status['eta_seconds'])
+
+        queue.cancel(job.id)
+        self.assertEqual(wait_for(job), 'cancelled')
+        self.assertFalse(os.path.exists(job.filepath))
+
+    def test_cancel_queued_job(self):
+        """Test queued jobs are cancelled before they start"""
+        release = threading.Event()
+        queue = JobQueue(lambda job: release.wait(10), max_workers=1)
+        running = queue.submit(write_upload(), 'first.pcap')
+        queued = queue.submit(write_upload(), 'second.pcap')
+
+        self.assertEqual(queue.cancel(queued.id).status, 'cancelled')
+        release.set()
+        self.assertEqual(wait_for(running), 'completed')
+        self.assertEqual(wait_for(queued), 'cancelled')
+        self.assertIsNone(queued.started_at)
+
+    def test_status_shared_through_store(self):
+        """Test job statuses are published to the store and a stop requested there cancels the job"""
+        store = MemoryAnalysisStore()
+        reported = threading.Event()
+
+        def analyze(job):
+            while True:
+                job.report_progress(1000, 250)
+                reported.set()
+                time.sleep(0.01)
+
+        queue = JobQueue(analyze, store=store)
+        job = queue.submit(write_upload(1000), 'slow.pcap')
+        job.publish_interval = 0
+        self.assertTrue(reported.wait(10))
+        self.assertEqual(store.get_status('job', job.id)['status'], 'running')
+
+        store.request_stop('job', job.id)
+        self.assertEqual(wait_for(job), 'cancelled')
+        self.assertEqual(store.get_status('job', job.id)['status'], 'cancelled')
+
+        queue.analyze = lambda job: {'total_packets': 3}
+        done = queue.submit(write_upload(), 'done.pcap')
+        wait_for(done)
+        self.assertNotIn('analysis', store.get_status('job', done.id))
+
+    def test_unknown_job(self):
+        """Test lookups of unknown job ids"""
+        queue = JobQueue(lambda job: None)
+        self.assertIsNone(queue.get('missing'))
+        self.assertIsNone(queue.cancel('missing'))
+
+    def test_finished_jobs_are_pruned(self):
+        """Test only the most recent finished jobs are kept"""
+        queue = JobQueue(lambda job: {}, max_workers=1, max_finished_jobs=2)
+        jobs = [queue.submit(write_upload(), f'{i}.pcap') for i in range(4)]
+        for job in jobs:
+            wait_for(job)
+        deadline = time.time() + 10
+        while len(queue.jobs) > 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(list(queue.jobs), [job.id for job in jobs[2:]])
+
+    def test_empty_upload_progress(self):
+        """Test progress of an empty upload"""
+        job = AnalysisJob(write_upload(0), 'empty.pcap')
+        try:
+            self.assertEqual(job.to_dict()['progress'], 0)
+        finally:
+            os.unlink(job.filepath)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+import unittest
+import copy
+import os
+import shutil
+import tempfile
+import time
+from scapy.all import wrpcap
+from fast_decoder import decode_frames
+from live_capture import LiveCapture, PcapTailer, result_delta
+from pcap_analyzer import PcapAnalyzer
+from synthetic_capture import write_capture
+from tests.test_pcap_analyzer import build_sample_packets, write_sample_pcap
+
+
+def analyze_all(tailer, analyzer):
+    """Poll a tailer once into an analyzer, returning the new packet count"""
+    return analyzer.add_records(record for _, record in decode_frames(tailer.read_frames()))
+
+
+class TestPcapTailer(unittest.TestCase):
+    def setUp(self):
+        """Write the sample capture and a directory to tail captures in"""
+        self.pcap_path = write_sample_pcap()
+        with open(self.pcap_path, 'rb') as f:
+            self.capture = f.read()
+        self.expected = PcapAnalyzer().analyze_pcap(self.pcap_path)
+        self.live_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        os.unlink(self.pcap_path)
+        shutil.rmtree(self.live_dir)
+
+    def test_growing_file(self):
+        """Test a file written in pieces is analyzed once, record by record"""
+        path = os.path.join(self.live_dir, 'growing.pcap')
+        tailer = PcapTailer(path)
+        analyzer = PcapAnalyzer()
+        self.assertEqual(analyze_all(tailer, analyzer), 0)
+
+        with open(path, 'wb') as f:
+            # Cuts fall inside the global header and inside records
+            for start in range(0, len(self.capture), 37):
+                f.write(self.capture[start:start + 37])
+                f.flush()
+                analyze_all(tailer, analyzer)
+        tailer.close()
+        self.assertEqual(analyzer.analysis_results, self.expected)
+
+    def test_rotated_directory(self):
+        """Test rotated files are read oldest first and each only once"""
+        packets = build_sample_packets()
+        thirds = [packets[:5], packets[5:10], packets[10:]]
+        tailer = PcapTailer(self.live_dir)
+        analyzer = PcapAnalyzer()
+        for i, part in enumerate(thirds[:2]):
+            path = os.path.join(self.live_dir, f'capture-{i}.pcap')
+            wrpcap(path, part)
+            os.utime(path, (1000 + i, 1000 + i))
+        self.assertEqual(analyze_all(tailer, analyzer), 10)
+        self.assertEqual(analyze_all(tailer, analyzer), 0)
+
+        wrpcap(os.path.join(self.live_dir, 'capture-2.pcap'), thirds[2])
+        self.assertEqual(analyze_all(tailer, analyzer), len(thirds[2]))
+        tailer.close()
+        self.assertEqual(analyzer.analysis_results, self.expected)
+
+    def test_replaced_file(self):
+        """Test a file replaced under the same name is finished before the new one"""
+        packets = build_sample_packets()
+        path = os.path.join(self.live_dir, 'live.pcap')
+        wrpcap(path, packets[:4])
+        tailer = PcapTailer(path)
+        analyzer = PcapAnalyzer()
+        self.assertEqual(analyze_all(tailer, analyzer), 4)
+
+        wrpcap(path, packets[4:6], append=True)
+        replacement = os.path.join(self.live_dir, 'next.pcap')
+        wrpcap(replacement, packets[6:])
+        os.replace(replacement, path)
+        self.assertEqual(analyze_all(tailer, analyzer), len(packets) - 4)
+        tailer.close()
+        self.assertEqual(analyzer.analysis_results, self.expected)
+
+    def test_pcapng_rejected(self):
+        """Test only uncompressed pcap files can be tailed"""
+        path = write_sample_pcap(suffix='.pcapng')
+        try:
+            with open(path, 'wb') as f:
+                f.write(b'\x0a\x0d\x0d\x0a' + b'\x00' * 24)
+            tailer = PcapTailer(path)
+            with self.assertRaises(Exception):
+                list(tailer.read_frames())
+            tailer.close()
+        finally:
+            os.unlink(path)
+
+
+class TestLiveCapture(unittest.TestCase):
+    def setUp(self):
+        self.live_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.live_dir, 'live.pcap')
+        self.packets = build_sample_packets()
+
+    def tearDown(self):
+        shutil.rmtree(self.live_dir)
+
+    def test_peeked_results_match_finished_results(self):
+        """Test live results equal results finished from a copy of the state, poll after poll"""
+        write_capture(self.path, 20000)
+        tailer = PcapTailer(self.path)
+        records = [record for _, record in decode_frames(tailer.read_frames())]
+        tailer.close()
+        analyzer = PcapAnalyzer()
+        for start in range(0, len(records), 3000):
+            analyzer.add_records(records[start:start + 3000])
+            finished = analyzer._collect_results(copy.deepcopy(analyzer.live_accumulators), analyzer.live_packets)
+            self.assertEqual(analyzer.analysis_results, finished)
+        self.assertEqual(analyzer.analysis_results, PcapAnalyzer().analyze_records(records))
+
+        self.assertEqual(analyzer.add_records([]), 0)
+        self.assertEqual(analyzer.live_changes, [])
+        analyzer.add_records([records[0]._replace(layers=0)])
+        self.assertNotIn('dns_analysis', analyzer.live_changes)
+        self.assertNotIn('tcp_analysis', analyzer.live_changes)
+        self.assertIn('basic_stats', analyzer.live_changes)
+
+    def test_result_delta(self):
+        """Test deltas carry the changed client sections only"""
+        current = {'total_packets': 3, 'dns_analysis': {'total_queries': 0},
+                   'timeline': [{'timestamp': 1, 'packets': 1}, {'timestamp': 2, 'packets': 2}]}
+        self.assertEqual(result_delta(current, ['total_packets', 'timeline', 'timeline_series']), {
+            'total_packets': 3,
+            'timeline': [{'timestamp': 1, 'packets': 1}, {'timestamp': 2, 'packets': 2}]
+        })
+        self.assertEqual(result_delta(current, []), {})
+
+    def test_subscribers_get_snapshot_then_deltas(self):
+        """Test polls publish deltas that rebuild the latest results"""
+        wrpcap(self.path, self.packets[:6])
+        updates = []
+        live = LiveCapture(self.path, 'live.pcap', on_update=lambda live, results: updates.append(results))
+        live.update_interval = 0
+        events = live.subscribe()
+        self.assertEqual(live.poll(), 6)
+        wrpcap(self.path, self.packets[6:], append=True)
+        self.assertEqual(live.poll(), len(self.packets) - 6)
+        self.assertEqual(live.poll(), 0)
+
+        event, data = events.get_nowait()
+        self.assertEqual(event, 'snapshot')
+        self.assertIsNone(data['analysis'])
+        analysis = {}
+        for sequence in (1, 2):
+            event, data = events.get_nowait()
+            self.assertEqual((event, data['sequence']), ('delta', sequence))
+            analysis.update(data['changes'])
+        self.assertTrue(events.empty())
+        self.assertEqual(analysis, live.results)
+        self.assertNotIn('timeline_series', analysis)
+        self.assertEqual(len(updates), 2)
+        self.assertIn('timeline_series', updates[-1])
+        self.assertEqual(live.results['total_packets'], len(self.packets))
+        live.tailer.close()
+
+    def test_stop_ends_streams(self):
+        """Test stopping a live capture sends an end event"""
+        wrpcap(self.path, self.packets)
+        live = LiveCapture(self.path, 'live.pcap')
+        live.poll_interval = 0.01
+        live.start()
+        events = live.subscribe()
+        live.stop()
+        live.thread.join(10)
+        received = []
+        while not events.empty():
+            received.append(events.get_nowait())
+        self.assertEqual(received[-1][0], 'end')
+        self.assertEqual(received[-1][1]['status'], 'stopped')
+        self.assertEqual(received[-1][1]['packets_processed'], len(self.packets))
+
+    def test_updates_are_throttled(self):
+        """Test on_update gets the results at most every update_interval and once more at the end"""
+        wrpcap(self.path, self.packets[:6])
+        updates = []
+        live = LiveCapture(self.path, 'live.pcap', on_update=lambda live, results: updates.append(results))
+        live.poll_interval = 0.01
+        live.update_interval = 60
+        live.start()
+        deadline = time.time() + 10
+        while not updates and time.time() < deadline:
+            time.sleep(0.01)
+        wrpcap(self.path, self.packets[6:], append=True)
+        while live.analyzer.live_packets < len(self.packets) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(updates), 1)
+
+        live.stop()
+        self.assertIn(live.to_dict()['status'], ('stopping', 'stopped'))
+        live.thread.join(10)
+        self.assertEqual(live.to_dict()['status'], 'stopped')
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(updates[-1]['total_packets'], len(self.packets))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os
+from scapy.all import IP, TCP, UDP, ICMP, ARP, rdpcap
+from packet_filter import PacketFilter
+from packet_record import record_from_packet
+from packet_table import PacketTable, FILTER_PROTOCOLS
+from pcap_analyzer import PcapAnalyzer
+from tests.test_pcap_analyzer import write_sample_pcap
+
+# Expressions with the packets of the sample capture they must select
+EXPRESSIONS = {
+    'tcp': lambda pkt: TCP in pkt,
+    'tcp and dst port 80': lambda pkt: TCP in pkt and pkt[TCP].dport == 80,
+    'udp port 53 or icmp': lambda pkt: (UDP in pkt and 53 in (pkt[UDP].sport, pkt[UDP].dport)) or ICMP in pkt,
+    'net 10.0.0.0/30 and not src host 10.0.0.1': lambda pkt: IP in pkt and pkt[IP].src != '10.0.0.1' and (
+        pkt[IP].src in ('10.0.0.2', '10.0.0.3') or pkt[IP].dst in ('10.0.0.1', '10.0.0.2', '10.0.0.3')),
+    'src net 192.168.0.0/16 && tcp dst portrange 1000-1004': lambda pkt: IP in pkt and
+        pkt[IP].src.startswith('192.168.') and TCP in pkt and 1000 <= pkt[TCP].dport <= 1004,
+    'tcp[tcpflags] & (tcp-syn|tcp-ack) == tcp-syn': lambda pkt: TCP in pkt and pkt[TCP].flags & 0x12 == 0x02,
+    '!(ip) || greater 200': lambda pkt: IP not in pkt or len(pkt) >= 200,
+    'len < 60 and arp': lambda pkt: ARP in pkt and len(pkt) < 60,
+}
+
+
+class TestPacketFilter(unittest.TestCase):
+    def setUp(self):
+        self.pcap_path = write_sample_pcap()
+        self.packets = rdpcap(self.pcap_path)
+        self.records = [record_from_packet(pkt) for pkt in self.packets]
+        self.table = PacketTable.from_records(self.records)
+
+    def tearDown(self):
+        os.unlink(self.pcap_path)
+
+    def test_predicate_and_mask_select_the_same_packets(self):
+        """Test record predicates and table masks agree with scapy field checks"""
+        for expression, selects in EXPRESSIONS.items():
+            expected = [bool(selects(pkt)) for pkt in self.packets]
+            packet_filter = PacketFilter(expression)
+            self.assertEqual([packet_filter.matches(record) for record in self.records], expected, expression)
+            self.assertEqual(packet_filter.mask(self.table).tolist(), expected, expression)
+
+    def test_protocol_names_match_protocol_filters(self):
+        """Test a protocol name as expression selects what filter_by_protocol does"""
+        analyzer = PcapAnalyzer()
+        analyzer.packet_table = self.table
+        for protocol in FILTER_PROTOCOLS:
+            filtered = analyzer.filter_by_expression(protocol.lower())
+            expected = analyzer.filter_by_protocol({}, protocol)
+            del filtered['expression'], expected['protocol']
+            self.assertEqual(filtered, expected)
+
+    def test_table_and_packet_paths_agree(self):
+        """Test the vectorized and per-record filters produce the same sections"""
+        indexed = PcapAnalyzer()
+        indexed.packet_table = self.table
+        scanned = PcapAnalyzer()
+        scanned.packets = self.packets
+        for expression in EXPRESSIONS:
+            self.assertEqual(indexed.filter_by_expression(expression), scanned.filter_by_expression(expression))
+
+    def test_invalid_expressions(self):
+        """Test malformed expressions are rejected with ValueError"""
+        for expression in ('', 'tcp and', 'port 70000', 'host 10.0.0', 'net fe80::/10', 'icmp port 7',
+                           'portrange 9-1', '(tcp', 'tcp)', 'frobnicate', 'ip port 80', '(' * 100 + 'tcp' + ')' * 100):
+            with self.assertRaises(ValueError, msg=expression):
+                PacketFilter(expression)
+
+
+if __name__ == '__main__':
+    unittest.main()
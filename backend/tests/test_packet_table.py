@@ -0,0 +1,111 @@
+import unittest
+import os
+from scapy.all import Ether, IP, UDP, rdpcap
+from packet_record import record_from_packet
+from packet_table import PacketIndexWriter, PacketTable, FILTER_PROTOCOLS, ip_to_int, int_to_ip
+from pcap_analyzer import PcapAnalyzer
+from tests.test_pcap_analyzer import build_sample_packets, write_sample_pcap
+
+
+class TestPacketTable(unittest.TestCase):
+    def setUp(self):
+        """Load the sample capture both as packets and as a table"""
+        packets = build_sample_packets()
+        # Equal packet counts whose numeric and string address orders differ
+        for i in range(3):
+            for pkt in (Ether() / IP(src='10.0.0.10', dst='10.0.0.9') / UDP(sport=7, dport=7),
+                        Ether() / IP(src='10.0.0.9', dst='10.0.0.100') / UDP(sport=7, dport=7)):
+                pkt.time = 1700000020 + i
+                packets.append(pkt)
+        self.pcap_path = write_sample_pcap(packets)
+        self.analyzer = PcapAnalyzer()
+        self.analyzer.packets = rdpcap(self.pcap_path)
+        self.table = PacketTable.from_records(record_from_packet(pkt) for pkt in self.analyzer.packets)
+
+    def tearDown(self):
+        os.unlink(self.pcap_path)
+
+    def test_ip_conversion(self):
+        """Test IPv4 addresses round-trip through uint32"""
+        self.assertEqual(int_to_ip(ip_to_int('192.168.1.66')), '192.168.1.66')
+
+    def test_sections_match_packet_scans(self):
+        """Test every vectorized section matches the per-packet stage"""
+        self.assertEqual(self.table.basic_statistics(), self.analyzer._get_basic_statistics())
+        self.assertEqual(self.table.protocol_distribution(), self.analyzer._get_protocol_distribution())
+        self.assertEqual(self.table.ip_conversations(), self.analyzer._get_ip_conversations())
+        self.assertEqual(self.table.tcp_analysis(), self.analyzer._get_tcp_analysis())
+        self.assertEqual(self.table.anomalies(), self.analyzer._detect_anomalies())
+        self.assertEqual(self.table.timeline(), self.analyzer._get_traffic_timeline())
+
+    def test_protocol_filters_match_packet_scans(self):
+        """Test filtering the table matches filtering dissected packets"""
+        for protocol in FILTER_PROTOCOLS:
+            expected = self.analyzer.filter_by_protocol({}, protocol)
+            indexed = PcapAnalyzer()
+            indexed.packet_table = self.table
+            self.assertEqual(indexed.filter_by_protocol({}, protocol), expected)
+
+    def test_save_and_load(self):
+        """Test a saved table loads back unchanged"""
+        index_path = self.pcap_path + '.npz'
+        self.table.save(index_path)
+        try:
+            loaded = PacketTable.load(index_path)
+            self.assertTrue(loaded.df.equals(self.table.df))
+            self.assertEqual(list(loaded.df.dtypes), list(self.table.df.dtypes))
+        finally:
+            os.unlink(index_path)
+
+    def test_index_writer(self):
+        """Test the index written in chunks, and appended across writers, loads as the whole table"""
+        directory = os.path.dirname(self.pcap_path)
+        index_path = self.pcap_path + '.npz'
+        records = [record_from_packet(pkt) for pkt in self.analyzer.packets]
+        try:
+            first, second = PacketIndexWriter(directory), PacketIndexWriter(directory)
+            first.flush_rows = second.flush_rows = 4
+            for record in records[:10]:
+                first.add(record)
+            for record in records[10:]:
+                second.add(record)
+            first.extend(second)
+            self.assertFalse(os.path.exists(second.spill_dir))
+            self.assertTrue(first.save(index_path))
+            self.assertFalse(os.path.exists(first.spill_dir))
+            loaded = PacketTable.load(index_path)
+            self.assertTrue(loaded.df.equals(self.table.df))
+
+            # Past max_packets nothing is kept or saved
+            os.unlink(index_path)
+            capped = PacketIndexWriter(directory, max_packets=len(records) - 1)
+            for record in records:
+                capped.add(record)
+            self.assertTrue(capped.truncated)
+            self.assertFalse(os.path.exists(capped.spill_dir))
+            self.assertFalse(capped.save(index_path))
+            self.assertFalse(os.path.exists(index_path))
+        finally:
+            if os.path.exists(index_path):
+                os.unlink(index_path)
+
+    def test_empty_table(self):
+        """Test aggregations over an empty table"""
+        table = PacketTable.from_records([])
+        self.analyzer.packets = []
+        self.assertEqual(table.basic_statistics(), {})
+        self.assertEqual(table.protocol_distribution(), {})
+        self.assertEqual(table.ip_conversations(), [])
+        self.assertEqual(table.tcp_analysis(), self.analyzer._get_tcp_analysis())
+        self.assertEqual(table.anomalies(), [])
+        self.assertEqual(table.timeline(), self.analyzer._get_traffic_timeline())
+
+    def test_columnar_analysis(self):
+        """Test columnar analyze_pcap matches the streaming result"""
+        analyzer = PcapAnalyzer()
+        result = analyzer.analyze_pcap(self.pcap_path, columnar=True)
+        self.assertEqual(result, PcapAnalyzer().analyze_pcap(self.pcap_path))
+        self.assertEqual(len(analyzer.packet_table), result['total_packets'])
+
+if __name__ == '__main__':
+    unittest.main()
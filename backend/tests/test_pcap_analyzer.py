@@ -1,8 +1,61 @@
 import unittest
 import tempfile
 import os
+from unittest.mock import patch
+from scapy.all import Ether, IP, IPv6, TCP, UDP, ICMP, ARP, DNS, DNSQR, Raw, wrpcap, rdpcap
+from scapy.utils import PcapNgWriter
+from fast_decoder import pcap_ranges, iter_capture
+from packet_table import PacketTable
 from pcap_analyzer import PcapAnalyzer
 
+
+def build_sample_packets():
+    """Small mixed capture covering every analysis section"""
+    packets = []
+    base = 1700000000.25
+
+    def add(pkt, offset):
+        pkt.time = base + offset
+        packets.append(pkt)
+
+    # Completed and refused TCP handshakes
+    add(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / TCP(sport=40000, dport=80, flags='S'), 0.0)
+    add(Ether() / IP(src='10.0.0.2', dst='10.0.0.1') / TCP(sport=80, dport=40000, flags='SA'), 0.1)
+    add(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / TCP(sport=40000, dport=80, flags='A'), 0.2)
+    add(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / TCP(sport=40000, dport=80, flags='PA') / Raw(b'GET / HTTP/1.1\r\n\r\n'), 0.3)
+    add(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / TCP(sport=40000, dport=80, flags='FA'), 1.4)
+    add(Ether() / IP(src='10.0.0.3', dst='10.0.0.2') / TCP(sport=40001, dport=22, flags='S'), 1.5)
+    add(Ether() / IP(src='10.0.0.2', dst='10.0.0.3') / TCP(sport=22, dport=40001, flags='R'), 1.6)
+
+    # Port scan from a single source
+    for i, port in enumerate(range(1000, 1015)):
+        add(Ether() / IP(src='192.168.1.66', dst='10.0.0.2') / TCP(sport=50000, dport=port, flags='S'), 2.0 + i * 0.01)
+
+    # DNS queries and responses
+    for i, name in enumerate(['example.com', 'example.com', 'test.org']):
+        add(Ether() / IP(src='10.0.0.1', dst='8.8.8.8') / UDP(sport=53000 + i, dport=53) /
+            DNS(id=i, rd=1, qd=DNSQR(qname=name)), 3.0 + i * 0.1)
+        add(Ether() / IP(src='8.8.8.8', dst='10.0.0.1') / UDP(sport=53, dport=53000 + i) /
+            DNS(id=i, qr=1, qd=DNSQR(qname=name)), 3.05 + i * 0.1)
+
+    # Plain UDP, ICMP, ARP, IPv6 and non-IP frames
+    add(Ether() / IP(src='10.0.0.4', dst='10.0.0.5') / UDP(sport=5000, dport=6000) / Raw(b'x' * 100), 4.0)
+    add(Ether() / IP(src='10.0.0.1', dst='10.0.0.5') / ICMP(), 4.5)
+    add(Ether() / ARP(psrc='10.0.0.1', pdst='10.0.0.9'), 5.0)
+    add(Ether() / IPv6(src='fe80::1', dst='fe80::2') / TCP(sport=1234, dport=443, flags='S'), 5.5)
+    add(Ether(type=0x88b5) / Raw(b'\x00' * 20), 6.0)
+    add(Ether() / IP(src='10.0.0.6', dst='10.0.0.7', proto=47) / Raw(b'\x00' * 8), 6.2)
+
+    return packets
+
+
+def write_sample_pcap(packets=None, suffix='.pcap'):
+    """Write packets to a temporary capture file and return its path"""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp_path = tmp.name
+    wrpcap(tmp_path, packets if packets is not None else build_sample_packets())
+    return tmp_path
+
 class TestPcapAnalyzer(unittest.TestCase):
     def setUp(self):
         """Set up test analyzer"""
@@ -30,5 +83,159 @@ class TestPcapAnalyzer(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.analyzer.filter_by_protocol({}, 'INVALID')
 
+class TestStreamingAnalysis(unittest.TestCase):
+    def setUp(self):
+        """Write a sample capture"""
+        self.pcap_path = write_sample_pcap()
+
+    def tearDown(self):
+        os.unlink(self.pcap_path)
+
+    def test_streaming_matches_full_load(self):
+        """Test streaming analysis produces the same results as rdpcap"""
+        expected = PcapAnalyzer().analyze_pcap(self.pcap_path, streaming=False)
+        analyzer = PcapAnalyzer()
+        result = analyzer.analyze_pcap(self.pcap_path)
+        self.assertEqual(result, expected)
+        self.assertEqual(list(result.keys()), list(expected.keys()))
+        self.assertEqual(len(analyzer.packets), 0)
+
+    def test_streaming_sections(self):
+        """Test streaming analysis covers anomalies, DNS and TCP"""
+        result = PcapAnalyzer().analyze_pcap(self.pcap_path)
+        self.assertEqual(result['total_packets'], len(build_sample_packets()))
+        self.assertEqual(result['dns_analysis']['total_queries'], 3)
+        self.assertEqual(result['dns_analysis']['top_domains'][0],
+                         {'domain': 'example.com', 'count': 2})
+        self.assertEqual(result['tcp_analysis']['total_tcp_packets'], 22)
+        self.assertIn('Port Scan Burst', [a['type'] for a in result['anomalies']])
+
+    def test_fast_decode_matches_scapy(self):
+        """Test raw-bytes decoding produces the same results as scapy"""
+        expected = PcapAnalyzer().analyze_pcap(self.pcap_path, fast_decode=False)
+        self.assertEqual(PcapAnalyzer().analyze_pcap(self.pcap_path), expected)
+
+    def test_progress_callback(self):
+        """Test progress reports and aborting from the callback"""
+        calls = []
+        with patch('pcap_analyzer.PROGRESS_INTERVAL', 10):
+            PcapAnalyzer().analyze_pcap(self.pcap_path, fast_decode=False,
+                                        progress=lambda *args: calls.append(args))
+        self.assertEqual([packets for packets, _ in calls], [10, 20, 30])
+        self.assertTrue(all(0 < bytes_read < os.path.getsize(self.pcap_path) for _, bytes_read in calls))
+
+        def cancel(packets, bytes_read):
+            raise Exception('Analysis cancelled')
+
+        with patch('pcap_analyzer.PROGRESS_INTERVAL', 10):
+            with self.assertRaisesRegex(Exception, 'Analysis cancelled'):
+                PcapAnalyzer().analyze_pcap(self.pcap_path, progress=cancel)
+
+    def test_protocol_rollups(self):
+        """Test filters are answered from the rollups without any packets"""
+        result = PcapAnalyzer().analyze_pcap(self.pcap_path)
+        scanner = PcapAnalyzer()
+        scanner.packets = rdpcap(self.pcap_path)
+        for protocol in ['TCP', 'UDP', 'DNS', 'HTTP', 'ICMP']:
+            self.assertEqual(PcapAnalyzer().filter_by_protocol(result, protocol),
+                             scanner.filter_by_protocol({}, protocol))
+        self.assertEqual(result['protocol_rollups']['DNS']['filtered_packet_count'], 6)
+
+    def test_packet_index(self):
+        """Test the saved packet index holds every packet with its file offset"""
+        index_path = self.pcap_path + '.npz'
+        offsets = [frame[0] for frame in iter_capture(self.pcap_path)]
+        try:
+            for fast_decode in (True, False):
+                analyzer = PcapAnalyzer()
+                result = analyzer.analyze_pcap(self.pcap_path, fast_decode=fast_decode, index_path=index_path)
+                self.assertEqual(result, PcapAnalyzer().analyze_pcap(self.pcap_path))
+                table = PacketTable.load(index_path)
+                self.assertEqual(table.df['offset'].tolist(), offsets)
+                self.assertEqual(table.basic_statistics(), result['basic_stats'])
+                self.assertTrue(analyzer.index_saved)
+                self.assertIsNone(analyzer.packet_table)
+        finally:
+            os.unlink(index_path)
+
+    def test_packet_index_limit(self):
+        """Test captures over max_index_packets are analyzed without saving an index"""
+        index_path = self.pcap_path + '.npz'
+        directory = os.path.dirname(self.pcap_path)
+        spill_dirs = lambda: {name for name in os.listdir(directory) if name.startswith('index_')}
+        before = spill_dirs()
+        for workers in (1, 3):
+            analyzer = PcapAnalyzer()
+            analyzer.min_chunk_bytes = 1
+            analyzer.max_index_packets = len(build_sample_packets()) - 1
+            result = analyzer.analyze_pcap(self.pcap_path, workers=workers, index_path=index_path)
+            self.assertEqual(result, PcapAnalyzer().analyze_pcap(self.pcap_path))
+            self.assertFalse(analyzer.index_saved)
+            self.assertFalse(os.path.exists(index_path))
+            self.assertEqual(spill_dirs(), before)
+
+    def test_streaming_empty_capture(self):
+        """Test streaming analysis of a capture without packets"""
+        empty_path = write_sample_pcap([])
+        try:
+            expected = PcapAnalyzer().analyze_pcap(empty_path, streaming=False)
+            self.assertEqual(PcapAnalyzer().analyze_pcap(empty_path), expected)
+        finally:
+            os.unlink(empty_path)
+
+class TestParallelAnalysis(unittest.TestCase):
+    def setUp(self):
+        """Write a sample capture and allow splitting it into tiny chunks"""
+        self.pcap_path = write_sample_pcap()
+        self.analyzer = PcapAnalyzer()
+        self.analyzer.min_chunk_bytes = 1
+
+    def tearDown(self):
+        os.unlink(self.pcap_path)
+
+    def test_parallel_matches_serial(self):
+        """Test merged chunk results equal a serial run"""
+        expected = PcapAnalyzer().analyze_pcap(self.pcap_path)
+        self.assertEqual(self.analyzer.analyze_pcap(self.pcap_path, workers=4), expected)
+
+    def test_merge_in_capture_order(self):
+        """Test merging many single-chunk partials keeps first-seen order"""
+        ranges = pcap_ranges(self.pcap_path, 10000)
+        self.assertEqual(len(ranges), len(build_sample_packets()))
+        result = self.analyzer.analyze_parallel(self.pcap_path, ranges, fast_decode=False, workers=3)
+        self.assertEqual(result, PcapAnalyzer().analyze_pcap(self.pcap_path, streaming=False))
+
+    def test_parallel_packet_index(self):
+        """Test per-chunk packet tables concatenate to the serial index"""
+        serial = PcapAnalyzer()
+        serial.analyze_pcap(self.pcap_path, columnar=True)
+        index_path = self.pcap_path + '.npz'
+        try:
+            self.analyzer.analyze_pcap(self.pcap_path, workers=3, index_path=index_path)
+            self.assertTrue(PacketTable.load(index_path).df.equals(serial.packet_table.df))
+        finally:
+            os.unlink(index_path)
+
+    def test_parallel_progress(self):
+        """Test progress is reported as each of several ranges per worker completes"""
+        calls = []
+        self.analyzer.ranges_per_worker = 3
+        self.analyzer.analyze_pcap(self.pcap_path, workers=2, progress=lambda *args: calls.append(args))
+        self.assertEqual(len(calls), 6)
+        self.assertEqual(max(calls), (len(build_sample_packets()), os.path.getsize(self.pcap_path) - 24))
+
+    def test_pcapng_falls_back_to_serial(self):
+        """Test captures that cannot be split are analyzed serially"""
+        pcapng_path = self.pcap_path + 'ng'
+        writer = PcapNgWriter(pcapng_path)
+        writer.write(build_sample_packets())
+        writer.close()
+        try:
+            self.assertEqual(pcap_ranges(pcapng_path, 4), [])
+            self.assertEqual(self.analyzer.analyze_pcap(pcapng_path, workers=4),
+                             PcapAnalyzer().analyze_pcap(pcapng_path))
+        finally:
+            os.unlink(pcapng_path)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
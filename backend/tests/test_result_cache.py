@@ -0,0 +1,83 @@
+import unittest
+import gzip
+import os
+import shutil
+import tempfile
+from result_cache import ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        """Create an empty cache directory"""
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ResultCache(self.cache_dir, version='1')
+        self.results = {'total_packets': 3, 'protocol_distribution': {'TCP': {'count': 3, 'percentage': 100.0}}}
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_round_trip(self):
+        """Test stored results are returned for the same hash"""
+        self.assertIsNone(self.cache.get('abc'))
+        self.cache.put('abc', self.results)
+        self.assertEqual(self.cache.get('abc'), self.results)
+
+    def test_entries_are_compressed(self):
+        """Test entries are gzip-compressed JSON"""
+        self.cache.put('abc', self.results)
+        entries = os.listdir(self.cache_dir)
+        self.assertEqual(entries, ['abc-v1.json.gz'])
+        with gzip.open(os.path.join(self.cache_dir, entries[0])) as f:
+            self.assertIn(b'total_packets', f.read())
+
+    def test_analyzer_version_in_key(self):
+        """Test results from another analyzer version are not served"""
+        self.cache.put('abc', self.results)
+        self.assertIsNone(ResultCache(self.cache_dir, version='2').get('abc'))
+
+    def test_lru_eviction(self):
+        """Test the least recently used entries are evicted beyond max_bytes"""
+        for i, key in enumerate(['a', 'b', 'c']):
+            self.cache.put(key, self.results)
+            os.utime(os.path.join(self.cache_dir, f'{key}-v1.json.gz'), (1000 + i, 1000 + i))
+        entry_size = os.path.getsize(os.path.join(self.cache_dir, 'a-v1.json.gz'))
+
+        # Reading 'a' makes 'b' the least recently used entry
+        self.cache.get('a')
+        self.cache.max_bytes = entry_size * 3
+        self.cache.put('d', self.results)
+
+        self.assertIsNone(self.cache.get('b'))
+        for key in ['a', 'c', 'd']:
+            self.assertEqual(self.cache.get(key), self.results)
+
+    def test_packet_index(self):
+        """Test packet indexes are found by hash and bounded separately from the results"""
+        self.assertIsNone(self.cache.get_index('abc'))
+        path = os.path.join(self.cache_dir, 'upload.index.npz.tmp')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 100)
+        self.cache.put_index('abc', path)
+        self.assertEqual(self.cache.get_index('abc'), self.cache.index_path('abc'))
+
+        # A large index does not evict results, nor results the index
+        self.cache.put('def', self.results)
+        self.cache.max_bytes = os.path.getsize(os.path.join(self.cache_dir, 'def-v1.json.gz')) + 50
+        self.cache.put('def', self.results)
+        self.assertEqual(self.cache.get_index('abc'), self.cache.index_path('abc'))
+        self.assertEqual(self.cache.get('def'), self.results)
+
+        self.cache.index_max_bytes = 50
+        self.cache.put('ghi', self.results)
+        self.assertIsNone(self.cache.get_index('abc'))
+
+    def test_corrupt_entry(self):
+        """Test unreadable entries are treated as misses and removed"""
+        path = os.path.join(self.cache_dir, 'abc-v1.json.gz')
+        with open(path, 'wb') as f:
+            f.write(b'not gzip')
+        self.assertIsNone(self.cache.get('abc'))
+        self.assertFalse(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from sections import analysis_summary, page_section
+from traffic_tables import TrafficTables
+
+ANALYSIS = {
+    'total_packets': 60,
+    'basic_stats': {'total_packets': 60},
+    'protocol_distribution': {'TCP': {'count': 40, 'percentage': 66.67}, 'UDP': {'count': 20, 'percentage': 33.33}},
+    'ip_conversations': [
+        {'endpoints': f'10.0.0.{i} ↔ 10.0.1.1', 'packets': 10 - i, 'bytes': i * 100} for i in range(7)
+    ],
+    'tcp_analysis': {'total_connections': 3, 'successful_connections': 2, 'failed_connections': 1,
+                     'success_rate': 66.67, 'handshake_rtt_ms': {'count': 2}},
+    'dns_analysis': {'total_queries': 4, 'total_responses': 3, 'unique_domains': 2,
+                     'top_domains': [{'domain': 'a.test', 'count': 1}, {'domain': 'b.test', 'count': 3}]},
+    'anomalies': [
+        {'type': 'Traffic Spike', 'severity': 'Low', 'window': {'start': 5, 'end': 6}},
+        {'type': 'SYN Flood', 'severity': 'High', 'window': {'start': 9, 'end': 20}},
+        {'type': 'Port Scan Burst', 'severity': 'Medium', 'window': {'start': 1, 'end': 2}},
+    ],
+}
+
+
+class TestSections(unittest.TestCase):
+    def test_cursor_pagination(self):
+        """Test pages follow each other without gaps or overlaps"""
+        seen = []
+        cursor = None
+        while True:
+            page = page_section(ANALYSIS, 'conversations', '-bytes', limit=3, cursor=cursor)
+            self.assertEqual(page['total'], 7)
+            seen.extend(item['bytes'] for item in page['items'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, [600, 500, 400, 300, 200, 100, 0])
+
+    def test_pages_match_a_stable_sort(self):
+        """Test heap-selected pages equal pages of a stable sort, ties in analysis order"""
+        anomalies = [{'type': f'Anomaly {i}', 'severity': ('Low', 'High', 'Medium')[i % 3]} for i in range(20)]
+        analysis = {'anomalies': anomalies}
+        for sort, reverse in (('-severity', True), ('severity', False)):
+            expected = sorted(anomalies, key=lambda a: ('Low', 'Medium', 'High').index(a['severity']),
+                              reverse=reverse)
+            seen = []
+            cursor = None
+            while True:
+                page = page_section(analysis, 'anomalies', sort, limit=6, cursor=cursor)
+                seen.extend(page['items'])
+                cursor = page['next_cursor']
+                if cursor is None:
+                    break
+            self.assertEqual(seen, expected)
+
+    def test_default_sorts(self):
+        """Test sections have sensible default orders"""
+        anomalies = page_section(ANALYSIS, 'anomalies')['items']
+        self.assertEqual([a['severity'] for a in anomalies], ['High', 'Medium', 'Low'])
+        self.assertEqual([a['type'] for a in page_section(ANALYSIS, 'anomalies', 'start')['items']],
+                         ['Port Scan Burst', 'Traffic Spike', 'SYN Flood'])
+        self.assertEqual(page_section(ANALYSIS, 'domains')['items'][0]['domain'], 'b.test')
+        self.assertEqual(page_section(ANALYSIS, 'protocols')['items'][0], {'protocol': 'TCP', 'count': 40,
+                                                                           'percentage': 66.67})
+
+    def test_full_tables(self):
+        """Test conversations and domains page the full tables, not the top-10 overviews"""
+        analysis = {
+            **ANALYSIS,
+            'conversation_table': {
+                'a': [f'10.0.0.{i}' for i in range(25)], 'b': ['10.0.1.1'] * 25,
+                'packets_ab': list(range(25)), 'bytes_ab': [100] * 25, 'packets_ba': [1] * 25, 'bytes_ba': [0] * 25,
+                'first_seen': [float(i) for i in range(25)], 'last_seen': [float(i + 1) for i in range(25)]
+            },
+            'domain_table': {'domain': [f'host{i}.test' for i in range(30)], 'count': list(range(30, 0, -1))},
+        }
+        conversations = page_section(analysis, 'conversations', limit=20)
+        self.assertEqual(conversations['total'], 25)
+        self.assertEqual(conversations['items'][0]['endpoints'], '10.0.0.24 ↔ 10.0.1.1')
+        self.assertEqual(conversations['items'][0]['packets'], 25)
+        # The same rows as the top-K conversation queries
+        tables = TrafficTables(analysis['conversation_table'])
+        self.assertEqual(conversations['items'][:10], tables.top_conversations('packets', 10)['items'])
+        self.assertEqual(page_section(analysis, 'conversations', limit=20, tables=tables), conversations)
+        rest = page_section(analysis, 'conversations', limit=20, cursor=conversations['next_cursor'])
+        self.assertEqual([item['packets'] for item in rest['items']], [5, 4, 3, 2, 1])
+        self.assertIsNone(rest['next_cursor'])
+
+        domains = page_section(analysis, 'domains', 'domain', limit=1000)
+        self.assertEqual(domains['total'], 30)
+        self.assertEqual(domains['items'][0], {'domain': 'host0.test', 'count': 30})
+        self.assertEqual(analysis_summary(analysis)['sections'],
+                         {'conversations': 25, 'anomalies': 3, 'domains': 30, 'protocols': 2})
+
+    def test_invalid_queries(self):
+        """Test unknown sections, sort keys, limits and foreign cursors are refused"""
+        cursor = page_section(ANALYSIS, 'conversations', '-bytes', limit=2)['next_cursor']
+        for args in (('flows',), ('conversations', 'severity'), ('conversations', None, 0),
+                     ('conversations', '-packets', 2, cursor), ('conversations', '-bytes', 2, 'not-a-cursor')):
+            with self.assertRaises(ValueError):
+                page_section(ANALYSIS, *args)
+
+    def test_summary(self):
+        """Test the summary holds headline numbers and section sizes only"""
+        summary = analysis_summary(ANALYSIS)
+        self.assertEqual(summary['total_packets'], 60)
+        self.assertEqual(summary['tcp_analysis'], {'total_connections': 3, 'successful_connections': 2,
+                                                   'failed_connections': 1, 'success_rate': 66.67})
+        self.assertEqual(summary['anomalies'], {'total': 3, 'by_severity': {'Low': 1, 'High': 1, 'Medium': 1}})
+        self.assertEqual(summary['sections'], {'conversations': 7, 'anomalies': 3, 'domains': 2, 'protocols': 2})
+        self.assertEqual(analysis_summary({})['sections']['conversations'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+import unittest
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from accumulators import DEFAULT_ACCUMULATORS, SKETCH_ACCUMULATORS, DomainAccumulator
+from packet_record import PacketRecord, LAYER_IP, LAYER_TCP, LAYER_UDP, LAYER_DNS
+from pcap_analyzer import PcapAnalyzer
+from sketches import SpaceSaving, HyperLogLog, QuantileSketch, stable_hash
+from tests.test_pcap_analyzer import write_sample_pcap
+
+
+def zipf_stream(n, distinct, seed=1):
+    """Skewed item stream where a few items dominate"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    return rng.choices(range(distinct), weights, k=n)
+
+
+class TestSpaceSaving(unittest.TestCase):
+    def test_exact_below_capacity(self):
+        """Test counts are exact while every item has a counter"""
+        summary = SpaceSaving(10)
+        for item in 'abracadabra':
+            summary.add(item)
+        self.assertEqual(summary.top(2), [('a', 5, 0, 0), ('b', 2, 0, 0)])
+        self.assertEqual(summary.error_bound(), 0)
+
+    def test_error_bounds(self):
+        """Test heavy hitters are found and counts stay within their bounds"""
+        stream = zipf_stream(20000, 5000)
+        exact = {}
+        for item in stream:
+            exact[item] = exact.get(item, 0) + 1
+        summary = SpaceSaving(200)
+        for item in stream:
+            summary.add(item)
+
+        self.assertLessEqual(summary.error_bound(), len(stream) / 200)
+        top = summary.top(5)
+        self.assertEqual([item for item, _, _, _ in top], [0, 1, 2, 3, 4])
+        for item, count, error, _ in top:
+            self.assertLessEqual(count - error, exact[item])
+            self.assertGreaterEqual(count, exact[item])
+        self.assertEqual(len(summary), 200)
+
+    def test_merge(self):
+        """Test merged summaries keep the heavy hitters and valid bounds"""
+        stream = zipf_stream(20000, 5000, seed=2)
+        exact = {}
+        for item in stream:
+            exact[item] = exact.get(item, 0) + 1
+        first, second = SpaceSaving(200), SpaceSaving(200)
+        for item in stream[:7000]:
+            first.add(item)
+        for item in stream[7000:]:
+            second.add(item)
+        first.merge(second)
+
+        self.assertEqual(first.total, len(stream))
+        for item, count, error, _ in first.top(5):
+            self.assertLessEqual(count - error, exact[item])
+            self.assertGreaterEqual(count, exact[item])
+
+
+class TestHyperLogLog(unittest.TestCase):
+    def test_stable_hash_across_processes(self):
+        """Test values hash alike in a fresh interpreter, whose str hash() is seeded differently"""
+        values = ['example.com', '10.0.0.1', 0, 443, -1, b'raw', ('10.0.0.1', 80)]
+        with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as executor:
+            self.assertEqual(list(executor.map(stable_hash, values)), [stable_hash(value) for value in values])
+        hashes = {stable_hash(value) for value in values}
+        self.assertEqual(len(hashes), len(values))
+        self.assertTrue(all(0 < hashed < 1 << 64 for hashed in hashes))
+
+    def test_small_sets_are_exact(self):
+        """Test small cardinalities are counted exactly"""
+        sketch = HyperLogLog(0.05)
+        for port in [80, 443, 80, 22]:
+            sketch.add(port)
+        self.assertEqual(sketch.estimate(), 3)
+        self.assertEqual(sketch.relative_error, 0)
+
+    def test_estimate_within_error(self):
+        """Test large cardinalities are within a few standard errors"""
+        sketch = HyperLogLog(0.01)
+        for i in range(100000):
+            sketch.add(f'host{i}.example.com')
+        self.assertLess(abs(sketch.estimate() - 100000) / 100000, 3 * sketch.relative_error)
+        self.assertEqual(len(sketch.registers), 16384)
+
+    def test_merge(self):
+        """Test merging equals sketching the union"""
+        first, second, union = HyperLogLog(0.02), HyperLogLog(0.02), HyperLogLog(0.02)
+        for i in range(30000):
+            (first if i % 3 else second).add(i)
+            union.add(i)
+        second.add(5)
+        first.merge(second)
+        self.assertEqual(first.registers, union.registers)
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(0.1))
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def test_relative_error(self):
+        """Test quantiles stay within the relative error of the exact ones"""
+        rng = random.Random(3)
+        values = sorted(rng.lognormvariate(-3, 1) for _ in range(10000))
+        sketch = QuantileSketch(error=0.01)
+        for value in values:
+            sketch.add(value)
+        for q in (0.0, 0.5, 0.9, 0.99, 1.0):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q), exact, delta=exact * 0.01)
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+
+    def test_merge(self):
+        """Test merged sketches equal a single sketch of all values"""
+        values = [i * 0.001 for i in range(1, 2000)] + [0.0]
+        whole, first, second = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for value in values:
+            whole.add(value)
+        for value in values[:500]:
+            first.add(value)
+        for value in values[500:]:
+            second.add(value)
+        first.merge(second)
+        self.assertEqual([first.quantile(q) for q in (0, 0.5, 0.99)], [whole.quantile(q) for q in (0, 0.5, 0.99)])
+        with self.assertRaises(ValueError):
+            first.merge(QuantileSketch(error=0.05))
+
+
+def largest_container(obj):
+    """Most entries held by any dict, list, set or deque reachable from ``obj``"""
+    largest = 0
+    seen = set()
+    stack = [obj]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen or isinstance(value, (str, bytes, bytearray, int, float, type(None))):
+            continue
+        seen.add(id(value))
+        if isinstance(value, dict):
+            largest = max(largest, len(value))
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset, deque)):
+            if not isinstance(value, tuple):
+                largest = max(largest, len(value))
+            stack.extend(value)
+        elif hasattr(value, '__dict__') or hasattr(value, '__slots__'):
+            stack.extend(vars(value).values() if hasattr(value, '__dict__') else
+                         [getattr(value, name) for name in value.__slots__ if hasattr(value, name)])
+    return largest
+
+
+class TestSketchAnalysis(unittest.TestCase):
+    def test_sketch_mode_matches_exact_on_small_capture(self):
+        """Test sketch mode adds error bounds but agrees on a small capture"""
+        pcap_path = write_sample_pcap()
+        try:
+            exact = PcapAnalyzer().analyze_pcap(pcap_path)
+            sketched = PcapAnalyzer(SKETCH_ACCUMULATORS).analyze_pcap(pcap_path)
+            parallel = PcapAnalyzer(SKETCH_ACCUMULATORS)
+            parallel.min_chunk_bytes = 1
+            self.assertEqual(parallel.analyze_pcap(pcap_path, workers=3), sketched)
+        finally:
+            os.unlink(pcap_path)
+
+        # Only the full conversation and domain tables are left out in sketch mode
+        self.assertEqual(list(sketched.keys()),
+                         [key for key in exact if key not in ('conversation_table', 'domain_table')])
+        self.assertEqual(sketched['dns_analysis']['unique_domains'], exact['dns_analysis']['unique_domains'])
+        self.assertEqual(sketched['dns_analysis']['unique_domains_error'], 0)
+        self.assertEqual([{key: entry[key] for key in ('endpoints', 'packets', 'bytes')}
+                          for entry in sketched['ip_conversations']], exact['ip_conversations'])
+        self.assertEqual([a['description'] for a in sketched['anomalies']],
+                         [a['description'] for a in exact['anomalies']])
+
+    def test_sketch_state_is_bounded(self):
+        """Test every sketch-mode accumulator stays bounded when each packet is a new conversation or domain"""
+        records = []
+        for i in range(30000):
+            src, dst = f'10.{i // 65536}.{i // 256 % 256}.{i % 256}', f'172.16.{i // 256 % 256}.{i % 256}'
+            records.append(PacketRecord(i * 0.1, 60, LAYER_IP | LAYER_TCP, src, dst, 40000 + i % 1000, 80, 0x10,
+                                        None, None))
+            records.append(PacketRecord(i * 0.1, 80, LAYER_IP | LAYER_UDP | LAYER_DNS, src, '8.8.8.8', 5353, 53, 0,
+                                        0, f'host{i}.example.com', i % 65536, 0))
+        # Well above the Space-Saving and resolver caps
+        bound = 10000
+        for cls in SKETCH_ACCUMULATORS:
+            accumulator = cls()
+            for record in records:
+                accumulator.add(record)
+            self.assertLessEqual(largest_container(accumulator), bound, cls.__name__)
+
+        # The exact accumulators do grow with the conversations and domains
+        # (sketch mode has no domain table at all)
+        exact = dict(zip(SKETCH_ACCUMULATORS, [cls for cls in DEFAULT_ACCUMULATORS if cls is not DomainAccumulator]))
+        for cls in SKETCH_ACCUMULATORS:
+            if exact[cls] is not cls:
+                accumulator = exact[cls]()
+                for record in records:
+                    accumulator.add(record)
+                self.assertGreater(largest_container(accumulator), bound, cls.__name__)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import io
+import os
+import tempfile
+import threading
+import time
+from pcap_analyzer import PcapAnalyzer
+from streaming_upload import (
+    GrowingFile, UploadRejected, is_capture_header, read_header, receive_upload
+)
+from tests.test_pcap_analyzer import write_sample_pcap
+
+
+class SlowStream:
+    """Stream returning small chunks with a pause between them"""
+
+    def __init__(self, data, chunk_size=100, delay=0.001):
+        self.data = io.BytesIO(data)
+        self.chunk_size = chunk_size
+        self.delay = delay
+
+    def read(self, size=-1):
+        time.sleep(self.delay)
+        return self.data.read(self.chunk_size)
+
+
+class TestStreamingUpload(unittest.TestCase):
+    def setUp(self):
+        """Write a sample capture and reserve an upload path"""
+        self.pcap_path = write_sample_pcap()
+        with open(self.pcap_path, 'rb') as f:
+            self.capture = f.read()
+        with tempfile.NamedTemporaryFile(suffix='.pcap', delete=False) as tmp:
+            self.upload_path = tmp.name
+
+    def tearDown(self):
+        os.unlink(self.pcap_path)
+        os.unlink(self.upload_path)
+
+    def test_capture_header(self):
+        """Test pcap, pcapng and gzip headers are recognized"""
+        self.assertTrue(is_capture_header(self.capture[:4]))
+        self.assertTrue(is_capture_header(b'\x0a\x0d\x0d\x0a'))
+        self.assertTrue(is_capture_header(b'\x1f\x8b\x08\x00'))
+        self.assertFalse(is_capture_header(b'test content'))
+        self.assertFalse(is_capture_header(b''))
+
+    def test_receive_upload(self):
+        """Test an upload is written to disk and hashed"""
+        stream = io.BytesIO(self.capture)
+        header = read_header(stream)
+        capture_hash, size = receive_upload(stream, self.upload_path, header, len(self.capture))
+        self.assertEqual(size, len(self.capture))
+        with open(self.upload_path, 'rb') as f:
+            self.assertEqual(f.read(), self.capture)
+        self.assertEqual(len(capture_hash), 64)
+
+    def test_size_limit(self):
+        """Test uploads are stopped as soon as they pass the limit"""
+        with self.assertRaises(UploadRejected) as cm:
+            stream = SlowStream(self.capture)
+            receive_upload(stream, self.upload_path, read_header(stream), len(self.capture) - 1)
+        self.assertEqual(cm.exception.status_code, 413)
+
+    def test_analysis_while_uploading(self):
+        """Test a capture analyzed while it arrives matches the finished file"""
+        growing = GrowingFile(self.upload_path)
+        results = {}
+
+        def analyze():
+            results['analysis'] = PcapAnalyzer().analyze_pcap(growing)
+
+        reader = threading.Thread(target=analyze)
+        reader.start()
+        try:
+            stream = SlowStream(self.capture)
+            receive_upload(stream, self.upload_path, read_header(stream), len(self.capture), growing)
+        finally:
+            growing.finish()
+        reader.join(30)
+        growing.close()
+        self.assertEqual(results['analysis'], PcapAnalyzer().analyze_pcap(self.pcap_path))
+
+    def test_failed_upload_fails_reader(self):
+        """Test readers waiting on an upload see its failure"""
+        growing = GrowingFile(self.upload_path)
+        threading.Timer(0.05, growing.finish, ['Upload incomplete']).start()
+        with self.assertRaisesRegex(Exception, 'Upload incomplete'):
+            growing.read(4)
+        growing.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import os
+import tempfile
+from scapy.all import rdpcap
+from pcap_analyzer import PcapAnalyzer
+from synthetic_capture import parse_size, write_capture
+
+
+class TestSyntheticCapture(unittest.TestCase):
+    def setUp(self):
+        fd, self.pcap_path = tempfile.mkstemp(suffix='.pcap')
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.pcap_path)
+
+    def test_parse_size(self):
+        """Test named, suffixed and plain sizes"""
+        self.assertEqual([parse_size(size) for size in ('10k', '1M', '10m', '2500', '3k')],
+                         [10_000, 1_000_000, 10_000_000, 2500, 3000])
+        for size in ('', 'lots', '0', '-5k'):
+            with self.assertRaises(ValueError):
+                parse_size(size)
+
+    def test_deterministic(self):
+        """Test the same seed writes the same bytes and another seed does not"""
+        with open(write_capture(self.pcap_path, 3000, seed=1), 'rb') as f:
+            first = f.read()
+        with open(write_capture(self.pcap_path, 3000, seed=1), 'rb') as f:
+            self.assertEqual(f.read(), first)
+        with open(write_capture(self.pcap_path, 3000, seed=2), 'rb') as f:
+            self.assertNotEqual(f.read(), first)
+
+    def test_traffic_mix(self):
+        """Test the capture has the exact packet count and exercises every section"""
+        write_capture(self.pcap_path, 5000)
+        self.assertEqual(len(rdpcap(self.pcap_path)), 5000)
+
+        results = PcapAnalyzer().analyze_pcap(self.pcap_path)
+        self.assertEqual(results['total_packets'], 5000)
+        self.assertEqual(set(results['protocol_distribution']), {'TCP', 'UDP', 'ICMP', 'ARP'})
+        self.assertGreater(results['tcp_analysis']['successful_connections'], 0)
+        self.assertGreater(results['tcp_analysis']['failed_connections'], 0)
+        self.assertGreater(results['dns_analysis']['total_responses'], 0)
+        self.assertLess(results['dns_analysis']['total_responses'], results['dns_analysis']['total_queries'])
+        dns = results['dns_analysis']
+        self.assertGreater(dns['answered_queries'], 0)
+        self.assertGreater(dns['unanswered_queries'], 0)
+        self.assertGreater(dns['nxdomain_rate'], 0)
+        self.assertGreater(dns['latency_ms']['p50'], 0)
+        types = {anomaly['type'] for anomaly in results['anomalies']}
+        self.assertIn('Port Scan Burst', types)
+        self.assertNotIn('Potential Port Scan', types)
+        self.assertIn('SYN Flood', types)
+
+
+if __name__ == '__main__':
+    unittest.main()
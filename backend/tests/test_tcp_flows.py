@@ -0,0 +1,122 @@
+import unittest
+from tcp_flows import FlowTable, flow_key, ESTABLISHED, SYN_SENT, CLOSED
+
+SYN, SYN_ACK, ACK, PSH_ACK, FIN_ACK, RST, RST_ACK = 0x02, 0x12, 0x10, 0x18, 0x11, 0x04, 0x14
+
+
+def handshake(table, time, client, server, sport=40000, dport=80):
+    """Feed a complete handshake, one data packet and a close"""
+    table.add(time, client, sport, server, dport, SYN, 60)
+    table.add(time + 0.05, server, dport, client, sport, SYN_ACK, 60)
+    table.add(time + 0.06, client, sport, server, dport, ACK, 54)
+    table.add(time + 0.1, client, sport, server, dport, PSH_ACK, 200)
+    table.add(time + 1.0, client, sport, server, dport, FIN_ACK, 54)
+    table.add(time + 1.01, server, dport, client, sport, FIN_ACK, 54)
+
+
+class TestFlowTable(unittest.TestCase):
+    def test_canonical_key(self):
+        """Test both directions of a connection share one key"""
+        forward, forward_dir = flow_key('10.0.0.2', 80, '10.0.0.1', 40000)
+        reverse, reverse_dir = flow_key('10.0.0.1', 40000, '10.0.0.2', 80)
+        self.assertEqual(forward, reverse)
+        self.assertNotEqual(forward_dir, reverse_dir)
+
+    def test_handshake_state_machine(self):
+        """Test a connection moves through the handshake states"""
+        table = FlowTable()
+        table.add(0.0, '10.0.0.1', 40000, '10.0.0.2', 80, SYN, 60)
+        flow = next(iter(table.flows.values()))
+        self.assertEqual(flow.state, SYN_SENT)
+        table.add(0.05, '10.0.0.2', 80, '10.0.0.1', 40000, SYN_ACK, 60)
+        table.add(0.06, '10.0.0.1', 40000, '10.0.0.2', 80, ACK, 54)
+        self.assertEqual(flow.state, ESTABLISHED)
+        table.add(1.0, '10.0.0.1', 40000, '10.0.0.2', 80, FIN_ACK, 54)
+        table.add(1.01, '10.0.0.2', 80, '10.0.0.1', 40000, FIN_ACK, 54)
+        self.assertEqual(flow.state, CLOSED)
+        self.assertEqual(len(table.flows), 1)
+
+    def test_success_failure_and_timings(self):
+        """Test outcomes, durations and handshake RTTs"""
+        table = FlowTable()
+        handshake(table, 0.0, '10.0.0.1', '10.0.0.2')
+        table.add(2.0, '10.0.0.3', 40001, '10.0.0.2', 22, SYN, 60)
+        table.add(2.2, '10.0.0.2', 22, '10.0.0.3', 40001, RST_ACK, 54)
+        table.add(3.0, '10.0.0.4', 40002, '10.0.0.2', 443, SYN, 60)
+        table.add(4.0, '10.0.0.5', 5000, '10.0.0.2', 8080, PSH_ACK, 100)
+
+        result = table.result()
+        self.assertEqual(result['total_connections'], 4)
+        self.assertEqual(result['successful_connections'], 1)
+        self.assertEqual(result['failed_connections'], 2)
+        self.assertEqual(result['refused_connections'], 1)
+        self.assertEqual(result['midstream_connections'], 1)
+        self.assertEqual(result['success_rate'], 33.33)
+        self.assertEqual(result['open_connections'], 2)
+        self.assertEqual(result['handshake_rtt_ms']['avg'], 50.0)
+        self.assertEqual(result['connection_duration']['max'], 1.01)
+
+    def test_syn_flood_memory_is_bounded(self):
+        """Test a SYN flood never holds more than max_flows flows"""
+        table = FlowTable()
+        table.max_flows = 100
+        for i in range(5000):
+            table.add(i * 0.001, f'10.1.{i // 256}.{i % 256}', 1024 + i % 60000, '10.0.0.2', 80, SYN, 60)
+            self.assertLessEqual(len(table.flows), 100)
+
+        result = table.result()
+        self.assertEqual(result['total_connections'], 5000)
+        self.assertEqual(result['failed_connections'], 5000)
+        self.assertEqual(result['flow_table']['evicted_flows'], 4900)
+
+    def test_idle_timeout(self):
+        """Test a reused 4-tuple after the idle timeout is a new connection"""
+        table = FlowTable()
+        handshake(table, 0.0, '10.0.0.1', '10.0.0.2')
+        handshake(table, 1000.0, '10.0.0.1', '10.0.0.2')
+        result = table.result()
+        self.assertEqual(result['total_connections'], 2)
+        self.assertEqual(result['successful_connections'], 2)
+        self.assertEqual(result['flow_table']['expired_flows'], 1)
+
+    def test_merge_matches_serial(self):
+        """Test tables of consecutive chunks merge into the serial result"""
+        packets = []
+
+        class Recorder:
+            def add(self, *args):
+                packets.append(args)
+
+        recorder = Recorder()
+        handshake(recorder, 0.0, '10.0.0.1', '10.0.0.2')
+        handshake(recorder, 0.5, '10.0.0.3', '10.0.0.2', sport=40001)
+        packets.append((2.0, '10.0.0.2', 22, '10.0.0.4', 40002, RST, 54))
+        handshake(recorder, 900.0, '10.0.0.1', '10.0.0.2')
+
+        serial = FlowTable()
+        for packet in packets:
+            serial.add(*packet)
+        expected = serial.result()
+
+        for split in range(1, len(packets)):
+            head, tail = FlowTable(), FlowTable()
+            for packet in packets[:split]:
+                head.add(*packet)
+            for packet in packets[split:]:
+                tail.add(*packet)
+            head.merge(tail)
+            self.assertEqual(head.result(), expected)
+
+        merged = FlowTable()
+        for packet in packets:
+            single = FlowTable()
+            single.add(*packet)
+            merged.merge(single)
+        self.assertEqual(merged.result(), expected)
+
+    def test_empty_table(self):
+        """Test the result of a capture without TCP"""
+        self.assertEqual(FlowTable().result(), {'total_connections': 0, 'success_rate': 0, 'failed_connections': 0})
+
+if __name__ == '__main__':
+    unittest.main()
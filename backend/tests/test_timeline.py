@@ -0,0 +1,75 @@
+import unittest
+import json
+from timeline import build_series, lttb, minmax, query_timeline, series_from_points, timeline_preview
+
+
+def day_series():
+    """One packet of 100 bytes every second for a day, with a burst at noon"""
+    buckets = {second: (1, 100) for second in range(86400)}
+    buckets[43200] = (5000, 500000)
+    return build_series(buckets)
+
+
+class TestTimeline(unittest.TestCase):
+    def test_build_series(self):
+        """Test every resolution sums the seconds of its buckets"""
+        series = build_series({5: (1, 60), 9: (2, 100), 12: (1, 40), 3605: (3, 90)})
+        self.assertEqual(series['1']['timestamps'], [5, 9, 12, 3605])
+        self.assertEqual(series['10'], {'timestamps': [0, 10, 3600], 'packets': [3, 1, 3], 'bytes': [160, 40, 90]})
+        self.assertEqual(series['3600'], {'timestamps': [0, 3600], 'packets': [4, 3], 'bytes': [200, 90]})
+        self.assertEqual(json.loads(json.dumps(series)), series)
+
+    def test_short_range_is_exact(self):
+        """Test ranges that fit are returned per second without downsampling"""
+        series = day_series()
+        points = query_timeline(series, 100, 110, max_points=50)
+        self.assertEqual(points['resolution'], 1)
+        self.assertIsNone(points['downsampled'])
+        self.assertEqual(points['timestamps'], list(range(100, 110)))
+
+    def test_day_is_downsampled(self):
+        """Test a day-long range stays within max_points and keeps the burst"""
+        series = day_series()
+        for method in ('lttb', 'minmax'):
+            points = query_timeline(series, max_points=500, method=method)
+            self.assertEqual(points['resolution'], 60)
+            self.assertEqual(points['downsampled'], method)
+            self.assertLessEqual(len(points['timestamps']), 500)
+            self.assertIn(max(series['60']['packets']), points['packets'])
+            self.assertEqual(points['timestamps'], sorted(points['timestamps']))
+
+    def test_range_includes_partial_buckets(self):
+        """Test a coarse bucket starting before the range is still returned"""
+        series = day_series()
+        points = query_timeline(series, 3630, 3600 * 5, max_points=10)
+        self.assertEqual(points['resolution'], 3600)
+        self.assertEqual(points['timestamps'], [3600, 7200, 10800, 14400])
+
+    def test_downsampling_keeps_ends(self):
+        """Test LTTB keeps the first and last point and min/max keeps extremes"""
+        timestamps = list(range(1000))
+        values = [i % 7 for i in timestamps]
+        values[500] = 100
+        indices = lttb(timestamps, values, 20)
+        self.assertEqual(len(indices), 20)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertIn(500, indices)
+        indices = minmax(timestamps, values, 20)
+        self.assertLessEqual(len(indices), 20)
+        self.assertIn(500, indices)
+
+    def test_preview_of_short_capture(self):
+        """Test the overview of a short capture has every second"""
+        points = [{'timestamp': 10, 'packets': 2, 'bytes': 120}, {'timestamp': 12, 'packets': 1, 'bytes': 60}]
+        preview = timeline_preview(series_from_points(points))
+        self.assertEqual([(p['timestamp'], p['packets'], p['bytes']) for p in preview], [(10, 2, 120), (12, 1, 60)])
+        self.assertEqual({p['resolution'] for p in preview}, {1})
+        day = timeline_preview(day_series())
+        self.assertLessEqual(len(day), 500)
+        # A day of seconds only fits the preview as downsampled per-minute totals
+        self.assertEqual({p['resolution'] for p in day}, {60})
+        self.assertIn(60 + 4999, [p['packets'] for p in day])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import random
+from traffic_tables import (
+    TrafficTables, add_conversation, conversation_table, merge_conversations, top_conversations
+)
+
+
+def random_table(packets=2000, seed=7):
+    """Conversation table of random traffic between a few hundred addresses"""
+    rng = random.Random(seed)
+    addresses = [f'10.{rng.randrange(4)}.{rng.randrange(8)}.{rng.randrange(256)}' for _ in range(300)]
+    addresses += ['192.168.0.1', '2001:db8::1']
+    conversations = {}
+    for i in range(packets):
+        add_conversation(conversations, rng.choice(addresses), rng.choice(addresses), rng.randrange(60, 1500), i / 10)
+    return conversation_table(conversations)
+
+
+class TestTrafficTables(unittest.TestCase):
+    def test_directions_and_merge(self):
+        """Test per-direction counters and that merging chunks equals one pass"""
+        packets = [('10.0.0.2', '10.0.0.1', 100, 5.0), ('10.0.0.1', '10.0.0.2', 60, 1.0),
+                   ('10.0.0.2', '10.0.0.1', 40, 9.0), ('10.0.0.3', '10.0.0.3', 80, 2.0)]
+        whole = {}
+        for packet in packets:
+            add_conversation(whole, *packet)
+        first, second = {}, {}
+        for packet in packets[:2]:
+            add_conversation(first, *packet)
+        for packet in packets[2:]:
+            add_conversation(second, *packet)
+        merge_conversations(first, second)
+        self.assertEqual(first, whole)
+
+        table = conversation_table(whole)
+        self.assertEqual(table['a'], ['10.0.0.1', '10.0.0.3'])
+        self.assertEqual((table['packets_ab'][0], table['bytes_ab'][0]), (1, 60))
+        self.assertEqual((table['packets_ba'][0], table['bytes_ba'][0]), (2, 140))
+        self.assertEqual((table['first_seen'][0], table['last_seen'][0]), (1.0, 9.0))
+
+    def test_top_matches_stable_sort(self):
+        """Test heap top-K equals a stable sort, ties in first-seen order"""
+        table = random_table()
+        packets = [ab + ba for ab, ba in zip(table['packets_ab'], table['packets_ba'])]
+        expected = sorted(range(len(packets)), key=packets.__getitem__, reverse=True)[:10]
+        self.assertEqual([entry['endpoints'] for entry in top_conversations(table)],
+                         [f"{table['a'][row]} ↔ {table['b'][row]}" for row in expected])
+
+        tables = TrafficTables(table)
+        top = tables.top_conversations('bytes', 25)
+        self.assertEqual(top['total'], len(packets))
+        self.assertEqual([item['bytes'] for item in top['items']],
+                         sorted(tables.conversation_columns['bytes'], reverse=True)[:25])
+
+        # Full orderings are sorted once and reused for later pages
+        rows = tables.sorted_conversations('packets')
+        self.assertEqual(list(rows), sorted(range(len(packets)), key=packets.__getitem__, reverse=True))
+        self.assertIs(tables.sorted_conversations('packets'), rows)
+
+    def test_endpoints_add_up(self):
+        """Test endpoint totals count every packet once as sent and once as received"""
+        table = random_table()
+        tables = TrafficTables(table)
+        total_packets = sum(table['packets_ab']) + sum(table['packets_ba'])
+        self.assertEqual(sum(tables.endpoint_columns['packets_sent']), total_packets)
+        self.assertEqual(sum(tables.endpoint_columns['packets_received']), total_packets)
+        endpoint = tables.top_endpoints('packets', 1)['items'][0]
+        self.assertEqual(endpoint['packets'], endpoint['packets_sent'] + endpoint['packets_received'])
+        self.assertLessEqual(endpoint['first_seen'], endpoint['last_seen'])
+
+    def test_address_filters(self):
+        """Test exact, CIDR and prefix filters agree with a scan of every endpoint"""
+        tables = TrafficTables(random_table())
+        in_network = [address for address in tables.addresses if address.startswith('10.1.')]
+        for ip in ('10.1.0.0/16', '10.1.'):
+            found = tables.top_endpoints('packets', 10000, ip)
+            self.assertEqual(sorted(item['address'] for item in found['items']), sorted(in_network))
+        self.assertEqual(tables.top_endpoints(ip='2001:db8::/32')['items'][0]['address'], '2001:db8::1')
+        self.assertEqual(tables.top_endpoints(ip='192.168.0.1')['total'], 1)
+
+        conversations = tables.top_conversations(k=10000, ip='192.168.0.1')
+        self.assertTrue(all('192.168.0.1' in (item['a'], item['b']) for item in conversations['items']))
+        self.assertEqual(conversations['total'], tables.endpoint(tables.endpoint_rows['192.168.0.1'])['peers'])
+
+        with self.assertRaises(ValueError):
+            tables.top_endpoints(ip='10.0.0.0/40')
+        with self.assertRaises(ValueError):
+            tables.top_conversations('peers')
+
+
+if __name__ == '__main__':
+    unittest.main()
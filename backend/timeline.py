@@ -0,0 +1,156 @@
+from bisect import bisect_left
+from datetime import datetime
+
+# Bucket widths in seconds kept for every capture, finest first
+RESOLUTIONS = (1, 10, 60, 3600)
+
+# Points in the timeline overview stored with each analysis
+PREVIEW_POINTS = 500
+
+# A resolution is downsampled only while it has at most this many times the requested points
+OVERSAMPLE = 4
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def build_series(buckets):
+    """Compact multi-resolution timeline from {second: (packets, bytes)}
+
+    Each resolution holds parallel ``timestamps``/``packets``/``bytes``
+    arrays of its non-empty buckets, keyed by the bucket width as a string
+    so the series survives a JSON round trip unchanged.
+    """
+    seconds = sorted(buckets)
+    series = {}
+    for resolution in RESOLUTIONS:
+        timestamps, packets, total_bytes = [], [], []
+        for second in seconds:
+            start = second - second % resolution
+            count, size = buckets[second]
+            if timestamps and timestamps[-1] == start:
+                packets[-1] += count
+                total_bytes[-1] += size
+            else:
+                timestamps.append(start)
+                packets.append(count)
+                total_bytes.append(size)
+        series[str(resolution)] = {'timestamps': timestamps, 'packets': packets, 'bytes': total_bytes}
+    return series
+
+
+def series_from_points(timeline):
+    """Series of a per-second timeline in the old list-of-dicts format"""
+    return build_series({point['timestamp']: (point['packets'], point['bytes']) for point in timeline})
+
+
+def lttb(timestamps, values, max_points):
+    """Indices kept by Largest-Triangle-Three-Buckets downsampling (Steinarsson, 2013)"""
+    n = len(timestamps)
+    if n <= max_points or max_points < 3:
+        return list(range(n))
+
+    indices = [0]
+    every = (n - 2) / (max_points - 2)
+    selected = 0
+    for i in range(max_points - 2):
+        # Average of the next bucket is the third corner of the triangles
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(timestamps[next_start:next_end]) / count
+        avg_y = sum(values[next_start:next_end]) / count
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = timestamps[selected], values[selected]
+        best = start
+        best_area = -1
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (values[j] - ay) - (ax - timestamps[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        indices.append(best)
+        selected = best
+    indices.append(n - 1)
+    return indices
+
+
+def minmax(timestamps, values, max_points):
+    """Indices of the smallest and largest value of each of ``max_points // 2`` equal-count bins"""
+    n = len(timestamps)
+    if n <= max_points:
+        return list(range(n))
+
+    bins = max(max_points // 2, 1)
+    indices = []
+    for b in range(bins):
+        start = b * n // bins
+        end = (b + 1) * n // bins
+        low = min(range(start, end), key=values.__getitem__)
+        high = max(range(start, end), key=values.__getitem__)
+        indices.extend(sorted({low, high}))
+    return indices
+
+
+def query_timeline(series, start=None, end=None, max_points=PREVIEW_POINTS, method='lttb'):
+    """At most ``max_points`` timeline points of [start, end)
+
+    Uses the finest resolution with at most OVERSAMPLE times ``max_points``
+    buckets in the range (or the coarsest one), downsampled with ``method``
+    on the packet counts when it has more than ``max_points``. Values are
+    totals per bucket of ``resolution`` seconds.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unsupported downsampling method: {method}")
+
+    chosen = None
+    for resolution in RESOLUTIONS:
+        level = series[str(resolution)]
+        timestamps = level['timestamps']
+        # Buckets starting before ``start`` still cover part of the range
+        first = bisect_left(timestamps, start - resolution + 1) if start is not None else 0
+        last = bisect_left(timestamps, end) if end is not None else len(timestamps)
+        chosen = resolution, level, first, last
+        if last - first <= max_points * OVERSAMPLE:
+            break
+
+    resolution, level, first, last = chosen
+    timestamps = level['timestamps'][first:last]
+    packets = level['packets'][first:last]
+    total_bytes = level['bytes'][first:last]
+    downsampled = None
+    if len(timestamps) > max_points:
+        downsampled = method
+        indices = lttb(timestamps, packets, max_points) if method == 'lttb' else minmax(timestamps, packets, max_points)
+        timestamps = [timestamps[i] for i in indices]
+        packets = [packets[i] for i in indices]
+        total_bytes = [total_bytes[i] for i in indices]
+
+    return {
+        'resolution': resolution,
+        'downsampled': downsampled,
+        'timestamps': timestamps,
+        'packets': packets,
+        'bytes': total_bytes
+    }
+
+
+def timeline_preview(series, max_points=PREVIEW_POINTS):
+    """Overview of the whole capture as timeline points, for the dashboard and reports
+
+    Each point totals a bucket of ``resolution`` seconds, which is coarser
+    than a second for long captures.
+    """
+    points = query_timeline(series, max_points=max_points)
+    return [
+        {
+            'timestamp': timestamp,
+            'datetime': datetime.fromtimestamp(timestamp).isoformat(),
+            'resolution': points['resolution'],
+            'packets': packets,
+            'bytes': total_bytes
+        }
+        for timestamp, packets, total_bytes in zip(points['timestamps'], points['packets'], points['bytes'])
+    ]
+
@@ -0,0 +1,281 @@
+import heapq
+import ipaddress
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Columns of the stored ``conversation_table`` section, one row per undirected pair
+CONVERSATION_COLUMNS = ('a', 'b', 'packets_ab', 'bytes_ab', 'packets_ba', 'bytes_ba', 'first_seen', 'last_seen')
+
+# Counter columns a top-K query can rank by
+CONVERSATION_SORTS = ('packets', 'bytes', 'packets_ab', 'bytes_ab', 'packets_ba', 'bytes_ba')
+ENDPOINT_SORTS = ('packets', 'bytes', 'packets_sent', 'bytes_sent', 'packets_received', 'bytes_received', 'peers')
+
+DEFAULT_TOP_K = 10
+MAX_TOP_K = 10000
+
+
+def conversation_table(conversations):
+    """Compact column table of {(a, b): [packets_ab, bytes_ab, packets_ba, bytes_ba, first, last]}
+
+    ``a`` and ``b`` are ordered as strings; ``ab`` counts packets sent from
+    ``a`` to ``b``. Rows keep the insertion (first-seen) order.
+    """
+    columns = {name: [] for name in CONVERSATION_COLUMNS}
+    a, b = columns['a'], columns['b']
+    counters = [columns[name] for name in CONVERSATION_COLUMNS[2:]]
+    for (src, dst), state in conversations.items():
+        a.append(src)
+        b.append(dst)
+        for column, value in zip(counters, state):
+            column.append(value)
+    return columns
+
+
+def add_conversation(conversations, src, dst, length, ts):
+    """Count one packet into the per-pair state used by conversation_table"""
+    if src <= dst:
+        state = conversations.get((src, dst))
+        if state is None:
+            conversations[(src, dst)] = [1, length, 0, 0, ts, ts]
+            return
+        state[0] += 1
+        state[1] += length
+    else:
+        state = conversations.get((dst, src))
+        if state is None:
+            conversations[(dst, src)] = [0, 0, 1, length, ts, ts]
+            return
+        state[2] += 1
+        state[3] += length
+    if ts < state[4]:
+        state[4] = ts
+    if ts > state[5]:
+        state[5] = ts
+
+
+def merge_conversations(conversations, other):
+    for conversation, (packets_ab, bytes_ab, packets_ba, bytes_ba, first, last) in other.items():
+        state = conversations.get(conversation)
+        if state is None:
+            conversations[conversation] = [packets_ab, bytes_ab, packets_ba, bytes_ba, first, last]
+        else:
+            state[0] += packets_ab
+            state[1] += bytes_ab
+            state[2] += packets_ba
+            state[3] += bytes_ba
+            state[4] = min(state[4], first)
+            state[5] = max(state[5], last)
+
+
+def top_conversations(table, top_n=10):
+    """Top conversations by packets in the ``ip_conversations`` format
+
+    Heap selection over the table; ties keep first-seen order, exactly like
+    a stable sort by descending packets.
+    """
+    packets_ab, packets_ba = table['packets_ab'], table['packets_ba']
+    bytes_ab, bytes_ba = table['bytes_ab'], table['bytes_ba']
+    top = heapq.nlargest(top_n, range(len(table['a'])), key=lambda row: packets_ab[row] + packets_ba[row])
+    return [
+        {
+            'endpoints': f"{table['a'][row]} ↔ {table['b'][row]}",
+            'packets': packets_ab[row] + packets_ba[row],
+            'bytes': bytes_ab[row] + bytes_ba[row]
+        }
+        for row in top
+    ]
+
+
+def _address_key(address):
+    """Numeric sort key of an address for CIDR range lookups, None if it is not an IP"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return None
+    return ip.version, int(ip)
+
+
+class TrafficTables:
+    """Queryable conversation and endpoint tables of one analysis
+
+    Built once from the ``conversation_table`` section: counters live in
+    typed arrays, and the per-endpoint table (sent/received, peers,
+    first/last seen) is derived from the conversations. Endpoints are
+    indexed by numeric address for CIDR lookups and by text for prefix
+    lookups, and each endpoint keeps the rows of its conversations, so a
+    filtered query only touches matching rows. Top-K queries use heap
+    selection instead of sorting the whole table; full orderings for paging
+    are sorted once per sort and kept.
+    """
+
+    def __init__(self, table):
+        self.a = table['a']
+        self.b = table['b']
+        self.packets_ab = array('q', table['packets_ab'])
+        self.bytes_ab = array('q', table['bytes_ab'])
+        self.packets_ba = array('q', table['packets_ba'])
+        self.bytes_ba = array('q', table['bytes_ba'])
+        self.first_seen = array('d', table['first_seen'])
+        self.last_seen = array('d', table['last_seen'])
+        self.conversation_columns = {
+            'packets': array('q', map(int.__add__, self.packets_ab, self.packets_ba)),
+            'bytes': array('q', map(int.__add__, self.bytes_ab, self.bytes_ba)),
+            'packets_ab': self.packets_ab,
+            'bytes_ab': self.bytes_ab,
+            'packets_ba': self.packets_ba,
+            'bytes_ba': self.bytes_ba,
+        }
+        self.sorted_rows = {}
+        self._build_endpoints()
+
+    def _build_endpoints(self):
+        rows = {}
+        self.addresses = []
+        self.endpoint_conversations = []  # conversation rows of each endpoint, in first-seen order
+        packets_sent, bytes_sent = array('q'), array('q')
+        packets_received, bytes_received = array('q'), array('q')
+        first_seen, last_seen = array('d'), array('d')
+
+        def endpoint(address, conversation):
+            row = rows.get(address)
+            if row is None:
+                row = rows[address] = len(self.addresses)
+                self.addresses.append(address)
+                self.endpoint_conversations.append([])
+                for column in (packets_sent, bytes_sent, packets_received, bytes_received):
+                    column.append(0)
+                first_seen.append(self.first_seen[conversation])
+                last_seen.append(self.last_seen[conversation])
+            else:
+                first_seen[row] = min(first_seen[row], self.first_seen[conversation])
+                last_seen[row] = max(last_seen[row], self.last_seen[conversation])
+            self.endpoint_conversations[row].append(conversation)
+            return row
+
+        for conversation, (a, b) in enumerate(zip(self.a, self.b)):
+            row = endpoint(a, conversation)
+            packets_sent[row] += self.packets_ab[conversation]
+            bytes_sent[row] += self.bytes_ab[conversation]
+            packets_received[row] += self.packets_ba[conversation]
+            bytes_received[row] += self.bytes_ba[conversation]
+            if b == a:
+                # Traffic to itself was both sent and received
+                packets_received[row] += self.packets_ab[conversation]
+                bytes_received[row] += self.bytes_ab[conversation]
+                continue
+            row = endpoint(b, conversation)
+            packets_sent[row] += self.packets_ba[conversation]
+            bytes_sent[row] += self.bytes_ba[conversation]
+            packets_received[row] += self.packets_ab[conversation]
+            bytes_received[row] += self.bytes_ab[conversation]
+
+        self.endpoint_rows = rows
+        self.endpoint_first_seen = first_seen
+        self.endpoint_last_seen = last_seen
+        self.endpoint_columns = {
+            'packets': array('q', map(int.__add__, packets_sent, packets_received)),
+            'bytes': array('q', map(int.__add__, bytes_sent, bytes_received)),
+            'packets_sent': packets_sent,
+            'bytes_sent': bytes_sent,
+            'packets_received': packets_received,
+            'bytes_received': bytes_received,
+            'peers': array('q', map(len, self.endpoint_conversations)),
+        }
+
+        # Sorted indexes of endpoint rows for CIDR and prefix lookups
+        numeric = sorted((key, row) for row, key in enumerate(map(_address_key, self.addresses)) if key is not None)
+        self.numeric_keys = [key for key, _ in numeric]
+        self.numeric_rows = [row for _, row in numeric]
+        text = sorted((address, row) for row, address in enumerate(self.addresses))
+        self.text_keys = [address for address, _ in text]
+        self.text_rows = [row for _, row in text]
+
+    def matching_endpoints(self, ip):
+        """Endpoint rows matching an address, a CIDR network or a text prefix (e.g. ``10.1.``)
+
+        Raises ValueError for a malformed network.
+        """
+        if '/' in ip:
+            try:
+                network = ipaddress.ip_network(ip, strict=False)
+            except ValueError:
+                raise ValueError(f"Invalid network: {ip}")
+            low = (network.version, int(network.network_address))
+            high = (network.version, int(network.broadcast_address))
+            rows = self.numeric_rows[bisect_left(self.numeric_keys, low):bisect_right(self.numeric_keys, high)]
+        else:
+            row = self.endpoint_rows.get(ip)
+            if row is not None:
+                return [row]
+            rows = self.text_rows[bisect_left(self.text_keys, ip):bisect_left(self.text_keys, ip + '\uffff')]
+        return sorted(rows)
+
+    def _endpoint_rows(self, ip):
+        return range(len(self.addresses)) if ip is None else self.matching_endpoints(ip)
+
+    def _conversation_rows(self, ip):
+        if ip is None:
+            return range(len(self.a))
+        rows = set()
+        for endpoint in self.matching_endpoints(ip):
+            rows.update(self.endpoint_conversations[endpoint])
+        return sorted(rows)
+
+    @staticmethod
+    def _top(rows, values, by, sorts, k):
+        if by not in sorts:
+            raise ValueError(f"Cannot rank by {by}; use one of {', '.join(sorts)}")
+        if not 1 <= k <= MAX_TOP_K:
+            raise ValueError(f"k must be between 1 and {MAX_TOP_K}")
+        return heapq.nlargest(k, rows, key=values[by].__getitem__)
+
+    def conversation(self, row):
+        columns = self.conversation_columns
+        return {
+            'a': self.a[row],
+            'b': self.b[row],
+            'endpoints': f"{self.a[row]} ↔ {self.b[row]}",
+            'packets': columns['packets'][row],
+            'bytes': columns['bytes'][row],
+            'packets_ab': self.packets_ab[row],
+            'bytes_ab': self.bytes_ab[row],
+            'packets_ba': self.packets_ba[row],
+            'bytes_ba': self.bytes_ba[row],
+            'first_seen': self.first_seen[row],
+            'last_seen': self.last_seen[row]
+        }
+
+    def endpoint(self, row):
+        endpoint = {'address': self.addresses[row]}
+        for name, column in self.endpoint_columns.items():
+            endpoint[name] = column[row]
+        endpoint['first_seen'] = self.endpoint_first_seen[row]
+        endpoint['last_seen'] = self.endpoint_last_seen[row]
+        return endpoint
+
+    def sorted_conversations(self, by='packets', descending=True):
+        """Every conversation row ordered by a counter or by ``endpoints``; ties keep first-seen order"""
+        rows = self.sorted_rows.get((by, descending))
+        if rows is not None:
+            return rows
+        if by == 'endpoints':
+            key = lambda row: f"{self.a[row]} ↔ {self.b[row]}"
+        elif by in CONVERSATION_SORTS:
+            key = self.conversation_columns[by].__getitem__
+        else:
+            raise ValueError(f"Cannot sort by {by}; use one of endpoints, {', '.join(CONVERSATION_SORTS)}")
+        rows = array('q', sorted(range(len(self.a)), key=key, reverse=descending))
+        self.sorted_rows[(by, descending)] = rows
+        return rows
+
+    def top_conversations(self, by='packets', k=DEFAULT_TOP_K, ip=None):
+        """Top ``k`` conversations by a counter, optionally only those of endpoints matching ``ip``"""
+        rows = self._conversation_rows(ip)
+        top = self._top(rows, self.conversation_columns, by, CONVERSATION_SORTS, k)
+        return {'by': by, 'total': len(rows), 'items': [self.conversation(row) for row in top]}
+
+    def top_endpoints(self, by='bytes', k=DEFAULT_TOP_K, ip=None):
+        """Top ``k`` endpoints by a counter, optionally only those matching ``ip``"""
+        rows = self._endpoint_rows(ip)
+        top = self._top(rows, self.endpoint_columns, by, ENDPOINT_SORTS, k)
+        return {'by': by, 'total': len(rows), 'items': [self.endpoint(row) for row in top]}
@@ -6,7 +6,51 @@ from reportlab.lib import colors
 import io
 import csv
 from datetime import datetime
+import hashlib
 import json
+from timeline import RESOLUTIONS
+from traffic_tables import CONVERSATION_COLUMNS
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Rows written per chunk of a streamed CSV report
+CSV_CHUNK_ROWS = 1000
+
+# Report styles are built once and shared by every PDF
+STYLES = getSampleStyleSheet()
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=STYLES['Heading1'],
+    fontSize=24,
+    spaceAfter=30,
+    alignment=1  # Center alignment
+)
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 14),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+def save_upload(file, filepath, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Stream an uploaded file to disk, returning the SHA-256 of its bytes"""
+    digest = hashlib.sha256()
+    with open(filepath, 'wb') as f:
+        while True:
+            chunk = file.stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+def _styled_table(rows):
+    table = Table(rows)
+    table.setStyle(TABLE_STYLE)
+    return table
 
 def generate_pdf_report(analysis_data, filename):
     """Generate PDF report from analysis data"""
@@ -14,28 +58,20 @@ def generate_pdf_report(analysis_data, filename):
     
     # Create PDF document
     doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
     story = []
     
     # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=1  # Center alignment
-    )
-    story.append(Paragraph("OGPW Network Traffic Analysis Report", title_style))
+    story.append(Paragraph("OGPW Network Traffic Analysis Report", TITLE_STYLE))
     story.append(Spacer(1, 20))
     
     # File information
-    story.append(Paragraph(f"<b>Analyzed File:</b> {filename}", styles['Normal']))
-    story.append(Paragraph(f"<b>Report Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
+    story.append(Paragraph(f"<b>Analyzed File:</b> {filename}", STYLES['Normal']))
+    story.append(Paragraph(f"<b>Report Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", STYLES['Normal']))
     story.append(Spacer(1, 20))
     
     # Basic Statistics
     if 'basic_stats' in analysis_data:
-        story.append(Paragraph("Basic Statistics", styles['Heading2']))
+        story.append(Paragraph("Basic Statistics", STYLES['Heading2']))
         stats = analysis_data['basic_stats']
         
         stats_data = [
@@ -48,24 +84,12 @@ def generate_pdf_report(analysis_data, filename):
             ['Throughput (bytes/sec)', f"{stats.get('throughput_bps', 'N/A'):,}"]
         ]
         
-        stats_table = Table(stats_data)
-        stats_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(stats_table)
+        story.append(_styled_table(stats_data))
         story.append(Spacer(1, 20))
     
     # Protocol Distribution
     if 'protocol_distribution' in analysis_data:
-        story.append(Paragraph("Protocol Distribution", styles['Heading2']))
+        story.append(Paragraph("Protocol Distribution", STYLES['Heading2']))
         protocols = analysis_data['protocol_distribution']
         
         protocol_data = [['Protocol', 'Packets', 'Percentage']]
@@ -76,24 +100,12 @@ def generate_pdf_report(analysis_data, filename):
                 f"{data.get('percentage', 0)}%"
             ])
         
-        protocol_table = Table(protocol_data)
-        protocol_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(protocol_table)
+        story.append(_styled_table(protocol_data))
         story.append(Spacer(1, 20))
     
     # TCP Analysis
     if 'tcp_analysis' in analysis_data:
-        story.append(Paragraph("TCP Connection Analysis", styles['Heading2']))
+        story.append(Paragraph("TCP Connection Analysis", STYLES['Heading2']))
         tcp = analysis_data['tcp_analysis']
         
         tcp_data = [
@@ -105,37 +117,25 @@ def generate_pdf_report(analysis_data, filename):
             ['Total TCP Packets', f"{tcp.get('total_tcp_packets', 'N/A'):,}"]
         ]
         
-        tcp_table = Table(tcp_data)
-        tcp_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(tcp_table)
+        story.append(_styled_table(tcp_data))
         story.append(Spacer(1, 20))
     
     # Anomalies
     if 'anomalies' in analysis_data and analysis_data['anomalies']:
-        story.append(Paragraph("Security Anomalies", styles['Heading2']))
+        story.append(Paragraph("Security Anomalies", STYLES['Heading2']))
         anomalies = analysis_data['anomalies']
         
         for anomaly in anomalies:
-            story.append(Paragraph(f"<b>{anomaly.get('type', 'Unknown Anomaly')}</b>", styles['Normal']))
-            story.append(Paragraph(f"Description: {anomaly.get('description', 'No description')}", styles['Normal']))
-            story.append(Paragraph(f"Severity: {anomaly.get('severity', 'Unknown')}", styles['Normal']))
+            story.append(Paragraph(f"<b>{anomaly.get('type', 'Unknown Anomaly')}</b>", STYLES['Normal']))
+            story.append(Paragraph(f"Description: {anomaly.get('description', 'No description')}", STYLES['Normal']))
+            story.append(Paragraph(f"Severity: {anomaly.get('severity', 'Unknown')}", STYLES['Normal']))
             if 'source_ip' in anomaly:
-                story.append(Paragraph(f"Source IP: {anomaly['source_ip']}", styles['Normal']))
+                story.append(Paragraph(f"Source IP: {anomaly['source_ip']}", STYLES['Normal']))
             story.append(Spacer(1, 10))
     
     # Top IP Conversations
     if 'ip_conversations' in analysis_data:
-        story.append(Paragraph("Top IP Conversations", styles['Heading2']))
+        story.append(Paragraph("Top IP Conversations", STYLES['Heading2']))
         conversations = analysis_data['ip_conversations']
         
         if conversations:
@@ -147,117 +147,142 @@ def generate_pdf_report(analysis_data, filename):
                     f"{conv.get('bytes', 0):,}"
                 ])
             
-            conv_table = Table(conv_data)
-            conv_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 14),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            story.append(conv_table)
+            story.append(_styled_table(conv_data))
     
     # Build PDF
     doc.build(story)
     buffer.seek(0)
     return buffer
 
-def generate_csv_report(analysis_data, filename):
-    """Generate CSV report from analysis data"""
-    buffer = io.StringIO()
-    writer = csv.writer(buffer)
-    
-    # Header
-    writer.writerow(['OGPW Network Traffic Analysis Report'])
-    writer.writerow(['Analyzed File:', filename])
-    writer.writerow(['Report Generated:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
-    writer.writerow([])  # Empty row
-    
+def _csv_header_rows(filename):
+    """Title rows of the CSV report, with the time they are written"""
+    yield ['OGPW Network Traffic Analysis Report']
+    yield ['Analyzed File:', filename]
+    yield ['Report Generated:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
+    yield []  # Empty row
+
+def _csv_rows(analysis_data):
+    """Rows of the CSV report below the title"""
     # Basic Statistics
     if 'basic_stats' in analysis_data:
-        writer.writerow(['Basic Statistics'])
+        yield ['Basic Statistics']
         stats = analysis_data['basic_stats']
-        writer.writerow(['Metric', 'Value'])
-        writer.writerow(['Total Packets', stats.get('total_packets', 'N/A')])
-        writer.writerow(['Total Bytes', stats.get('total_bytes', 'N/A')])
-        writer.writerow(['Duration (seconds)', stats.get('duration_seconds', 'N/A')])
-        writer.writerow(['Average Packet Size', f"{stats.get('avg_packet_size', 'N/A')} bytes"])
-        writer.writerow(['Throughput (packets/sec)', stats.get('throughput_pps', 'N/A')])
-        writer.writerow(['Throughput (bytes/sec)', stats.get('throughput_bps', 'N/A')])
-        writer.writerow([])  # Empty row
+        yield ['Metric', 'Value']
+        yield ['Total Packets', stats.get('total_packets', 'N/A')]
+        yield ['Total Bytes', stats.get('total_bytes', 'N/A')]
+        yield ['Duration (seconds)', stats.get('duration_seconds', 'N/A')]
+        yield ['Average Packet Size', f"{stats.get('avg_packet_size', 'N/A')} bytes"]
+        yield ['Throughput (packets/sec)', stats.get('throughput_pps', 'N/A')]
+        yield ['Throughput (bytes/sec)', stats.get('throughput_bps', 'N/A')]
+        yield []  # Empty row
     
     # Protocol Distribution
     if 'protocol_distribution' in analysis_data:
-        writer.writerow(['Protocol Distribution'])
-        writer.writerow(['Protocol', 'Packets', 'Percentage'])
+        yield ['Protocol Distribution']
+        yield ['Protocol', 'Packets', 'Percentage']
         protocols = analysis_data['protocol_distribution']
         for proto, data in protocols.items():
-            writer.writerow([proto, data.get('count', 0), f"{data.get('percentage', 0)}%"])
-        writer.writerow([])  # Empty row
+            yield [proto, data.get('count', 0), f"{data.get('percentage', 0)}%"]
+        yield []  # Empty row
     
     # TCP Analysis
     if 'tcp_analysis' in analysis_data:
-        writer.writerow(['TCP Connection Analysis'])
+        yield ['TCP Connection Analysis']
         tcp = analysis_data['tcp_analysis']
-        writer.writerow(['Metric', 'Value'])
-        writer.writerow(['Total Connections', tcp.get('total_connections', 'N/A')])
-        writer.writerow(['Successful Connections', tcp.get('successful_connections', 'N/A')])
-        writer.writerow(['Failed Connections', tcp.get('failed_connections', 'N/A')])
-        writer.writerow(['Success Rate', f"{tcp.get('success_rate', 'N/A')}%"])
-        writer.writerow(['Total TCP Packets', tcp.get('total_tcp_packets', 'N/A')])
-        writer.writerow([])  # Empty row
+        yield ['Metric', 'Value']
+        yield ['Total Connections', tcp.get('total_connections', 'N/A')]
+        yield ['Successful Connections', tcp.get('successful_connections', 'N/A')]
+        yield ['Failed Connections', tcp.get('failed_connections', 'N/A')]
+        yield ['Success Rate', f"{tcp.get('success_rate', 'N/A')}%"]
+        yield ['Total TCP Packets', tcp.get('total_tcp_packets', 'N/A')]
+        yield []  # Empty row
     
     # DNS Analysis
     if 'dns_analysis' in analysis_data:
-        writer.writerow(['DNS Analysis'])
+        yield ['DNS Analysis']
         dns = analysis_data['dns_analysis']
-        writer.writerow(['Total DNS Queries', dns.get('total_queries', 'N/A')])
-        writer.writerow(['Total DNS Responses', dns.get('total_responses', 'N/A')])
-        writer.writerow(['Unique Domains', dns.get('unique_domains', 'N/A')])
-        writer.writerow([])
+        yield ['Total DNS Queries', dns.get('total_queries', 'N/A')]
+        yield ['Total DNS Responses', dns.get('total_responses', 'N/A')]
+        yield ['Unique Domains', dns.get('unique_domains', 'N/A')]
+        yield []
         
         if 'top_domains' in dns and dns['top_domains']:
-            writer.writerow(['Top Queried Domains'])
-            writer.writerow(['Domain', 'Query Count'])
+            yield ['Top Queried Domains']
+            yield ['Domain', 'Query Count']
             for domain_info in dns['top_domains']:
-                writer.writerow([domain_info.get('domain', 'Unknown'), domain_info.get('count', 0)])
-            writer.writerow([])
+                yield [domain_info.get('domain', 'Unknown'), domain_info.get('count', 0)]
+            yield []
     
     # Anomalies
     if 'anomalies' in analysis_data and analysis_data['anomalies']:
-        writer.writerow(['Security Anomalies'])
-        writer.writerow(['Type', 'Description', 'Severity', 'Source IP'])
+        yield ['Security Anomalies']
+        yield ['Type', 'Description', 'Severity', 'Source IP']
         for anomaly in analysis_data['anomalies']:
-            writer.writerow([
+            yield [
                 anomaly.get('type', 'Unknown'),
                 anomaly.get('description', 'No description'),
                 anomaly.get('severity', 'Unknown'),
                 anomaly.get('source_ip', 'N/A')
-            ])
-        writer.writerow([])
+            ]
+        yield []
     
     # IP Conversations
     if 'ip_conversations' in analysis_data:
-        writer.writerow(['Top IP Conversations'])
-        writer.writerow(['Endpoints', 'Packets', 'Bytes'])
+        yield ['Top IP Conversations']
+        yield ['Endpoints', 'Packets', 'Bytes']
         conversations = analysis_data['ip_conversations']
         for conv in conversations:
-            writer.writerow([
+            yield [
                 conv.get('endpoints', 'Unknown'),
                 conv.get('packets', 0),
                 conv.get('bytes', 0)
-            ])
-    
-    # Convert StringIO to BytesIO for file response
-    csv_content = buffer.getvalue()
-    buffer.close()
+            ]
+        yield []
     
-    bytes_buffer = io.BytesIO()
-    bytes_buffer.write(csv_content.encode('utf-8'))
-    bytes_buffer.seek(0)
+    # Full conversation table kept on the server (absent in sketch mode)
+    if 'conversation_table' in analysis_data:
+        table = analysis_data['conversation_table']
+        yield ['All IP Conversations']
+        yield ['Endpoint A', 'Endpoint B', 'Packets A→B', 'Bytes A→B', 'Packets B→A', 'Bytes B→A',
+               'First Seen', 'Last Seen']
+        yield from zip(*(table[column] for column in CONVERSATION_COLUMNS))
+        yield []
     
-    return bytes_buffer
\ No newline at end of file
+    # Per-second timeline
+    if 'timeline_series' in analysis_data:
+        series = analysis_data['timeline_series'][str(RESOLUTIONS[0])]
+        yield ['Traffic Timeline (per second)']
+        yield ['Timestamp', 'Packets', 'Bytes']
+        yield from zip(series['timestamps'], series['packets'], series['bytes'])
+
+def _iter_csv(table_rows, chunk_rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rows = 0
+    for row in table_rows:
+        writer.writerow(row)
+        rows += 1
+        if rows == chunk_rows:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if rows:
+        yield buffer.getvalue().encode('utf-8')
+
+def csv_report_header(filename):
+    """Title rows of the CSV report as UTF-8; written per request, so the timestamp is never cached"""
+    return b''.join(_iter_csv(_csv_header_rows(filename), CSV_CHUNK_ROWS))
+
+def iter_csv_body(analysis_data, chunk_rows=CSV_CHUNK_ROWS):
+    """CSV report below the title as UTF-8 chunks of ``chunk_rows`` rows, for streaming and caching"""
+    return _iter_csv(_csv_rows(analysis_data), chunk_rows)
+
+def iter_csv_report(analysis_data, filename, chunk_rows=CSV_CHUNK_ROWS):
+    """Whole CSV report as UTF-8 chunks of ``chunk_rows`` rows"""
+    yield csv_report_header(filename)
+    yield from iter_csv_body(analysis_data, chunk_rows)
+
+def generate_csv_report(analysis_data, filename):
+    """Generate CSV report from analysis data"""
+    return io.BytesIO(b''.join(iter_csv_report(analysis_data, filename)))
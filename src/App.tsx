@@ -7,20 +7,11 @@ import ProtocolFilter from './components/ProtocolFilter';
 import LoadingSpinner from './components/LoadingSpinner';
 import * as api from './services/api';
 
-interface AnalysisData {
-  basic_stats?: any;
-  protocol_distribution?: any;
-  ip_conversations?: any;
-  tcp_streams?: any;
-  dns_analysis?: any;
-  anomalies?: any;
-  kpis?: any;
-  timeline?: any;
-}
-
 function App() {
   const [currentView, setCurrentView] = useState<'upload' | 'dashboard' | 'chat' | 'filter'>('upload');
-  const [analysisData, setAnalysisData] = useState<AnalysisData | null>(null);
+  // Headline numbers only; the dashboard fetches list sections on demand
+  const [summary, setSummary] = useState<api.AnalysisSummary | null>(null);
+  const [analysisId, setAnalysisId] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [currentFileName, setCurrentFileName] = useState<string>('');
@@ -31,7 +22,8 @@ function App() {
     
     try {
       const result = await api.uploadPcapFile(file);
-      setAnalysisData(result.analysis);
+      setSummary(result.summary);
+      setAnalysisId(result.analysis_id);
       setCurrentFileName(result.filename);
       setCurrentView('dashboard');
     } catch (err) {
@@ -73,7 +65,7 @@ function App() {
               </div>
             </div>
             
-            {analysisData && (
+            {summary && (
               <div className="flex items-center space-x-2">
                 <button
                   onClick={handleExportPDF}
@@ -98,7 +90,7 @@ function App() {
       {/* Main Content */}
       <div className="flex h-[calc(100vh-4rem)]">
         {/* Sidebar */}
-        {analysisData && (
+        {summary && (
           <div className="w-64 bg-slate-800/30 backdrop-blur-sm border-r border-slate-700/50 p-4">
             <div className="mb-6">
               <h3 className="text-sm font-medium text-slate-400 mb-2">CURRENT FILE</h3>
@@ -191,15 +183,15 @@ function App() {
                 </div>
               )}
 
-              {currentView === 'dashboard' && analysisData && (
-                <Dashboard data={analysisData} />
+              {currentView === 'dashboard' && summary && (
+                <Dashboard analysisId={analysisId} summary={summary} />
               )}
 
-              {currentView === 'chat' && analysisData && (
+              {currentView === 'chat' && summary && (
                 <ChatInterface />
               )}
 
-              {currentView === 'filter' && analysisData && (
+              {currentView === 'filter' && summary && (
                 <ProtocolFilter />
               )}
             </>
@@ -1,36 +1,73 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, PieChart, Pie, Cell, LineChart, Line } from 'recharts';
 import { Activity, Network, Shield, Zap, AlertTriangle, CheckCircle, XCircle } from 'lucide-react';
+import * as api from '../services/api';
 
 interface DashboardProps {
-  data: any;
+  analysisId: string | null;
+  summary: api.AnalysisSummary;
 }
 
-const Dashboard: React.FC<DashboardProps> = ({ data }) => {
+const ANOMALY_PAGE_SIZE = 20;
+
+// First paint uses the summary only; charts and lists are fetched section by section
+const Dashboard: React.FC<DashboardProps> = ({ analysisId, summary }) => {
   const COLORS = ['#3B82F6', '#10B981', '#F59E0B', '#EF4444', '#8B5CF6', '#06B6D4'];
+  const [protocols, setProtocols] = useState<any[]>([]);
+  const [conversations, setConversations] = useState<any[]>([]);
+  const [domains, setDomains] = useState<any[]>([]);
+  const [timeline, setTimeline] = useState<api.TimelineRange | null>(null);
+  const [anomalies, setAnomalies] = useState<any[]>([]);
+  const [anomalyCursor, setAnomalyCursor] = useState<string | null>(null);
+
+  useEffect(() => {
+    setAnomalies([]);
+    setAnomalyCursor(null);
+    api.getAnalysisSection('protocols', { analysisId }).then((page) => setProtocols(page.items)).catch(() => {});
+    api.getAnalysisSection('conversations', { sort: '-packets', limit: 10, analysisId })
+      .then((page) => setConversations(page.items)).catch(() => {});
+    api.getAnalysisSection('domains', { limit: 10, analysisId }).then((page) => setDomains(page.items)).catch(() => {});
+    api.getAnalysisSection('anomalies', { limit: ANOMALY_PAGE_SIZE, analysisId })
+      .then((page) => {
+        setAnomalies(page.items);
+        setAnomalyCursor(page.next_cursor);
+      }).catch(() => {});
+    api.getTimeline().then(setTimeline).catch(() => {});
+  }, [analysisId]);
+
+  const loadMoreAnomalies = async () => {
+    const page = await api.getAnalysisSection('anomalies', {
+      limit: ANOMALY_PAGE_SIZE,
+      cursor: anomalyCursor,
+      analysisId,
+    });
+    setAnomalies((loaded) => [...loaded, ...page.items]);
+    setAnomalyCursor(page.next_cursor);
+  };
 
   // Prepare protocol distribution data for charts
-  const protocolData = data.protocol_distribution ? 
-    Object.entries(data.protocol_distribution).map(([protocol, info]: [string, any]) => ({
-      name: protocol,
-      value: info.count,
-      percentage: info.percentage
-    })) : [];
+  const protocolData = protocols.map((row: any) => ({
+    name: row.protocol,
+    value: row.count,
+    percentage: row.percentage
+  }));
 
   // Prepare IP conversation data
-  const ipConversationData = data.ip_conversations ? 
-    data.ip_conversations.slice(0, 10).map((conv: any, index: number) => ({
-      name: `${conv.ips[0]} ↔ ${conv.ips[1]}`,
-      packets: conv.packets,
-      bytes: conv.bytes
-    })) : [];
+  const ipConversationData = conversations.map((conv: any) => ({
+    name: conv.endpoints,
+    packets: conv.packets,
+    bytes: conv.bytes
+  }));
 
   // Prepare timeline data
-  const timelineData = data.timeline ? 
-    data.timeline.map((point: any) => ({
-      time: new Date(point.timestamp).toLocaleTimeString(),
-      packets: point.packet_count
+  const timelineData = timeline ?
+    timeline.timestamps.map((timestamp: number, index: number) => ({
+      time: new Date(timestamp * 1000).toLocaleTimeString(),
+      packets: timeline.packets[index]
     })) : [];
+  // Seconds each timeline point totals; long captures are shown per minute or hour
+  const timelineResolution = timeline?.resolution ?? 1;
+  const tcp = summary.tcp_analysis;
 
   return (
     <div className="space-y-6">
@@ -40,7 +77,7 @@ const Dashboard: React.FC<DashboardProps> = ({ data }) => {
       </div>
 
       {/* KPI Cards */}
-      {data.basic_stats && (
+      {summary.basic_stats && (
         <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
           <div className="bg-slate-800/50 backdrop-blur-sm rounded-xl p-6 border border-slate-700/50">
             <div className="flex items-center space-x-3">
@@ -49,7 +86,7 @@ const Dashboard: React.FC<DashboardProps> = ({ data }) => {
               </div>
               <div>
                 <p className="text-slate-400 text-sm">Total Packets</p>
-                <p className="text-2xl font-bold text-white">{data.basic_stats.total_packets?.toLocaleString()}</p>
+                <p className="text-2xl font-bold text-white">{summary.basic_stats.total_packets?.toLocaleString()}</p>
               </div>
             </div>
           </div>
@@ -61,7 +98,7 @@ const Dashboard: React.FC<DashboardProps> = ({ data }) => {
               </div>
               <div>
                 <p className="text-slate-400 text-sm">Total Bytes</p>
-                <p className="text-2xl font-bold text-white">{(data.basic_stats.total_bytes / 1024 / 1024).toFixed(2)} MB</p>
+                <p className="text-2xl font-bold text-white">{(summary.basic_stats.total_bytes / 1024 / 1024).toFixed(2)} MB</p>
               </div>
             </div>
           </div>
@@ -73,7 +110,7 @@ const Dashboard: React.FC<DashboardProps> = ({ data }) => {
               </div>
               <div>
                 <p className="text-slate-400 text-sm">Duration</p>
-                <p className="text-2xl font-bold text-white">{data.basic_stats.duration_seconds}s</p>
+                <p className="text-2xl font-bold text-white">{summary.basic_stats.duration_seconds}s</p>
               </div>
             </div>
           </div>
@@ -85,7 +122,7 @@ const Dashboard: React.FC<DashboardProps> = ({ data }) => {
               </div>
               <div>
                 <p className="text-slate-400 text-sm">Packets/Sec</p>
-                <p className="text-2xl font-bold text-white">{data.basic_stats.packets_per_second}</p>
+                <p className="text-2xl font-bold text-white">{summary.basic_stats.packets_per_second}</p>
               </div>
             </div>
           </div>
@@ -93,13 +130,13 @@ const Dashboard: React.FC<DashboardProps> = ({ data }) => {
       )}
 
       {/* Connection KPIs */}
-      {data.kpis && (
+      {tcp && tcp.total_connections > 0 && (
         <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
           <div className="bg-slate-800/50 backdrop-blur-sm rounded-xl p-6 border border-slate-700/50">
             <div className="flex items-center justify-between">
               <div>
                 <p className="text-slate-400 text-sm">TCP Established</p>
-                <p className="text-2xl font-bold text-green-400">{data.kpis.tcp_established_connections}</p>
+                <p className="text-2xl font-bold text-green-400">{tcp.successful_connections}</p>
               </div>
               <CheckCircle className="h-8 w-8 text-green-400" />
             </div>
@@ -109,7 +146,7 @@ const Dashboard: React.FC<DashboardProps> = ({ data }) => {
             <div className="flex items-center justify-between">
               <div>
                 <p className="text-slate-400 text-sm">TCP Failed</p>
-                <p className="text-2xl font-bold text-red-400">{data.kpis.tcp_failed_connections}</p>
+                <p className="text-2xl font-bold text-red-400">{tcp.failed_connections}</p>
               </div>
               <XCircle className="h-8 w-8 text-red-400" />
             </div>
@@ -119,7 +156,7 @@ const Dashboard: React.FC<DashboardProps> = ({ data }) => {
             <div className="flex items-center justify-between">
               <div>
                 <p className="text-slate-400 text-sm">Success Rate</p>
-                <p className="text-2xl font-bold text-blue-400">{data.kpis.connection_success_rate}%</p>
+                <p className="text-2xl font-bold text-blue-400">{tcp.success_rate}%</p>
               </div>
               <Activity className="h-8 w-8 text-blue-400" />
             </div>
@@ -187,7 +224,12 @@ const Dashboard: React.FC<DashboardProps> = ({ data }) => {
       {/* Timeline Chart */}
       {timelineData.length > 0 && (
         <div className="bg-slate-800/50 backdrop-blur-sm rounded-xl p-6 border border-slate-700/50">
-          <h3 className="text-xl font-bold text-white mb-4">Traffic Timeline</h3>
+          <h3 className="text-xl font-bold text-white mb-4">
+            Traffic Timeline
+            <span className="ml-2 text-sm font-normal text-slate-400">
+              packets per {timelineResolution === 1 ? 'second' : `${timelineResolution} s`}
+            </span>
+          </h3>
           <ResponsiveContainer width="100%" height={300}>
             <LineChart data={timelineData}>
               <CartesianGrid strokeDasharray="3 3" stroke="#374151" />
@@ -207,14 +249,15 @@ const Dashboard: React.FC<DashboardProps> = ({ data }) => {
       )}
 
       {/* Anomalies Section */}
-      {data.anomalies && data.anomalies.length > 0 && (
+      {anomalies.length > 0 && (
         <div className="bg-slate-800/50 backdrop-blur-sm rounded-xl p-6 border border-slate-700/50">
           <div className="flex items-center space-x-3 mb-4">
             <AlertTriangle className="h-6 w-6 text-yellow-400" />
             <h3 className="text-xl font-bold text-white">Detected Anomalies</h3>
+            <span className="text-sm text-slate-400">{summary.anomalies.total} total</span>
           </div>
           <div className="space-y-3">
-            {data.anomalies.map((anomaly: any, index: number) => (
+            {anomalies.map((anomaly: any, index: number) => (
               <div key={index} className="flex items-start space-x-3 p-4 bg-slate-700/50 rounded-lg">
                 <div className={`p-2 rounded-full ${
                   anomaly.severity === 'High' ? 'bg-red-600' :
@@ -235,30 +278,39 @@ const Dashboard: React.FC<DashboardProps> = ({ data }) => {
               </div>
             ))}
           </div>
+          {anomalyCursor && (
+            <button
+              onClick={loadMoreAnomalies}
+              className="mt-4 px-4 py-2 bg-slate-700 hover:bg-slate-600 text-white rounded-lg transition-colors"
+            >
+              Load more
+            </button>
+          )}
         </div>
       )}
 
-      {/* TCP Streams Table */}
-      {data.tcp_streams && data.tcp_streams.length > 0 && (
+      {/* Top Domains Table */}
+      {domains.length > 0 && (
         <div className="bg-slate-800/50 backdrop-blur-sm rounded-xl p-6 border border-slate-700/50">
-          <h3 className="text-xl font-bold text-white mb-4">Top TCP Streams</h3>
+          <h3 className="text-xl font-bold text-white mb-4">
+            Top Queried Domains
+            <span className="ml-2 text-sm font-normal text-slate-400">
+              of {summary.sections.domains?.toLocaleString()}
+            </span>
+          </h3>
           <div className="overflow-x-auto">
             <table className="w-full">
               <thead>
                 <tr className="border-b border-slate-700">
-                  <th className="text-left py-3 px-4 text-slate-400 font-medium">Endpoints</th>
-                  <th className="text-left py-3 px-4 text-slate-400 font-medium">Packets</th>
-                  <th className="text-left py-3 px-4 text-slate-400 font-medium">Bytes</th>
-                  <th className="text-left py-3 px-4 text-slate-400 font-medium">Ports</th>
+                  <th className="text-left py-3 px-4 text-slate-400 font-medium">Domain</th>
+                  <th className="text-left py-3 px-4 text-slate-400 font-medium">Queries</th>
                 </tr>
               </thead>
               <tbody>
-                {data.tcp_streams.slice(0, 10).map((stream: any, index: number) => (
+                {domains.map((row: any, index: number) => (
                   <tr key={index} className="border-b border-slate-700/50 hover:bg-slate-700/30">
-                    <td className="py-3 px-4 text-white text-sm">{stream.endpoints.join(' ↔ ')}</td>
-                    <td className="py-3 px-4 text-slate-300">{stream.packets}</td>
-                    <td className="py-3 px-4 text-slate-300">{(stream.bytes / 1024).toFixed(1)} KB</td>
-                    <td className="py-3 px-4 text-slate-300">{stream.ports.join(', ')}</td>
+                    <td className="py-3 px-4 text-white text-sm">{row.domain}</td>
+                    <td className="py-3 px-4 text-slate-300">{row.count}</td>
                   </tr>
                 ))}
               </tbody>
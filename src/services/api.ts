@@ -31,21 +31,83 @@ apiClient.interceptors.response.use(
   }
 );
 
-export const uploadPcapFile = async (file: File) => {
+export interface AnalysisJob {
+  job_id: string;
+  filename: string;
+  status: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+  progress: number;
+  bytes_processed: number;
+  total_bytes: number;
+  packets_processed: number;
+  packets_per_second: number;
+  elapsed_seconds: number;
+  eta_seconds: number | null;
+  error?: string;
+  analysis_id?: string;
+  summary?: AnalysisSummary;
+}
+
+const JOB_POLL_INTERVAL_MS = 1000;
+
+// Id of the analysis the other endpoints should use, set by the last upload
+let currentAnalysisId: string | null = null;
+
+export const setCurrentAnalysisId = (analysisId: string | null) => {
+  currentAnalysisId = analysisId;
+};
+
+const analysisParams = () => (currentAnalysisId ? { analysis_id: currentAnalysisId } : {});
+
+export const getJobStatus = async (jobId: string): Promise<AnalysisJob> => {
+  const response = await apiClient.get(`/jobs/${jobId}`);
+  return response.data;
+};
+
+export const cancelJob = async (jobId: string): Promise<AnalysisJob> => {
+  const response = await apiClient.post(`/jobs/${jobId}/cancel`);
+  return response.data;
+};
+
+// Poll an analysis job until it leaves the queued/running states
+const waitForJob = async (jobId: string, onProgress?: (job: AnalysisJob) => void) => {
+  while (true) {
+    const job = await getJobStatus(jobId);
+    onProgress?.(job);
+
+    if (job.status === 'completed') {
+      setCurrentAnalysisId(job.analysis_id ?? null);
+      return { analysis_id: job.analysis_id, filename: job.filename, summary: job.summary };
+    }
+    if (job.status === 'failed') {
+      throw new Error(`Analysis failed: ${job.error}`);
+    }
+    if (job.status === 'cancelled') {
+      throw new Error('Analysis cancelled');
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+};
+
+export const uploadPcapFile = async (file: File, onProgress?: (job: AnalysisJob) => void) => {
   try {
     console.log('Uploading file:', file.name, 'Size:', file.size, 'bytes');
     
-    const formData = new FormData();
-    formData.append('file', file);
-    
-    const response = await apiClient.post('/upload', formData, {
+    // Raw body so the backend can start analyzing before the upload finishes
+    const response = await apiClient.post('/upload/stream', file, {
+      params: { filename: file.name },
       headers: {
-        'Content-Type': 'multipart/form-data',
+        'Content-Type': 'application/octet-stream',
       },
     });
     
-    console.log('Upload successful:', response.data);
-    return response.data;
+    if (response.data.cached) {
+      console.log('Upload successful, analysis loaded from cache');
+      setCurrentAnalysisId(response.data.analysis_id);
+      return response.data;
+    }
+
+    console.log('Upload successful, analysis job:', response.data.job_id);
+    return await waitForJob(response.data.job_id, onProgress);
   } catch (error) {
     console.error('Upload failed:', error);
     if (axios.isAxiosError(error)) {
@@ -64,23 +126,269 @@ export const uploadPcapFile = async (file: File) => {
   }
 };
 
-export const chatWithAI = async (message: string) => {
-  const response = await apiClient.post('/chat', { message });
+export interface LiveCapture {
+  live_id: string;
+  filename: string;
+  status: 'running' | 'stopping' | 'stopped' | 'failed';
+  analysis_id: string | null;
+  current_file: string | null;
+  packets_processed: number;
+  sequence: number;
+  error?: string;
+}
+
+// Tail a growing capture (or a directory of rotated ones) under the backend's LIVE_CAPTURE_DIR
+export const startLiveCapture = async (path: string): Promise<LiveCapture> => {
+  const response = await apiClient.post('/live', { path });
   return response.data;
 };
 
-export const getCurrentAnalysis = async () => {
-  const response = await apiClient.get('/analysis/current');
+export const stopLiveCapture = async (liveId: string): Promise<LiveCapture> => {
+  const response = await apiClient.post(`/live/${liveId}/stop`);
+  return response.data;
+};
+
+// Follow a live capture over Server-Sent Events; returns a function closing the stream
+export const subscribeLiveCapture = (
+  liveId: string,
+  onUpdate: (analysis: any) => void,
+  onEnd?: (live: LiveCapture) => void,
+) => {
+  const source = new EventSource(`${API_BASE_URL}/live/${liveId}/events`);
+  let analysis: any = null;
+
+  source.addEventListener('snapshot', (event) => {
+    analysis = JSON.parse((event as MessageEvent).data).analysis;
+    if (analysis) onUpdate(analysis);
+  });
+  source.addEventListener('delta', (event) => {
+    // Deltas hold the sections that changed, each in full
+    analysis = { ...analysis, ...JSON.parse((event as MessageEvent).data).changes };
+    onUpdate(analysis);
+  });
+  source.addEventListener('end', (event) => {
+    source.close();
+    const live: LiveCapture = JSON.parse((event as MessageEvent).data);
+    setCurrentAnalysisId(live.analysis_id);
+    onEnd?.(live);
+  });
+
+  return () => source.close();
+};
+
+// Estimated tokens of the analysis context an AI answer was built from
+export interface ChatContextUsage {
+  budget: number;
+  used: number;
+  sections: { section: string; list_limit: number; tokens: number }[];
+  dropped: string[];
+}
+
+export interface ChatResponse {
+  response: string;
+  context: ChatContextUsage | null;
+}
+
+export const chatWithAI = async (message: string): Promise<ChatResponse> => {
+  const response = await apiClient.post('/chat', { message, ...analysisParams() });
+  return response.data;
+};
+
+// Stream an AI answer over Server-Sent Events, calling onToken as text arrives; resolves to the whole answer
+export const streamChatWithAI = async (
+  message: string,
+  onToken: (text: string) => void,
+): Promise<ChatResponse> => {
+  const response = await fetch(`${API_BASE_URL}/chat`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ message, stream: true, ...analysisParams() }),
+  });
+  if (!response.ok || !response.body) {
+    const error = await response.json().catch(() => ({}));
+    throw new Error(error.error || `Chat failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = /^event: (.*)$/m.exec(block)?.[1];
+      const data = JSON.parse(/^data: (.*)$/m.exec(block)?.[1] ?? 'null');
+      if (event === 'token') onToken(data.text);
+      else if (event === 'done') return data;
+      else if (event === 'error') throw new Error(data.error);
+    }
+  }
+  throw new Error('Chat stream ended without an answer');
+};
+
+// Summary of the current analysis; full=true returns the whole analysis instead (large for big captures)
+export const getCurrentAnalysis = async (full = false) => {
+  const response = await apiClient.get('/analysis/current', { params: { full: full || undefined, ...analysisParams() } });
+  return response.data;
+};
+
+// `performance` section of an analysis when the backend runs with ANALYSIS_PROFILING
+export interface AnalysisStage {
+  stage: string;
+  wall_seconds: number;
+  cpu_seconds: number;
+  packets: number;
+  peak_allocated_bytes?: number;
+}
+
+export interface AnalysisPerformance {
+  mode: 'streaming' | 'columnar' | 'parallel' | 'legacy';
+  wall_seconds: number;
+  cpu_seconds: number;
+  packets: number;
+  packets_per_second: number;
+  peak_rss_mb: number | null;
+  stages: AnalysisStage[];
+}
+
+export interface AnalysisSummary {
+  total_packets: number;
+  basic_stats: any;
+  tcp_analysis: any;
+  dns_analysis: any;
+  anomalies: { total: number; by_severity: Record<string, number> };
+  sections: Record<string, number>;
+}
+
+export interface SectionPage<T = any> {
+  section: string;
+  sort: string;
+  total: number;
+  items: T[];
+  next_cursor: string | null;
+}
+
+// Headline numbers only, for a fast first paint
+export const getAnalysisSummary = async (
+  analysisId?: string | null,
+): Promise<{ analysis_id: string; filename: string; summary: AnalysisSummary }> => {
+  const params = analysisId ? { analysis_id: analysisId } : analysisParams();
+  const response = await apiClient.get('/analysis/summary', { params });
+  return response.data;
+};
+
+// One page of conversations, anomalies, domains or protocols; sort is a field name, '-' prefixed for descending
+export const getAnalysisSection = async <T = any>(
+  section: 'conversations' | 'anomalies' | 'domains' | 'protocols',
+  options: { sort?: string; limit?: number; cursor?: string | null; analysisId?: string | null } = {},
+): Promise<SectionPage<T>> => {
+  const response = await apiClient.get(`/analysis/sections/${section}`, {
+    params: {
+      sort: options.sort,
+      limit: options.limit,
+      cursor: options.cursor ?? undefined,
+      ...(options.analysisId ? { analysis_id: options.analysisId } : analysisParams()),
+    },
+  });
+  return response.data;
+};
+
+export interface TimelineRange {
+  start: number | null;
+  end: number | null;
+  resolution: number;
+  downsampled: 'lttb' | 'minmax' | null;
+  timestamps: number[];
+  packets: number[];
+  bytes: number[];
+}
+
+// Traffic in [start, end) at the finest resolution that fits in maxPoints
+export const getTimeline = async (
+  start?: number,
+  end?: number,
+  maxPoints = 500,
+  method: 'lttb' | 'minmax' = 'lttb',
+): Promise<TimelineRange> => {
+  const response = await apiClient.get('/analysis/timeline', {
+    params: { start, end, max_points: maxPoints, method, ...analysisParams() },
+  });
+  return response.data;
+};
+
+export interface Conversation {
+  a: string;
+  b: string;
+  endpoints: string;
+  packets: number;
+  bytes: number;
+  packets_ab: number;
+  bytes_ab: number;
+  packets_ba: number;
+  bytes_ba: number;
+  first_seen: number;
+  last_seen: number;
+}
+
+export interface Endpoint {
+  address: string;
+  packets: number;
+  bytes: number;
+  packets_sent: number;
+  bytes_sent: number;
+  packets_received: number;
+  bytes_received: number;
+  peers: number;
+  first_seen: number;
+  last_seen: number;
+}
+
+export interface TopK<T> {
+  analysis_id: string;
+  ip: string | null;
+  by: string;
+  total: number;
+  items: T[];
+}
+
+// Top k conversations; ip is an address, a CIDR network or a prefix such as '10.1.'
+export const getConversations = async (
+  options: { by?: string; k?: number; ip?: string } = {},
+): Promise<TopK<Conversation>> => {
+  const response = await apiClient.get('/analysis/conversations', {
+    params: { by: options.by, k: options.k, ip: options.ip, ...analysisParams() },
+  });
+  return response.data;
+};
+
+// Top k endpoints by packets, bytes, sent/received counters or peers
+export const getEndpoints = async (
+  options: { by?: string; k?: number; ip?: string } = {},
+): Promise<TopK<Endpoint>> => {
+  const response = await apiClient.get('/analysis/endpoints', {
+    params: { by: options.by, k: options.k, ip: options.ip, ...analysisParams() },
+  });
   return response.data;
 };
 
 export const filterPackets = async (protocol: string) => {
-  const response = await apiClient.post('/analysis/filter', { protocol });
+  const response = await apiClient.post('/analysis/filter', { protocol, ...analysisParams() });
+  return response.data;
+};
+
+// BPF-style filter, e.g. 'tcp and dst port 443 and net 10.0.0.0/8'
+export const filterByExpression = async (expression: string) => {
+  const response = await apiClient.post('/analysis/filter', { expression, ...analysisParams() });
   return response.data;
 };
 
 export const exportPDF = async () => {
   const response = await apiClient.get('/export/pdf', {
+    params: analysisParams(),
     responseType: 'blob',
   });
   
@@ -97,6 +405,7 @@ export const exportPDF = async () => {
 
 export const exportCSV = async () => {
   const response = await apiClient.get('/export/csv', {
+    params: analysisParams(),
     responseType: 'blob',
   });
   
@@ -111,6 +420,27 @@ export const exportCSV = async () => {
   window.URL.revokeObjectURL(url);
 };
 
+export type BulkTable = 'packets' | 'flows' | 'timeline';
+export type BulkFormat = 'parquet' | 'arrow' | 'ndjson';
+
+// Per-packet, per-flow or per-second table for analysis in other tools
+export const exportBulk = async (table: BulkTable, format: BulkFormat = 'parquet') => {
+  const response = await apiClient.get('/export/bulk', {
+    params: { table, format, ...analysisParams() },
+    responseType: 'blob',
+  });
+  
+  // Create download link
+  const url = window.URL.createObjectURL(new Blob([response.data]));
+  const link = document.createElement('a');
+  link.href = url;
+  link.download = `ogpw_${table}_${new Date().toISOString().split('T')[0]}.${format}`;
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+  window.URL.revokeObjectURL(url);
+};
+
 export const healthCheck = async () => {
   const response = await apiClient.get('/health');
   return response.data;